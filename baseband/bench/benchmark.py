@@ -0,0 +1,279 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+"""Cycle-accurate throughput and latency benchmarks of the baseband blocks.
+
+Every benchmark sends packets through one toplevel and records per scenario
+(PHY, payload length, pause pattern):
+
+    cycles_per_bit     output cycles from the first to the last bit / bits
+    first_bit_latency  cycles from restart (task_start) to the first output bit
+    turnaround         cycles from the last bit of a packet to the first bit of
+                       the next one, restarted as soon as the last bit is seen
+    stall_cycles       cycles without a transfer between the first and last bit
+
+Results go to ``results/<toplevel>.json`` and are compared to
+``baseline/<toplevel>.json``. A metric above its baseline by more than
+BENCH_TOLERANCE (relative, default 0.02) fails the benchmark.
+
+Environment variables:
+    BENCH_FULL_SWEEP=1       sweep every payload length 0-255
+    BENCH_UPDATE_BASELINE=1  store the results as the new baseline
+    BENCH_TOLERANCE          allowed relative regression
+"""
+
+import itertools
+import json
+import logging
+import os
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge
+
+from cocotbext.axi import AxiStreamBus, AxiStreamSink, AxiStreamSource
+
+from ble_model import random_packets
+from helpers import is_high, PackedBits
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+results_dir = os.path.join(bench_dir, "results")
+baseline_dir = os.path.join(bench_dir, "baseline")
+
+METRICS = ("cycles_per_bit", "first_bit_latency", "turnaround", "stall_cycles")
+
+PAYLOAD_LENGTHS = [0, 1, 2, 3, 4, 5, 8, 16, 31, 32, 33, 64, 127, 128, 200, 251, 255]
+
+IDLE_CYCLE_PAUSE = [1, 1, 1, 1, 0]
+BACKPRESSURE_CYCLE_PAUSE = [1, 1, 1, 1, 1, 0]
+
+# Pattern name: (source pause, sink pause)
+PAUSE_PATTERNS = {
+    "none": (None, None),
+    "idle": (IDLE_CYCLE_PAUSE, None),
+    "backpressure": (None, BACKPRESSURE_CYCLE_PAUSE),
+}
+
+
+def payload_lengths():
+    """Payload lengths to sweep, every length with BENCH_FULL_SWEEP=1."""
+    if int(os.getenv("BENCH_FULL_SWEEP", "0")):
+        return list(range(256))
+    return PAYLOAD_LENGTHS
+
+
+class PacketMonitor:
+    """
+    Record start, first beat, last beat and number of beats of every packet.
+
+    A packet starts on the rising edge where ``start`` is sampled high after
+    being low; all cycle numbers count rising edges of the clock.
+
+    Args:
+        dut: Handle of the top-level module.
+        start: Restart signal, e.g. ``dut.task_start``.
+        prefix (str): Signal name prefix of the monitored output interface.
+    """
+
+    def __init__(self, dut, start, prefix="output"):
+        self.clock = dut.aclk
+        self.start = start
+        self.tvalid = getattr(dut, f"{prefix}_tvalid")
+        self.tready = getattr(dut, f"{prefix}_tready")
+        self.packets = []
+
+        cocotb.start_soon(self._run())
+
+    async def _run(self):
+        cycle = 0
+        start_seen = False
+        packet = None
+
+        while True:
+            await RisingEdge(self.clock)
+            cycle += 1
+
+            if is_high(self.start):
+                if not start_seen:
+                    packet = {"start": cycle, "first": None, "last": None, "beats": 0}
+                    self.packets.append(packet)
+                start_seen = True
+            else:
+                start_seen = False
+
+            if packet is not None and is_high(self.tvalid) and is_high(self.tready):
+                packet["beats"] += 1
+                if packet["first"] is None:
+                    packet["first"] = cycle
+                packet["last"] = cycle
+
+    def metrics(self):
+        """Metrics of the last packet, turnaround is measured from the packet before it."""
+        packet = self.packets[-1]
+        active_cycles = packet["last"] - packet["first"] + 1
+
+        result = {
+            "cycles_per_bit": active_cycles / packet["beats"],
+            "first_bit_latency": packet["first"] - packet["start"],
+            "turnaround": None,
+            "stall_cycles": active_cycles - packet["beats"],
+        }
+        if len(self.packets) > 1:
+            result["turnaround"] = packet["first"] - self.packets[-2]["last"]
+        return result
+
+
+class BenchTB:
+    """
+    Clock, reset and AXI-Stream drivers shared by the benchmarks.
+
+    Args:
+        dut: Handle of the top-level module.
+        source_prefix (str): Prefix of the input interface, None if the benchmark drives it.
+        source_byte_lanes (int): Byte lanes of the input interface, None to derive from tdata.
+        start: Restart signal of the module.
+    """
+
+    def __init__(self, dut, source_prefix, source_byte_lanes, start):
+        self.dut = dut
+
+        self.log = logging.getLogger("cocotb.tb")
+        self.log.setLevel(logging.INFO)
+
+        # 1/40Mhz = 25ns
+        cocotb.start_soon(Clock(dut.aclk, 25, units="ns").start())
+        self.start = start
+        self.source = None
+        if source_prefix is not None:
+            self.source = AxiStreamSource(AxiStreamBus.from_prefix(dut, source_prefix), dut.aclk, dut.aresetn, False, byte_lanes=source_byte_lanes)
+            self.source.log.setLevel(logging.WARNING)
+        # A 1-bit output without tkeep is one lane, with tkeep the sink takes the lanes from it
+        sink_lanes = {} if hasattr(dut, "output_tkeep") else {"byte_lanes": 1}
+        self.sink = AxiStreamSink(AxiStreamBus.from_prefix(dut, "output"), dut.aclk, dut.aresetn, False, **sink_lanes)
+        self.monitor = PacketMonitor(dut, start)
+        self.pattern = "none"
+
+        start.setimmediatevalue(0)
+        self.sink.log.setLevel(logging.WARNING)
+
+    async def reset(self):
+        self.dut.aresetn.setimmediatevalue(0)
+        await RisingEdge(self.dut.aclk)
+        await RisingEdge(self.dut.aclk)
+        self.dut.aresetn.value = 0
+        await RisingEdge(self.dut.aclk)
+        await RisingEdge(self.dut.aclk)
+        self.dut.aresetn.value = 1
+        await RisingEdge(self.dut.aclk)
+        await RisingEdge(self.dut.aclk)
+
+    def set_pause_pattern(self, pattern):
+        self.pattern = pattern
+        idle, backpressure = PAUSE_PATTERNS[pattern]
+        for driver, pause in ((self.source, idle), (self.sink, backpressure)):
+            if driver is None:
+                continue
+            if pause:
+                driver.set_pause_generator(itertools.cycle(pause))
+            else:
+                driver.clear_pause_generator()
+                driver.pause = False
+
+    def idle_generator(self):
+        """Idle generator of the current pattern, for benchmarks driving the input themselves."""
+        idle = PAUSE_PATTERNS[self.pattern][0]
+        return itertools.cycle(idle if idle else [0])
+
+    async def restart(self):
+        self.start.value = 1
+        await RisingEdge(self.dut.aclk)
+        self.start.value = 0
+
+    async def transfer(self, input_data, expected_output_data):
+        """Restart the module, send one packet and check what comes out."""
+        # Queue the input before the restart, so nothing waits for the testbench
+        if len(input_data):
+            self.source.send_nowait(input_data)
+        await self.restart()
+
+        expected = PackedBits.from_bits(expected_output_data)
+        mismatch = expected.mismatch(await self.sink.recv())
+        assert mismatch is None, f"output differs from bit {mismatch} of {len(expected)}"
+
+
+async def run_sweep(tb, scenarios, send_packet):
+    """
+    Run every scenario twice back-to-back and collect the metrics of the second packet.
+
+    Args:
+        tb (BenchTB): Testbench.
+        scenarios (iterable): Tuples of (phy, payload_length, pattern), phy is a BlePhy, a label or None.
+        send_packet: Coroutine function (phy, payload_length) sending one packet.
+
+    Returns:
+        list: One dict per scenario.
+    """
+    results = []
+    for phy, payload_length, pattern in scenarios:
+        tb.set_pause_pattern(pattern)
+
+        for _ in range(2):
+            await send_packet(phy, payload_length)
+
+        result = {"phy": getattr(phy, "name", phy), "payload_length": payload_length, "pattern": pattern}
+        result.update(tb.monitor.metrics())
+        tb.log.info("%s", result)
+        results.append(result)
+
+    return results
+
+
+def scenario_key(result):
+    return (result["phy"], result["payload_length"], result["pattern"])
+
+
+def save_and_compare(toplevel, results):
+    """
+    Write the results as JSON and compare them with the stored baseline.
+
+    Raises:
+        AssertionError: A metric regressed past the baseline.
+    """
+    os.makedirs(results_dir, exist_ok=True)
+    with open(os.path.join(results_dir, f"{toplevel}.json"), "w", encoding="utf-8") as f:
+        json.dump({"toplevel": toplevel, "results": results}, f, indent=2)
+
+    baseline_file = os.path.join(baseline_dir, f"{toplevel}.json")
+    if int(os.getenv("BENCH_UPDATE_BASELINE", "0")):
+        os.makedirs(baseline_dir, exist_ok=True)
+        with open(baseline_file, "w", encoding="utf-8") as f:
+            json.dump({"toplevel": toplevel, "results": results}, f, indent=2)
+        return
+
+    if not os.path.exists(baseline_file):
+        logging.getLogger("cocotb.tb").warning("No baseline for %s", toplevel)
+        return
+
+    with open(baseline_file, encoding="utf-8") as f:
+        baseline = {scenario_key(result): result for result in json.load(f)["results"]}
+
+    tolerance = float(os.getenv("BENCH_TOLERANCE", "0.02"))
+    regressions = []
+    for result in results:
+        reference = baseline.get(scenario_key(result))
+        if reference is None:
+            continue
+        for metric in METRICS:
+            if result[metric] is None or reference[metric] is None:
+                continue
+            if result[metric] > reference[metric] * (1 + tolerance) + 1e-9:
+                regressions.append(f"{scenario_key(result)} {metric}: {result[metric]} > {reference[metric]}")
+
+    assert not regressions, "Performance regressions:\n" + "\n".join(regressions)
+
+
+def random_packet(rng, payload_length):
+    """Random parameters of one packet as Python scalars, payload as bytes."""
+    params = random_packets(rng, 1, payload_length)
+    packet = {name: int(value[0]) for name, value in params.items() if name != "payload"}
+    packet["payload"] = params["payload"][0].tobytes()
+    return packet
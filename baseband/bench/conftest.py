@@ -0,0 +1,8 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+import os
+import sys
+
+# The benchmarks share the helpers of the tests and the reference model
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'test')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'model')))
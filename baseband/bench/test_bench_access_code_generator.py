@@ -0,0 +1,38 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+import itertools
+import os
+
+import cocotb
+import numpy as np
+
+from ble_model import access_code_bits, pdu_crc_bits
+from benchmark import BenchTB, PAUSE_PATTERNS, payload_lengths, random_packet, run_sweep, save_and_compare
+from helpers import setup_test, rtl_dir
+
+@cocotb.test()
+async def run_bench(dut):
+    tb = BenchTB(dut, "input", 1, dut.restart)
+    await tb.reset()
+
+    rng = np.random.default_rng(2024)
+
+    async def send_packet(_phy, payload_length):
+        packet = random_packet(rng, payload_length)
+        bits = pdu_crc_bits(packet["crc_init"], packet["header"], np.frombuffer(packet["payload"], dtype=np.uint8))
+        expected = np.concatenate([access_code_bits(packet["access_code"]), bits], axis=1)
+        dut.access_code.value = packet["access_code"]
+        await tb.transfer(bits[0].tobytes(), expected[0].tobytes())
+
+    scenarios = itertools.product([None], payload_lengths(), PAUSE_PATTERNS)
+    save_and_compare("access_code_generator", await run_sweep(tb, scenarios, send_packet))
+
+def test_bench_access_code_generator():
+    setup_test(
+        "test_bench_access_code_generator",
+        "access_code_generator",
+        [
+            os.path.join(rtl_dir, "tx/access_code_generator.sv"),
+            os.path.join(rtl_dir, "axis_skid_buffer.sv"),
+        ]
+    )
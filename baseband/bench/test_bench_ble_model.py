@@ -0,0 +1,52 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from ble_model import BlePhy, GfskModulator, ll_packet_bits, random_packets
+from benchmark import results_dir
+
+log = logging.getLogger("ble_model.bench")
+
+
+def write_results(name, results):
+    os.makedirs(results_dir, exist_ok=True)
+    with open(os.path.join(results_dir, f"{name}.json"), "w", encoding="utf-8") as f:
+        json.dump({"toplevel": name, "cpus": os.cpu_count(), "results": results}, f, indent=2)
+
+
+def test_bench_ll_packet_bits():
+    """Packets per second of the batched TX chain model"""
+    n_packets = 20000
+    params = random_packets(np.random.default_rng(1), n_packets, 37)
+
+    start = time.perf_counter()
+    ll_packet_bits(BlePhy.BLE_PHY_1M, **params)
+    elapsed = time.perf_counter() - start
+
+    result = {"phy": BlePhy.BLE_PHY_1M.name, "payload_length": 37, "packets_per_second": round(n_packets / elapsed)}
+    log.info("%s", result)
+    write_results("ble_model", [result])
+
+    assert result["packets_per_second"] > 10000
+
+
+def test_bench_gfsk():
+    """Real time factor of the streaming GFSK modulator at 8 samples per symbol"""
+    bits = np.random.default_rng(10).integers(0, 2, 2_000_000, dtype=np.uint8)
+    modulator = GfskModulator(BlePhy.BLE_PHY_1M, 8)
+
+    start = time.perf_counter()
+    n_samples = sum(len(iq) for iq in modulator.stream([bits]))
+    elapsed = time.perf_counter() - start
+
+    result = {"phy": BlePhy.BLE_PHY_1M.name, "samples_per_symbol": 8,
+              "real_time_factor": round(n_samples / modulator.sample_rate / elapsed, 2)}
+    log.info("%s", result)
+    write_results("gfsk", [result])
+
+    assert result["real_time_factor"] > 2
@@ -0,0 +1,78 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+import itertools
+import os
+
+import cocotb
+import numpy as np
+
+from ble_model import ll_packet_bits
+from benchmark import BenchTB, PAUSE_PATTERNS, payload_lengths, random_packet, run_sweep, save_and_compare
+from helpers import setup_test, rtl_dir, BleCi, BlePhy, BlePduType
+
+# Benchmark label: (PHY, coding indicator)
+MODES = {
+    "BLE_PHY_1M": (BlePhy.BLE_PHY_1M, BleCi.BLE_CI_S8),
+    "BLE_PHY_2M": (BlePhy.BLE_PHY_2M, BleCi.BLE_CI_S8),
+    "BLE_PHY_CODED_S8": (BlePhy.BLE_PHY_CODED, BleCi.BLE_CI_S8),
+    "BLE_PHY_CODED_S2": (BlePhy.BLE_PHY_CODED, BleCi.BLE_CI_S2),
+}
+
+@cocotb.test()
+async def run_bench(dut):
+    tb = BenchTB(dut, "payload", None, dut.task_start)
+    await tb.reset()
+
+    rng = np.random.default_rng(2024)
+    dut.pdu_type.value = BlePduType.PDU_TYPE_ADVERTISING.value
+    dut.descriptor_tvalid.value = 0
+    dut.counter_address.value = 0
+    dut.counter_clear.value = 0
+    dut.channel_selection_enabled.value = 0
+    dut.event_counter.value = 0
+    dut.channel_map.value = 0
+    dut.start_tick.value = 0
+    dut.start_arm.value = 0
+    dut.start_disarm.value = 0
+    dut.event_tready.value = 0
+    dut.event_overflow_clear.value = 0
+
+    async def send_packet(mode, payload_length):
+        phy, coding_indicator = MODES[mode]
+        packet = random_packet(rng, payload_length)
+        dut.phy_type.value = phy.value
+        dut.coding_indicator.value = coding_indicator.value
+        dut.access_code.value = packet["access_code"]
+        dut.whitening_enabled.value = packet["whitening_enabled"]
+        dut.channel.value = packet["channel"]
+        dut.crc_init.value = packet["crc_init"]
+        dut.packet_hdr.value = packet["header"]
+        expected = ll_packet_bits(phy, **{**packet, "payload": np.frombuffer(packet["payload"], dtype=np.uint8)},
+                                  coding_indicator=coding_indicator)[0]
+        await tb.transfer(packet["payload"], expected.tobytes())
+
+    scenarios = itertools.product(MODES, payload_lengths(), PAUSE_PATTERNS)
+    save_and_compare("ll_pkt_generator", await run_sweep(tb, scenarios, send_packet))
+
+def test_bench_ll_pkt_generator():
+    setup_test(
+        "test_bench_ll_pkt_generator",
+        "ll_pkt_generator",
+        [
+            os.path.join(rtl_dir, "tx/ll_pkt_generator.sv"),
+            os.path.join(rtl_dir, "tx/pdu_crc_generator.sv"),
+            os.path.join(rtl_dir, "tx/preamble_generator.sv"),
+            os.path.join(rtl_dir, "tx/access_code_generator.sv"),
+            os.path.join(rtl_dir, "tx/fec_encoder.sv"),
+
+            os.path.join(rtl_dir, "parallel_crc24.sv"),
+            os.path.join(rtl_dir, "serializer.sv"),
+            os.path.join(rtl_dir, "whitening.sv"),
+            os.path.join(rtl_dir, "channel_selector.sv"),
+            os.path.join(rtl_dir, "timebase.sv"),
+            os.path.join(rtl_dir, "axis_skid_buffer.sv"),
+            os.path.join(rtl_dir, "axis_fifo.sv"),
+            os.path.join(rtl_dir, "deserializer.sv"),
+            os.path.join(rtl_dir, "axis_perf_counter.sv"),
+        ]
+    )
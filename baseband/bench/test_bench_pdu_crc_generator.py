@@ -0,0 +1,40 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+import itertools
+import os
+
+import cocotb
+import numpy as np
+
+from ble_model import pdu_crc_bits
+from benchmark import BenchTB, PAUSE_PATTERNS, payload_lengths, random_packet, run_sweep, save_and_compare
+from helpers import setup_test, rtl_dir
+
+@cocotb.test()
+async def run_bench(dut):
+    tb = BenchTB(dut, "payload", None, dut.restart)
+    await tb.reset()
+
+    rng = np.random.default_rng(2024)
+    dut.pdu_type.value = 0
+
+    async def send_packet(_phy, payload_length):
+        packet = random_packet(rng, payload_length)
+        dut.crc_init.value = packet["crc_init"]
+        dut.packet_hdr.value = packet["header"]
+        expected = pdu_crc_bits(packet["crc_init"], packet["header"], np.frombuffer(packet["payload"], dtype=np.uint8))[0]
+        await tb.transfer(packet["payload"], expected.tobytes())
+
+    scenarios = itertools.product([None], payload_lengths(), PAUSE_PATTERNS)
+    save_and_compare("pdu_crc_generator", await run_sweep(tb, scenarios, send_packet))
+
+def test_bench_pdu_crc_generator():
+    setup_test(
+        "test_bench_pdu_crc_generator",
+        "pdu_crc_generator",
+        [
+            os.path.join(rtl_dir, "tx/pdu_crc_generator.sv"),
+            os.path.join(rtl_dir, "parallel_crc24.sv"),
+            os.path.join(rtl_dir, "serializer.sv"),
+        ]
+    )
@@ -0,0 +1,41 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+import itertools
+import os
+
+import cocotb
+import numpy as np
+
+from ble_model import access_code_bits, pdu_crc_bits, preamble_bits
+from benchmark import BenchTB, PAUSE_PATTERNS, payload_lengths, random_packet, run_sweep, save_and_compare
+from helpers import setup_test, rtl_dir, BlePhy
+
+@cocotb.test()
+async def run_bench(dut):
+    tb = BenchTB(dut, "input", 1, dut.restart)
+    await tb.reset()
+
+    rng = np.random.default_rng(2024)
+
+    async def send_packet(phy, payload_length):
+        packet = random_packet(rng, payload_length)
+        bits = np.concatenate([
+            access_code_bits(packet["access_code"]),
+            pdu_crc_bits(packet["crc_init"], packet["header"], np.frombuffer(packet["payload"], dtype=np.uint8)),
+        ], axis=1)
+        expected = np.concatenate([preamble_bits(phy, bits[:, 0]), bits], axis=1)
+        dut.phy.value = phy.value
+        await tb.transfer(bits[0].tobytes(), expected[0].tobytes())
+
+    scenarios = itertools.product(BlePhy, payload_lengths(), PAUSE_PATTERNS)
+    save_and_compare("preamble_generator", await run_sweep(tb, scenarios, send_packet))
+
+def test_bench_preamble_generator():
+    setup_test(
+        "test_bench_preamble_generator",
+        "preamble_generator",
+        [
+            os.path.join(rtl_dir, "tx/preamble_generator.sv"),
+            os.path.join(rtl_dir, "axis_skid_buffer.sv"),
+        ]
+    )
@@ -0,0 +1,69 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+import itertools
+import os
+
+import cocotb
+import numpy as np
+import pytest
+from cocotb.triggers import RisingEdge
+
+from ble_model import bytes_to_bits
+from benchmark import BenchTB, PAUSE_PATTERNS, payload_lengths, run_sweep, save_and_compare
+from helpers import setup_test, rtl_dir, is_high
+
+async def send_words(dut, data, idle, word_bytes=4):
+    """Drive data as words of word_bytes, skipping a cycle whenever idle yields 1"""
+    chunks = [data[i:i + word_bytes] for i in range(0, len(data), word_bytes)]
+
+    for index, chunk in enumerate(chunks):
+        while next(idle):
+            dut.input_tvalid.value = 0
+            await RisingEdge(dut.aclk)
+
+        dut.input_tdata.value = int.from_bytes(chunk, "little")
+        dut.input_length.value = 8 * len(chunk)
+        dut.input_tlast.value = int(index == len(chunks) - 1)
+        dut.input_tvalid.value = 1
+
+        await RisingEdge(dut.aclk)
+        while not is_high(dut.input_tready):
+            await RisingEdge(dut.aclk)
+
+    dut.input_tvalid.value = 0
+    dut.input_tlast.value = 0
+
+@cocotb.test()
+async def run_bench(dut):
+    tb = BenchTB(dut, None, None, dut.restart)
+    dut.input_tvalid.setimmediatevalue(0)
+    dut.input_tlast.setimmediatevalue(0)
+    await tb.reset()
+
+    rng = np.random.default_rng(2024)
+
+    async def send_packet(_phy, payload_length):
+        # The serializer has no header, send at least one byte
+        data = rng.integers(0, 0x100, max(payload_length, 1), dtype=np.uint8).tobytes()
+
+        # The double-buffered input is ready during restart, drive it afterwards
+        await tb.restart()
+        cocotb.start_soon(send_words(dut, data, tb.idle_generator()))
+
+        output_data = bytes(await tb.sink.recv())
+        assert output_data == bytes_to_bits(data).tobytes()
+
+    scenarios = itertools.product([None], payload_lengths(), PAUSE_PATTERNS)
+    toplevel = f"serializer_double_buffer_{int(dut.C_DOUBLE_BUFFER.value)}"
+    save_and_compare(toplevel, await run_sweep(tb, scenarios, send_packet))
+
+@pytest.mark.parametrize("double_buffer", [0, 1])
+def test_bench_serializer(double_buffer):
+    setup_test(
+        "test_bench_serializer",
+        "serializer",
+        [
+            os.path.join(rtl_dir, "serializer.sv"),
+        ],
+        parameters={"C_DOUBLE_BUFFER": double_buffer}
+    )
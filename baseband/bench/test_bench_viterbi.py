@@ -0,0 +1,45 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from ble_model import BleCi, BlePhy, decode_packets, fec_decode, ll_packet_bits, random_packets
+from benchmark import results_dir
+
+N_PACKETS = 4000
+PAYLOAD_LENGTH = 37
+NOISE = 0.5
+
+log = logging.getLogger("ble_model.bench")
+
+
+def packet_rate(decode, coded):
+    start = time.perf_counter()
+    decode(coded)
+    return len(coded) / (time.perf_counter() - start)
+
+
+def test_bench_viterbi():
+    """Packets per second of the Coded PHY decoder, in one process and in a process pool"""
+    rng = np.random.default_rng(2024)
+    params = random_packets(rng, N_PACKETS, PAYLOAD_LENGTH)
+
+    results = []
+    for ci in (BleCi.BLE_CI_S8, BleCi.BLE_CI_S2):
+        coded = ll_packet_bits(BlePhy.BLE_PHY_CODED, coding_indicator=ci, **params)[:, 80:]
+        soft = 2.0 * coded - 1 + rng.normal(0, NOISE, coded.shape)
+        for mode, decode in (("batch", fec_decode), ("pool", lambda soft: decode_packets(list(soft)))):
+            result = {"coding_indicator": ci.name, "mode": mode, "payload_length": PAYLOAD_LENGTH,
+                      "packets_per_second": round(packet_rate(decode, soft))}
+            log.info("%s", result)
+            results.append(result)
+
+    os.makedirs(results_dir, exist_ok=True)
+    with open(os.path.join(results_dir, "viterbi.json"), "w", encoding="utf-8") as f:
+        json.dump({"toplevel": "viterbi", "cpus": os.cpu_count(), "results": results}, f, indent=2)
+
+    assert min(result["packets_per_second"] for result in results) > 1000
@@ -0,0 +1,38 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+import itertools
+import os
+
+import cocotb
+import numpy as np
+
+from ble_model import pdu_crc_bits, whiten
+from benchmark import BenchTB, PAUSE_PATTERNS, payload_lengths, random_packet, run_sweep, save_and_compare
+from helpers import setup_test, rtl_dir
+
+@cocotb.test()
+async def run_bench(dut):
+    tb = BenchTB(dut, "input", 1, dut.restart)
+    await tb.reset()
+
+    rng = np.random.default_rng(2024)
+    dut.bypass.value = 0
+
+    async def send_packet(_phy, payload_length):
+        packet = random_packet(rng, payload_length)
+        bits = pdu_crc_bits(packet["crc_init"], packet["header"], np.frombuffer(packet["payload"], dtype=np.uint8))
+        dut.channel.value = packet["channel"]
+        await tb.transfer(bits[0].tobytes(), whiten(bits, packet["channel"])[0].tobytes())
+
+    scenarios = itertools.product([None], payload_lengths(), PAUSE_PATTERNS)
+    save_and_compare("whitening", await run_sweep(tb, scenarios, send_packet))
+
+def test_bench_whitening():
+    setup_test(
+        "test_bench_whitening",
+        "whitening",
+        [
+            os.path.join(rtl_dir, "whitening.sv"),
+            os.path.join(rtl_dir, "axis_skid_buffer.sv"),
+        ]
+    )
@@ -0,0 +1,130 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+import json
+import os
+import sys
+import time
+
+import pytest
+
+# Metrics compared with the previous run, True when a higher value is worse
+PROFILE_METRICS = {"sim_wall_time_s": True, "sim_ns_per_wall_s": False, "callbacks": True}
+PROFILE_PROPERTIES = ("compile_time_s", "sim_wall_time_s", "startup_time_s", "sim_time_ns", "sim_ns_per_wall_s",
+                      "callbacks")
+
+# Directory of the simulation tests, the default report goes to its sim_build
+tests_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test")
+
+profiles_key = pytest.StashKey[dict]()
+report_key = pytest.StashKey[tuple]()
+
+
+def pytest_addoption(parser):
+    parser.addoption("--sim", choices=["icarus", "verilator"], default=None,
+                     help="Simulator for the cocotb tests, overrides the SIM environment variable (default: icarus)")
+
+def pytest_configure(config):
+    # setup_test and cocotb-test read the simulator from the environment
+    sim = config.getoption("--sim")
+    if sim is not None:
+        os.environ["SIM"] = sim
+    config.stash[profiles_key] = {}
+
+
+def summarize_profiles(profiles):
+    """Sum the simulation profiles of one test (see helpers.profile_run)."""
+    summary = {name: sum(profile[name] for profile in profiles)
+               for name in ("compile_time_s", "sim_wall_time_s", "startup_time_s", "sim_time_ns", "callbacks")}
+    wall_time_s = summary["sim_wall_time_s"]
+    summary["sim_ns_per_wall_s"] = summary["sim_time_ns"] / wall_time_s if wall_time_s else 0.0
+    summary["simulations"] = profiles
+    return summary
+
+
+@pytest.fixture(autouse=True)
+def test_profile(request):
+    """Collect the profiles of the simulations a test runs, as JUnit properties and for the report"""
+    helpers = sys.modules.get("helpers")
+    if helpers is not None:
+        helpers.test_profiles.clear()
+    yield
+
+    helpers = sys.modules.get("helpers")
+    if helpers is None or not helpers.test_profiles:
+        return
+    summary = summarize_profiles(list(helpers.test_profiles))
+    helpers.test_profiles.clear()
+    # user_properties end up as <property> of the test case with --junitxml
+    request.node.user_properties.extend((name, summary[name]) for name in PROFILE_PROPERTIES)
+    request.config.stash[profiles_key][request.node.nodeid] = summary
+
+
+def compare_profiles(profiles, previous, tolerance):
+    """Add the previous metrics to every profile, return the ones worse by more than tolerance."""
+    regressions = []
+    for nodeid, summary in profiles.items():
+        reference = previous.get(nodeid)
+        summary["previous"] = {metric: reference[metric] for metric in PROFILE_METRICS} if reference else None
+        if reference is None:
+            continue
+        for metric, higher_is_worse in PROFILE_METRICS.items():
+            value, before = summary[metric], reference[metric]
+            worse = value > before * (1 + tolerance) if higher_is_worse else value < before * (1 - tolerance)
+            if worse and before:
+                regressions.append(f"{nodeid} {metric}: {value:.6g} (previous run {before:.6g})")
+    return regressions
+
+
+def pytest_sessionfinish(session):
+    """
+    Write the profile report and compare it with the previous run.
+
+    The report goes to TEST_PROFILE_REPORT, by default
+    baseband/test/sim_build/test_profile_<simulator>.json whatever the working
+    directory. Tests of earlier runs that didn't run this time are kept, so the
+    report always holds the last profile of every test. A metric worse than in
+    the previous run by more than TEST_PROFILE_TOLERANCE (relative, default
+    0.25) is a regression, TEST_PROFILE_STRICT=1 fails the session on one.
+    """
+    profiles = session.config.stash.get(profiles_key, {})
+    if not profiles:
+        return
+
+    simulator = os.getenv("SIM", "icarus")
+    path = os.getenv("TEST_PROFILE_REPORT") or os.path.join(tests_dir, "sim_build", f"test_profile_{simulator}.json")
+    previous = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            previous = json.load(f)["tests"]
+
+    regressions = compare_profiles(profiles, previous, float(os.getenv("TEST_PROFILE_TOLERANCE", "0.25")))
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"simulator": simulator, "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                   "tests": {**previous, **profiles}, "regressions": regressions}, f, indent=1)
+
+    session.config.stash[report_key] = (path, regressions)
+    if regressions and int(os.getenv("TEST_PROFILE_STRICT", "0")):
+        session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    profiles = config.stash.get(profiles_key, {})
+    if not profiles:
+        return
+
+    terminalreporter.write_sep("=", "simulation profile")
+    terminalreporter.write_line(f"{'test':<70} {'compile':>8} {'sim wall':>9} {'startup':>8} {'sim ns':>12} "
+                                f"{'ns/s':>10} {'callbacks':>10}")
+    for nodeid, summary in sorted(profiles.items(), key=lambda item: -item[1]["sim_wall_time_s"]):
+        terminalreporter.write_line(f"{nodeid:<70} {summary['compile_time_s']:>7.2f}s "
+                                    f"{summary['sim_wall_time_s']:>8.2f}s {summary['startup_time_s']:>7.2f}s "
+                                    f"{summary['sim_time_ns']:>12.0f} {summary['sim_ns_per_wall_s']:>10.0f} "
+                                    f"{summary['callbacks']:>10}")
+
+    path, regressions = config.stash.get(report_key, (None, []))
+    for regression in regressions:
+        terminalreporter.write_line(f"slower than the previous run: {regression}")
+    if path:
+        terminalreporter.write_line(f"profile report: {path}")
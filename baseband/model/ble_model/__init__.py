@@ -0,0 +1,20 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+"""Bit-exact NumPy reference model of the baseband RTL."""
+
+from .bits import bits_to_bytes, bits_to_uint, bytes_to_bits, uint_to_bits
+from .ccm import aes128_encrypt, aes128_key_expansion, ccm_decrypt, ccm_encrypt, ccm_nonce, encrypt_pdu
+from .channel_selection import (ADVERTISING_CHANNELS, ALL_CHANNELS_MAP, NUM_DATA_CHANNELS, advertising_channel,
+                                channel_identifier, csa2_channel, csa2_prn, select_channel)
+from .correlator import correlate, correlation_errors, expected_windows
+from .crc import CRC24_POLY, crc24, crc24_bytes, crc24_to_bits
+from .fec import conv_encode, fec_bits, pattern_map
+from .gfsk import GfskModulator, gaussian_pulse, gfsk_modulate
+from .packet import (access_code_bits, header_payload_length, ll_packet_bits, ll_packets_bits, pdu_bits, pdu_crc_bits,
+                     preamble_bits, random_packets)
+from .pdu_filter import (ADVERTISER_ADDRESS_OFFSETS, PduFilterTable, advertiser_address, filter_bucket, filter_key,
+                         filter_packets)
+from .types import BleCi, BlePduType, BlePhy
+from .viterbi import decode_fec_block_1, decode_fec_block_2, decode_packets, fec_decode, pattern_demap, viterbi_decode
+from .whitening import (NUM_CHANNEL_INDEXES, NUM_CHANNELS, WHITENING_PERIOD, keystream_table, whiten, whitening_init,
+                        whitening_keystream, whitening_keystream_words)
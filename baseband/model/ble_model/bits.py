@@ -0,0 +1,69 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+"""Conversions between integers, bytes and bit arrays.
+
+Every bit array in the model is a ``numpy.uint8`` array holding one bit per
+element in transmission order. Bytes and multi-bit fields are transmitted
+LSB first, the same way ``serializer`` shifts out ``input_tdata[0]`` first.
+The leading axis of a 2D array is the packet index of a batch.
+"""
+
+import numpy as np
+
+
+def bytes_to_bits(data):
+    """
+    Unpack bytes into bits, LSB first.
+
+    Args:
+        data (bytes | array_like): Byte values, shape ``(..., n)``.
+
+    Returns:
+        numpy.ndarray: Bits, shape ``(..., 8 * n)``.
+    """
+    data = np.asarray(bytearray(data) if isinstance(data, (bytes, bytearray)) else data, dtype=np.uint8)
+    return np.unpackbits(data, axis=-1, bitorder='little')
+
+
+def bits_to_bytes(bits):
+    """
+    Pack bits into bytes, LSB first. A trailing partial byte is zero padded.
+
+    Args:
+        bits (array_like): Bits, shape ``(..., n)``.
+
+    Returns:
+        numpy.ndarray: Bytes, shape ``(..., ceil(n / 8))``.
+    """
+    return np.packbits(np.asarray(bits, dtype=np.uint8), axis=-1, bitorder='little')
+
+
+def uint_to_bits(value, width):
+    """
+    Unpack unsigned integers into ``width`` bits, LSB first.
+
+    Args:
+        value (int | array_like): Integer values, shape ``(...)``.
+        width (int): Number of bits to extract.
+
+    Returns:
+        numpy.ndarray: Bits, shape ``(..., width)``.
+    """
+    value = np.asarray(value, dtype=np.uint64)
+    shifts = np.arange(width, dtype=np.uint64)
+    return ((value[..., np.newaxis] >> shifts) & 1).astype(np.uint8)
+
+
+def bits_to_uint(bits):
+    """
+    Pack bits (LSB first) into unsigned integers.
+
+    Args:
+        bits (array_like): Bits, shape ``(..., width)`` with ``width <= 64``.
+
+    Returns:
+        numpy.ndarray: Integer values, shape ``(...)``.
+    """
+    bits = np.asarray(bits, dtype=np.uint64)
+    shifts = np.arange(bits.shape[-1], dtype=np.uint64)
+    return np.bitwise_or.reduce(bits << shifts, axis=-1)
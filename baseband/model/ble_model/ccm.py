@@ -0,0 +1,247 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+"""Reference model of ``aes128`` and ``ccm_encryptor``.
+
+AES-128 (FIPS-197) runs on a batch of blocks at once, every step is an array
+operation over all blocks. Blocks, keys and nonces are byte strings in the
+order of FIPS-197 and RFC 3610: byte 0 is the first byte of the block.
+
+Link layer encryption is CCM with a 4-byte MIC and a 2-byte length field
+(Bluetooth Core Specification Vol 6 Part E). The 13-byte nonce is the 39-bit
+packet counter and the direction bit followed by the 8-byte IV, the only
+additional authenticated data is the first header byte with NESN, SN and MD
+masked.
+"""
+
+import numpy as np
+
+
+def _sbox():
+    # Multiplicative inverse in GF(2^8) through exp/log tables of the generator 3
+    exp = np.zeros(256, dtype=np.uint8)
+    log = np.zeros(256, dtype=np.uint8)
+    x = 1
+    for i in range(255):
+        exp[i] = x
+        log[x] = i
+        x ^= (x << 1) ^ (0x11B if x & 0x80 else 0)
+    inverse = np.zeros(256, dtype=np.uint8)
+    inverse[1:] = exp[(255 - log[1:].astype(np.int32)) % 255]
+
+    # Affine transform
+    sbox = inverse.copy()
+    for shift in range(1, 5):
+        sbox ^= (inverse << shift) | (inverse >> (8 - shift))
+    return sbox ^ 0x63
+
+
+SBOX = _sbox()
+
+# Byte i of the state is row i % 4 and column i // 4, ShiftRows rotates row r left by r
+SHIFT_ROWS = np.array([(i + 4 * (i % 4)) % 16 for i in range(16)])
+
+RCON = np.array([0x01, 0x02, 0x04, 0x08, 0x10, 0x20, 0x40, 0x80, 0x1B, 0x36], dtype=np.uint8)
+
+AES_BLOCK_SIZE = 16
+
+# Link layer CCM: 4-byte MIC, 2-byte length field
+CCM_MIC_SIZE = 4
+CCM_NONCE_SIZE = 13
+
+
+def _xtime(x):
+    return (x << 1) ^ np.where(x & 0x80, 0x1B, 0).astype(np.uint8)
+
+
+def _mix_columns(state):
+    columns = state.reshape(-1, 4, 4)
+    rotated = np.roll(columns, -1, axis=2)
+    total = np.bitwise_xor.reduce(columns, axis=2, keepdims=True)
+    return (columns ^ total ^ _xtime(columns ^ rotated)).reshape(state.shape)
+
+
+def aes128_key_expansion(key):
+    """
+    Expand AES-128 keys into the round keys.
+
+    Args:
+        key (array_like): Keys, shape ``(16,)`` or ``(n_keys, 16)``.
+
+    Returns:
+        numpy.ndarray: Round keys, shape ``(n_keys, 11, 16)``.
+    """
+    key = np.atleast_2d(np.asarray(key, dtype=np.uint8))
+    round_keys = np.empty((key.shape[0], 11, AES_BLOCK_SIZE), dtype=np.uint8)
+    round_keys[:, 0] = key
+
+    for i in range(10):
+        words = round_keys[:, i].reshape(-1, 4, 4)
+        temp = SBOX[np.roll(words[:, 3], -1, axis=1)]
+        temp[:, 0] ^= RCON[i]
+        next_words = np.empty_like(words)
+        for j in range(4):
+            temp = temp ^ words[:, j]
+            next_words[:, j] = temp
+        round_keys[:, i + 1] = next_words.reshape(-1, AES_BLOCK_SIZE)
+    return round_keys
+
+
+def aes128_encrypt(key, blocks):
+    """
+    Encrypt blocks with AES-128.
+
+    Args:
+        key (array_like): One key for every block, shape ``(16,)``, or one per block, shape ``(n_blocks, 16)``.
+        blocks (array_like): Plaintext blocks, shape ``(n_blocks, 16)``.
+
+    Returns:
+        numpy.ndarray: Ciphertext blocks, shape ``(n_blocks, 16)``.
+    """
+    blocks = np.atleast_2d(np.asarray(blocks, dtype=np.uint8))
+    round_keys = aes128_key_expansion(key)
+
+    state = blocks ^ round_keys[:, 0]
+    for i in range(1, 10):
+        state = _mix_columns(SBOX[state][:, SHIFT_ROWS]) ^ round_keys[:, i]
+    return SBOX[state][:, SHIFT_ROWS] ^ round_keys[:, 10]
+
+
+def ccm_nonce(packet_counter, direction, iv):
+    """
+    Build the link layer CCM nonce.
+
+    Args:
+        packet_counter (int | array_like): 39-bit packet counter per packet, shape ``(n_packets,)``.
+        direction (int | array_like): Direction bit per packet, 1 from the central.
+        iv (array_like): 8-byte IV, shape ``(8,)`` or ``(n_packets, 8)``.
+
+    Returns:
+        numpy.ndarray: Nonces, shape ``(n_packets, 13)``.
+    """
+    packet_counter = np.atleast_1d(np.asarray(packet_counter, dtype=np.uint64))
+    direction = np.broadcast_to(np.asarray(direction, dtype=np.uint64), packet_counter.shape)
+    counter = (packet_counter & ((1 << 39) - 1)) | (direction << np.uint64(39))
+
+    nonce = np.empty((packet_counter.shape[0], CCM_NONCE_SIZE), dtype=np.uint8)
+    # Packet counter and direction, least significant octet first
+    nonce[:, :5] = (counter[:, np.newaxis] >> (8 * np.arange(5, dtype=np.uint64))) & 0xFF
+    nonce[:, 5:] = np.asarray(iv, dtype=np.uint8)
+    return nonce
+
+
+def _ccm_blocks(flags, nonce, counter):
+    blocks = np.zeros((nonce.shape[0], AES_BLOCK_SIZE), dtype=np.uint8)
+    blocks[:, 0] = flags
+    blocks[:, 1:14] = nonce
+    blocks[:, 14] = counter >> 8
+    blocks[:, 15] = counter & 0xFF
+    return blocks
+
+
+def _ccm_mac(key, nonce, aad, payload, mic_size):
+    n_packets, length = payload.shape
+    # Adata, M' = (M - 2) / 2 and L' = L - 1
+    x = aes128_encrypt(key, _ccm_blocks(0x40 | ((mic_size - 2) // 2) << 3 | 0x01, nonce, length))
+
+    # l(a) in two bytes followed by the additional data, zero padded to whole blocks
+    header = np.zeros((n_packets, -(-(2 + aad.shape[1]) // AES_BLOCK_SIZE) * AES_BLOCK_SIZE), dtype=np.uint8)
+    header[:, 0] = aad.shape[1] >> 8
+    header[:, 1] = aad.shape[1] & 0xFF
+    header[:, 2:2 + aad.shape[1]] = aad
+
+    data = np.zeros((n_packets, -(-length // AES_BLOCK_SIZE) * AES_BLOCK_SIZE), dtype=np.uint8)
+    data[:, :length] = payload
+
+    for block in np.hstack([header, data]).reshape(n_packets, -1, AES_BLOCK_SIZE).transpose(1, 0, 2):
+        x = aes128_encrypt(key, x ^ block)
+    return x[:, :mic_size]
+
+
+def _ccm_keystream(key, nonce, n_blocks):
+    # A_i with flags L' = 1 and counter i, A_0 encrypts the MIC
+    counters = [aes128_encrypt(key, _ccm_blocks(0x01, nonce, i)) for i in range(n_blocks + 1)]
+    return np.stack(counters, axis=1)
+
+
+def ccm_encrypt(key, nonce, aad, payload, mic_size=CCM_MIC_SIZE):
+    """
+    CCM authenticated encryption with a 2-byte length field.
+
+    Args:
+        key (array_like): 16-byte key, shape ``(16,)`` or ``(n_packets, 16)``.
+        nonce (array_like): 13-byte nonces, shape ``(n_packets, 13)``.
+        aad (array_like): Additional authenticated data, shape ``(n_packets, n_aad)``.
+        payload (array_like): Plaintext, shape ``(n_packets, n_bytes)``.
+        mic_size (int): MIC length in bytes, 4 for the link layer.
+
+    Returns:
+        tuple: Ciphertext, shape ``(n_packets, n_bytes)``, and MIC, shape ``(n_packets, mic_size)``.
+    """
+    nonce = np.atleast_2d(np.asarray(nonce, dtype=np.uint8))
+    aad = np.atleast_2d(np.asarray(aad, dtype=np.uint8))
+    payload = np.atleast_2d(np.asarray(payload, dtype=np.uint8))
+    n_packets, length = payload.shape
+    key = np.broadcast_to(np.asarray(key, dtype=np.uint8), (n_packets, AES_BLOCK_SIZE))
+
+    n_blocks = -(-length // AES_BLOCK_SIZE)
+    keystream = _ccm_keystream(key, nonce, n_blocks)
+    mic = _ccm_mac(key, nonce, aad, payload, mic_size) ^ keystream[:, 0, :mic_size]
+    ciphertext = payload ^ keystream[:, 1:].reshape(n_packets, -1)[:, :length]
+    return ciphertext, mic
+
+
+def ccm_decrypt(key, nonce, aad, ciphertext, mic):
+    """
+    Decrypt and authenticate CCM packets, the inverse of :func:`ccm_encrypt`.
+
+    Args:
+        key (array_like): 16-byte key, shape ``(16,)`` or ``(n_packets, 16)``.
+        nonce (array_like): 13-byte nonces, shape ``(n_packets, 13)``.
+        aad (array_like): Additional authenticated data, shape ``(n_packets, n_aad)``.
+        ciphertext (array_like): Ciphertext, shape ``(n_packets, n_bytes)``.
+        mic (array_like): Received MIC, shape ``(n_packets, mic_size)``.
+
+    Returns:
+        tuple: Plaintext, shape ``(n_packets, n_bytes)``, and a bool per packet, True if the MIC matches.
+    """
+    ciphertext = np.atleast_2d(np.asarray(ciphertext, dtype=np.uint8))
+    # CTR mode is its own inverse, the MIC is recomputed over the plaintext
+    nonce = np.atleast_2d(np.asarray(nonce, dtype=np.uint8))
+    n_packets, length = ciphertext.shape
+    key = np.broadcast_to(np.asarray(key, dtype=np.uint8), (n_packets, AES_BLOCK_SIZE))
+    keystream = _ccm_keystream(key, nonce, -(-length // AES_BLOCK_SIZE))
+    plaintext = ciphertext ^ keystream[:, 1:].reshape(n_packets, -1)[:, :length]
+    mic = np.atleast_2d(np.asarray(mic, dtype=np.uint8))
+    _, expected_mic = ccm_encrypt(key, nonce, aad, plaintext, mic.shape[1])
+    return plaintext, np.all(expected_mic == mic, axis=1)
+
+
+def encrypt_pdu(key, iv, packet_counter, direction, header, payload):
+    """
+    Encrypt data channel PDUs the way ``pdu_crc_generator`` does with encryption enabled.
+
+    The MIC is appended to the payload and the length field of the header grows
+    by 4. Empty PDUs are sent unencrypted.
+
+    Args:
+        key (array_like): Session key in AES byte order, shape ``(16,)``.
+        iv (array_like): 8-byte IV, shape ``(8,)``.
+        packet_counter (int | array_like): Packet counter per packet, shape ``(n_packets,)``.
+        direction (int | array_like): Direction bit per packet.
+        header (array_like): 16-bit headers with the plaintext length, shape ``(n_packets,)``.
+        payload (array_like): Plaintext payloads, shape ``(n_packets, n_bytes)``.
+
+    Returns:
+        tuple: Headers, shape ``(n_packets,)``, and payloads, shape ``(n_packets, n_bytes + 4)``,
+        or the inputs unchanged if ``n_bytes`` is 0.
+    """
+    header = np.atleast_1d(np.asarray(header, dtype=np.uint32))
+    payload = np.atleast_2d(np.asarray(payload, dtype=np.uint8))
+    if payload.shape[1] == 0:
+        return header, payload
+
+    nonce = ccm_nonce(packet_counter, direction, iv)
+    # NESN, SN and MD are masked in the authenticated header byte
+    aad = (header & 0xE3).astype(np.uint8)[:, np.newaxis]
+    ciphertext, mic = ccm_encrypt(key, nonce, aad, payload)
+    return header + (CCM_MIC_SIZE << 8), np.hstack([ciphertext, mic])
@@ -0,0 +1,151 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+"""Reference model of ``channel_selector``.
+
+Channel Selection Algorithm #2 (Bluetooth Core Specification Vol 6 Part B
+4.5.8.3) for data channels and the 37/38/39 sequence of an advertising event.
+Channel maps are integers with bit ``i`` set when channel ``i`` is used:
+bits 0-36 are the data channels and bits 37-39 the advertising channels.
+"""
+
+import numpy as np
+
+# Data channels 0-36, advertising channels 37-39
+NUM_DATA_CHANNELS = 37
+ADVERTISING_CHANNELS = (37, 38, 39)
+
+# Every channel used
+ALL_CHANNELS_MAP = (1 << 40) - 1
+
+# Bits of every byte in reverse order
+_BIT_REVERSE = np.array([int(f"{i:08b}"[::-1], 2) for i in range(256)], dtype=np.uint32)
+
+
+def channel_identifier(access_address):
+    """
+    Return the channel identifier, the two halves of the access address XORed.
+
+    Args:
+        access_address (int | array_like): Access addresses.
+
+    Returns:
+        numpy.ndarray: 16-bit channel identifiers.
+    """
+    access_address = np.asarray(access_address, dtype=np.uint32)
+    return (access_address >> 16) ^ (access_address & 0xFFFF)
+
+
+def _perm(value):
+    """Reverse the bits of each byte of 16-bit values."""
+    return (_BIT_REVERSE[value >> 8] << 8) | _BIT_REVERSE[value & 0xFF]
+
+
+def _mam(a, b):
+    """Multiply, add and modulo: (17 * a + b) mod 2^16."""
+    return (17 * a + b) & 0xFFFF
+
+
+def csa2_prn(event_counter, identifier):
+    """
+    Generate the pseudo-random number prn_e of CSA#2.
+
+    Args:
+        event_counter (int | array_like): 16-bit event counters.
+        identifier (int | array_like): Channel identifiers, broadcast against ``event_counter``.
+
+    Returns:
+        numpy.ndarray: 16-bit prn_e.
+    """
+    identifier = np.asarray(identifier, dtype=np.uint32)
+    prn = np.asarray(event_counter, dtype=np.uint32) ^ identifier
+    for _ in range(3):
+        prn = _mam(_perm(prn), identifier)
+    return prn ^ identifier
+
+
+def _used_channels(channel_map, first, n_channels):
+    """
+    List the used channels of every distinct map.
+
+    Returns:
+        tuple: Used channels per distinct map, padded with ``first``, shape
+        ``(n_maps, n_channels)``; used channel count per distinct map; index of
+        the distinct map of every element of ``channel_map``.
+    """
+    maps, inverse = np.unique(np.asarray(channel_map, dtype=np.uint64), return_inverse=True)
+    bits = ((maps[:, np.newaxis] >> np.arange(first, first + n_channels, dtype=np.uint64)) & 1).astype(bool)
+    n_used = bits.sum(axis=1)
+    table = np.full((len(maps), n_channels), first, dtype=np.uint8)
+    rows, columns = np.nonzero(bits)
+    # Rank of every used channel among the used channels of its map
+    ranks = np.cumsum(bits, axis=1)[rows, columns] - 1
+    table[rows, ranks] = first + columns
+    return table, n_used, inverse.reshape(np.shape(channel_map))
+
+
+def csa2_channel(access_address, event_counter, channel_map):
+    """
+    Select the data channel of a connection event with CSA#2.
+
+    The unmapped channel ``prn_e mod 37`` is used when it is in the map,
+    otherwise it is remapped to the used channel with index
+    ``floor(n_used * prn_e / 2^16)``. The map must use at least one data
+    channel.
+
+    Args:
+        access_address (int | array_like): Access addresses.
+        event_counter (int | array_like): 16-bit connection event counters.
+        channel_map (int | array_like): Channel maps, bits 0-36 are used.
+
+    Returns:
+        numpy.ndarray: Channel indexes, the broadcast shape of the arguments.
+    """
+    access_address, event_counter, channel_map = np.broadcast_arrays(
+        np.asarray(access_address, dtype=np.uint32), np.asarray(event_counter, dtype=np.uint32),
+        np.asarray(channel_map, dtype=np.uint64))
+    prn_e = csa2_prn(event_counter, channel_identifier(access_address))
+
+    unmapped = (prn_e % NUM_DATA_CHANNELS).astype(np.uint8)
+    used = ((channel_map >> unmapped.astype(np.uint64)) & 1).astype(bool)
+
+    table, n_used, inverse = _used_channels(channel_map, 0, NUM_DATA_CHANNELS)
+    remapping_index = (n_used[inverse] * prn_e) >> 16
+    return np.where(used, unmapped, table[inverse, remapping_index])
+
+
+def advertising_channel(index, channel_map):
+    """
+    Select the channel of a packet of an advertising event.
+
+    Packet ``index`` of an event is sent on the ``index``-th used advertising
+    channel in 37, 38, 39 order, wrapping around. A map without advertising
+    channels sends on channel 37.
+
+    Args:
+        index (int | array_like): Packet indexes within the advertising event.
+        channel_map (int | array_like): Channel maps, bits 37-39 are used.
+
+    Returns:
+        numpy.ndarray: Channel indexes, the broadcast shape of the arguments.
+    """
+    index, channel_map = np.broadcast_arrays(np.asarray(index, dtype=np.uint32), np.asarray(channel_map, dtype=np.uint64))
+    table, n_used, inverse = _used_channels(channel_map, ADVERTISING_CHANNELS[0], len(ADVERTISING_CHANNELS))
+    return table[inverse, index % np.maximum(n_used[inverse], 1)]
+
+
+def select_channel(access_address, event_counter, channel_map, advertising):
+    """
+    Select the channel the way ``channel_selector`` does.
+
+    Args:
+        access_address (int | array_like): Access addresses.
+        event_counter (int | array_like): Connection event counters, or for
+            advertising the packet index within the advertising event.
+        channel_map (int | array_like): 40-bit channel maps.
+        advertising (bool | array_like): Advertising PDUs.
+
+    Returns:
+        numpy.ndarray: Channel indexes, the broadcast shape of the arguments.
+    """
+    return np.where(advertising, advertising_channel(event_counter, channel_map),
+                    csa2_channel(access_address, event_counter, channel_map))
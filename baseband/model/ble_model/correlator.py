@@ -0,0 +1,87 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+"""Reference model of ``access_code_correlator``.
+
+The correlator compares the last 48 received bits with preamble + access code
+of every address in the bank after each input bit. The window starts out as
+zeros after restart, like the RTL shift register.
+"""
+
+import numpy as np
+
+from .bits import uint_to_bits
+from .types import BlePhy
+
+WINDOW_LENGTH_BITS = 48
+PREAMBLE_2M = 0xAAAA
+
+
+def expected_windows(access_codes):
+    """
+    Preamble (2M length) and access code of each address, first bit first.
+
+    Args:
+        access_codes (array_like): Access addresses, shape ``(n_addresses,)``.
+
+    Returns:
+        numpy.ndarray: Expected window per address, shape ``(n_addresses, 48)``.
+    """
+    access = uint_to_bits(np.atleast_1d(np.asarray(access_codes, dtype=np.uint64)), 32)
+    preamble = uint_to_bits(PREAMBLE_2M, 16)[np.newaxis, :] ^ access[:, :1]
+    return np.concatenate([preamble, access], axis=1)
+
+
+def correlation_errors(bits, access_codes, phy):
+    """
+    Mismatching bits of every address after every input bit.
+
+    Args:
+        bits (array_like): Received bits, shape ``(n_bits,)``.
+        access_codes (array_like): Access addresses, shape ``(n_addresses,)``.
+        phy (BlePhy): 1M compares an 8-bit preamble, 2M a 16-bit one.
+
+    Returns:
+        numpy.ndarray: Errors, shape ``(n_addresses, n_bits)``.
+    """
+    bits = np.asarray(bits, dtype=np.uint8)
+    padded = np.concatenate([np.zeros(WINDOW_LENGTH_BITS, dtype=np.uint8), bits])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, WINDOW_LENGTH_BITS)[1:]
+
+    mask = np.ones(WINDOW_LENGTH_BITS, dtype=bool)
+    if phy == BlePhy.BLE_PHY_1M:
+        mask[:8] = False
+
+    expected = expected_windows(access_codes)[:, :, None]
+    mismatch = (windows.T[np.newaxis, mask, :] != expected[:, mask, :])
+    return mismatch.sum(axis=1)
+
+
+def correlate(bits, access_codes, access_code_enable, error_threshold, phy):
+    """
+    Model the correlator outputs.
+
+    Args:
+        bits (array_like): Received bits, shape ``(n_bits,)``.
+        access_codes (array_like): Access addresses, shape ``(n_addresses,)``.
+        access_code_enable (array_like): Enable per address.
+        error_threshold (int): Largest accepted number of mismatching bits.
+        phy (BlePhy): PHY type, Coded PHY never matches.
+
+    Returns:
+        list: ``(bit_index, match_mask, match_index, match_errors)`` per match,
+        ``bit_index`` is the index of the last access code bit.
+    """
+    if phy == BlePhy.BLE_PHY_CODED:
+        return []
+
+    errors = correlation_errors(bits, access_codes, phy)
+    enable = np.asarray(access_code_enable, dtype=bool)[:, np.newaxis]
+    matched = enable & (errors <= error_threshold)
+
+    result = []
+    for bit_index in np.flatnonzero(matched.any(axis=0)):
+        candidates = np.where(matched[:, bit_index], errors[:, bit_index], np.iinfo(errors.dtype).max)
+        best = int(np.argmin(candidates))
+        mask = int(np.dot(matched[:, bit_index], 1 << np.arange(matched.shape[0])))
+        result.append((int(bit_index), mask, best, int(errors[best, bit_index])))
+    return result
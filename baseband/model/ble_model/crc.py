@@ -0,0 +1,86 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+"""Reference model of ``serial_crc24``.
+
+CRC polynomial coefficients: x^24 + x^10 + x^9 + x^6 + x^4 + x^3 + x + 1
+
+:func:`crc24` steps one bit at a time like ``serial_crc24``, :func:`crc24_bytes`
+is the table-driven byte-wise equivalent of ``parallel_crc24``.
+"""
+
+import numpy as np
+
+CRC24_POLY = 0x00065B
+CRC24_MASK = 0xFFFFFF
+
+
+def _crc24_table():
+    table = np.arange(256, dtype=np.uint32) << 16
+    for _ in range(8):
+        table = ((table << 1) & CRC24_MASK) ^ np.where(table & 0x800000, CRC24_POLY, 0).astype(np.uint32)
+    return table
+
+
+# Register update for a byte entering the register MSB first
+CRC24_TABLE = _crc24_table()
+
+# Bytes are transmitted LSB first, so they are bit reversed before the table lookup
+BIT_REVERSE_TABLE = np.array([int(f"{i:08b}"[::-1], 2) for i in range(256)], dtype=np.uint32)
+
+
+def crc24(bits, init_preset):
+    """
+    Run bits through the CRC shift register, one bit per step like ``serial_crc24``.
+
+    Args:
+        bits (array_like): Bits in transmission order, shape ``(n_packets, n_bits)``.
+        init_preset (int | array_like): Register value loaded on restart, one per packet.
+
+    Returns:
+        numpy.ndarray: Register values (``crc_out``), shape ``(n_packets,)``.
+    """
+    bits = np.atleast_2d(np.asarray(bits, dtype=np.uint32))
+    lfsr = np.broadcast_to(np.asarray(init_preset, dtype=np.uint32), bits.shape[:1]).copy()
+
+    for column in bits.T:
+        feedback = column ^ (lfsr >> 23)
+        lfsr = ((lfsr << 1) & CRC24_MASK) ^ (feedback * CRC24_POLY)
+
+    return lfsr
+
+
+def crc24_bytes(data, init_preset):
+    """
+    Table-driven byte-wise CRC, equivalent to :func:`crc24` over the bits of ``data``.
+
+    Args:
+        data (array_like): Bytes in transmission order, shape ``(n_packets, n_bytes)``.
+        init_preset (int | array_like): Register value loaded on restart, one per packet.
+
+    Returns:
+        numpy.ndarray: Register values (``crc_out``), shape ``(n_packets,)``.
+    """
+    data = BIT_REVERSE_TABLE[np.atleast_2d(np.asarray(data, dtype=np.uint8))]
+    lfsr = np.broadcast_to(np.asarray(init_preset, dtype=np.uint32), data.shape[:1]).copy()
+
+    for column in data.T:
+        lfsr = ((lfsr << 8) & CRC24_MASK) ^ CRC24_TABLE[(lfsr >> 16) ^ column]
+
+    return lfsr
+
+
+def crc24_to_bits(crc):
+    """
+    Convert register values to the bits appended to a PDU.
+
+    ``pdu_crc_generator`` sends the register MSB first (``swap24``).
+
+    Args:
+        crc (int | array_like): Register values, shape ``(n_packets,)``.
+
+    Returns:
+        numpy.ndarray: CRC bits in transmission order, shape ``(n_packets, 24)``.
+    """
+    crc = np.atleast_1d(np.asarray(crc, dtype=np.uint32))
+    shifts = np.arange(23, -1, -1, dtype=np.uint32)
+    return ((crc[:, np.newaxis] >> shifts) & 1).astype(np.uint8)
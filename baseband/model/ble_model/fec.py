@@ -0,0 +1,86 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+"""Reference model of ``fec_encoder`` (LE Coded PHY).
+
+FEC block 1 is the access code, the coding indicator and TERM1, coded with
+S=8. FEC block 2 is PDU, CRC and TERM2, coded with the S selected by the
+coding indicator. The convolutional encoder has no feedback, so each coded
+bit is an XOR of shifted copies of the input and a whole batch is encoded at
+once.
+"""
+
+import numpy as np
+
+from .bits import uint_to_bits
+from .types import BleCi
+
+CODING_INDICATOR_LENGTH_BITS = 2
+TERM_LENGTH_BITS = 3
+
+# Pattern mapper for S=8, indexed by the coded bit, first transmitted bit first
+PATTERN_S8 = np.array([[0, 0, 1, 1], [1, 1, 0, 0]], dtype=np.uint8)
+
+
+def conv_encode(bits):
+    """
+    Rate 1/2 convolutional encoder, G0 = 1 + D + D^2 + D^3 and G1 = 1 + D^2 + D^3.
+
+    Args:
+        bits (array_like): Uncoded bits, shape ``(n_packets, n_bits)``, the encoder starts at zero.
+
+    Returns:
+        numpy.ndarray: Coded bits ``c0, c1`` per input bit, shape ``(n_packets, 2 * n_bits)``.
+    """
+    bits = np.atleast_2d(np.asarray(bits, dtype=np.uint8))
+    delayed = np.pad(bits, ((0, 0), (TERM_LENGTH_BITS, 0)))
+    d0 = delayed[:, 3:]
+    d1 = delayed[:, 2:-1]
+    d2 = delayed[:, 1:-2]
+    d3 = delayed[:, :-3]
+
+    coded = np.empty((bits.shape[0], 2 * bits.shape[1]), dtype=np.uint8)
+    coded[:, 0::2] = d0 ^ d1 ^ d2 ^ d3
+    coded[:, 1::2] = d0 ^ d2 ^ d3
+    return coded
+
+
+def pattern_map(coded, coding_indicator):
+    """
+    Map coded bits to S=8 patterns, S=2 passes them through.
+
+    Args:
+        coded (array_like): Coded bits, shape ``(n_packets, n_bits)``.
+        coding_indicator (BleCi): Coding of the block.
+
+    Returns:
+        numpy.ndarray: Mapped bits.
+    """
+    coded = np.atleast_2d(np.asarray(coded, dtype=np.uint8))
+    if coding_indicator == BleCi.BLE_CI_S2:
+        return coded
+    return PATTERN_S8[coded].reshape(coded.shape[0], -1)
+
+
+def fec_bits(access_code_bits, pdu_crc_bits, coding_indicator):
+    """
+    Model ``fec_encoder``: FEC block 1 followed by FEC block 2.
+
+    Args:
+        access_code_bits (array_like): Access code bits, shape ``(n_packets, 32)``.
+        pdu_crc_bits (array_like): Whitened PDU and CRC bits, shape ``(n_packets, n_bits)``.
+        coding_indicator (BleCi): Coding of FEC block 2, shared by the batch.
+
+    Returns:
+        numpy.ndarray: Coded bits, shape ``(n_packets, n_coded_bits)``.
+    """
+    access_code_bits = np.atleast_2d(np.asarray(access_code_bits, dtype=np.uint8))
+    pdu_crc_bits = np.atleast_2d(np.asarray(pdu_crc_bits, dtype=np.uint8))
+    n_packets = access_code_bits.shape[0]
+
+    ci = np.broadcast_to(uint_to_bits(coding_indicator.value, CODING_INDICATOR_LENGTH_BITS), (n_packets, CODING_INDICATOR_LENGTH_BITS))
+    term = np.zeros((n_packets, TERM_LENGTH_BITS), dtype=np.uint8)
+
+    # TERM1 flushes the encoder, so both blocks start from the zero state
+    block_1 = pattern_map(conv_encode(np.concatenate([access_code_bits, ci, term], axis=1)), BleCi.BLE_CI_S8)
+    block_2 = pattern_map(conv_encode(np.concatenate([pdu_crc_bits, term], axis=1)), coding_indicator)
+    return np.concatenate([block_1, block_2], axis=1)
@@ -0,0 +1,180 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+"""Streaming GFSK modulator for the ``ll_pkt_generator`` bitstream.
+
+Bits are mapped to +-1 symbols, shaped by a Gaussian frequency pulse and
+integrated into the phase of a unit-amplitude complex baseband signal. A 1 is
+a positive frequency deviation of ``modulation_index / 2`` times the symbol
+rate. The Coded PHY is transmitted at 1 Msym/s like the 1M PHY, so the model
+only needs the symbol rate of the PHY.
+
+The modulator keeps the filter history and the phase between calls, so a long
+transmission is fed in chunks and every chunk is written into the same
+preallocated buffers. The samples of a symbol are looked up in a table of
+the phase trajectories of all symbol patterns the filter spans, so only one
+phasor per symbol is computed.
+"""
+
+import itertools
+import math
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .types import BlePhy
+
+# Symbols per second
+SYMBOL_RATE = {
+    BlePhy.BLE_PHY_1M: 1e6,
+    BlePhy.BLE_PHY_2M: 2e6,
+    BlePhy.BLE_PHY_CODED: 1e6,
+}
+
+
+def gaussian_pulse(bt, samples_per_symbol, span):
+    """
+    Gaussian filtered rectangular frequency pulse.
+
+    Args:
+        bt (float): Bandwidth-time product of the Gaussian filter.
+        samples_per_symbol (int): Samples per symbol.
+        span (int): Pulse length in symbols.
+
+    Returns:
+        numpy.ndarray: ``span * samples_per_symbol`` taps summing to ``samples_per_symbol``.
+    """
+    t = (np.arange(span * samples_per_symbol) + 0.5) / samples_per_symbol - span / 2
+    k = math.pi * bt * math.sqrt(2 / math.log(2))
+    erf = np.vectorize(math.erf)
+    pulse = 0.5 * (erf(k * (t + 0.5)) - erf(k * (t - 0.5)))
+    return pulse * samples_per_symbol / pulse.sum()
+
+
+# The pattern tables and the chunk buffers are built once and reused for every chunk
+class GfskModulator:  # pylint: disable=too-many-instance-attributes
+    """
+    Chunked GFSK modulator.
+
+    The arrays yielded by :meth:`modulate`, :meth:`flush` and :meth:`stream`
+    are views of an internal buffer that is overwritten by the next chunk;
+    write them out or copy them before advancing the generator.
+
+    Args:
+        phy (BlePhy): PHY, selects the symbol rate.
+        samples_per_symbol (int): Output samples per symbol.
+        bt (float): Bandwidth-time product of the Gaussian filter.
+        modulation_index (float): Peak-to-peak frequency deviation over the symbol rate.
+        span (int): Gaussian pulse length in symbols.
+        chunk_size (int): Symbols modulated per step.
+    """
+
+    def __init__(self, phy=BlePhy.BLE_PHY_1M, samples_per_symbol=8, bt=0.5, modulation_index=0.5, span=3, chunk_size=16384):
+        self.phy = phy
+        self.samples_per_symbol = samples_per_symbol
+        self.span = span
+        self.chunk_size = chunk_size
+        self.sample_rate = SYMBOL_RATE[phy] * samples_per_symbol
+
+        # taps[i, j]: contribution of the symbol i symbols back to sample j of the current symbol
+        self.taps = gaussian_pulse(bt, samples_per_symbol, span).reshape(span, samples_per_symbol)
+        self._phase = 0.0
+
+        # The samples of a symbol only depend on the last span symbols (-1, +1 or 0 while the
+        # filter is idle) and the phase at the start of the symbol. The phase trajectory of
+        # every symbol pattern is tabulated, so only one phasor per symbol is computed.
+        levels = np.array(list(itertools.product((-1, 0, 1), repeat=span)))[:, ::-1]
+        offsets = np.cumsum(levels @ self.taps, axis=1) * (math.pi * modulation_index / samples_per_symbol)
+        self._pattern_weights = 3 ** np.arange(span)
+        self._pattern_iq = np.exp(1j * offsets).astype(np.complex64)
+        self._pattern_phase = offsets[:, -1]
+
+        # Filter history (span - 1 symbols) followed by the current chunk
+        self._symbols = np.zeros(span - 1 + chunk_size, dtype=np.int8)
+        self._patterns = np.empty(chunk_size, dtype=np.intp)
+        self._phases = np.empty(chunk_size + 1)
+        self._rotation = np.empty(chunk_size, dtype=np.complex64)
+        self._iq = np.empty((chunk_size, samples_per_symbol), dtype=np.complex64)
+
+    @property
+    def delay(self):
+        """Samples from a symbol to the center of its frequency pulse."""
+        return self.span * self.samples_per_symbol // 2
+
+    def _modulate_chunk(self, n_symbols):
+        history = self.span - 1
+
+        # Pattern index with the current symbol as the lowest base-3 digit
+        windows = sliding_window_view(self._symbols[:history + n_symbols], self.span)[:, ::-1]
+        patterns = self._patterns[:n_symbols]
+        np.matmul(windows + 1, self._pattern_weights, out=patterns)
+
+        # Phase at the start of every symbol and one past the last one
+        phases = self._phases[:n_symbols + 1]
+        phases[0] = self._phase
+        np.cumsum(self._pattern_phase[patterns], out=phases[1:])
+        phases[1:] += self._phase
+        self._phase = math.fmod(phases[-1], 2 * math.pi)
+
+        rotation = self._rotation[:n_symbols]
+        np.cos(phases[:-1], out=rotation.real)
+        np.sin(phases[:-1], out=rotation.imag)
+
+        iq = self._iq[:n_symbols]
+        np.take(self._pattern_iq, patterns, axis=0, out=iq)
+        iq *= rotation[:, None]
+
+        self._symbols[:history] = self._symbols[n_symbols:n_symbols + history]
+        return iq.reshape(-1)
+
+    def modulate(self, bits):
+        """
+        Modulate bits, continuing from the previous call.
+
+        Args:
+            bits (array_like): Bits in transmission order.
+
+        Yields:
+            numpy.ndarray: complex64 IQ samples, ``samples_per_symbol`` per bit.
+        """
+        bits = np.asarray(bits, dtype=np.uint8).reshape(-1)
+        history = self.span - 1
+        for start in range(0, len(bits), self.chunk_size):
+            chunk = bits[start:start + self.chunk_size]
+            symbols = self._symbols[history:history + len(chunk)]
+            np.multiply(chunk, 2, out=symbols, casting="unsafe")
+            symbols -= 1
+            yield self._modulate_chunk(len(chunk))
+
+    def flush(self):
+        """
+        Let the filter settle after the last bit and clear the history.
+
+        Yields:
+            numpy.ndarray: The remaining ``(span - 1) * samples_per_symbol`` samples.
+        """
+        history = self.span - 1
+        if history:
+            self._symbols[history:2 * history] = 0
+            yield self._modulate_chunk(history)
+
+    def stream(self, bit_chunks):
+        """
+        Modulate an iterable of bit chunks (e.g. one packet per chunk) and flush at the end.
+
+        Yields:
+            numpy.ndarray: complex64 IQ samples.
+        """
+        for bits in bit_chunks:
+            yield from self.modulate(bits)
+        yield from self.flush()
+
+
+def gfsk_modulate(bits, phy=BlePhy.BLE_PHY_1M, samples_per_symbol=8, bt=0.5, modulation_index=0.5):
+    """
+    Modulate one bitstream into a new array.
+
+    Returns:
+        numpy.ndarray: complex64 IQ samples, ``(len(bits) + 2) * samples_per_symbol`` long.
+    """
+    modulator = GfskModulator(phy, samples_per_symbol, bt, modulation_index)
+    return np.concatenate([iq.copy() for iq in modulator.stream([bits])])
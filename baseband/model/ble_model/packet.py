@@ -0,0 +1,187 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+"""Bit-exact reference model of the ``ll_pkt_generator`` transmit chain.
+
+Each stage mirrors one RTL module and works on a batch of packets at once:
+
+    pdu_crc_generator -> whitening -> access_code_generator -> fec_encoder -> preamble_generator
+
+All packets of a batch share the payload length, every other parameter may
+be given per packet. Use :func:`ll_packets_bits` for a list of packets with
+mixed lengths.
+"""
+
+import numpy as np
+
+from .bits import bits_to_bytes, bytes_to_bits, uint_to_bits
+from .crc import crc24_bytes, crc24_to_bits
+from .fec import fec_bits
+from .types import BleCi, BlePhy
+from .whitening import whiten
+
+HEADER_LENGTH_BITS = 16
+CRC_LENGTH_BITS = 24
+ACCESS_CODE_LENGTH_BITS = 32
+
+PREAMBLE_1M = 0xAA
+PREAMBLE_2M = 0xAAAA
+CODED_PREAMBLE_BITS = np.tile(uint_to_bits(0x3C, 8), 10)
+
+
+def header_payload_length(header):
+    """Return the payload length in bytes encoded in ``packet_hdr[15:8]``."""
+    return (np.asarray(header, dtype=np.uint32) >> 8) & 0xFF
+
+
+def pdu_bits(header, payload):
+    """
+    Model the PDU part of ``pdu_crc_generator``: 16 header bits then the payload.
+
+    Args:
+        header (int | array_like): ``packet_hdr`` per packet.
+        payload (array_like): Payload bytes, shape ``(n_packets, n_bytes)``.
+
+    Returns:
+        numpy.ndarray: PDU bits, shape ``(n_packets, 16 + 8 * n_bytes)``.
+    """
+    payload = np.atleast_2d(np.asarray(payload, dtype=np.uint8))
+    header = np.broadcast_to(np.asarray(header), payload.shape[:1])
+    return np.concatenate([uint_to_bits(header, HEADER_LENGTH_BITS), bytes_to_bits(payload)], axis=1)
+
+
+def pdu_crc_bits(crc_init, header, payload):
+    """
+    Model ``pdu_crc_generator``: PDU bits followed by their CRC.
+
+    Args:
+        crc_init (int | array_like): CRC preset per packet.
+        header (int | array_like): ``packet_hdr`` per packet.
+        payload (array_like): Payload bytes, shape ``(n_packets, n_bytes)``.
+
+    Returns:
+        numpy.ndarray: PDU and CRC bits, shape ``(n_packets, 40 + 8 * n_bytes)``.
+    """
+    pdu = pdu_bits(header, payload)
+    return np.concatenate([pdu, crc24_to_bits(crc24_bytes(bits_to_bytes(pdu), crc_init))], axis=1)
+
+
+def access_code_bits(access_code):
+    """Model ``access_code_generator``: 32 access code bits, LSB first."""
+    return uint_to_bits(np.atleast_1d(access_code), ACCESS_CODE_LENGTH_BITS)
+
+
+def preamble_bits(phy, first_bit):
+    """
+    Model ``preamble_generator``.
+
+    For 1M and 2M PHY the first preamble bit equals the first bit of the
+    access code, for Coded PHY the preamble is fixed.
+
+    Args:
+        phy (BlePhy): PHY type shared by the batch.
+        first_bit (array_like): First bit of the access code per packet.
+
+    Returns:
+        numpy.ndarray: Preamble bits, shape ``(n_packets, preamble_length)``.
+    """
+    first_bit = np.atleast_1d(np.asarray(first_bit, dtype=np.uint8))
+    if phy == BlePhy.BLE_PHY_1M:
+        return uint_to_bits(PREAMBLE_1M, 8)[np.newaxis, :] ^ first_bit[:, np.newaxis]
+    if phy == BlePhy.BLE_PHY_2M:
+        return uint_to_bits(PREAMBLE_2M, 16)[np.newaxis, :] ^ first_bit[:, np.newaxis]
+    return np.broadcast_to(CODED_PREAMBLE_BITS, (first_bit.shape[0], CODED_PREAMBLE_BITS.shape[0])).copy()
+
+
+def ll_packet_bits(phy, access_code, channel, whitening_enabled, crc_init, header, payload,
+                   coding_indicator=BleCi.BLE_CI_S8):
+    """
+    Model the ``ll_pkt_generator`` output bitstream for a batch of packets.
+
+    Args:
+        phy (BlePhy): PHY type shared by the batch.
+        access_code (int | array_like): Access address per packet.
+        channel (int | array_like): Channel index per packet.
+        whitening_enabled (bool | array_like): Whitening enable per packet.
+        crc_init (int | array_like): CRC preset per packet.
+        header (int | array_like): ``packet_hdr`` per packet.
+        payload (array_like): Payload bytes, shape ``(n_packets, n_bytes)``.
+        coding_indicator (BleCi): Coding of FEC block 2 for Coded PHY, shared by the batch.
+
+    Returns:
+        numpy.ndarray: Output bits, shape ``(n_packets, n_bits)``.
+    """
+    pdu = pdu_crc_bits(crc_init, header, payload)
+    n_packets = pdu.shape[0]
+
+    whitening_enabled = np.broadcast_to(np.asarray(whitening_enabled, dtype=bool), (n_packets,))
+    channel = np.broadcast_to(np.asarray(channel), (n_packets,))
+    if whitening_enabled.any():
+        pdu[whitening_enabled] = whiten(pdu[whitening_enabled], channel[whitening_enabled])
+
+    access = np.broadcast_to(access_code_bits(access_code), (n_packets, ACCESS_CODE_LENGTH_BITS))
+    preamble = preamble_bits(phy, access[:, 0])
+
+    if phy == BlePhy.BLE_PHY_CODED:
+        return np.concatenate([preamble, fec_bits(access, pdu, coding_indicator)], axis=1)
+    return np.concatenate([preamble, access, pdu], axis=1)
+
+
+def ll_packets_bits(phy, access_code, channel, whitening_enabled, crc_init, header, payloads,
+                    coding_indicator=BleCi.BLE_CI_S8):
+    """
+    Model ``ll_pkt_generator`` for packets with different payload lengths.
+
+    Packets are grouped by payload length and every group is generated with
+    a single call to :func:`ll_packet_bits`.
+
+    Args:
+        phy (BlePhy): PHY type shared by all packets.
+        access_code (int | array_like): Access address per packet.
+        channel (int | array_like): Channel index per packet.
+        whitening_enabled (bool | array_like): Whitening enable per packet.
+        crc_init (int | array_like): CRC preset per packet.
+        header (int | array_like): ``packet_hdr`` per packet.
+        payloads (list): Payload bytes per packet.
+        coding_indicator (BleCi): Coding of FEC block 2 for Coded PHY, shared by all packets.
+
+    Returns:
+        list: Output bits (``numpy.ndarray``) per packet, in input order.
+    """
+    params = [np.broadcast_to(np.asarray(p), (len(payloads),)) for p in (access_code, channel, whitening_enabled, crc_init, header)]
+
+    packets = [None] * len(payloads)
+    for length, index in _length_groups(payloads):
+        payload = np.array([bytearray(payloads[i]) for i in index], dtype=np.uint8).reshape(len(index), length)
+        for i, packet in zip(index, ll_packet_bits(phy, *(p[index] for p in params), payload, coding_indicator)):
+            packets[i] = packet
+
+    return packets
+
+
+def _length_groups(payloads):
+    """Payload length and indexes of the packets of every length."""
+    lengths = np.array([len(payload) for payload in payloads])
+    return [(length, np.flatnonzero(lengths == length)) for length in np.unique(lengths)]
+
+
+def random_packets(rng, n_packets, payload_length):
+    """
+    Draw random packet parameters with a fixed payload length.
+
+    Args:
+        rng (numpy.random.Generator): Random generator.
+        n_packets (int): Batch size.
+        payload_length (int): Payload length in bytes (0-255).
+
+    Returns:
+        dict: Keyword arguments for :func:`ll_packet_bits` except ``phy``.
+    """
+    pdu_header = rng.integers(0, 0x100, n_packets) & 0xFF
+    return {
+        "access_code": rng.integers(0, 1 << 32, n_packets, dtype=np.uint64),
+        "channel": rng.integers(0, 40, n_packets),
+        "whitening_enabled": rng.integers(0, 2, n_packets).astype(bool),
+        "crc_init": rng.integers(0, 1 << 24, n_packets),
+        "header": pdu_header | (payload_length << 8),
+        "payload": rng.integers(0, 0x100, (n_packets, payload_length), dtype=np.uint8),
+    }
@@ -0,0 +1,197 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+"""Reference model of ``pdu_filter``.
+
+A received PDU is matched on the 82-bit key ``{pdu_type, access_code,
+address}``, ``address`` being the advertiser address of the advertising PDUs
+that carry it at a fixed offset and 0 otherwise. The keys are kept in a cuckoo
+hash table, one bucket per way, each way folding the key bits differently.
+:class:`PduFilterTable` is the host side of the table: it places keys and
+returns the writes for the ``table_*`` ports.
+"""
+
+import collections
+
+from .types import BlePduType
+
+KEY_LENGTH_BITS = 82
+
+# Payload offset of AdvA per advertising PDU type (header bits 3:0)
+ADVERTISER_ADDRESS_OFFSETS = {
+    0: 0,  # ADV_IND
+    1: 0,  # ADV_DIRECT_IND
+    2: 0,  # ADV_NONCONN_IND
+    3: 6,  # SCAN_REQ
+    4: 0,  # SCAN_RSP
+    5: 6,  # CONNECT_IND
+    6: 0,  # ADV_SCAN_IND
+}
+
+
+def advertiser_address(pdu_type, header, payload):
+    """
+    Return the advertiser address of a PDU as the filter reads it.
+
+    Args:
+        pdu_type (BlePduType): PDU type.
+        header (int): ``packet_hdr`` of the PDU.
+        payload (array_like): Payload bytes.
+
+    Returns:
+        int: AdvA, little endian, 0 for PDUs without one. Bytes past the end of
+        the payload read as 0.
+    """
+    offset = ADVERTISER_ADDRESS_OFFSETS.get(int(header) & 0xF)
+    if pdu_type != BlePduType.PDU_TYPE_ADVERTISING or offset is None:
+        return 0
+    return int.from_bytes(bytes(bytearray(payload)[offset:offset + 6]), "little")
+
+
+def filter_key(access_code, pdu_type, header, payload):
+    """
+    Return the key ``{pdu_type, access_code, address}`` of a PDU.
+
+    Args:
+        access_code (int): Access address the PDU was received on.
+        pdu_type (BlePduType): PDU type.
+        header (int): ``packet_hdr`` of the PDU.
+        payload (array_like): Payload bytes.
+
+    Returns:
+        int: 82-bit key.
+    """
+    return (pdu_type.value << 80) | (int(access_code) << 48) | advertiser_address(pdu_type, header, payload)
+
+
+def filter_bucket(key, n_buckets, way=0):
+    """
+    Return the bucket of a key in a way of the table.
+
+    Key bit ``i`` is XORed into bucket bit ``(i + (i // width) * way) % width``,
+    ``width`` being ``log2(n_buckets)``, so every way folds the key differently.
+
+    Args:
+        key (int): 82-bit key.
+        n_buckets (int): Buckets per way, a power of two.
+        way (int): Way of the table.
+
+    Returns:
+        int: Bucket index.
+    """
+    width = n_buckets.bit_length() - 1
+    bucket = 0
+    for i in range(KEY_LENGTH_BITS):
+        bucket ^= ((key >> i) & 1) << ((i % width + (i // width) * way) % width)
+    return bucket
+
+
+def filter_packets(keys, packets, enable=True):
+    """
+    Model which PDUs ``pdu_filter`` forwards.
+
+    Args:
+        keys (set): Keys in the table.
+        packets (list): ``(access_code, pdu_type, header, payload)`` per PDU.
+        enable (bool): ``enable`` input, every PDU is forwarded when low.
+
+    Returns:
+        list: ``True`` for every forwarded PDU.
+    """
+    return [not enable or filter_key(*packet) in keys for packet in packets]
+
+
+class PduFilterTable:
+    """
+    Host side of the ``pdu_filter`` cuckoo hash table.
+
+    A key can sit in one bucket per way. When all of them are taken, keys are
+    moved to their bucket in another way to make room, found by a breadth-first
+    search over the moves.
+
+    Args:
+        n_buckets (int): ``C_NUM_BUCKETS``.
+        n_ways (int): ``C_NUM_WAYS``.
+        max_search (int): Entries visited by the search before giving up.
+    """
+
+    def __init__(self, n_buckets=256, n_ways=4, max_search=1024):
+        self.n_buckets = n_buckets
+        self.n_ways = n_ways
+        self.max_search = max_search
+        self.entries = [[None] * n_buckets for _ in range(n_ways)]
+
+    def keys(self):
+        """Return the set of keys in the table."""
+        return {key for way in self.entries for key in way if key is not None}
+
+    def _candidates(self, key):
+        return [(way, filter_bucket(key, self.n_buckets, way)) for way in range(self.n_ways)]
+
+    def _find(self, key):
+        for way, bucket in self._candidates(key):
+            if self.entries[way][bucket] == key:
+                return way, bucket
+        return None
+
+    def _write(self, slot, key):
+        way, bucket = slot
+        self.entries[way][bucket] = key
+        entry = 0 if key is None else (1 << KEY_LENGTH_BITS) | key
+        return way * self.n_buckets + bucket, entry
+
+    def insert(self, key):
+        """
+        Place a key, moving other keys if needed.
+
+        The moved keys are written to their new entry before their old one is
+        overwritten, so the filter finds every key at any point of the writes.
+
+        Args:
+            key (int): 82-bit key.
+
+        Returns:
+            list: ``(table_index, table_entry)`` pairs to write in order, none
+            when the key is in the table already.
+
+        Raises:
+            ValueError: No free entry was found within ``max_search`` entries.
+        """
+        if self._find(key) is not None:
+            return []
+
+        parents = dict.fromkeys(self._candidates(key))
+        queue = collections.deque(parents)
+        while queue and len(parents) <= self.max_search:
+            slot = queue.popleft()
+            occupant = self.entries[slot[0]][slot[1]]
+            if occupant is None:
+                writes = []
+                while parents[slot] is not None:
+                    parent = parents[slot]
+                    writes.append(self._write(slot, self.entries[parent[0]][parent[1]]))
+                    slot = parent
+                writes.append(self._write(slot, key))
+                return writes
+            for candidate in self._candidates(occupant):
+                if candidate not in parents:
+                    parents[candidate] = slot
+                    queue.append(candidate)
+        raise ValueError(f"no room for key {key:#x}")
+
+    def remove(self, key):
+        """
+        Remove a key from the table.
+
+        Args:
+            key (int): 82-bit key.
+
+        Returns:
+            tuple: ``(table_index, table_entry)`` to write, an invalid entry.
+
+        Raises:
+            KeyError: The key is not in the table.
+        """
+        slot = self._find(key)
+        if slot is None:
+            raise KeyError(key)
+        return self._write(slot, None)
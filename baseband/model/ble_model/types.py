@@ -0,0 +1,29 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+"""Enumerations shared by the reference model and the cocotb tests.
+
+The values match the encodings of the typedefs in ``rtl/ble_types.svh``.
+"""
+
+from enum import Enum
+
+
+class BlePhy(Enum):
+    """Enumeration for BLE PHY types."""
+    BLE_PHY_1M = 0
+    BLE_PHY_2M = 1
+    BLE_PHY_CODED = 2
+
+
+class BleCi(Enum):
+    """Enumeration for bluetooth coding indicator types."""
+    BLE_CI_S8 = 0
+    BLE_CI_S2 = 1
+
+
+class BlePduType(Enum):
+    """Enumeration for bluetooth PDU types."""
+    PDU_TYPE_ADVERTISING = 0
+    PDU_TYPE_DATA = 1
+    PDU_TYPE_ISO = 2
+    PDU_TYPE_TEST = 3
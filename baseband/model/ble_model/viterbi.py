@@ -0,0 +1,233 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+"""Soft-decision Viterbi decoder for the LE Coded PHY.
+
+Inverse of :mod:`ble_model.fec`. Received values are soft bits: positive
+means 1, negative means 0, the magnitude is the confidence. Hard bits from
+the model or the RTL can be passed as ``numpy.uint8`` and are mapped to +-1.
+
+The trellis has 8 states, the state holds the last three input bits with the
+most recent one in bit 0. All packets of a batch are decoded together, the
+loops only run over the trellis steps.
+"""
+
+import multiprocessing
+
+import numpy as np
+
+from .bits import bits_to_uint
+from .fec import CODING_INDICATOR_LENGTH_BITS, TERM_LENGTH_BITS
+from .types import BleCi
+
+N_STATES = 8
+
+ACCESS_CODE_LENGTH_BITS = 32
+FEC_BLOCK_1_LENGTH_BITS = ACCESS_CODE_LENGTH_BITS + CODING_INDICATOR_LENGTH_BITS + TERM_LENGTH_BITS
+FEC_BLOCK_1_CODED_LENGTH = 2 * 4 * FEC_BLOCK_1_LENGTH_BITS
+
+# Per next state: the two predecessor states (oldest bit 0 or 1) and the input bit
+_NEXT_STATE = np.arange(N_STATES)
+PREDECESSORS = np.stack([(_NEXT_STATE >> 1), (_NEXT_STATE >> 1) | 4], axis=1)
+INPUT_BIT = _NEXT_STATE & 1
+
+
+def _branch_outputs():
+    """Bipolar encoder outputs (c0, c1) per next state and predecessor."""
+    outputs = np.empty((N_STATES, 2, 2))
+    for state in range(N_STATES):
+        for branch, previous in enumerate(PREDECESSORS[state]):
+            bit = INPUT_BIT[state]
+            s0, s1, s2 = previous & 1, (previous >> 1) & 1, (previous >> 2) & 1
+            outputs[state, branch] = [bit ^ s0 ^ s1 ^ s2, bit ^ s1 ^ s2]
+    return 2 * outputs - 1
+
+
+BRANCH_OUTPUTS = _branch_outputs()
+
+
+def to_soft(values):
+    """Map hard bits (integer arrays) to +-1, pass soft values through as float."""
+    values = np.atleast_2d(np.asarray(values))
+    if values.dtype.kind in "biu":
+        return 2.0 * values - 1.0
+    return values.astype(np.float64, copy=False)
+
+
+def pattern_demap(soft, coding_indicator):
+    """
+    Undo the pattern mapper: S=8 correlates every 4 values with the 1100 pattern, S=2 passes through.
+
+    Args:
+        soft (array_like): Received values, shape ``(n_packets, n)``.
+        coding_indicator (BleCi): Coding of the block.
+
+    Returns:
+        numpy.ndarray: Soft coded bits.
+    """
+    soft = to_soft(soft)
+    if coding_indicator == BleCi.BLE_CI_S2:
+        return soft
+    # Coded bit 1 is sent as 1,1,0,0 and 0 as 0,0,1,1
+    groups = soft.reshape(soft.shape[0], -1, 4)
+    return (groups[:, :, 0] + groups[:, :, 1] - groups[:, :, 2] - groups[:, :, 3]) / 4
+
+
+def _add_compare_select(metric, y):
+    """
+    One trellis step: extend the path metrics by the received pair and keep the best branch per state.
+
+    Returns:
+        tuple: Path metrics, shape ``(n_packets, N_STATES)``, and the chosen branch per state.
+    """
+    # Correlation of the received pair with each branch, shape (n_packets, next state, branch)
+    candidates = metric[:, PREDECESSORS] + y[:, 0, None, None] * BRANCH_OUTPUTS[:, :, 0] + y[:, 1, None, None] * BRANCH_OUTPUTS[:, :, 1]
+    decision = candidates[:, :, 1] > candidates[:, :, 0]
+    return np.where(decision, candidates[:, :, 1], candidates[:, :, 0]), decision
+
+
+def viterbi_decode(soft_coded, terminated=True):
+    """
+    Decode the rate 1/2 convolutional code.
+
+    Args:
+        soft_coded (array_like): Soft coded bits ``c0, c1`` per input bit, shape ``(n_packets, 2 * n_bits)``.
+        terminated (bool): The block ends with TERM bits, the path ends in state 0.
+
+    Returns:
+        numpy.ndarray: Decoded bits including the TERM bits, shape ``(n_packets, n_bits)``.
+    """
+    soft_coded = to_soft(soft_coded)
+    n_packets = soft_coded.shape[0]
+    n_bits = soft_coded.shape[1] // 2
+    pairs = soft_coded[:, :2 * n_bits].reshape(n_packets, n_bits, 2)
+
+    # The encoder starts in state 0
+    metric = np.full((n_packets, N_STATES), -np.inf)
+    metric[:, 0] = 0
+    decisions = np.empty((n_bits, n_packets, N_STATES), dtype=np.uint8)
+    for step in range(n_bits):
+        metric, decisions[step] = _add_compare_select(metric, pairs[:, step, :])
+
+    state = np.zeros(n_packets, dtype=np.intp) if terminated else np.argmax(metric, axis=1)
+    packets = np.arange(n_packets)
+    bits = np.empty((n_packets, n_bits), dtype=np.uint8)
+    for step in range(n_bits - 1, -1, -1):
+        bits[:, step] = INPUT_BIT[state]
+        state = PREDECESSORS[state, decisions[step, packets, state]]
+
+    return bits
+
+
+def decode_fec_block_1(soft):
+    """
+    Decode FEC block 1 (always S=8).
+
+    Args:
+        soft (array_like): Received values after the preamble, at least the 296 values of block 1.
+
+    Returns:
+        tuple: Access code bits, shape ``(n_packets, 32)``, and coding indicator value per packet.
+    """
+    soft = to_soft(soft)
+    bits = viterbi_decode(pattern_demap(soft[:, :FEC_BLOCK_1_CODED_LENGTH], BleCi.BLE_CI_S8))
+    access_code = bits[:, :ACCESS_CODE_LENGTH_BITS]
+    coding_indicator = bits_to_uint(bits[:, ACCESS_CODE_LENGTH_BITS:ACCESS_CODE_LENGTH_BITS + CODING_INDICATOR_LENGTH_BITS])
+    return access_code, coding_indicator
+
+
+def decode_fec_block_2(soft, coding_indicator):
+    """
+    Decode FEC block 2.
+
+    Args:
+        soft (array_like): Received values of block 2, shape ``(n_packets, n)``.
+        coding_indicator (BleCi): Coding of block 2, shared by the batch.
+
+    Returns:
+        numpy.ndarray: PDU and CRC bits without TERM2.
+    """
+    return viterbi_decode(pattern_demap(soft, coding_indicator))[:, :-TERM_LENGTH_BITS]
+
+
+def fec_decode(soft):
+    """
+    Decode ``fec_encoder`` output (the Coded PHY packet after the preamble).
+
+    Args:
+        soft (array_like): Received values, shape ``(n_packets, n)``. All packets must use the same coding indicator.
+
+    Returns:
+        tuple: Access code bits ``(n_packets, 32)``, coding indicator (BleCi) and PDU + CRC bits.
+
+    Raises:
+        ValueError: The packets use different coding indicators.
+    """
+    soft = to_soft(soft)
+    access_code, coding_indicator = decode_fec_block_1(soft)
+    if np.any(coding_indicator != coding_indicator[0]):
+        raise ValueError("Packets with different coding indicators, decode them in separate batches")
+
+    coding_indicator = BleCi(int(coding_indicator[0]))
+    return access_code, coding_indicator, decode_fec_block_2(soft[:, FEC_BLOCK_1_CODED_LENGTH:], coding_indicator)
+
+
+def _decode_group(soft):
+    """Decode packets of equal length, splitting block 2 by coding indicator."""
+    access_code, coding_indicator = decode_fec_block_1(soft)
+    pdu_crc = [None] * soft.shape[0]
+    for value in np.unique(coding_indicator):
+        index = np.flatnonzero(coding_indicator == value)
+        bits = decode_fec_block_2(soft[index, FEC_BLOCK_1_CODED_LENGTH:], BleCi(int(value)))
+        for i, packet in zip(index, bits):
+            pdu_crc[i] = packet
+    return [(access_code[i], BleCi(int(coding_indicator[i])), pdu_crc[i]) for i in range(soft.shape[0])]
+
+
+def _pool_map(processes, function, args):
+    """Map function over args in a pool of processes, in order."""
+    with multiprocessing.Pool(processes) as pool:
+        try:
+            return pool.map(function, args)
+        finally:
+            # Let the workers exit before the with block calls terminate(): workers forked
+            # from a process with a SIGTERM handler installed (cocotb-test) would run it
+            # instead of exiting
+            pool.close()
+            pool.join()
+
+
+def decode_packets(packets, processes=None, chunk_size=256):
+    """
+    Decode Coded PHY packets of any length and coding in a process pool.
+
+    Packets are grouped by length and every chunk of a group is decoded as a
+    batch by one worker.
+
+    Args:
+        packets (list): Received values per packet, after the preamble.
+        processes (int): Worker processes, None for one per CPU, 0 to decode in this process.
+        chunk_size (int): Packets per batch.
+
+    Returns:
+        list: ``(access_code_bits, coding_indicator, pdu_crc_bits)`` per packet, in input order.
+    """
+    packets = [to_soft(packet)[0] for packet in packets]
+    lengths = np.array([len(packet) for packet in packets])
+
+    jobs = []
+    for length in np.unique(lengths):
+        index = np.flatnonzero(lengths == length)
+        for start in range(0, len(index), chunk_size):
+            chunk = index[start:start + chunk_size]
+            jobs.append((chunk, np.stack([packets[i] for i in chunk])))
+
+    if processes == 0:
+        results = [_decode_group(soft) for _, soft in jobs]
+    else:
+        results = _pool_map(processes, _decode_group, [soft for _, soft in jobs])
+
+    decoded = [None] * len(packets)
+    for (chunk, _), result in zip(jobs, results):
+        for i, packet in zip(chunk, result):
+            decoded[i] = packet
+    return decoded
@@ -0,0 +1,122 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+"""Reference model of ``whitening``.
+
+7-bit linear feedback shift register with the polynomial x^7 + x^4 + 1,
+initialized from the physical channel index. The keystream only depends on
+the channel and the bit position, so one period of it is tabulated for every
+value of the 6-bit ``channel`` port, the 40 BLE channels and 40-63, and every
+packet looks its keystream up in the shared table.
+"""
+
+import functools
+
+import numpy as np
+
+
+def whitening_init(channel):
+    """
+    Return the LFSR value loaded on restart for the given channels.
+
+    Bit 6 of the register holds ``channel[0]``, bit 1 holds ``channel[5]``
+    and bit 0 is always set.
+
+    Args:
+        channel (int | array_like): Channel indexes.
+
+    Returns:
+        numpy.ndarray: 7-bit register values.
+    """
+    channel = np.asarray(channel, dtype=np.uint8)
+    lfsr = np.ones_like(channel)
+    for i in range(6):
+        lfsr |= ((channel >> i) & 1) << (6 - i)
+    return lfsr
+
+
+# The LFSR is maximal length, the keystream repeats every 127 bits
+WHITENING_PERIOD = 127
+
+# Channels of the BLE RF band
+NUM_CHANNELS = 40
+
+# Values of the 6-bit channel index the LFSR is loaded from
+NUM_CHANNEL_INDEXES = 64
+
+
+@functools.lru_cache(maxsize=None)
+def keystream_table():
+    """
+    Return one period of the keystream of every channel index.
+
+    The table is computed once and shared by every call of
+    :func:`whitening_keystream`.
+
+    Returns:
+        numpy.ndarray: Read-only keystream, shape ``(NUM_CHANNEL_INDEXES, WHITENING_PERIOD)``.
+    """
+    lfsr = whitening_init(np.arange(NUM_CHANNEL_INDEXES))
+    table = np.empty((NUM_CHANNEL_INDEXES, WHITENING_PERIOD), dtype=np.uint8)
+
+    for i in range(WHITENING_PERIOD):
+        msb = lfsr >> 6
+        table[:, i] = msb
+        lfsr = ((lfsr << 1) & 0x7F) | msb
+        lfsr ^= msb << 4
+
+    table.flags.writeable = False
+    return table
+
+
+def whitening_keystream(channel, n_bits):
+    """
+    Generate the bits XORed onto the data stream.
+
+    Args:
+        channel (int | array_like): Channel index per packet (0-63), shape ``(n_packets,)``.
+        n_bits (int): Keystream length.
+
+    Returns:
+        numpy.ndarray: Keystream, shape ``(n_packets, n_bits)``.
+
+    Raises:
+        ValueError: A channel index doesn't fit the 6-bit ``channel`` port.
+    """
+    channel = np.atleast_1d(np.asarray(channel, dtype=np.intp))
+    if channel.size and not 0 <= channel.min() <= channel.max() < NUM_CHANNEL_INDEXES:
+        raise ValueError(f"channel index out of range 0-{NUM_CHANNEL_INDEXES - 1}: {channel.min()}-{channel.max()}")
+    return keystream_table()[channel[:, np.newaxis], np.arange(n_bits) % WHITENING_PERIOD]
+
+
+def whitening_keystream_words(channel, n_words):
+    """
+    Generate the keystream as 32-bit words, the first bit in bit 0.
+
+    This is the keystream ``pdu_crc_generator`` XORs onto the PDU and CRC words
+    when it whitens a word per clock.
+
+    Args:
+        channel (int | array_like): Channel index per packet (0-63), shape ``(n_packets,)``.
+        n_words (int): Keystream length in words.
+
+    Returns:
+        numpy.ndarray: uint32 keystream words, shape ``(n_packets, n_words)``.
+    """
+    keystream = np.packbits(whitening_keystream(channel, 32 * n_words), axis=-1, bitorder='little')
+    return np.ascontiguousarray(keystream).view('<u4')
+
+
+def whiten(bits, channel):
+    """
+    Whiten or de-whiten bits.
+
+    Args:
+        bits (array_like): Bits, shape ``(n_packets, n_bits)``.
+        channel (int | array_like): Channel index per packet.
+
+    Returns:
+        numpy.ndarray: Whitened bits, shape ``(n_packets, n_bits)``.
+    """
+    bits = np.atleast_2d(np.asarray(bits, dtype=np.uint8))
+    channel = np.broadcast_to(np.asarray(channel), bits.shape[:1])
+    return bits ^ whitening_keystream(channel, bits.shape[1])
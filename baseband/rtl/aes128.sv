@@ -0,0 +1,137 @@
+// 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+`resetall  //
+`timescale 1ns / 1ps  //
+`default_nettype none  //
+
+// AES-128 encryption (FIPS-197), one round per clock. A block is taken on the
+// input handshake and its ciphertext is on output_tdata for one clock with
+// output_tvalid 10 clocks later, the next block is taken on the clock after
+// that. The round keys are expanded alongside the rounds, so the key may change
+// between blocks. Blocks are byte strings, byte 0 of the block is in bits
+// [127:120].
+module aes128 (
+    input wire aclk,
+    input wire aresetn,
+
+    // Drop the block in flight
+    input wire restart,
+
+    input wire [127:0] key,
+
+    input  wire [127:0] input_tdata,
+    input  wire         input_tvalid,
+    output wire         input_tready,
+
+    output reg [127:0] output_tdata,
+    output reg         output_tvalid
+);
+
+  localparam integer NumRounds = 10;
+
+  // S-box, entry x in bits [8*x+7:8*x]
+  localparam logic [2047:0] Sbox = {
+      256'h16bb54b0_0f2d9941_6842e6bf_0d89a18c_df2855ce_e9871e9b_948ed969_1198f8e1,
+      256'h9e1dc186_b9573561_0ef60348_66b53e70_8a8bbd4b_1f74dde8_c6b4a61c_2e2578ba,
+      256'h08ae7a65_eaf4566c_a94ed58d_6d37c8e7_79e49591_62acd3c2_5c240649_0a3a32e0,
+      256'hdb0b5ede_14b8ee46_88902a22_dc4f8160_73195d64_3d7ea7c4_1744975f_ec130ccd,
+      256'hd2f3ff10_21dab6bc_f5389d92_8f40a351_a89f3c50_7f02f945_85334d43_fbaaefd0,
+      256'hcf584c4a_39becb6a_5bb1fc20_ed00d153_842fe329_b3d63b52_a05a6e1b_1a2c8309,
+      256'h75b227eb_e2801207_9a059618_c323c704_1531d871_f1e5a534_ccf73f36_2693fdb7,
+      256'hc072a49c_afa2d4ad_f04759fa_7dc982ca_76abd7fe_2b670130_c56f6bf2_7b777c63
+  };
+
+  reg busy;
+  reg [3:0] round;
+  reg [7:0] rcon;
+  reg [127:0] state;
+  reg [127:0] round_key;
+
+  assign input_tready = ~busy;
+
+  wire [127:0] next_round_key = expand_key(round_key, rcon);
+  wire [127:0] shifted_state = shift_rows(sub_bytes(state));
+
+  always @(posedge aclk) begin
+    if (~aresetn | restart) begin
+      busy <= 0;
+      round <= 0;
+      rcon <= 0;
+      state <= 0;
+      round_key <= 0;
+      output_tdata <= 0;
+      output_tvalid <= 0;
+    end else begin
+      output_tvalid <= 0;
+
+      if (input_tvalid & input_tready) begin
+        busy <= 1;
+        round <= 1;
+        rcon <= 8'h01;
+        state <= input_tdata ^ key;
+        round_key <= key;
+      end else if (busy) begin
+        round <= round + 1;
+        rcon <= xtime(rcon);
+        round_key <= next_round_key;
+        if (round == NumRounds[3:0]) begin
+          // The last round has no MixColumns
+          busy <= 0;
+          output_tdata <= shifted_state ^ next_round_key;
+          output_tvalid <= 1;
+        end else begin
+          state <= mix_columns(shifted_state) ^ next_round_key;
+        end
+      end
+    end
+  end
+
+  function automatic [7:0] xtime(input logic [7:0] x);
+    xtime = {x[6:0], 1'b0} ^ (x[7] ? 8'h1b : 8'h00);
+  endfunction
+
+  function automatic [127:0] sub_bytes(input logic [127:0] data);
+    integer i;
+    for (i = 0; i < 16; i = i + 1) begin
+      sub_bytes[8*i+:8] = sbox(data[8*i+:8]);
+    end
+  endfunction
+
+  // Row r of the state is rotated left by r columns, byte i is row i % 4 of column i / 4
+  function automatic [127:0] shift_rows(input logic [127:0] data);
+    integer i;
+    for (i = 0; i < 16; i = i + 1) begin
+      shift_rows[127-8*i-:8] = data[127-8*((i+4*(i%4))%16)-:8];
+    end
+  endfunction
+
+  function automatic [127:0] mix_columns(input logic [127:0] data);
+    integer c, r;
+    logic [7:0] total;
+    for (c = 0; c < 4; c = c + 1) begin
+      total = data[127-32*c-:8] ^ data[119-32*c-:8] ^ data[111-32*c-:8] ^ data[103-32*c-:8];
+      for (r = 0; r < 4; r = r + 1) begin
+        mix_columns[127-32*c-8*r-:8] = data[127-32*c-8*r-:8] ^ total ^
+            xtime(data[127-32*c-8*r-:8] ^ data[127-32*c-8*((r+1)%4)-:8]);
+      end
+    end
+  endfunction
+
+  function automatic [127:0] expand_key(input logic [127:0] round_key, input logic [7:0] rcon);
+    logic [31:0] temp;
+    integer i;
+    // SubWord(RotWord(w3)) ^ Rcon
+    temp = {sbox(round_key[23:16]) ^ rcon, sbox(round_key[15:8]), sbox(round_key[7:0]), sbox(round_key[31:24])};
+    for (i = 0; i < 4; i = i + 1) begin
+      temp = temp ^ round_key[127-32*i-:32];
+      expand_key[127-32*i-:32] = temp;
+    end
+  endfunction
+
+  function automatic [7:0] sbox(input logic [7:0] x);
+    sbox = Sbox[{x, 3'b000}+:8];
+  endfunction
+
+endmodule
+
+`resetall
@@ -0,0 +1,72 @@
+// 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+`resetall  //
+`timescale 1ns / 1ps  //
+`default_nettype none  //
+
+// Synchronous AXI-Stream FIFO. output_tdata comes straight from the memory,
+// so a beat written on one clock can be read on the next one, and a full FIFO
+// accepts a new beat on the clock its head is read.
+module axis_fifo #(
+    // Width of data bus
+    parameter integer C_DATA_WIDTH = 8,
+    // Number of entries, a power of two
+    parameter integer C_DEPTH = 4
+) (
+    input wire aclk,
+    input wire aresetn,
+
+    input wire restart,
+
+    input  wire [C_DATA_WIDTH-1:0] input_tdata,
+    input  wire                    input_tvalid,
+    output wire                    input_tready,
+
+    output wire [C_DATA_WIDTH-1:0] output_tdata,
+    output wire                    output_tvalid,
+    input  wire                    output_tready,
+
+    output wire [$clog2(C_DEPTH):0] level
+);
+  localparam integer AddressWidth = $clog2(C_DEPTH);
+
+  reg [C_DATA_WIDTH-1:0] memory[0:C_DEPTH-1];
+
+  // One extra bit tells a full FIFO from an empty one
+  reg [AddressWidth:0] write_pointer;
+  reg [AddressWidth:0] read_pointer;
+
+  wire empty = (write_pointer == read_pointer);
+  wire full = (write_pointer == {~read_pointer[AddressWidth], read_pointer[AddressWidth-1:0]});
+
+  wire write = input_tvalid & input_tready;
+  wire read = output_tvalid & output_tready;
+
+  assign input_tready = ~full | output_tready;
+  assign output_tvalid = ~empty;
+  assign output_tdata = memory[read_pointer[AddressWidth-1:0]];
+  assign level = write_pointer - read_pointer;
+
+  always @(posedge aclk) begin
+    if (~aresetn | restart) begin
+      write_pointer <= 0;
+      read_pointer  <= 0;
+    end else begin
+      if (write) begin
+        write_pointer <= write_pointer + 1;
+      end
+      if (read) begin
+        read_pointer <= read_pointer + 1;
+      end
+    end
+  end
+
+  always @(posedge aclk) begin
+    if (write) begin
+      memory[write_pointer[AddressWidth-1:0]] <= input_tdata;
+    end
+  end
+
+endmodule
+
+`resetall
@@ -0,0 +1,64 @@
+// 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+`resetall  //
+`timescale 1ns / 1ps  //
+`default_nettype none  //
+
+// Performance counters of one bit-wide AXI-Stream link. A packet runs from
+// restart to the beat with tlast; every clock of it counts as active and as
+// exactly one of: a bit sent, stalled (valid but the sink is not ready) or
+// starved (nothing to send, the stage waits on its input).
+module axis_perf_counter (
+    input wire aclk,
+    input wire aresetn,
+
+    input wire restart,
+    input wire clear,
+
+    input wire tvalid,
+    input wire tready,
+    input wire tlast,
+
+    output reg [31:0] active_cycles,
+    output reg [31:0] stall_cycles,
+    output reg [31:0] starve_cycles,
+    output reg [31:0] packets,
+    output reg [31:0] bits
+);
+  reg in_packet;
+
+  wire handshake = tvalid & tready;
+
+  always @(posedge aclk) begin
+    if (~aresetn) begin
+      in_packet <= 0;
+    end else if (restart) begin
+      in_packet <= 1;
+    end else if (handshake & tlast) begin
+      in_packet <= 0;
+    end
+  end
+
+  always @(posedge aclk) begin
+    if (~aresetn | clear) begin
+      active_cycles <= 0;
+      stall_cycles <= 0;
+      starve_cycles <= 0;
+      packets <= 0;
+      bits <= 0;
+    end else if (in_packet & ~restart) begin
+      active_cycles <= active_cycles + 1;
+      if (handshake) begin
+        bits <= bits + 1;
+        packets <= packets + {31'b0, tlast};
+      end else if (tvalid) begin
+        stall_cycles <= stall_cycles + 1;
+      end else begin
+        starve_cycles <= starve_cycles + 1;
+      end
+    end
+  end
+
+endmodule
+
+`resetall
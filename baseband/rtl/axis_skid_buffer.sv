@@ -0,0 +1,69 @@
+// 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+`resetall  //
+`timescale 1ns / 1ps  //
+`default_nettype none  //
+
+// Two entry AXI-Stream register slice. Both input_tready and the output
+// signals come from flops, and a beat is accepted on every clock as long as
+// the output is consumed, so a chain of stages sustains one beat per clock.
+// When the output stalls, the beat already in flight is parked in the skid
+// register and input_tready drops on the next clock.
+module axis_skid_buffer #(
+    // Width of data bus
+    parameter integer C_DATA_WIDTH = 1
+) (
+    input wire aclk,
+    input wire aresetn,
+
+    input wire restart,
+
+    input  wire [C_DATA_WIDTH-1:0] input_tdata,
+    input  wire                    input_tvalid,
+    output wire                    input_tready,
+    input  wire                    input_tlast,
+
+    output reg  [C_DATA_WIDTH-1:0] output_tdata,
+    output reg                     output_tvalid,
+    input  wire                    output_tready,
+    output reg                     output_tlast
+);
+  reg [C_DATA_WIDTH-1:0] skid_tdata = 0;
+  reg skid_tvalid = 0;
+  reg skid_tlast = 0;
+
+  assign input_tready = ~skid_tvalid;
+
+  always @(posedge aclk) begin
+    if (~aresetn | restart) begin
+      skid_tdata <= 0;
+      skid_tvalid <= 0;
+      skid_tlast <= 0;
+
+      output_tdata <= 0;
+      output_tvalid <= 0;
+      output_tlast <= 0;
+    end else begin
+      if (input_tvalid & input_tready) begin
+        if (output_tvalid & ~output_tready) begin
+          // Output is stalled, park the beat
+          skid_tdata  <= input_tdata;
+          skid_tvalid <= 1;
+          skid_tlast  <= input_tlast;
+        end else begin
+          output_tdata  <= input_tdata;
+          output_tvalid <= 1;
+          output_tlast  <= input_tlast;
+        end
+      end else if (output_tready | ~output_tvalid) begin
+        output_tdata  <= skid_tdata;
+        output_tvalid <= skid_tvalid;
+        output_tlast  <= skid_tlast;
+        skid_tvalid   <= 0;
+      end
+    end
+  end
+
+endmodule
+
+`resetall
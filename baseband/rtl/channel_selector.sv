@@ -0,0 +1,119 @@
+// 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+`resetall  //
+`timescale 1ns / 1ps  //
+`default_nettype none  //
+
+// Channel selection, combinational so the channel is ready on the clock the
+// packet restarts with its parameters.
+//
+// Data channels follow Channel Selection Algorithm #2 (Bluetooth Core
+// Specification Vol 6 Part B 4.5.8.3): prn_e from the event counter and the
+// channel identifier (access address halves XORed) through three rounds of
+// PERM (bits of each byte reversed) and MAM ((17a + b) mod 2^16). The unmapped
+// channel prn_e mod 37 is used if it is in the map, otherwise it is remapped to
+// the used channel with index (n_used * prn_e) >> 16.
+//
+// Advertising PDUs are sent on the used advertising channels in 37, 38, 39
+// order, event_counter then counts the packets of the advertising event.
+//
+// Bit i of channel_map is set when channel i is used, bits 0-36 are the data
+// channels and bits 37-39 the advertising channels.
+module channel_selector (
+    input wire [31:0] access_address,
+    input wire [15:0] event_counter,
+    input wire [39:0] channel_map,
+    input wire        advertising,
+
+    output wire [5:0] channel
+);
+
+  localparam integer NumDataChannels = 37;
+  localparam integer NumAdvertisingChannels = 3;
+
+  //***************************************************************************
+  // prn_e
+  //***************************************************************************
+  wire [15:0] identifier = access_address[31:16] ^ access_address[15:0];
+
+  function automatic [15:0] perm(input logic [15:0] value);
+    integer i;
+    for (i = 0; i < 8; i = i + 1) begin
+      perm[i] = value[7-i];
+      perm[8+i] = value[15-i];
+    end
+  endfunction
+
+  function automatic [15:0] mam(input logic [15:0] a, input logic [15:0] b);
+    mam = {a[11:0], 4'b0000} + a + b;
+  endfunction
+
+  wire [15:0] prn_round_0 = mam(perm(event_counter ^ identifier), identifier);
+  wire [15:0] prn_round_1 = mam(perm(prn_round_0), identifier);
+  wire [15:0] prn_round_2 = mam(perm(prn_round_1), identifier);
+  wire [15:0] prn_e = prn_round_2 ^ identifier;
+
+  //***************************************************************************
+  // Data channel
+  //***************************************************************************
+  wire [36:0] data_map = channel_map[36:0];
+
+  wire [5:0] unmapped_channel = 6'(prn_e % 16'(NumDataChannels));
+  wire [5:0] n_used = count_ones(data_map);
+  wire [21:0] remapping_product = n_used * prn_e;
+  wire [5:0] remapping_index = remapping_product[21:16];
+
+  // Channel with the given rank among the used channels
+  function automatic [5:0] nth_used(input logic [36:0] map, input logic [5:0] n);
+    integer i;
+    logic [5:0] rank;
+    nth_used = 0;
+    rank = 0;
+    for (i = 0; i < NumDataChannels; i = i + 1) begin
+      if (map[i]) begin
+        if (rank == n) begin
+          nth_used = 6'(i);
+        end
+        rank = rank + 1;
+      end
+    end
+  endfunction
+
+  function automatic [5:0] count_ones(input logic [36:0] map);
+    integer i;
+    count_ones = 0;
+    for (i = 0; i < NumDataChannels; i = i + 1) begin
+      count_ones = count_ones + {5'b0, map[i]};
+    end
+  endfunction
+
+  wire [5:0] data_channel = (data_map[unmapped_channel]) ? unmapped_channel : nth_used(data_map, remapping_index);
+
+  //***************************************************************************
+  // Advertising channel
+  //***************************************************************************
+  wire [2:0] advertising_map = channel_map[39:37];
+  wire [1:0] n_advertising = {1'b0, advertising_map[0]} + {1'b0, advertising_map[1]} + {1'b0, advertising_map[2]};
+  wire [1:0] advertising_index = 2'(event_counter % {14'b0, (n_advertising == 0) ? 2'd1 : n_advertising});
+
+  reg [5:0] advertising_channel;
+  always @(*) begin : select_advertising
+    integer i;
+    logic [1:0] rank;
+    advertising_channel = 6'd37;
+    rank = 0;
+    for (i = 0; i < NumAdvertisingChannels; i = i + 1) begin
+      if (advertising_map[i]) begin
+        if (rank == advertising_index) begin
+          advertising_channel = 6'(NumDataChannels + i);
+        end
+        rank = rank + 1;
+      end
+    end
+  end
+
+  assign channel = (advertising) ? advertising_channel : data_channel;
+
+endmodule
+
+`resetall
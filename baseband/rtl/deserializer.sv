@@ -0,0 +1,89 @@
+// 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+`resetall  //
+`timescale 1 ns / 1 ps  //
+`default_nettype none  //
+
+// Packs a bitstream into C_DATA_WIDTH bit words, the first bit goes to
+// output_tdata[0]. A word is sent when it is full or holds the bit marked
+// with input_tlast; the unused bits of that last word are zero and
+// output_tkeep only flags the bytes holding packet bits.
+//
+// The next word is collected while the current one waits on the output, so a
+// stream of one bit per clock passes without stalls.
+module deserializer #(
+    // Width of output data bus: 8, 16 or 32
+    parameter integer C_DATA_WIDTH = 32
+) (
+    input wire aclk,
+    input wire aresetn,
+
+    input wire restart,
+
+    input  wire input_tdata,
+    input  wire input_tvalid,
+    output wire input_tready,
+    input  wire input_tlast,
+
+    output reg [  C_DATA_WIDTH-1:0] output_tdata,
+    output reg [C_DATA_WIDTH/8-1:0] output_tkeep,
+    output reg                      output_tvalid,
+    input wire                      output_tready,
+    output reg                      output_tlast
+);
+  localparam logic [$clog2(C_DATA_WIDTH)-1:0] LastBit = C_DATA_WIDTH[$clog2(C_DATA_WIDTH)-1:0] - 1;
+
+  reg [C_DATA_WIDTH-1:0] shift_data;
+  reg [$clog2(C_DATA_WIDTH)-1:0] shift_index;
+
+  wire output_free = ~output_tvalid | output_tready;
+  wire word_done = (shift_index == LastBit) | input_tlast;
+  wire input_handshake = input_tvalid & input_tready;
+
+  // A bit that completes the word needs a free output register
+  assign input_tready = output_free | ~word_done;
+
+  wire [C_DATA_WIDTH-1:0] word = shift_data | ({{(C_DATA_WIDTH - 1) {1'b0}}, input_tdata} << shift_index);
+
+  always @(posedge aclk) begin
+    if (~aresetn | restart) begin
+      shift_data <= 0;
+      shift_index <= 0;
+
+      output_tdata <= 0;
+      output_tkeep <= 0;
+      output_tvalid <= 0;
+      output_tlast <= 0;
+    end else begin
+      if (output_tready) begin
+        output_tvalid <= 0;
+      end
+
+      if (input_handshake) begin
+        if (word_done) begin
+          output_tdata <= word;
+          output_tkeep <= keep(shift_index);
+          output_tvalid <= 1;
+          output_tlast <= input_tlast;
+
+          shift_data <= 0;
+          shift_index <= 0;
+        end else begin
+          shift_data  <= word;
+          shift_index <= shift_index + 1;
+        end
+      end
+    end
+  end
+
+  // Bytes holding the bits up to last_bit
+  function automatic logic [C_DATA_WIDTH/8-1:0] keep(logic [$clog2(C_DATA_WIDTH)-1:0] last_bit);
+    integer i;
+    for (i = 0; i < C_DATA_WIDTH / 8; i = i + 1) begin
+      keep[i] = (i * 8 <= {{(32 - $clog2(C_DATA_WIDTH)) {1'b0}}, last_bit});
+    end
+  endfunction
+
+endmodule
+
+`resetall
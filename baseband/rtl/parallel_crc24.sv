@@ -0,0 +1,60 @@
+// 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+`resetall  //
+`timescale 1ns / 1ps  //
+`default_nettype none  //
+
+// CRC polynomial coefficients: x^24 + x^10 + x^9 + x^6 + x^4 + x^3 + x + 1
+// CRC width:                   24 bits
+//
+// Same CRC as serial_crc24, but advances C_DATA_WIDTH bits per aclk.
+// input_tdata[0] is processed first, i.e. the word is consumed in the order
+// the serializer sends it. Bytes with input_tkeep low are skipped, which
+// allows partial words at the end of a PDU.
+module parallel_crc24 #(
+    // Width of input data bus: 8, 16 or 32
+    parameter integer C_DATA_WIDTH = 32
+) (
+    input wire aclk,
+    input wire aresetn,
+
+    input wire restart,
+
+    input wire [23:0] init_preset,
+
+    input wire [  C_DATA_WIDTH-1:0] input_tdata,
+    input wire [C_DATA_WIDTH/8-1:0] input_tkeep,
+    input wire                      input_tvalid,
+
+    output wire [23:0] crc_out
+);
+  localparam logic [23:0] Polynomial = 24'h00065B;
+
+  reg [23:0] lfsr = 0;
+
+  assign crc_out = lfsr;
+
+  always @(posedge aclk)
+    if (~aresetn | restart) begin
+      lfsr <= init_preset;
+    end else if (input_tvalid) begin
+      lfsr <= next_crc(lfsr, input_tdata, input_tkeep);
+    end
+
+  // Unrolled serial_crc24 steps, synthesizes into one XOR network
+  function automatic [23:0] next_crc(input logic [23:0] crc, input logic [C_DATA_WIDTH-1:0] data,
+                                     input logic [C_DATA_WIDTH/8-1:0] keep);
+    integer i;
+    logic feedback;
+    next_crc = crc;
+    for (i = 0; i < C_DATA_WIDTH; i = i + 1) begin
+      if (keep[i/8]) begin
+        feedback = data[i] ^ next_crc[23];
+        next_crc = {next_crc[22:0], 1'b0} ^ (feedback ? Polynomial : 24'h0);
+      end
+    end
+  endfunction
+
+endmodule
+
+`resetall
@@ -0,0 +1,127 @@
+// 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+`resetall  //
+`timescale 1ns / 1ps  //
+`default_nettype none  //
+`include "ble_types.svh"
+
+// Searches a demodulated 1M/2M PHY bitstream for preamble + access code.
+// Coded PHY needs a correlator on the FEC-coded symbols, so nothing ever matches
+// here with phy set to PHY_CODED.
+//
+// The last 48 received bits are kept in a sliding window. On every input bit the
+// window is XORed with the expected preamble and access code of each address
+// in the bank, and the mismatching bits are counted. An address matches when
+// it is enabled and has at most error_threshold mismatches. The bank is
+// evaluated in parallel, so a new candidate is checked on every clock.
+//
+// The match is reported one clock after the last access code bit was accepted:
+// match_mask flags every matching address, match_index/match_errors the one
+// with the fewest errors (the lowest index on a tie).
+module access_code_correlator #(
+    // Number of access addresses searched in parallel, at least 2
+    parameter integer C_NUM_ADDRESSES = 4
+) (
+    input wire aclk,
+    input wire aresetn,
+
+    input wire restart,
+
+    input wire ble_phy_t phy,
+
+    input wire [C_NUM_ADDRESSES*AccessCodeLength-1:0] access_codes,
+    input wire [                 C_NUM_ADDRESSES-1:0] access_code_enable,
+    input wire [                                 5:0] error_threshold,
+
+    input  wire input_tdata,
+    input  wire input_tvalid,
+    output wire input_tready,
+
+    output reg                                match_valid,
+    output reg  [        C_NUM_ADDRESSES-1:0] match_mask,
+    output reg  [$clog2(C_NUM_ADDRESSES)-1:0] match_index,
+    output reg  [                        5:0] match_errors
+);
+  localparam integer WindowLength = 2 * PreambleLength + AccessCodeLength;
+
+  // Received bits, window[WindowLength-1] is the newest one
+  reg [WindowLength-1:0] window;
+  reg window_updated;
+
+  // The receiver never stalls the demodulator
+  assign input_tready = 1'b1;
+
+  always @(posedge aclk) begin
+    if (~aresetn | restart) begin
+      window <= 0;
+      window_updated <= 0;
+    end else begin
+      window_updated <= input_tvalid;
+      if (input_tvalid) begin
+        window <= {input_tdata, window[WindowLength-1:1]};
+      end
+    end
+  end
+
+  // Mismatching bits per address, 6 bits each
+  reg [6*C_NUM_ADDRESSES-1:0] errors;
+  reg [C_NUM_ADDRESSES-1:0] address_match;
+  reg [$clog2(C_NUM_ADDRESSES)-1:0] best_index;
+  reg [5:0] best_errors;
+
+  always @(*) begin
+    integer i;
+    for (i = 0; i < C_NUM_ADDRESSES; i = i + 1) begin
+      errors[6*i+:6] = popcount((window ^ expected_window(access_codes[i*AccessCodeLength+:AccessCodeLength])) &
+                                window_mask(phy));
+      address_match[i] = access_code_enable[i] & (phy != PHY_CODED) & (errors[6*i+:6] <= error_threshold);
+    end
+
+    best_index  = 0;
+    best_errors = 6'h3F;
+    for (i = 0; i < C_NUM_ADDRESSES; i = i + 1) begin
+      if (address_match[i] & (errors[6*i+:6] < best_errors)) begin
+        best_index  = i[$clog2(C_NUM_ADDRESSES)-1:0];
+        best_errors = errors[6*i+:6];
+      end
+    end
+  end
+
+  always @(posedge aclk) begin
+    if (~aresetn | restart) begin
+      match_valid  <= 0;
+      match_mask   <= 0;
+      match_index  <= 0;
+      match_errors <= 0;
+    end else begin
+      match_valid  <= window_updated & (|address_match);
+      match_mask   <= (window_updated) ? address_match : 0;
+      match_index  <= best_index;
+      match_errors <= best_errors;
+    end
+  end
+
+  // Preamble and access code as they appear in the window, first bit lowest.
+  // The 1M preamble only fills the upper byte of the preamble field.
+  function automatic logic [WindowLength-1:0] expected_window(logic [AccessCodeLength-1:0] access_code);
+    logic [2*PreambleLength-1:0] preamble;
+    preamble = (access_code[0]) ? 16'h5555 : 16'hAAAA;
+    expected_window = {access_code, preamble};
+  endfunction
+
+  // Bits of the window compared for the given PHY
+  function automatic logic [WindowLength-1:0] window_mask(ble_phy_t phy);
+    window_mask = (phy == PHY_2M) ? {WindowLength{1'b1}} : {{(WindowLength - PreambleLength) {1'b1}}, {PreambleLength{1'b0}}};
+  endfunction
+
+  function automatic logic [5:0] popcount(logic [WindowLength-1:0] value);
+    integer i;
+    popcount = 0;
+    for (i = 0; i < WindowLength; i = i + 1) begin
+      popcount = popcount + {5'b0, value[i]};
+    end
+  endfunction
+
+endmodule
+
+`resetall
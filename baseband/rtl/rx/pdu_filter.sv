@@ -0,0 +1,280 @@
+// 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+`resetall  //
+`timescale 1ns / 1ps  //
+`default_nettype none  //
+`include "ble_types.svh"
+
+// Forwards only the received PDUs the host asked for, so the host sees the
+// wanted traffic and not everything on air. Sits after the CRC check, which
+// has already dropped the corrupted packets.
+//
+// The input is the PDU (header first) as 32-bit words, first byte in bits
+// [7:0], tkeep on every word and tlast on the last one. input_tuser carries
+// {pdu_type, access_code} of the packet and is sampled on its first word.
+//
+// A packet is matched on the key {pdu_type, access_code, address}. address is
+// the advertiser address (AdvA) of the advertising PDUs that carry it at a
+// fixed offset, ADV_IND, ADV_DIRECT_IND, ADV_NONCONN_IND, SCAN_RSP and
+// ADV_SCAN_IND at byte 0 of the payload, SCAN_REQ and CONNECT_IND at byte 6.
+// It is 0 for the other PDUs, which are then matched on type and access code.
+//
+// The keys live in a cuckoo hash table: C_NUM_WAYS ways of C_NUM_BUCKETS
+// entries, each way with its own hash. Way w folds the 82 key bits down to
+// the bucket index with key bit i into bucket bit (i + (i / B) * w) % B, B =
+// log2(C_NUM_BUCKETS), so a key has one candidate entry per way, and a packet
+// matches if any of them holds its key. All ways are read in parallel. The
+// host places the keys, moving others between their candidates to make room,
+// and writes an entry {valid, pdu_type, access_code, address} at table_index
+// = way * C_NUM_BUCKETS + bucket. Writes take effect on the next clock and
+// never stall the stream, a lookup on the clock of a write sees the old entry.
+// A key moved to another way is written there before its old entry is reused,
+// so it never misses while the host rearranges the table.
+//
+// The packet words wait in a buffer while the first 16 bytes are collected
+// and looked up, so the filter passes one word per clock with a latency of a
+// few clocks. With enable low every packet is forwarded.
+module pdu_filter #(
+    // Entries per way, a power of two
+    parameter integer C_NUM_BUCKETS = 256,
+    // Ways of the table, each with its own hash, a power of two, at least 2
+    parameter integer C_NUM_WAYS = 4,
+    // Words buffered while a packet is looked up, a power of two, at least 4
+    parameter integer C_BUFFER_DEPTH = 16
+) (
+    input wire aclk,
+    input wire aresetn,
+
+    input wire enable,
+    input wire counter_clear,
+
+    input wire                                          table_write,
+    input wire [$clog2(C_NUM_WAYS*C_NUM_BUCKETS)-1:0] table_index,
+    input wire [                                  82:0] table_entry,
+
+    input  wire [31:0] input_tdata,
+    input  wire [ 3:0] input_tkeep,
+    input  wire [33:0] input_tuser,
+    input  wire        input_tvalid,
+    output wire        input_tready,
+    input  wire        input_tlast,
+
+    output wire [31:0] output_tdata,
+    output wire [ 3:0] output_tkeep,
+    output wire [33:0] output_tuser,
+    output wire        output_tvalid,
+    input  wire        output_tready,
+    output wire        output_tlast,
+
+    output reg [31:0] forwarded_packets,
+    output reg [31:0] dropped_packets
+);
+  localparam integer BucketWidth = $clog2(C_NUM_BUCKETS);
+  localparam integer WayWidth = $clog2(C_NUM_WAYS);
+  localparam integer KeyLength = 82;
+  localparam integer HeadWords = 4;
+
+  //***************************************************************************
+  // Key
+  //***************************************************************************
+  // Words of the current packet so far, saturating once the key is complete
+  reg [2:0] word_index;
+  reg [8*4*HeadWords-1:0] head;
+  reg [33:0] packet_user;
+
+  wire input_handshake = input_tvalid & input_tready;
+  wire [31:0] input_bytes = input_tdata & {{8{input_tkeep[3]}}, {8{input_tkeep[2]}}, {8{input_tkeep[1]}}, {8{input_tkeep[0]}}};
+  wire [8*4*HeadWords-1:0] next_head = head | ({96'b0, input_bytes} << {word_index[1:0], 5'b0});
+  wire [33:0] next_user = (word_index == 0) ? input_tuser : packet_user;
+  wire head_collected = (word_index == 3'(HeadWords));
+  wire key_complete = input_handshake & ~head_collected & ((word_index == 3'(HeadWords - 1)) | input_tlast);
+
+  always @(posedge aclk) begin
+    if (~aresetn) begin
+      word_index <= 0;
+      head <= 0;
+      packet_user <= 0;
+    end else if (input_handshake) begin
+      if (input_tlast) begin
+        word_index <= 0;
+        head <= 0;
+      end else if (~head_collected) begin
+        word_index <= word_index + 1;
+        head <= next_head;
+        packet_user <= next_user;
+      end
+    end
+  end
+
+  //***************************************************************************
+  // Lookup
+  //***************************************************************************
+  wire [KeyLength-1:0] next_key = packet_key(next_user, next_head);
+
+  reg lookup_valid;
+  reg [KeyLength-1:0] lookup_key;
+
+  reg match_valid;
+  reg [KeyLength-1:0] match_key;
+  wire [C_NUM_WAYS-1:0] way_hit;
+
+  always @(posedge aclk) begin
+    if (~aresetn) begin
+      lookup_valid <= 0;
+      lookup_key <= 0;
+      match_valid <= 0;
+      match_key <= 0;
+    end else begin
+      lookup_valid <= key_complete;
+      lookup_key <= next_key;
+      match_valid <= lookup_valid;
+      match_key <= lookup_key;
+    end
+  end
+
+  genvar way;
+  generate
+    for (way = 0; way < C_NUM_WAYS; way = way + 1) begin : gen_ways
+      reg [KeyLength-1:0] keys[0:C_NUM_BUCKETS-1];
+      reg [C_NUM_BUCKETS-1:0] valid;
+      reg [BucketWidth-1:0] lookup_bucket;
+      reg [KeyLength-1:0] way_key;
+      reg way_valid;
+
+      wire write = table_write & (table_index[WayWidth+BucketWidth-1:BucketWidth] == way);
+
+      // The keys have no reset, so they can go to block RAM
+      always @(posedge aclk) begin
+        if (write) begin
+          keys[table_index[BucketWidth-1:0]] <= table_entry[KeyLength-1:0];
+        end
+        lookup_bucket <= key_bucket(next_key, way);
+        way_key <= keys[lookup_bucket];
+      end
+
+      always @(posedge aclk) begin
+        if (~aresetn) begin
+          valid <= 0;
+          way_valid <= 0;
+        end else begin
+          if (write) begin
+            valid[table_index[BucketWidth-1:0]] <= table_entry[KeyLength];
+          end
+          way_valid <= valid[lookup_bucket];
+        end
+      end
+
+      assign way_hit[way] = way_valid & (way_key == match_key);
+    end
+  endgenerate
+
+  //***************************************************************************
+  // Buffer
+  //***************************************************************************
+  wire [31:0] buffer_tdata;
+  wire [3:0] buffer_tkeep;
+  wire [33:0] buffer_tuser;
+  wire buffer_tvalid;
+  wire buffer_tready;
+  wire buffer_tlast;
+  wire [$clog2(C_BUFFER_DEPTH):0] buffer_level;
+
+  axis_fifo #(
+      .C_DATA_WIDTH(71),
+      .C_DEPTH(C_BUFFER_DEPTH)
+  ) buffer_fifo_inst (
+      .aclk(aclk),
+      .aresetn(aresetn),
+      .restart(1'b0),
+
+      .input_tdata ({input_tlast, input_tuser, input_tkeep, input_tdata}),
+      .input_tvalid(input_tvalid),
+      .input_tready(input_tready),
+
+      .output_tdata ({buffer_tlast, buffer_tuser, buffer_tkeep, buffer_tdata}),
+      .output_tvalid(buffer_tvalid),
+      .output_tready(buffer_tready),
+
+      .level(buffer_level)
+  );
+
+  // One decision per packet with words in the buffer, so it never overflows
+  wire decision_tdata;
+  wire decision_tvalid;
+  wire decision_tready;
+  wire decision_input_tready;
+  wire [$clog2(C_BUFFER_DEPTH):0] decision_level;
+
+  axis_fifo #(
+      .C_DATA_WIDTH(1),
+      .C_DEPTH(C_BUFFER_DEPTH)
+  ) decision_fifo_inst (
+      .aclk(aclk),
+      .aresetn(aresetn),
+      .restart(1'b0),
+
+      .input_tdata (~enable | (|way_hit)),
+      .input_tvalid(match_valid),
+      .input_tready(decision_input_tready),
+
+      .output_tdata (decision_tdata),
+      .output_tvalid(decision_tvalid),
+      .output_tready(decision_tready),
+
+      .level(decision_level)
+  );
+
+  //***************************************************************************
+  // Output
+  //***************************************************************************
+  // The words of a dropped packet are read out of the buffer and discarded
+  assign buffer_tready = decision_tvalid & (~decision_tdata | output_tready);
+  assign decision_tready = buffer_tvalid & buffer_tready & buffer_tlast;
+
+  assign output_tdata = buffer_tdata;
+  assign output_tkeep = buffer_tkeep;
+  assign output_tuser = buffer_tuser;
+  assign output_tvalid = buffer_tvalid & decision_tvalid & decision_tdata;
+  assign output_tlast = buffer_tlast;
+
+  always @(posedge aclk) begin
+    if (~aresetn | counter_clear) begin
+      forwarded_packets <= 0;
+      dropped_packets <= 0;
+    end else if (decision_tvalid & decision_tready) begin
+      if (decision_tdata) begin
+        forwarded_packets <= forwarded_packets + 1;
+      end else begin
+        dropped_packets <= dropped_packets + 1;
+      end
+    end
+  end
+
+  // {pdu_type, access_code, address} of a packet from its first 16 bytes
+  function automatic logic [KeyLength-1:0] packet_key(logic [33:0] user, logic [8*4*HeadWords-1:0] pdu);
+    logic [47:0] address;
+    address = 0;
+    if (bits_to_pdu_type(user[33:32]) == PDU_TYPE_ADVERTISING) begin
+      case (pdu[3:0])
+        4'd0, 4'd1, 4'd2, 4'd4, 4'd6: address = pdu[16+:48];
+        4'd3, 4'd5: address = pdu[64+:48];
+        default: address = 0;
+      endcase
+    end
+    packet_key = {user, address};
+  endfunction
+
+  // Bucket of a key in the given way
+  function automatic logic [BucketWidth-1:0] key_bucket(logic [KeyLength-1:0] key, integer way);
+    integer i;
+    integer bucket_bit;
+    key_bucket = 0;
+    for (i = 0; i < KeyLength; i = i + 1) begin
+      bucket_bit = (i % BucketWidth + (i / BucketWidth) * way) % BucketWidth;
+      key_bucket[bucket_bit] = key_bucket[bucket_bit] ^ key[i];
+    end
+  endfunction
+
+endmodule
+
+`resetall
@@ -6,7 +6,10 @@
 
 module serializer #(
     // Width of input data bus
-    parameter integer C_DATA_WIDTH = 32
+    parameter integer C_DATA_WIDTH = 32,
+    // Accept the next word while the current one is shifted out,
+    // so back-to-back words are sent without idle cycles
+    parameter integer C_DOUBLE_BUFFER = 0
 ) (
     input wire aclk,
     input wire aresetn,
@@ -30,49 +33,140 @@ module serializer #(
   reg [$clog2(C_DATA_WIDTH):0] shift_buffer_length = 0;
   reg [$clog2(C_DATA_WIDTH):0] shift_buffer_index = 0;
   reg shift_buffer_tlast;
-  always @(posedge aclk) begin
-    if (~aresetn | restart) begin
-      shift_buffer_index <= 0;
-      shift_buffer_length <= 0;
-      shift_buffer_data <= 0;
-      shift_buffer_tlast <= 0;
-
-      input_tready <= 1;
-
-      output_tvalid <= 0;
-      output_tdata <= 0;
-      output_tlast <= 0;
-    end else begin
-      if (input_tready & input_tvalid) begin
-        input_tready <= 0;
-
-        shift_buffer_data <= input_tdata;
-        shift_buffer_length <= input_length;
-        shift_buffer_index <= 1;
-        shift_buffer_tlast <= input_tlast;
-        output_tdata <= input_tdata[0];
-        output_tvalid <= 1;
+
+  generate
+    if (C_DOUBLE_BUFFER != 0) begin : gen_double_buffer
+      // Next word, loaded into the shift buffer as soon as its last bit is accepted
+      reg [C_DATA_WIDTH-1:0] hold_buffer_data = 0;
+      reg [$clog2(C_DATA_WIDTH):0] hold_buffer_length = 0;
+      reg hold_buffer_tlast = 0;
+      reg hold_buffer_valid = 0;
+
+      wire input_handshake = input_tready & input_tvalid;
+      wire shift_buffer_pending = output_tvalid & (shift_buffer_index < shift_buffer_length);
+
+      // A word presented together with restart is the first word of the new
+      // stream, its first bit is on the output on the next clock
+      always @(*) begin
+        input_tready = ~hold_buffer_valid | restart;
       end
 
-      if (output_tvalid & output_tready) begin
-        if (shift_buffer_index < shift_buffer_length) begin
-          shift_buffer_index <= shift_buffer_index + 1;
-          output_tvalid <= 1;
-          /* verilator lint_off WIDTH */
-          output_tdata <= shift_buffer_data[shift_buffer_index];
-          /* verilator lint_on WIDTH */
-          if ((shift_buffer_index + 1) == shift_buffer_length) begin
-            output_tlast <= shift_buffer_tlast;
-          end
+      always @(posedge aclk) begin
+        if (~aresetn) begin
+          shift_buffer_index <= 0;
+          shift_buffer_length <= 0;
+          shift_buffer_data <= 0;
+          shift_buffer_tlast <= 0;
+
+          hold_buffer_data <= 0;
+          hold_buffer_length <= 0;
+          hold_buffer_tlast <= 0;
+          hold_buffer_valid <= 0;
+
+          output_tvalid <= 0;
+          output_tdata <= 0;
+          output_tlast <= 0;
+        end else if (restart) begin
+          hold_buffer_data <= 0;
+          hold_buffer_length <= 0;
+          hold_buffer_tlast <= 0;
+          hold_buffer_valid <= 0;
+
+          shift_buffer_data <= input_tdata;
+          shift_buffer_length <= input_length;
+          shift_buffer_index <= 1;
+          shift_buffer_tlast <= input_tlast;
+          output_tdata <= input_tvalid & input_tdata[0];
+          output_tvalid <= input_tvalid;
+          output_tlast <= input_tvalid & input_tlast & (input_length == 1);
         end else begin
+          if (input_handshake) begin
+            hold_buffer_data <= input_tdata;
+            hold_buffer_length <= input_length;
+            hold_buffer_tlast <= input_tlast;
+            hold_buffer_valid <= 1;
+          end
+
+          if (~output_tvalid | output_tready) begin
+            if (shift_buffer_pending) begin
+              shift_buffer_index <= shift_buffer_index + 1;
+              /* verilator lint_off WIDTH */
+              output_tdata <= shift_buffer_data[shift_buffer_index];
+              /* verilator lint_on WIDTH */
+              output_tlast <= shift_buffer_tlast & ((shift_buffer_index + 1) == shift_buffer_length);
+            end else if (hold_buffer_valid) begin
+              shift_buffer_data <= hold_buffer_data;
+              shift_buffer_length <= hold_buffer_length;
+              shift_buffer_index <= 1;
+              shift_buffer_tlast <= hold_buffer_tlast;
+              output_tdata <= hold_buffer_data[0];
+              output_tvalid <= 1;
+              output_tlast <= hold_buffer_tlast & (hold_buffer_length == 1);
+              hold_buffer_valid <= 0;
+            end else if (input_handshake) begin
+              // Both buffers are empty, the word goes straight to the shift buffer
+              shift_buffer_data <= input_tdata;
+              shift_buffer_length <= input_length;
+              shift_buffer_index <= 1;
+              shift_buffer_tlast <= input_tlast;
+              output_tdata <= input_tdata[0];
+              output_tvalid <= 1;
+              output_tlast <= input_tlast & (input_length == 1);
+              hold_buffer_valid <= 0;
+            end else begin
+              output_tvalid <= 0;
+              output_tdata  <= 0;
+              output_tlast  <= 0;
+            end
+          end
+        end
+      end
+    end else begin : gen_single_buffer
+      always @(posedge aclk) begin
+        if (~aresetn | restart) begin
+          shift_buffer_index <= 0;
+          shift_buffer_length <= 0;
+          shift_buffer_data <= 0;
+          shift_buffer_tlast <= 0;
+
+          input_tready <= 1;
+
           output_tvalid <= 0;
-          output_tdata  <= 0;
-          output_tlast  <= 0;
-          input_tready  <= 1;
+          output_tdata <= 0;
+          output_tlast <= 0;
+        end else begin
+          if (input_tready & input_tvalid) begin
+            input_tready <= 0;
+
+            shift_buffer_data <= input_tdata;
+            shift_buffer_length <= input_length;
+            shift_buffer_index <= 1;
+            shift_buffer_tlast <= input_tlast;
+            output_tdata <= input_tdata[0];
+            output_tvalid <= 1;
+          end
+
+          if (output_tvalid & output_tready) begin
+            if (shift_buffer_index < shift_buffer_length) begin
+              shift_buffer_index <= shift_buffer_index + 1;
+              output_tvalid <= 1;
+              /* verilator lint_off WIDTH */
+              output_tdata <= shift_buffer_data[shift_buffer_index];
+              /* verilator lint_on WIDTH */
+              if ((shift_buffer_index + 1) == shift_buffer_length) begin
+                output_tlast <= shift_buffer_tlast;
+              end
+            end else begin
+              output_tvalid <= 0;
+              output_tdata  <= 0;
+              output_tlast  <= 0;
+              input_tready  <= 1;
+            end
+          end
         end
       end
     end
-  end
+  endgenerate
 endmodule
 
 `resetall
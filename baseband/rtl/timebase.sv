@@ -0,0 +1,107 @@
+// 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+`resetall  //
+`timescale 1ns / 1ps  //
+`default_nettype none  //
+
+// Free-running timebase counting aclk ticks from reset.
+//
+// Compare: compare_arm takes compare_tick and arms the compare, compare_match
+// is high for the one clock the timestamp reaches it and disarms it. A tick
+// already passed (up to half the counter range) matches on the next clock,
+// so a late arm starts at once instead of after a wrap. compare_disarm
+// cancels a pending compare.
+//
+// Events: a clock with any bit of events set writes {events, timestamp} to the
+// event FIFO, which the host drains in bulk. Events that find the FIFO full
+// are dropped and set event_overflow until event_overflow_clear.
+module timebase #(
+    // Event FIFO entries, a power of two
+    parameter integer C_EVENT_FIFO_DEPTH = 16,
+    // Number of event inputs
+    parameter integer C_NUM_EVENTS = 2
+) (
+    input wire aclk,
+    input wire aresetn,
+
+    output reg [31:0] timestamp,
+
+    input  wire [31:0] compare_tick,
+    input  wire        compare_arm,
+    input  wire        compare_disarm,
+    output reg         compare_armed,
+    output wire        compare_match,
+
+    input wire [C_NUM_EVENTS-1:0] events,
+
+    // Event records: timestamp in bits [31:0], events from bit 32
+    output wire [C_NUM_EVENTS+31:0] event_tdata,
+    output wire                     event_tvalid,
+    input  wire                     event_tready,
+
+    output wire [$clog2(C_EVENT_FIFO_DEPTH):0] event_level,
+    output reg                                 event_overflow,
+    input  wire                                event_overflow_clear
+);
+  //***************************************************************************
+  // Counter and compare
+  //***************************************************************************
+  reg [31:0] compare_value;
+
+  // Timestamp at or past the compare value, modulo the counter range
+  wire [31:0] compare_distance = timestamp - compare_value;
+  assign compare_match = compare_armed & ~compare_distance[31];
+
+  always @(posedge aclk) begin
+    if (~aresetn) begin
+      timestamp <= 0;
+      compare_value <= 0;
+      compare_armed <= 0;
+    end else begin
+      timestamp <= timestamp + 1;
+
+      if (compare_arm) begin
+        compare_value <= compare_tick;
+        compare_armed <= 1;
+      end else if (compare_match | compare_disarm) begin
+        compare_armed <= 0;
+      end
+    end
+  end
+
+  //***************************************************************************
+  // Event timestamps
+  //***************************************************************************
+  wire record_tvalid = |events;
+  wire record_tready;
+
+  axis_fifo #(
+      .C_DATA_WIDTH(C_NUM_EVENTS + 32),
+      .C_DEPTH(C_EVENT_FIFO_DEPTH)
+  ) event_fifo_inst (
+      .aclk(aclk),
+      .aresetn(aresetn),
+      .restart(1'b0),
+
+      .input_tdata ({events, timestamp}),
+      .input_tvalid(record_tvalid),
+      .input_tready(record_tready),
+
+      .output_tdata (event_tdata),
+      .output_tvalid(event_tvalid),
+      .output_tready(event_tready),
+
+      .level(event_level)
+  );
+
+  always @(posedge aclk) begin
+    if (~aresetn | event_overflow_clear) begin
+      event_overflow <= 0;
+    end else if (record_tvalid & ~record_tready) begin
+      event_overflow <= 1;
+    end
+  end
+
+endmodule
+
+`resetall
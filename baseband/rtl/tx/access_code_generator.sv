@@ -14,18 +14,14 @@ module access_code_generator (
 
     input  wire input_tdata,
     input  wire input_tvalid,
-    output reg  input_tready,
+    output wire input_tready,
     input  wire input_tlast,
 
-    output reg  output_tdata,
-    output reg  output_tvalid,
+    output wire output_tdata,
+    output wire output_tvalid,
     input  wire output_tready,
-    output reg  output_tlast
+    output wire output_tlast
 );
-  reg first_tdata = 0;
-  reg first_tlast = 0;
-
-
   typedef enum logic [1:0] {
     FsmIdle              = 0,
     FsmInit,
@@ -36,66 +32,42 @@ module access_code_generator (
   fsm_state_t state;
 
   localparam integer AccessCodeLength = 32;
-  reg [$clog2(AccessCodeLength):0] counter;
+  reg [$clog2(AccessCodeLength)-1:0] counter;
+
+  // Stream in front of the skid buffer: access code bits first, then the input stream
+  wire skid_tdata = (state == FsmSendingData) ? input_tdata : access_code[counter];
+  wire skid_tvalid = (state == FsmSendingData) ? input_tvalid : (state == FsmSendingAccessCode);
+  wire skid_tready;
+  wire skid_tlast = (state == FsmSendingData) ? input_tlast : 1'b0;
+
+  assign input_tready = (state == FsmSendingData) & skid_tready;
 
   always @(posedge aclk) begin
     if (~aresetn) begin
       counter <= 0;
-
-      output_tdata <= 0;
-      output_tvalid <= 0;
-      output_tlast <= 0;
-
-      input_tready <= 0;
-
-      state <= FsmIdle;
+      state   <= FsmIdle;
     end else begin
       case (state)
         FsmIdle: begin
-          input_tready  <= 0;
-          output_tvalid <= 0;
-          output_tlast <= 0;
+          state <= FsmIdle;
         end
         FsmInit: begin
-          input_tready <= 0;
-          output_tvalid <= 0;
-          counter <= 1;
-          output_tdata <= access_code[0];
-          output_tvalid <= 1;
-          output_tlast <= 0;
-          state <= FsmSendingAccessCode;
+          counter <= 0;
+          state   <= FsmSendingAccessCode;
         end
         FsmSendingAccessCode: begin
-          if (output_tvalid & output_tready) begin
+          if (skid_tvalid & skid_tready) begin
             counter <= counter + 1;
-            if (AccessCodeLength > counter) begin
-              output_tdata  <= access_code[counter];
-              output_tvalid <= 1;
-            end else begin
-              output_tvalid <= 0;
-
-              input_tready <= 1;
+            // Last access code bit
+            if (&counter) begin
               state <= FsmSendingData;
             end
           end
         end
         FsmSendingData: begin
-          if (input_tvalid & input_tready) begin
-            input_tready  <= 0;
-
-            output_tdata  <= input_tdata;
-            output_tlast  <= input_tlast;
-            output_tvalid <= 1;
+          if (skid_tvalid & skid_tready & skid_tlast) begin
+            state <= FsmIdle;
           end
-
-          if (output_tvalid & output_tready) begin
-            output_tvalid <= 0;
-            input_tready  <= 1;
-            if (output_tlast) begin
-              state <= FsmIdle;
-            end
-          end
-
         end
         default: state <= FsmIdle;
       endcase
@@ -104,6 +76,24 @@ module access_code_generator (
       end
     end
   end
+
+  axis_skid_buffer #(
+      .C_DATA_WIDTH(1)
+  ) skid_buffer_inst (
+      .aclk(aclk),
+      .aresetn(aresetn),
+      .restart(restart),
+
+      .input_tdata (skid_tdata),
+      .input_tvalid(skid_tvalid),
+      .input_tready(skid_tready),
+      .input_tlast (skid_tlast),
+
+      .output_tdata (output_tdata),
+      .output_tvalid(output_tvalid),
+      .output_tready(output_tready),
+      .output_tlast (output_tlast)
+  );
 endmodule
 
 `resetall
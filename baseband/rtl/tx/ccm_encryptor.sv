@@ -0,0 +1,352 @@
+// 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+`resetall  //
+`timescale 1ns / 1ps  //
+`default_nettype none  //
+
+// Link layer AES-CCM encryption of the payload stream (Bluetooth Core
+// Specification Vol 6 Part E). Payload words, first byte in bits [7:0], come in
+// as plaintext and leave as ciphertext followed by the 4-byte MIC, so the
+// stream is payload_length + 4 bytes long. Key, nonce, header byte and length
+// are taken on restart. With enable low, or for an empty payload, the stream
+// passes through unchanged.
+//
+// Two aes128 cores run side by side: one generates the CTR keystream S_1..S_n
+// and then S_0, the other runs the CBC-MAC over B_0, B_1 and the plaintext
+// blocks. A block takes 11 clocks per core, far less than the 128 bits it is
+// sent in, so the ciphertext keeps up with the serializer; only the MIC waits
+// for the MAC of the last block.
+module ccm_encryptor (
+    input wire aclk,
+    input wire aresetn,
+
+    input wire restart,
+
+    input wire         enable,
+    // AES byte order, byte 0 in bits [127:120]
+    input wire [127:0] session_key,
+    // Nonce fields, least significant octet first on air
+    input wire [ 63:0] iv,
+    input wire [ 38:0] packet_counter,
+    input wire         direction,
+    // First header byte and plaintext payload length
+    input wire [  7:0] header,
+    input wire [  7:0] payload_length,
+
+    input  wire [31:0] input_tdata,
+    input  wire        input_tvalid,
+    output wire        input_tready,
+
+    output wire [31:0] output_tdata,
+    output wire        output_tvalid,
+    input  wire        output_tready
+);
+
+  localparam integer MicBytes = 4;
+
+  //***************************************************************************
+  // Packet parameters, taken on restart
+  //***************************************************************************
+  reg encrypting;
+  reg [127:0] key;
+  reg [103:0] nonce;
+  reg [7:0] length;
+  reg [7:0] aad;
+
+  wire [4:0] n_blocks = 5'((9'(length) + 9'd15) >> 4);
+
+  always @(posedge aclk) begin
+    if (~aresetn) begin
+      encrypting <= 0;
+      key <= 0;
+      nonce <= 0;
+      length <= 0;
+      aad <= 0;
+    end else if (restart) begin
+      encrypting <= enable & (payload_length != 0);
+      key <= session_key;
+      nonce <= {
+        packet_counter[7:0],
+        packet_counter[15:8],
+        packet_counter[23:16],
+        packet_counter[31:24],
+        direction,
+        packet_counter[38:32],
+        iv[7:0],
+        iv[15:8],
+        iv[23:16],
+        iv[31:24],
+        iv[39:32],
+        iv[47:40],
+        iv[55:48],
+        iv[63:56]
+      };
+      length <= payload_length;
+      // NESN, SN and MD are not authenticated
+      aad <= header & 8'he3;
+    end
+  end
+
+  // Flags: Adata, M' = 1 (4-byte MIC), L' = 1 (2-byte length)
+  wire [127:0] block_b0 = {8'h49, nonce, 8'h00, length};
+  // l(a) = 1 and the header byte
+  wire [127:0] block_b1 = {16'h0001, aad, 104'b0};
+
+  //***************************************************************************
+  // Plaintext blocks, collected from the input words
+  //***************************************************************************
+  reg [7:0] input_remaining;
+  reg [4:0] plain_fill;
+  reg [127:0] plain_data;
+  reg plain_valid;
+  reg plain_last;
+  reg plain_mac_issued;
+  reg plain_ctr_done;
+
+  wire [2:0] word_bytes = (input_remaining > 4) ? 3'd4 : input_remaining[2:0];
+  wire collect_ready = encrypting & ~plain_valid & (input_remaining != 0);
+  wire collect_handshake = collect_ready & input_tvalid;
+  wire [4:0] next_fill = plain_fill + {2'b0, word_bytes};
+
+  //***************************************************************************
+  // CTR keystream
+  //***************************************************************************
+  wire ctr_tready;
+  wire [127:0] ctr_result;
+  wire ctr_result_valid;
+
+  reg [4:0] ctr_index;
+  reg [127:0] keystream;
+  reg keystream_valid;
+  reg keystream_pending;
+  reg [31:0] mic_keystream;
+  reg mic_keystream_valid;
+  reg mic_keystream_pending;
+
+  // S_1..S_n one at a time as the blocks are sent, then S_0 for the MIC
+  wire issue_keystream = encrypting & ctr_tready & ~keystream_valid & ~keystream_pending & (ctr_index <= n_blocks);
+  wire issue_mic_keystream = encrypting & ctr_tready & ~keystream_pending & ~mic_keystream_valid &
+      ~mic_keystream_pending & (ctr_index > n_blocks);
+  wire [4:0] ctr_counter = (issue_keystream) ? ctr_index : 5'd0;
+
+  aes128 ctr_aes_inst (
+      .aclk(aclk),
+      .aresetn(aresetn),
+      .restart(restart),
+      .key(key),
+
+      .input_tdata ({8'h01, nonce, 11'b0, ctr_counter}),
+      .input_tvalid(issue_keystream | issue_mic_keystream),
+      .input_tready(ctr_tready),
+
+      .output_tdata (ctr_result),
+      .output_tvalid(ctr_result_valid)
+  );
+
+  //***************************************************************************
+  // CBC-MAC
+  //***************************************************************************
+  wire mac_tready;
+  wire [127:0] mac_result;
+  wire mac_result_valid;
+
+  // 0: B_0 next, 1: B_1 next, 2: plaintext blocks
+  reg [1:0] mac_step;
+  reg [127:0] mac_x;
+  reg mac_x_valid;
+  reg mac_pending;
+  reg mac_last_issued;
+  reg mac_done;
+
+  wire issue_b0 = encrypting & mac_tready & ~mac_pending & (mac_step == 0);
+  wire issue_b1 = mac_tready & mac_x_valid & (mac_step == 1);
+  wire issue_plain = mac_tready & mac_x_valid & (mac_step == 2) & plain_valid & ~plain_mac_issued;
+
+  reg [127:0] mac_input;
+  always @(*) begin
+    if (issue_b0) begin
+      mac_input = block_b0;
+    end else if (issue_b1) begin
+      mac_input = mac_x ^ block_b1;
+    end else begin
+      mac_input = mac_x ^ plain_data;
+    end
+  end
+
+  aes128 mac_aes_inst (
+      .aclk(aclk),
+      .aresetn(aresetn),
+      .restart(restart),
+      .key(key),
+
+      .input_tdata (mac_input),
+      .input_tvalid(issue_b0 | issue_b1 | issue_plain),
+      .input_tready(mac_tready),
+
+      .output_tdata (mac_result),
+      .output_tvalid(mac_result_valid)
+  );
+
+  //***************************************************************************
+  // Output buffer: ciphertext blocks and the MIC are appended as bytes, words
+  // leave from the bottom
+  //***************************************************************************
+  localparam integer OutputBytes = 16 + MicBytes;
+
+  reg [8*OutputBytes-1:0] output_data;
+  reg [4:0] output_count;
+  reg last_appended;
+  reg mic_appended;
+
+  wire append_block = plain_valid & ~plain_ctr_done & keystream_valid & (output_count <= 4);
+  wire append_mic = last_appended & mac_done & mic_keystream_valid & ~mic_appended & (output_count <= 16);
+  wire [127:0] cipher_block = (plain_data ^ keystream) & byte_mask(plain_fill);
+  wire [31:0] mic = mac_x[127:96] ^ mic_keystream;
+  wire [31:0] mic_stream = {mic[7:0], mic[15:8], mic[23:16], mic[31:24]};
+
+  wire encrypted_tvalid = (output_count >= 4) | (mic_appended & (output_count != 0));
+  wire output_handshake = encrypted_tvalid & output_tready;
+
+  wire [8*OutputBytes-1:0] shifted_data = (output_handshake) ? output_data >> 32 : output_data;
+  wire [4:0] shifted_count = (output_handshake) ? ((output_count > 4) ? output_count - 5'd4 : 5'd0) : output_count;
+
+  always @(posedge aclk) begin
+    if (~aresetn | restart) begin
+      input_remaining <= (restart) ? payload_length : 8'd0;
+      plain_fill <= 0;
+      plain_data <= 0;
+      plain_valid <= 0;
+      plain_last <= 0;
+      plain_mac_issued <= 0;
+      plain_ctr_done <= 0;
+
+      ctr_index <= 1;
+      keystream <= 0;
+      keystream_valid <= 0;
+      keystream_pending <= 0;
+      mic_keystream <= 0;
+      mic_keystream_valid <= 0;
+      mic_keystream_pending <= 0;
+
+      mac_step <= 0;
+      mac_x <= 0;
+      mac_x_valid <= 0;
+      mac_pending <= 0;
+      mac_last_issued <= 0;
+      mac_done <= 0;
+
+      output_data <= 0;
+      output_count <= 0;
+      last_appended <= 0;
+      mic_appended <= 0;
+    end else begin
+      // Plaintext block
+      if (plain_valid & plain_mac_issued & plain_ctr_done) begin
+        plain_fill <= 0;
+        plain_data <= 0;
+        plain_valid <= 0;
+        plain_mac_issued <= 0;
+        plain_ctr_done <= 0;
+      end else if (collect_handshake) begin
+        input_remaining <= input_remaining - {5'b0, word_bytes};
+        plain_fill <= next_fill;
+        plain_data <= place_word(plain_data, plain_fill, input_tdata, word_bytes);
+        if ((next_fill == 16) | (input_remaining == {5'b0, word_bytes})) begin
+          plain_valid <= 1;
+          plain_last  <= input_remaining == {5'b0, word_bytes};
+        end
+      end
+
+      // Keystream
+      if (issue_keystream) begin
+        ctr_index <= ctr_index + 1;
+        keystream_pending <= 1;
+      end
+      if (issue_mic_keystream) begin
+        mic_keystream_pending <= 1;
+      end
+      if (ctr_result_valid) begin
+        if (mic_keystream_pending) begin
+          mic_keystream <= ctr_result[127:96];
+          mic_keystream_valid <= 1;
+          mic_keystream_pending <= 0;
+        end else begin
+          keystream <= ctr_result;
+          keystream_valid <= 1;
+          keystream_pending <= 0;
+        end
+      end
+
+      // MAC
+      if (issue_b0 | issue_b1 | issue_plain) begin
+        mac_x_valid <= 0;
+        mac_pending <= 1;
+        if (~issue_plain) begin
+          mac_step <= mac_step + 1;
+        end
+      end
+      if (issue_plain) begin
+        plain_mac_issued <= 1;
+        mac_last_issued  <= plain_last;
+      end
+      if (mac_result_valid) begin
+        mac_x <= mac_result;
+        mac_x_valid <= 1;
+        mac_pending <= 0;
+        mac_done <= mac_last_issued;
+      end
+
+      // Output buffer
+      if (append_block) begin
+        plain_ctr_done <= 1;
+        keystream_valid <= 0;
+        last_appended <= plain_last;
+        output_data <= shifted_data | ({32'b0, to_stream(cipher_block)} << {shifted_count, 3'b000});
+        output_count <= shifted_count + plain_fill;
+      end else if (append_mic) begin
+        mic_appended <= 1;
+        output_data <= shifted_data | ({128'b0, mic_stream} << {shifted_count, 3'b000});
+        output_count <= shifted_count + MicBytes[4:0];
+      end else begin
+        output_data  <= shifted_data;
+        output_count <= shifted_count;
+      end
+    end
+  end
+
+  // Pass-through when not encrypting
+  assign output_tdata = (encrypting) ? output_data[31:0] : input_tdata;
+  assign output_tvalid = (encrypting) ? encrypted_tvalid : input_tvalid;
+  assign input_tready = (encrypting) ? collect_ready : output_tready;
+
+  // Write n_bytes bytes of a word (first byte in bits [7:0]) to the block from byte fill
+  function automatic [127:0] place_word(input logic [127:0] block, input logic [4:0] fill, input logic [31:0] word,
+                                        input logic [2:0] n_bytes);
+    integer i;
+    place_word = block;
+    for (i = 0; i < 16; i = i + 1) begin
+      if ((5'(i) >= fill) & (5'(i) < fill + {2'b0, n_bytes})) begin
+        place_word[127-8*i-:8] = 8'(word >> {5'(i) - fill, 3'b000});
+      end
+    end
+  endfunction
+
+  // Mask of the first n_bytes bytes of a block
+  function automatic [127:0] byte_mask(input logic [4:0] n_bytes);
+    integer i;
+    for (i = 0; i < 16; i = i + 1) begin
+      byte_mask[127-8*i-:8] = (5'(i) < n_bytes) ? 8'hff : 8'h00;
+    end
+  endfunction
+
+  // Byte strings (byte 0 in the top bits) to stream order (byte 0 in bits [7:0])
+  function automatic [127:0] to_stream(input logic [127:0] block);
+    integer i;
+    for (i = 0; i < 16; i = i + 1) begin
+      to_stream[8*i+:8] = block[127-8*i-:8];
+    end
+  endfunction
+
+endmodule
+
+`resetall
@@ -5,6 +5,19 @@
 `default_nettype none  //
 `include "ble_types.svh"
 
+// LE Coded PHY forward error correction.
+//
+// The input stream is the access code followed by the (whitened) PDU and CRC.
+// FEC block 1 carries the access code, the coding indicator and TERM1 and is
+// always coded with S=8. FEC block 2 carries PDU, CRC and TERM2 and is coded
+// with the S selected by the coding indicator.
+//
+// Every uncoded bit goes through the rate 1/2 convolutional encoder
+// (G0 = 1 + D + D^2 + D^3, G1 = 1 + D^2 + D^3) and the pattern mapper, which
+// turns each coded bit into 4 bits for S=8 (0 -> 0011, 1 -> 1100) or passes it
+// through for S=2. The next symbol is loaded while the last bit of the current
+// one is accepted, so the output runs at one coded bit per clock and the input
+// is only throttled by the coding rate.
 module fec_encoder (
     input wire aclk,
     input wire aresetn,
@@ -24,8 +37,54 @@ module fec_encoder (
     input  wire output_tready,
     output wire output_tlast
 );
+  typedef enum logic [2:0] {
+    FsmIdle        = 0,
+    FsmInit,
+    FsmAccessCode,
+    FsmCodingIndicator,
+    FsmTerm1,
+    FsmPdu,
+    FsmTerm2
+  } fsm_state_t;
 
-  reg  input_tready_int;
+  fsm_state_t state;
+  reg [$clog2(AccessCodeLength)-1:0] counter;
+
+  // Index of the last bit of the coding indicator and of TERM1/TERM2
+  localparam logic [$clog2(AccessCodeLength)-1:0] CodingIndicatorLastBit = 1;
+  localparam logic [$clog2(AccessCodeLength)-1:0] TermLastBit = 2;
+  ble_ci_t ci;
+
+  // Convolutional encoder delay line, conv_state[0] holds the previous bit
+  reg [2:0] conv_state;
+
+  // Mapped symbol: 8 bits for S=8, the lower 2 bits for S=2
+  reg [7:0] symbol_data;
+  reg symbol_s8;
+  reg symbol_last;
+  reg symbol_valid;
+  reg [2:0] symbol_index;
+
+  wire symbol_last_bit = (symbol_index == (symbol_s8 ? 3'd7 : 3'd1));
+  wire skid_tready;
+  wire symbol_done = symbol_valid & skid_tready & symbol_last_bit;
+  wire symbol_free = ~symbol_valid | symbol_done;
+
+  // Uncoded bit: taken from the input or inserted (coding indicator, terminations)
+  wire source_from_input = (state == FsmAccessCode) | (state == FsmPdu);
+  wire source_inserted = (state == FsmCodingIndicator) | (state == FsmTerm1) | (state == FsmTerm2);
+  wire source_tvalid = source_from_input ? input_tvalid : source_inserted;
+  wire source_bit = (state == FsmCodingIndicator) ? ci[counter[0]] :
+                    (source_from_input ? input_tdata : 1'b0);
+  wire source_handshake = source_tvalid & symbol_free;
+
+  wire coded_bit_0 = source_bit ^ conv_state[0] ^ conv_state[1] ^ conv_state[2];
+  wire coded_bit_1 = source_bit ^ conv_state[1] ^ conv_state[2];
+
+  // FEC block 1 always uses S=8
+  wire coding_s8 = ((state != FsmPdu) & (state != FsmTerm2)) | (ci == CI_S8);
+
+  wire input_tready_int = source_from_input & symbol_free;
   wire output_tdata_int;
   wire output_tvalid_int;
   wire output_tlast_int;
@@ -35,6 +94,116 @@ module fec_encoder (
   assign output_tvalid = (bypass) ? input_tvalid : output_tvalid_int;
   assign output_tlast  = (bypass) ? input_tlast : output_tlast_int;
 
+  always @(posedge aclk) begin
+    if (~aresetn) begin
+      state <= FsmIdle;
+      counter <= 0;
+      ci <= CI_S8;
+      conv_state <= 0;
+      symbol_data <= 0;
+      symbol_s8 <= 0;
+      symbol_last <= 0;
+      symbol_valid <= 0;
+      symbol_index <= 0;
+    end else begin
+      if (source_handshake) begin
+        conv_state <= {conv_state[1:0], source_bit};
+
+        symbol_data <= coding_s8 ? {pattern_s8(coded_bit_1), pattern_s8(coded_bit_0)} :
+                                   {6'b0, coded_bit_1, coded_bit_0};
+        symbol_s8 <= coding_s8;
+        symbol_last <= (state == FsmTerm2) & (counter == TermLastBit);
+        symbol_valid <= 1;
+        symbol_index <= 0;
+      end else if (symbol_valid & skid_tready) begin
+        symbol_valid <= ~symbol_last_bit;
+        symbol_index <= symbol_index + 1;
+      end
+
+      case (state)
+        FsmIdle: begin
+          state <= FsmIdle;
+        end
+        FsmInit: begin
+          counter <= 0;
+          ci <= coding_indicator;
+          conv_state <= 0;
+          symbol_valid <= 0;
+          state <= (bypass) ? FsmIdle : FsmAccessCode;
+        end
+        FsmAccessCode: begin
+          if (source_handshake) begin
+            counter <= counter + 1;
+            // Last access code bit
+            if (&counter) begin
+              counter <= 0;
+              state   <= FsmCodingIndicator;
+            end
+          end
+        end
+        FsmCodingIndicator: begin
+          if (source_handshake) begin
+            counter <= counter + 1;
+            if (counter == CodingIndicatorLastBit) begin
+              counter <= 0;
+              state   <= FsmTerm1;
+            end
+          end
+        end
+        FsmTerm1: begin
+          if (source_handshake) begin
+            counter <= counter + 1;
+            if (counter == TermLastBit) begin
+              counter <= 0;
+              state   <= FsmPdu;
+            end
+          end
+        end
+        FsmPdu: begin
+          if (source_handshake & input_tlast) begin
+            state <= FsmTerm2;
+          end
+        end
+        FsmTerm2: begin
+          if (source_handshake) begin
+            counter <= counter + 1;
+            if (counter == TermLastBit) begin
+              counter <= 0;
+              state   <= FsmIdle;
+            end
+          end
+        end
+        default: state <= FsmIdle;
+      endcase
+      if (restart) begin
+        state <= FsmInit;
+      end
+    end
+  end
+
+  // S=8 pattern of one coded bit, bit 0 is transmitted first
+  function automatic logic [3:0] pattern_s8(logic coded_bit);
+    pattern_s8 = (coded_bit) ? 4'b0011 : 4'b1100;
+  endfunction
+
+  axis_skid_buffer #(
+      .C_DATA_WIDTH(1)
+  ) skid_buffer_inst (
+      .aclk(aclk),
+      .aresetn(aresetn),
+      .restart(restart),
+
+      .input_tdata (symbol_data[symbol_index]),
+      .input_tvalid(symbol_valid),
+      .input_tready(skid_tready),
+      .input_tlast (symbol_last & symbol_last_bit),
+
+      .output_tdata (output_tdata_int),
+      .output_tvalid(output_tvalid_int),
+      .output_tready(output_tready),
+      .output_tlast (output_tlast_int)
+  );
+
 endmodule
 
 `resetall
@@ -5,7 +5,65 @@
 `default_nettype none  //
 `include "ble_types.svh"
 
-module ll_pkt_generator (
+// Link Layer packet transmitter.
+//
+// A packet is started either by task_start, with the parameters driven on the
+// parameter inputs for the whole packet, or by a descriptor written to the
+// descriptor stream (layout in ble_types.svh). Descriptors are queued in a
+// FIFO; the head of the queue is prefetched into shadow registers while the
+// current packet is transmitted, copied to the active registers on the last
+// output bit and the next packet restarts on the following clock. A queue of
+// descriptors is thus sent back-to-back without the host in the loop.
+//
+// Every stage has performance counters (see axis_perf_counter) on its output,
+// read through the counter port one clock after counter_address is set:
+// counter_address = {stage, counter} with stage 0 pdu/CRC, 1 whitening,
+// 2 access code, 3 FEC, 4 preamble and counter 0 active cycles, 1 stalled on
+// backpressure, 2 starved on input, 3 packets, 4 bits. counter_clear zeroes
+// them all.
+//
+// With C_WORD_WHITENING the PDU and CRC are whitened a 32-bit word at a time
+// inside pdu_crc_generator, ahead of its serializer, and the bit-serial
+// whitening stage is left out (its counters then follow the pdu/CRC stage).
+//
+// With C_ENCRYPTION the payload of packets with encryption_enabled (or the
+// descriptor bit) is encrypted with AES-CCM under session_key and iv. The
+// packet_counter and direction of the nonce come from the inputs with task_start
+// and from the descriptor otherwise, so every queued packet carries its own
+// counter. packet_hdr carries the plaintext length and the MIC is appended.
+// Empty PDUs are sent unencrypted.
+//
+// With channel_selection_enabled (or the descriptor bit) the channel input or
+// descriptor field is ignored and channel_selector picks the channel from the
+// access code, event_counter and channel_map: CSA#2 for data PDUs, the
+// 37/38/39 sequence for advertising PDUs. Like the packet counter, the event
+// counter and channel map come from the inputs with task_start and from the
+// descriptor otherwise, so queued packets of successive events select their
+// own channels.
+//
+// A timebase counts aclk ticks from reset on timestamp. start_arm arms a timed
+// start at start_tick: on the clock the timestamp reaches it the packet starts
+// as with task_start, so the air time follows with the fixed pipeline latency
+// and no host in the loop. Every event_payload and event_end is written with
+// its timestamp to the event FIFO for the host to drain in bulk (see
+// timebase); event_overflow_clear clears event_overflow, independently of the
+// performance counters.
+//
+// The packet leaves one bit per beat, or packed into C_OUTPUT_WIDTH bit words
+// (first bit in bit 0) with output_tkeep flagging the bytes of the last word
+// that hold packet bits.
+module ll_pkt_generator #(
+    // Descriptor FIFO entries, a power of two
+    parameter integer C_DESCRIPTOR_FIFO_DEPTH = 4,
+    // Width of output data bus: 1, 8, 16 or 32
+    parameter integer C_OUTPUT_WIDTH = 1,
+    // Whiten PDU and CRC a word per clock in pdu_crc_generator instead of a bit per clock after it
+    parameter integer C_WORD_WHITENING = 0,
+    // AES-CCM link layer encryption in pdu_crc_generator
+    parameter integer C_ENCRYPTION = 0,
+    // Event timestamp FIFO entries, a power of two
+    parameter integer C_EVENT_FIFO_DEPTH = 16
+) (
     input wire aclk,
     input wire aresetn,
 
@@ -16,6 +74,27 @@ module ll_pkt_generator (
     output wire event_payload,
     output wire event_end,
 
+    // Timebase, aclk ticks from reset, and the timed start
+    output wire [31:0] timestamp,
+    input  wire [31:0] start_tick,
+    input  wire        start_arm,
+    input  wire        start_disarm,
+    output wire        start_armed,
+
+    // Event records: timestamp[31:0], event_payload[32], event_end[33]
+    output wire [                        33:0] event_tdata,
+    output wire                                event_tvalid,
+    input  wire                                event_tready,
+    output wire [$clog2(C_EVENT_FIFO_DEPTH):0] event_level,
+    output wire                                event_overflow,
+    input  wire                                event_overflow_clear,
+
+    input  wire [TxDescriptorLength-1:0] descriptor_tdata,
+    input  wire                          descriptor_tvalid,
+    output wire                          descriptor_tready,
+
+    output wire [$clog2(C_DESCRIPTOR_FIFO_DEPTH):0] descriptor_level,
+
     input wire ble_phy_t             phy_type,
     input wire ble_ci_t              coding_indicator,
     input wire                [31:0] access_code,
@@ -24,6 +103,21 @@ module ll_pkt_generator (
     input wire ble_pdu_type_t        pdu_type,
     input wire                [23:0] crc_init,
     input wire                [23:0] packet_hdr,
+    input wire                       encryption_enabled,
+    input wire                       channel_selection_enabled,
+
+    // Connection encryption state, used with C_ENCRYPTION only, packet_counter
+    // and direction with task_start only
+    input wire [127:0] session_key,
+    input wire [ 63:0] iv,
+    input wire [ 38:0] packet_counter,
+    input wire         direction,
+
+    // Channel selection state, with task_start only: connection event counter
+    // (advertising: packet index in the advertising event) and the map of used
+    // channels
+    input wire [15:0] event_counter,
+    input wire [39:0] channel_map,
 
     input  wire [31:0] payload_tdata,
     input  wire        payload_tvalid,
@@ -32,13 +126,160 @@ module ll_pkt_generator (
 
     output wire [3:0] fsm_state,
 
+    input  wire [ 5:0] counter_address,
+    output reg  [31:0] counter_rdata,
+    input  wire        counter_clear,
+
     // Master interface
-    output wire output_tdata,
-    output wire output_tvalid,
-    input  wire output_tready,
-    output wire output_tlast
+    output wire [      C_OUTPUT_WIDTH-1:0] output_tdata,
+    output wire [(C_OUTPUT_WIDTH+7)/8-1:0] output_tkeep,
+    output wire                            output_tvalid,
+    input  wire                            output_tready,
+    output wire                            output_tlast
 );
-  wire restart = task_start;
+  //***************************************************************************
+  // Timebase
+  //***************************************************************************
+  wire timed_start;
+
+  timebase #(
+      .C_EVENT_FIFO_DEPTH(C_EVENT_FIFO_DEPTH),
+      .C_NUM_EVENTS(2)
+  ) timebase_inst (
+      .aclk(aclk),
+      .aresetn(aresetn),
+
+      .timestamp(timestamp),
+
+      .compare_tick  (start_tick),
+      .compare_arm   (start_arm),
+      .compare_disarm(start_disarm),
+      .compare_armed (start_armed),
+      .compare_match (timed_start),
+
+      .events({event_end, event_payload}),
+
+      .event_tdata (event_tdata),
+      .event_tvalid(event_tvalid),
+      .event_tready(event_tready),
+
+      .event_level(event_level),
+      .event_overflow(event_overflow),
+      .event_overflow_clear(event_overflow_clear)
+  );
+
+  // Packet started with the parameter inputs
+  wire parameter_start = task_start | timed_start;
+
+  //***************************************************************************
+  // Descriptor queue
+  //***************************************************************************
+  wire [TxDescriptorLength-1:0] queue_tdata;
+  wire queue_tvalid;
+  wire queue_tready;
+
+  axis_fifo #(
+      .C_DATA_WIDTH(TxDescriptorLength),
+      .C_DEPTH(C_DESCRIPTOR_FIFO_DEPTH)
+  ) descriptor_fifo_inst (
+      .aclk(aclk),
+      .aresetn(aresetn),
+      .restart(1'b0),
+
+      .input_tdata (descriptor_tdata),
+      .input_tvalid(descriptor_tvalid),
+      .input_tready(descriptor_tready),
+
+      .output_tdata (queue_tdata),
+      .output_tvalid(queue_tvalid),
+      .output_tready(queue_tready),
+
+      .level(descriptor_level)
+  );
+
+  // Next descriptor, loaded from the queue while the current packet is sent
+  reg [TxDescriptorLength-1:0] shadow_descriptor;
+  reg shadow_valid;
+  // Parameters of the packet in flight
+  reg [TxDescriptorLength-1:0] active_descriptor;
+  // The packet in flight was started by a descriptor, not by task_start
+  reg descriptor_mode;
+  reg busy;
+  reg descriptor_start;
+
+  wire packet_done = output_tvalid & output_tready & output_tlast;
+  wire load_active = shadow_valid & (~busy | packet_done) & ~descriptor_start & ~parameter_start;
+
+  assign queue_tready = ~shadow_valid | load_active;
+
+  always @(posedge aclk) begin
+    if (~aresetn) begin
+      shadow_descriptor <= 0;
+      shadow_valid <= 0;
+      active_descriptor <= 0;
+      descriptor_mode <= 0;
+      busy <= 0;
+      descriptor_start <= 0;
+    end else begin
+      descriptor_start <= load_active;
+
+      if (queue_tvalid & queue_tready) begin
+        shadow_descriptor <= queue_tdata;
+        shadow_valid <= 1;
+      end else if (load_active) begin
+        shadow_valid <= 0;
+      end
+
+      if (load_active) begin
+        active_descriptor <= shadow_descriptor;
+        descriptor_mode <= 1;
+        busy <= 1;
+      end else if (packet_done) begin
+        busy <= 0;
+      end
+
+      if (parameter_start) begin
+        descriptor_mode <= 0;
+        busy <= 1;
+      end
+    end
+  end
+
+  wire restart = parameter_start | descriptor_start;
+
+  // Parameters seen by the pipeline, task_start and the timed start take the parameter
+  // inputs right away
+  wire use_descriptor = descriptor_mode & ~parameter_start;
+  wire ble_phy_t tx_phy_type = (use_descriptor) ? bits_to_phy(active_descriptor[1:0]) : phy_type;
+  wire ble_ci_t tx_coding_indicator = (use_descriptor) ? bits_to_ci(active_descriptor[3:2]) : coding_indicator;
+  wire [31:0] tx_access_code = (use_descriptor) ? active_descriptor[35:4] : access_code;
+  wire [5:0] tx_channel_field = (use_descriptor) ? active_descriptor[41:36] : channel;
+  wire tx_whitening_enabled = (use_descriptor) ? active_descriptor[42] : whitening_enabled;
+  wire ble_pdu_type_t tx_pdu_type = (use_descriptor) ? bits_to_pdu_type(active_descriptor[44:43]) : pdu_type;
+  wire [23:0] tx_crc_init = (use_descriptor) ? active_descriptor[68:45] : crc_init;
+  wire [23:0] tx_packet_hdr = (use_descriptor) ? active_descriptor[92:69] : packet_hdr;
+  wire tx_encryption_enabled = (use_descriptor) ? active_descriptor[93] : encryption_enabled;
+  wire tx_channel_selection_enabled = (use_descriptor) ? active_descriptor[94] : channel_selection_enabled;
+  wire [38:0] tx_packet_counter = (use_descriptor) ? active_descriptor[133:95] : packet_counter;
+  wire tx_direction = (use_descriptor) ? active_descriptor[134] : direction;
+  wire [15:0] tx_event_counter = (use_descriptor) ? active_descriptor[150:135] : event_counter;
+  wire [39:0] tx_channel_map = (use_descriptor) ? active_descriptor[190:151] : channel_map;
+
+  //***************************************************************************
+  // Channel selection
+  //***************************************************************************
+  wire [5:0] selected_channel;
+
+  channel_selector channel_selector_inst (
+      .access_address(tx_access_code),
+      .event_counter (tx_event_counter),
+      .channel_map   (tx_channel_map),
+      .advertising   (tx_pdu_type == PDU_TYPE_ADVERTISING),
+
+      .channel(selected_channel)
+  );
+
+  wire [5:0] tx_channel = (tx_channel_selection_enabled) ? selected_channel : tx_channel_field;
 
 
   wire pkt_tdata;
@@ -49,7 +290,10 @@ module ll_pkt_generator (
   //***************************************************************************
   // Generates PDU and CRC stream
   //***************************************************************************
-  pdu_crc_generator pdu_crc_generator_inst (
+  pdu_crc_generator #(
+      .C_WORD_WHITENING(C_WORD_WHITENING),
+      .C_ENCRYPTION(C_ENCRYPTION)
+  ) pdu_crc_generator_inst (
       .aclk(aclk),
       .aresetn(aresetn),
 
@@ -58,9 +302,18 @@ module ll_pkt_generator (
       .event_payload(event_payload),
       .event_end(event_end),
 
-      .pdu_type  (pdu_type),
-      .crc_init  (crc_init),
-      .packet_hdr(packet_hdr),
+      .pdu_type  (tx_pdu_type),
+      .crc_init  (tx_crc_init),
+      .packet_hdr(tx_packet_hdr),
+
+      .whitening_enabled(tx_whitening_enabled),
+      .channel          (tx_channel),
+
+      .encryption_enabled(tx_encryption_enabled),
+      .session_key(session_key),
+      .iv(iv),
+      .packet_counter(tx_packet_counter),
+      .direction(tx_direction),
 
       .payload_tdata  (payload_tdata),
       .payload_tvalid (payload_tvalid),
@@ -78,31 +331,41 @@ module ll_pkt_generator (
   //***************************************************************************
   // Data whitening is used to avoid long sequences of zeros or ones, e.g.,
   // 0b0000000 or 0b1111111, in the data bit stream. Whitening shall be applied on
-  // the PDU and CRC of all Link Layer packets and is performed after the CRC
+  // the PDU and CRC of all Link Layer packets and is performed after the CRC.
+  // With C_WORD_WHITENING pdu_crc_generator whitens the words it serializes.
   //***************************************************************************
   wire whitened_tdata;
   wire whitened_tvalid;
   wire whitened_tready;
   wire whitened_tlast;
 
-  whitening ble_whitening (
-      .aclk(aclk),
-      .aresetn(aresetn),
-
-      .bypass (~whitening_enabled),
-      .restart(restart),
-      .channel(channel),
-
-      .input_tdata (pkt_tdata),
-      .input_tvalid(pkt_tvalid),
-      .input_tready(pkt_tready),
-      .input_tlast (pkt_tlast),
-
-      .output_tdata (whitened_tdata),
-      .output_tvalid(whitened_tvalid),
-      .output_tready(whitened_tready),
-      .output_tlast (whitened_tlast)
-  );
+  generate
+    if (C_WORD_WHITENING != 0) begin : gen_word_whitening
+      assign whitened_tdata = pkt_tdata;
+      assign whitened_tvalid = pkt_tvalid;
+      assign pkt_tready = whitened_tready;
+      assign whitened_tlast = pkt_tlast;
+    end else begin : gen_bit_whitening
+      whitening ble_whitening (
+          .aclk(aclk),
+          .aresetn(aresetn),
+
+          .bypass (~tx_whitening_enabled),
+          .restart(restart),
+          .channel(tx_channel),
+
+          .input_tdata (pkt_tdata),
+          .input_tvalid(pkt_tvalid),
+          .input_tready(pkt_tready),
+          .input_tlast (pkt_tlast),
+
+          .output_tdata (whitened_tdata),
+          .output_tvalid(whitened_tvalid),
+          .output_tready(whitened_tready),
+          .output_tlast (whitened_tlast)
+      );
+    end
+  endgenerate
 
   //***************************************************************************
   // Assembles preamble, access code and whitened PDU into one stream
@@ -116,7 +379,7 @@ module ll_pkt_generator (
       .aresetn(aresetn),
       .restart(restart),
 
-      .access_code(access_code),
+      .access_code(tx_access_code),
 
       .input_tdata (whitened_tdata),
       .input_tvalid(whitened_tvalid),
@@ -141,8 +404,8 @@ module ll_pkt_generator (
       .aresetn(aresetn),
       .restart(restart),
 
-      .bypass          (phy_type != PHY_CODED),
-      .coding_indicator(coding_indicator),
+      .bypass          (tx_phy_type != PHY_CODED),
+      .coding_indicator(tx_coding_indicator),
 
       .input_tdata (pkt_with_acc_tdata),
       .input_tvalid(pkt_with_acc_tvalid),
@@ -155,24 +418,114 @@ module ll_pkt_generator (
       .output_tlast (pkt_without_preamble_tlast)
   );
 
+  wire bit_tdata;
+  wire bit_tvalid;
+  wire bit_tready;
+  wire bit_tlast;
+
   preamble_generator preamble_generator_inst (
       .aclk(aclk),
       .aresetn(aresetn),
       .restart(restart),
 
-      .phy(phy_type),
+      .phy(tx_phy_type),
 
       .input_tdata (pkt_without_preamble_tdata),
       .input_tvalid(pkt_without_preamble_tvalid),
       .input_tready(pkt_without_preamble_tready),
       .input_tlast (pkt_without_preamble_tlast),
 
-      .output_tdata (output_tdata),
-      .output_tvalid(output_tvalid),
-      .output_tready(output_tready),
-      .output_tlast (output_tlast)
+      .output_tdata (bit_tdata),
+      .output_tvalid(bit_tvalid),
+      .output_tready(bit_tready),
+      .output_tlast (bit_tlast)
   );
 
+  //***************************************************************************
+  // Performance counters
+  //***************************************************************************
+  localparam integer NumStages = 5;
+  localparam integer NumCounters = 5;
+
+  wire [NumStages-1:0] stage_tvalid = {bit_tvalid, pkt_without_preamble_tvalid, pkt_with_acc_tvalid, whitened_tvalid, pkt_tvalid};
+  wire [NumStages-1:0] stage_tready = {bit_tready, pkt_without_preamble_tready, pkt_with_acc_tready, whitened_tready, pkt_tready};
+  wire [NumStages-1:0] stage_tlast = {bit_tlast, pkt_without_preamble_tlast, pkt_with_acc_tlast, whitened_tlast, pkt_tlast};
+
+  wire [32*NumCounters*NumStages-1:0] counter_values;
+
+  genvar stage;
+  generate
+    for (stage = 0; stage < NumStages; stage = stage + 1) begin : gen_counters
+      axis_perf_counter perf_counter_inst (
+          .aclk(aclk),
+          .aresetn(aresetn),
+          .restart(restart),
+          .clear(counter_clear),
+
+          .tvalid(stage_tvalid[stage]),
+          .tready(stage_tready[stage]),
+          .tlast (stage_tlast[stage]),
+
+          .active_cycles(counter_values[32*(NumCounters*stage+0)+:32]),
+          .stall_cycles (counter_values[32*(NumCounters*stage+1)+:32]),
+          .starve_cycles(counter_values[32*(NumCounters*stage+2)+:32]),
+          .packets      (counter_values[32*(NumCounters*stage+3)+:32]),
+          .bits         (counter_values[32*(NumCounters*stage+4)+:32])
+      );
+    end
+  endgenerate
+
+  localparam logic [2:0] LastStage = NumStages[2:0] - 1;
+  localparam logic [2:0] LastCounter = NumCounters[2:0] - 1;
+
+  wire [2:0] counter_stage = counter_address[5:3];
+  wire [2:0] counter_index = counter_address[2:0];
+  // Bit offset of the selected counter, 32 * (NumCounters * stage + index)
+  wire [4:0] counter_select = {2'b0, counter_stage} * NumCounters[4:0] + {2'b0, counter_index};
+  wire [9:0] counter_offset = {counter_select, 5'b0};
+
+  always @(posedge aclk) begin
+    if (~aresetn) begin
+      counter_rdata <= 0;
+    end else if ((counter_stage <= LastStage) & (counter_index <= LastCounter)) begin
+      counter_rdata <= counter_values[counter_offset+:32];
+    end else begin
+      counter_rdata <= 0;
+    end
+  end
+
+  //***************************************************************************
+  // Output bus
+  //***************************************************************************
+  generate
+    if (C_OUTPUT_WIDTH == 1) begin : gen_bit_output
+      assign output_tdata = bit_tdata;
+      assign output_tkeep = 1'b1;
+      assign output_tvalid = bit_tvalid;
+      assign bit_tready = output_tready;
+      assign output_tlast = bit_tlast;
+    end else begin : gen_word_output
+      deserializer #(
+          .C_DATA_WIDTH(C_OUTPUT_WIDTH)
+      ) deserializer_inst (
+          .aclk(aclk),
+          .aresetn(aresetn),
+          .restart(restart),
+
+          .input_tdata (bit_tdata),
+          .input_tvalid(bit_tvalid),
+          .input_tready(bit_tready),
+          .input_tlast (bit_tlast),
+
+          .output_tdata (output_tdata),
+          .output_tkeep (output_tkeep),
+          .output_tvalid(output_tvalid),
+          .output_tready(output_tready),
+          .output_tlast (output_tlast)
+      );
+    end
+  endgenerate
+
 endmodule
 
 `resetall
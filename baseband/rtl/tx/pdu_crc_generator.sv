@@ -5,7 +5,12 @@
 `default_nettype none  //
 `include "ble_types.svh"  //
 
-module pdu_crc_generator (
+module pdu_crc_generator #(
+    // Whiten PDU and CRC a word at a time ahead of the serializer
+    parameter integer C_WORD_WHITENING = 0,
+    // AES-CCM encryption of the payload (ccm_encryptor)
+    parameter integer C_ENCRYPTION = 0
+) (
     input wire aclk,
     input wire aresetn,
 
@@ -20,9 +25,20 @@ module pdu_crc_generator (
     input wire [23:0] crc_init,
     input wire [23:0] packet_hdr,
 
+    // Used with C_WORD_WHITENING only
+    input wire       whitening_enabled,
+    input wire [5:0] channel,
+
+    // Used with C_ENCRYPTION only, packet_hdr holds the plaintext length
+    input wire         encryption_enabled,
+    input wire [127:0] session_key,
+    input wire [ 63:0] iv,
+    input wire [ 38:0] packet_counter,
+    input wire         direction,
+
     input  wire [31:0] payload_tdata,
     input  wire        payload_tvalid,
-    output reg         payload_tready,
+    output wire        payload_tready,
     output wire        payload_restart,
 
     output wire fsm_tx_state_t fsm_state,
@@ -36,123 +52,118 @@ module pdu_crc_generator (
 
   assign payload_restart = restart;
   //***************************************************************************
-  // Receiver state machine
+  // Transmitter state machine
+  //
+  // The header is handed to the serializer together with restart, so its first
+  // bit is on the output on the next clock. Payload words go to the serializer
+  // as they arrive and the double buffered serializer takes the next word while
+  // the current one is shifted out. The CRC is computed one word at a time from
+  // the words handed to the serializer and is ready a clock after the last
+  // payload word, long before that word has been shifted out, so the CRC
+  // follows the payload without idle cycles.
   //***************************************************************************
   fsm_tx_state_t state;
   fsm_tx_state_t previous_fsm_state;
 
-  //assign fsm_state = state;
-
-
+  assign fsm_state = state;
 
+  // The MIC adds 4 bytes to the length of an encrypted PDU
+  wire encrypt_packet = (C_ENCRYPTION != 0) & encryption_enabled & (packet_hdr[15:8] != 0);
+  wire [23:0] tx_packet_hdr = (encrypt_packet) ? packet_hdr + 24'h000400 : packet_hdr;
+  wire [7:0] hdr_payload_byte_length = tx_packet_hdr[15:8];
 
-  wire [7:0] hdr_payload_byte_length = packet_hdr[15:8];
+  // Payload after encryption
+  wire [31:0] pdu_payload_tdata;
+  wire pdu_payload_tvalid;
+  reg pdu_payload_tready;
 
   wire [23:0] crc_out;
-  reg [7:0] payload_remaining_bytes = 0;
+  reg [7:0] payload_remaining_bytes;
 
   localparam integer MaxPduChunkLengthBits = 32;
-  reg [$clog2(MaxPduChunkLengthBits):0] pdu_chunk_length_bits = 0;
-
-  reg [31:0] pdu_chunk_tdata = 0;
-  reg pdu_chunk_tvalid = 0;
+  reg [$clog2(MaxPduChunkLengthBits):0] pdu_chunk_length_bits;
+  reg [MaxPduChunkLengthBits-1:0] pdu_chunk_tdata;
+  reg [MaxPduChunkLengthBits/8-1:0] pdu_chunk_tkeep;
+  reg pdu_chunk_tvalid;
   wire pdu_chunk_tready;
-  reg pdu_chunk_tlast = 0;
+  reg pdu_chunk_tlast;
+
+  wire pdu_chunk_handshake = pdu_chunk_tvalid & pdu_chunk_tready;
+  wire serializer_tvalid;
+
+  // Words handed to the serializer, fed to the CRC on the next clock
+  reg [MaxPduChunkLengthBits-1:0] crc_tdata;
+  reg [MaxPduChunkLengthBits/8-1:0] crc_tkeep;
+  reg crc_tvalid;
 
   assign event_end = output_tvalid & output_tlast & output_tready;
-  assign event_payload = (previous_fsm_state != state) & (state == FsmTxFinishCrcCalulation);
+  assign event_payload = (previous_fsm_state != state) & (state == FsmTxSendingCrc);
+
+  // Serializer input: header on restart, then payload words, then the CRC
+  always @(*) begin
+    pdu_chunk_tdata = 0;
+    pdu_chunk_tkeep = 0;
+    pdu_chunk_length_bits = 0;
+    pdu_chunk_tvalid = 0;
+    pdu_chunk_tlast = 0;
+    pdu_payload_tready = 0;
+
+    if (restart) begin
+      pdu_chunk_tdata = {8'b0, tx_packet_hdr};  // TODO: add 24bit header support
+      pdu_chunk_tkeep = 4'b0011;
+      pdu_chunk_length_bits = 16;
+      pdu_chunk_tvalid = 1;
+    end else if (state == FsmTxSendingPayload) begin
+      pdu_chunk_tdata = pdu_payload_tdata;
+      if (payload_remaining_bytes > 3) begin
+        pdu_chunk_tkeep = 4'b1111;
+        pdu_chunk_length_bits = 32;
+      end else begin
+        pdu_chunk_tkeep = ~(4'b1111 << payload_remaining_bytes[1:0]);
+        pdu_chunk_length_bits = {payload_remaining_bytes[2:0], 3'b000};
+      end
+      pdu_chunk_tvalid = pdu_payload_tvalid;
+      pdu_payload_tready = pdu_chunk_tready;
+    end else if (state == FsmTxSendingCrc) begin
+      pdu_chunk_tdata = {8'b0, swap24(crc_out)};
+      pdu_chunk_length_bits = 24;
+      // Wait for the last payload word to reach the CRC
+      pdu_chunk_tvalid = ~crc_tvalid;
+      pdu_chunk_tlast = 1;
+    end
+  end
 
   always @(posedge aclk) begin : FSM
     if (~aresetn) begin
-
       payload_remaining_bytes <= 0;
-      payload_tready <= 0;
 
-      pdu_chunk_length_bits <= 0;
-      pdu_chunk_tdata <= 0;
-      pdu_chunk_tvalid <= 0;
-      pdu_chunk_tlast <= 0;
+      crc_tdata <= 0;
+      crc_tkeep <= 0;
+      crc_tvalid <= 0;
 
       state <= FsmTxIdle;
       previous_fsm_state <= FsmTxIdle;
     end else begin
+      crc_tdata  <= pdu_chunk_tdata;
+      crc_tkeep  <= pdu_chunk_tkeep;
+      crc_tvalid <= pdu_chunk_handshake & ~pdu_chunk_tlast;
+
       case (state)
         FsmTxIdle: begin
           state <= FsmTxIdle;
         end
-        FsmTxInit: begin
-          payload_remaining_bytes <= 0;
-          payload_tready <= 0;
-
-          pdu_chunk_length_bits <= 0;
-          pdu_chunk_tdata <= 0;
-          pdu_chunk_tvalid <= 0;
-          pdu_chunk_tlast <= 0;
-          state <= FsmTxSendingHdr;
-        end
-        FsmTxSendingHdr: begin
-          payload_tready <= 0;
-          payload_remaining_bytes <= 0;
-
-          // Prepate header for the next state
-          pdu_chunk_length_bits <= 16;  // TODO: add 24bit header support
-          pdu_chunk_tdata <= packet_hdr;
-          pdu_chunk_tvalid <= 1;
-          pdu_chunk_tlast <= 0;
-
-          state <= FsmTxWaitingHdrToSend;
-        end
-        FsmTxWaitingHdrToSend: begin
-          if (pdu_chunk_tvalid & pdu_chunk_tready) begin
-            pdu_chunk_tvalid <= 0;
-            payload_tready <= 1;
-            payload_remaining_bytes <= hdr_payload_byte_length;
-            state <= FsmTxSendingPayload;
-          end
-        end
         FsmTxSendingPayload: begin
-          if (payload_tvalid & payload_tready) begin
-            payload_tready   <= 0;
-            pdu_chunk_tdata  <= payload_tdata;
-            pdu_chunk_tvalid <= 1;
-
-            if (payload_remaining_bytes > 3) begin
+          if (pdu_chunk_handshake) begin
+            if (payload_remaining_bytes > 4) begin
               payload_remaining_bytes <= payload_remaining_bytes - 4;
-              pdu_chunk_length_bits   <= 32;
             end else begin
               payload_remaining_bytes <= 0;
-              pdu_chunk_length_bits   <= payload_remaining_bytes * 8;
+              state <= FsmTxSendingCrc;
             end
-
-          end
-
-          if (pdu_chunk_tvalid & pdu_chunk_tready) begin
-            pdu_chunk_tvalid <= 0;
-            if (payload_remaining_bytes) begin
-              payload_tready <= 1;
-            end else begin
-              payload_tready <= 0;
-              state <= FsmTxFinishCrcCalulation;
-            end
-          end
-        end
-        FsmTxFinishCrcCalulation: begin
-          if (pdu_chunk_tready) begin
-            // One extra cycle to finish CRC calculation
-            state <= FsmTxSendingCrc;
           end
         end
         FsmTxSendingCrc: begin
-          pdu_chunk_tlast <= 1;
-          pdu_chunk_tvalid <= 1;
-          pdu_chunk_tdata <= swap24(crc_out);
-          pdu_chunk_length_bits <= 24;
-          state <= FsmTxWaitingToFinish;
-        end
-        FsmTxWaitingToFinish: begin
-          if (pdu_chunk_tvalid & pdu_chunk_tready) begin
-            pdu_chunk_tlast <= 0;
-            pdu_chunk_tvalid <= 0;
+          if (pdu_chunk_handshake) begin
             state <= FsmTxDone;
           end
         end
@@ -164,43 +175,138 @@ module pdu_crc_generator (
       endcase
 
       if (restart) begin
-        state <= FsmTxInit;
+        payload_remaining_bytes <= hdr_payload_byte_length;
+        // Empty PDU, the CRC follows the header
+        state <= (hdr_payload_byte_length != 0) ? FsmTxSendingPayload : FsmTxSendingCrc;
       end
       previous_fsm_state <= state;
     end
   end
 
+  //***************************************************************************
+  // Link layer encryption
+  //
+  // The payload is encrypted before it reaches the serializer, so the CRC is
+  // computed over the ciphertext and the MIC as the specification requires.
+  //***************************************************************************
+  generate
+    if (C_ENCRYPTION != 0) begin : gen_encryption
+      ccm_encryptor ccm_encryptor_inst (
+          .aclk(aclk),
+          .aresetn(aresetn),
+          .restart(restart),
+
+          .enable(encryption_enabled),
+          .session_key(session_key),
+          .iv(iv),
+          .packet_counter(packet_counter),
+          .direction(direction),
+          .header(packet_hdr[7:0]),
+          .payload_length(packet_hdr[15:8]),
+
+          .input_tdata (payload_tdata),
+          .input_tvalid(payload_tvalid),
+          .input_tready(payload_tready),
+
+          .output_tdata (pdu_payload_tdata),
+          .output_tvalid(pdu_payload_tvalid),
+          .output_tready(pdu_payload_tready)
+      );
+    end else begin : gen_plaintext
+      assign pdu_payload_tdata = payload_tdata;
+      assign pdu_payload_tvalid = payload_tvalid;
+      assign payload_tready = pdu_payload_tready;
+    end
+  endgenerate
 
+  //***************************************************************************
+  // Word-parallel whitening
+  //
+  // The keystream of the whitening LFSR only depends on the channel and the
+  // bit position. The keystream bits of a chunk are computed from the LFSR
+  // state at its first bit and the state is advanced by the chunk length, so
+  // header, payload and CRC are whitened a word per clock before the
+  // serializer. The CRC is computed from the words before whitening.
+  //***************************************************************************
+  reg [6:0] whitening_lfsr;
 
+  wire [6:0] whitening_init = {channel[0], channel[1], channel[2], channel[3], channel[4], channel[5], 1'b1};
+  // The header is handed over with restart, before the LFSR is loaded
+  wire [6:0] whitening_state = (restart) ? whitening_init : whitening_lfsr;
+  wire whitening_active = (C_WORD_WHITENING != 0) & whitening_enabled;
+  wire [MaxPduChunkLengthBits-1:0] keystream = (whitening_active) ? whitening_keystream(whitening_state) : 0;
+
+  always @(posedge aclk) begin
+    if (~aresetn) begin
+      whitening_lfsr <= 0;
+    end else if (pdu_chunk_handshake) begin
+      whitening_lfsr <= whitening_advance(whitening_state, pdu_chunk_length_bits);
+    end
+  end
 
   serializer #(
-      .C_DATA_WIDTH(MaxPduChunkLengthBits)
+      .C_DATA_WIDTH(MaxPduChunkLengthBits),
+      .C_DOUBLE_BUFFER(1)
   ) serializer_inst (
       .aclk(aclk),
       .aresetn(aresetn),
       .restart(restart),
       .input_length(pdu_chunk_length_bits),
-      .input_tdata(pdu_chunk_tdata),
+      .input_tdata(pdu_chunk_tdata ^ keystream),
       .input_tvalid(pdu_chunk_tvalid),
       .input_tready(pdu_chunk_tready),
       .input_tlast(pdu_chunk_tlast),
 
       .output_tdata (output_tdata),
-      .output_tvalid(output_tvalid),
+      .output_tvalid(serializer_tvalid),
       .output_tready(output_tready),
       .output_tlast (output_tlast)
   );
 
-  serial_crc24 crc_inst (
+  // The header is reloaded on every clock of a restart longer than one clock,
+  // nothing leaves before restart is released
+  assign output_tvalid = serializer_tvalid & ~restart;
+
+  parallel_crc24 #(
+      .C_DATA_WIDTH(MaxPduChunkLengthBits)
+  ) crc_inst (
       .aclk(aclk),
       .aresetn(aresetn),
       .restart(restart),
       .init_preset(crc_init),
-      .input_tdata(output_tdata),
-      .input_tvalid(output_tvalid & output_tready),
+      .input_tdata(crc_tdata),
+      .input_tkeep(crc_tkeep),
+      .input_tvalid(crc_tvalid),
       .crc_out(crc_out)
   );
 
+  // One step of the LFSR with the polynomial x^7 + x^4 + 1, as in whitening
+  function automatic [6:0] whitening_step(input logic [6:0] lfsr);
+    whitening_step = {lfsr[5], lfsr[4], lfsr[3] ^ lfsr[6], lfsr[2], lfsr[1], lfsr[0], lfsr[6]};
+  endfunction
+
+  // Keystream of the next 32 bits, the first bit in bit 0
+  function automatic [MaxPduChunkLengthBits-1:0] whitening_keystream(input logic [6:0] lfsr);
+    integer i;
+    logic [6:0] state;
+    state = lfsr;
+    for (i = 0; i < MaxPduChunkLengthBits; i = i + 1) begin
+      whitening_keystream[i] = state[6];
+      state = whitening_step(state);
+    end
+  endfunction
+
+  // LFSR state after n_bits bits
+  function automatic [6:0] whitening_advance(input logic [6:0] lfsr, input logic [$clog2(MaxPduChunkLengthBits):0] n_bits);
+    integer i;
+    whitening_advance = lfsr;
+    for (i = 0; i < MaxPduChunkLengthBits; i = i + 1) begin
+      if (i[$clog2(MaxPduChunkLengthBits):0] < n_bits) begin
+        whitening_advance = whitening_step(whitening_advance);
+      end
+    end
+  endfunction
+
   function automatic [23:0] swap24(input logic [23:0] data);
     integer i;
     for (i = 0; i < 24; i = i + 1) begin
@@ -15,13 +15,13 @@ module preamble_generator (
 
     input  wire input_tdata,
     input  wire input_tvalid,
-    output reg  input_tready,
+    output wire input_tready,
     input  wire input_tlast,
 
-    output reg  output_tdata,
-    output reg  output_tvalid,
+    output wire output_tdata,
+    output wire output_tvalid,
     input  wire output_tready,
-    output reg  output_tlast
+    output wire output_tlast
 );
 
   localparam integer Preamble1MLength = 8;
@@ -41,101 +41,57 @@ module preamble_generator (
     FsmSendingData
   } fsm_state_t;
 
-  reg first_tdata;
-  reg first_tlast;
-
   fsm_state_t state;
   reg [$clog2(CodedPreambleLength):0] counter;
   reg [$clog2(CodedPreambleLength):0] preamble_len;
   reg [CodedPreambleLength-1:0] preamble;
 
+  // Stream in front of the skid buffer: preamble bits first, then the input stream
+  wire skid_tdata = (state == FsmSendingData) ? input_tdata : preamble[counter[$clog2(CodedPreambleLength)-1:0]];
+  wire skid_tvalid = (state == FsmSendingData) ? input_tvalid : (state == FsmSendingPreamble);
+  wire skid_tready;
+  wire skid_tlast = (state == FsmSendingData) ? input_tlast : 1'b0;
 
+  assign input_tready = (state == FsmSendingData) & skid_tready;
 
   always @(posedge aclk) begin
     if (~aresetn) begin
       counter <= 0;
-
-      first_tdata <= 0;
-      first_tlast <= 0;
-
-      output_tdata <= 0;
-      output_tvalid <= 0;
-      output_tlast <= 0;
-
-      input_tready <= 1;
+      preamble_len <= 0;
+      preamble <= 0;
 
       state <= FsmIdle;
-
-      preamble <= 0;
     end else begin
       case (state)
         FsmIdle: begin
-          output_tvalid <= 0;
-          input_tready <= 0;
           state <= FsmIdle;
         end
         FsmInit: begin
           state <= FsmWaitingForAccessWord;
-          output_tvalid <= 0;
-          input_tready <= 0;
         end
         FsmWaitingForAccessWord: begin
-          input_tready <= 1;
-
-          // Waiting for the first bit of access address so we can use it to calculate preamble
-          if (input_tvalid & input_tready) begin
-            input_tready <= 0;
-            first_tdata <= input_tdata;
-            first_tlast <= input_tlast;
-
+          // Waiting for the first bit of access address so we can use it to calculate preamble.
+          // The bit is only looked at here, it is consumed in FsmSendingData.
+          if (input_tvalid) begin
             preamble <= get_preamble(phy, input_tdata);
             preamble_len <= get_preamble_len(phy);
-
-            counter <= 1;
-            output_tdata <= get_preamble(phy, input_tdata) & 1;
-            output_tvalid <= 1;
-            output_tlast <= 0;
+            counter <= 0;
 
             state <= FsmSendingPreamble;
           end
         end
         FsmSendingPreamble: begin
-          input_tready <= 0;
-
-          if (output_tvalid & output_tready) begin
+          if (skid_tvalid & skid_tready) begin
             counter <= counter + 1;
-            output_tvalid <= 1;
-            output_tdata <= preamble[counter];
-            output_tlast <= 0;
-
-            if (preamble_len <= counter) begin
-              // Send
-              output_tdata <= first_tdata;
-              output_tlast <= first_tlast;
-              output_tvalid <= 1;
+            if (counter + 1 >= preamble_len) begin
               state <= FsmSendingData;
             end
           end
         end
         FsmSendingData: begin
-          if (input_tvalid & input_tready) begin
-            input_tready  <= 0;
-
-            output_tdata  <= input_tdata;
-            output_tlast  <= input_tlast;
-            output_tvalid <= 1;
-          end
-
-          if (output_tvalid & output_tready) begin
-            output_tvalid <= 0;
-            input_tready  <= 1;
-
-            if (output_tlast) begin
-              input_tready <= 0;
-              state <= FsmIdle;
-            end
+          if (skid_tvalid & skid_tready & skid_tlast) begin
+            state <= FsmIdle;
           end
-
         end
         default: state <= FsmIdle;
       endcase
@@ -145,6 +101,24 @@ module preamble_generator (
     end
   end
 
+  axis_skid_buffer #(
+      .C_DATA_WIDTH(1)
+  ) skid_buffer_inst (
+      .aclk(aclk),
+      .aresetn(aresetn),
+      .restart(restart),
+
+      .input_tdata (skid_tdata),
+      .input_tvalid(skid_tvalid),
+      .input_tready(skid_tready),
+      .input_tlast (skid_tlast),
+
+      .output_tdata (output_tdata),
+      .output_tvalid(output_tvalid),
+      .output_tready(output_tready),
+      .output_tlast (output_tlast)
+  );
+
   // Returns preamble value based on phy type
   function automatic logic [CodedPreambleLength-1:0] get_preamble(ble_phy_t phy,
                                                                   logic acc_first_bit);
@@ -154,10 +128,16 @@ module preamble_generator (
     // shall be the same as the LSB of the Access Address.
     case (phy)
       PHY_1M: begin
-        get_preamble = (acc_first_bit) ? ~Preamble1MPattern : Preamble1MPattern;
+        get_preamble = {
+            {(CodedPreambleLength - Preamble1MLength) {1'b0}},
+            (acc_first_bit) ? ~Preamble1MPattern : Preamble1MPattern
+        };
       end
       PHY_2M: begin
-        get_preamble = (acc_first_bit) ? ~Preamble2MPattern : Preamble2MPattern;
+        get_preamble = {
+            {(CodedPreambleLength - Preamble2MLength) {1'b0}},
+            (acc_first_bit) ? ~Preamble2MPattern : Preamble2MPattern
+        };
       end
       PHY_CODED: begin
         get_preamble = CodedPreamblePattern;
@@ -172,13 +152,13 @@ module preamble_generator (
   function automatic logic [$clog2(CodedPreambleLength):0] get_preamble_len(ble_phy_t phy);
     case (phy)
       PHY_1M: begin
-        get_preamble_len = Preamble1MLength;
+        get_preamble_len = Preamble1MLength[$clog2(CodedPreambleLength):0];
       end
       PHY_2M: begin
-        get_preamble_len = Preamble2MLength;
+        get_preamble_len = Preamble2MLength[$clog2(CodedPreambleLength):0];
       end
       PHY_CODED: begin
-        get_preamble_len = CodedPreambleLength;
+        get_preamble_len = CodedPreambleLength[$clog2(CodedPreambleLength):0];
       end
       default: begin
         get_preamble_len = 0;
@@ -28,10 +28,10 @@ module whitening (
     output wire output_tlast
 );
   reg [6:0] lfsr = 0;
-  reg input_tready_int = 0;
-  reg output_tdata_int = 0;
-  reg output_tvalid_int = 0;
-  reg output_tlast_int = 0;
+  wire input_tready_int;
+  wire output_tdata_int;
+  wire output_tvalid_int;
+  wire output_tlast_int;
 
   assign input_tready  = (bypass) ? output_tready : input_tready_int;
   assign output_tdata  = (bypass) ? input_tdata : output_tdata_int;
@@ -48,33 +48,37 @@ module whitening (
   always @(posedge aclk) begin
     if (~aresetn | restart) begin
       lfsr <= init_sequence;
-      input_tready_int <= 1;
-      output_tvalid_int <= 0;
-      output_tdata_int <= 0;
-      output_tlast_int <= 0;
-    end else begin
-      if (input_tready_int & input_tvalid) begin
-        lfsr[0] <= lfsr[6];
-        lfsr[1] <= lfsr[0];
-        lfsr[2] <= lfsr[1];
-        lfsr[3] <= lfsr[2];
-        lfsr[4] <= lfsr[3] ^ lfsr[6];
-        lfsr[5] <= lfsr[4];
-        lfsr[6] <= lfsr[5];
-        input_tready_int <= 0;
-
-        output_tdata_int <= lfsr[6] ^ input_tdata;
-        output_tvalid_int <= 1;
-        output_tlast_int <= input_tlast;
-      end
-
-      if (output_tvalid_int & output_tready) begin
-        output_tvalid_int <= 0;
-        input_tready_int  <= 1;
-      end
+    end else if (input_tready_int & input_tvalid & ~bypass) begin
+      lfsr[0] <= lfsr[6];
+      lfsr[1] <= lfsr[0];
+      lfsr[2] <= lfsr[1];
+      lfsr[3] <= lfsr[2];
+      lfsr[4] <= lfsr[3] ^ lfsr[6];
+      lfsr[5] <= lfsr[4];
+      lfsr[6] <= lfsr[5];
     end
   end
 
+  // Whitened bit is computed on the input handshake, the skid buffer keeps
+  // the stage at one bit per clock
+  axis_skid_buffer #(
+      .C_DATA_WIDTH(1)
+  ) skid_buffer_inst (
+      .aclk(aclk),
+      .aresetn(aresetn),
+      .restart(restart),
+
+      .input_tdata (lfsr[6] ^ input_tdata),
+      .input_tvalid(input_tvalid & ~bypass),
+      .input_tready(input_tready_int),
+      .input_tlast (input_tlast),
+
+      .output_tdata (output_tdata_int),
+      .output_tvalid(output_tvalid_int),
+      .output_tready(output_tready),
+      .output_tlast (output_tlast_int)
+  );
+
 endmodule
 
 `resetall
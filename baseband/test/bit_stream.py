@@ -0,0 +1,228 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+"""
+Drivers of the test bench shims for 1-bit AXI-Stream ports (see
+``rtl/axis_bit_source_shim.sv`` and ``rtl/axis_bit_sink_shim.sv``).
+
+A frame crosses the shim as 32-bit words, so a test makes one transaction per
+word instead of one per bit, and with check set the sink shim compares the
+frame in RTL and returns one result per frame.
+"""
+
+import collections
+
+import cocotb
+import numpy as np
+from cocotb.triggers import Event, ReadOnly, RisingEdge
+
+from helpers import is_high, PackedBits
+
+
+class _WordPusher:
+    """
+    Push words into a FIFO port of a test bench shim.
+
+    Words leave one per clock while the FIFO takes them. While it is full the
+    coroutine sleeps until tready rises instead of waking on every clock.
+
+    Args:
+        dut: Handle of the test bench top.
+        prefix (str): Prefix of the FIFO port, e.g. "input_word".
+        clock: Clock signal.
+    """
+
+    def __init__(self, dut, prefix, clock):
+        self.queue = collections.deque()
+        self.transactions = 0
+        self._wake = Event()
+        self._idle = Event()
+        self._idle.set()
+
+        tvalid = getattr(dut, f"{prefix}_tvalid")
+        tvalid.setimmediatevalue(0)
+        cocotb.start_soon(self._run(clock, tvalid, getattr(dut, f"{prefix}_tready"),
+                                    [getattr(dut, f"{prefix}_{name}") for name in ("tdata", "tbits", "tlast")]))
+
+    def push(self, words):
+        """Queue (tdata, tbits, tlast) tuples."""
+        self.queue.extend(words)
+        self._idle.clear()
+        self._wake.set()
+
+    async def wait(self):
+        """Wait until every queued word is taken."""
+        await self._idle.wait()
+
+    async def _run(self, clock, tvalid, tready, signals):
+        while True:
+            if not self.queue:
+                tvalid.value = 0
+                self._idle.set()
+                self._wake.clear()
+                await self._wake.wait()
+
+            for signal, value in zip(signals, self.queue.popleft()):
+                signal.value = value
+            tvalid.value = 1
+            self.transactions += 1
+
+            while True:
+                await RisingEdge(clock)
+                if is_high(tready):
+                    break
+                await ReadOnly()
+                if not is_high(tready):
+                    await RisingEdge(tready)
+
+
+def _frame_words(bits):
+    """Split a frame into (tdata, tbits, tlast) words of 32 bits"""
+    stream = bits if isinstance(bits, PackedBits) else PackedBits.from_bits(bits)
+    if not stream:
+        raise ValueError("a frame needs at least one bit")
+    words = stream.words(32)
+    return [(int(word), min(32, len(stream) - 32 * i), i == len(words) - 1) for i, word in enumerate(words)]
+
+
+class BitStreamSource:
+    """
+    Drive a 1-bit AXI-Stream port through ``axis_bit_source_shim``.
+
+    A frame goes to the shim as 32-bit words, one transaction per word, and
+    the shim sends it one bit per clock. Idle cycles come from a pause mask in
+    the shim instead of a pause generator called every clock.
+
+    Args:
+        dut: Handle of the test bench top.
+        prefix (str): Prefix of the shim ports, e.g. "input".
+        clock: Clock signal.
+    """
+
+    def __init__(self, dut, prefix, clock):
+        self.pause_mask = getattr(dut, f"{prefix}_pause_mask")
+        self.pause_mask.setimmediatevalue(0)
+        self._words = _WordPusher(dut, f"{prefix}_word", clock)
+
+    @property
+    def transactions(self):
+        """Words handed to the shim so far."""
+        return self._words.transactions
+
+    def set_pause_mask(self, mask):
+        """Hold tvalid low on the clocks whose bit of the 32-bit mask is set, walking the mask one bit per clock."""
+        self.pause_mask.value = mask
+
+    def send(self, bits):
+        """
+        Queue a frame.
+
+        Args:
+            bits (PackedBits | array_like): Frame, packed or one bit per element.
+        """
+        self._words.push(_frame_words(bits))
+
+    async def wait(self):
+        """Wait until every queued frame is in the shim."""
+        await self._words.wait()
+
+
+class BitStreamSink:
+    """
+    Receive a 1-bit AXI-Stream port through ``axis_bit_sink_shim``.
+
+    Without check the shim packs the bits into 32-bit words and :meth:`recv`
+    reads a frame a word at a time. With check the shim compares the bits with
+    the frames queued by :meth:`expect`, and :meth:`result` reads one result
+    per frame.
+
+    Args:
+        dut: Handle of the test bench top.
+        prefix (str): Prefix of the shim ports, e.g. "output".
+        clock: Clock signal.
+        check (bool): Compare in the shim.
+    """
+
+    def __init__(self, dut, prefix, clock, check=False):
+        self.clock = clock
+        self.pause_mask = getattr(dut, f"{prefix}_pause_mask")
+        # (tvalid, tready, data signals) of the word and result FIFOs, as taken by _read
+        self._word_port = (getattr(dut, f"{prefix}_word_tvalid"), getattr(dut, f"{prefix}_word_tready"),
+                           [getattr(dut, f"{prefix}_word_{name}") for name in ("tdata", "tbits", "tlast")])
+        self._result_port = (getattr(dut, f"{prefix}_result_tvalid"), getattr(dut, f"{prefix}_result_tready"),
+                             [getattr(dut, f"{prefix}_result_tdata")])
+
+        self.pause_mask.setimmediatevalue(0)
+        getattr(dut, f"{prefix}_check").setimmediatevalue(int(check))
+        self._word_port[1].setimmediatevalue(0)
+        self._result_port[1].setimmediatevalue(0)
+
+        self._expected = _WordPusher(dut, f"{prefix}_expected", clock)
+        self.transactions = 0
+
+    def set_pause_mask(self, mask):
+        """Hold tready low on the clocks whose bit of the 32-bit mask is set, walking the mask one bit per clock."""
+        self.pause_mask.value = mask
+
+    async def _read(self, tvalid, tready, signals):
+        """Read the head of a shim FIFO, sleeping until tvalid rises"""
+        tready.value = 1
+        while True:
+            await ReadOnly()
+            if is_high(tvalid):
+                break
+            await RisingEdge(tvalid)
+        values = [signal.value.integer for signal in signals]
+        await RisingEdge(self.clock)
+        tready.value = 0
+        self.transactions += 1
+        return values
+
+    async def recv(self):
+        """
+        Receive a frame (without check).
+
+        Returns:
+            PackedBits: The frame.
+        """
+        words = []
+        while True:
+            tdata, tbits, tlast = await self._read(*self._word_port)
+            words.append(tdata)
+            if tlast:
+                return PackedBits(np.array(words, dtype="<u4").view(np.uint8), 32 * (len(words) - 1) + tbits)
+
+    def expect(self, bits):
+        """
+        Queue the expected bits of the next frame (with check).
+
+        Args:
+            bits (PackedBits | array_like): Frame, packed or one bit per element.
+        """
+        self._expected.push(_frame_words(bits))
+
+    async def result(self):
+        """
+        Wait for the check of the next expected frame.
+
+        A received frame longer or shorter than the expected one is a length
+        mismatch; the shim takes it whole and drops the rest of the expected
+        frame, so the next frame is checked from its first bit.
+
+        Returns:
+            int | None: Index of the first differing bit, the length of the shorter frame if one
+            is a prefix of the other, None if the frame matches (as :meth:`PackedBits.mismatch`).
+        """
+        (value,) = await self._read(*self._result_port)
+        n_bits = value & 0xFFFFFFFF
+        n_expected = (value >> 32) & 0xFFFFFFFF
+        first_mismatch = value >> 96
+        if first_mismatch < min(n_bits, n_expected):
+            return first_mismatch
+        if n_bits != n_expected:
+            return min(n_bits, n_expected)
+        return None
+
+    async def check(self, bits):
+        """Queue a frame with :meth:`expect` and wait for its :meth:`result`."""
+        self.expect(bits)
+        return await self.result()
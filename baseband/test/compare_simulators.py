@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+"""Run the test suite with every simulator and compare the wall time per test.
+
+Usage:
+    python baseband/test/compare_simulators.py [pytest arguments]
+
+Each simulator runs twice: a cold run that builds the simulations and a warm
+run that reuses the cached builds, so compile and simulation time can be
+told apart.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import xml.etree.ElementTree as ET
+
+SIMULATORS = {"icarus": "iverilog", "verilator": "verilator"}
+
+
+def run_suite(simulator, pytest_args, sim_build_root):
+    """
+    Run pytest in sim_build_root.
+
+    Returns:
+        tuple: {test name: seconds} of every test that ran and the list of tests that failed,
+        so a failing test doesn't drop the timings of the others.
+    """
+    junit_file = os.path.join(sim_build_root, f"{simulator}.xml")
+    command = [sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider", f"--sim={simulator}",
+               f"--junitxml={junit_file}"] + pytest_args
+    # Keep the profile report of the comparison out of the one of the regular runs
+    env = {**os.environ, "TEST_PROFILE_REPORT": os.path.join(sim_build_root, f"{simulator}_profile.json")}
+    result = subprocess.run(command, cwd=sim_build_root, env=env, check=False)
+    if not os.path.exists(junit_file):
+        return {}, [f"pytest exited with {result.returncode} without a report"]
+
+    timings = {}
+    failures = []
+    for case in ET.parse(junit_file).iter("testcase"):
+        test = f'{case.get("classname")}::{case.get("name")}'
+        timings[test] = float(case.get("time"))
+        if case.find("failure") is not None or case.find("error") is not None:
+            failures.append(test)
+    if result.returncode != 0 and not failures:
+        failures.append(f"pytest exited with {result.returncode}")
+    return timings, failures
+
+
+def print_table(timings, failures):
+    """Print the time of every test per simulator and run, failed tests flagged with "!"."""
+    columns = list(timings)
+    tests = sorted({test for key in columns for test in timings[key]})
+
+    def seconds(key, test):
+        if test not in timings[key]:
+            return "-"
+        return f"{timings[key][test]:.2f}" + ("!" if test in failures[key] else "")
+
+    header = ["test"] + [f"{simulator} {run} [s]" for simulator, run in columns]
+    rows = [[test] + [seconds(key, test) for key in columns] for test in tests]
+    rows.append(["total"] + [f"{sum(timings[key].values()):.2f}" for key in columns])
+
+    widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header))]
+    for row in [header] + rows:
+        print("  ".join(cell.ljust(width) for cell, width in zip(row, widths)))
+
+
+def main():
+    tests_dir = os.path.dirname(os.path.abspath(__file__))
+    pytest_args = sys.argv[1:] or [tests_dir]
+    pytest_args = [os.path.abspath(arg) if os.path.exists(arg) else arg for arg in pytest_args]
+
+    timings = {}
+    failures = {}
+    for simulator, executable in SIMULATORS.items():
+        if shutil.which(executable) is None:
+            print(f"{simulator}: {executable} not found, skipped")
+            continue
+
+        with tempfile.TemporaryDirectory(prefix=f"sim_compare_{simulator}_") as sim_build_root:
+            for run in ("cold", "warm"):
+                timings[(simulator, run)], failures[(simulator, run)] = run_suite(simulator, pytest_args, sim_build_root)
+
+    print_table(timings, failures)
+
+    for (simulator, run), failed in failures.items():
+        for test in failed:
+            print(f"{simulator} {run}: {test} failed")
+
+    return 1 if any(failures.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,7 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+import os
+import sys
+
+# Make the reference model importable from the tests (the simulator gets it via python_search)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'model')))
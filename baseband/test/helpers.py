@@ -1,50 +1,709 @@
 """Module with helper functions for the baseband tests."""
 
-from enum import Enum
+import collections
+import functools
+import hashlib
+import importlib
+import json
+import logging
 import os
+import shutil
+import subprocess
+import tempfile
+import time
+import warnings
+
+import cocotb
 import cocotb_test.simulator
+import numpy as np
+from cocotb.result import SimTimeoutError
+from cocotb.triggers import ReadOnly, RisingEdge, with_timeout
+from cocotb.utils import get_sim_time
+from cocotbext.axi import AxiStreamFrame
+
+from ble_model import BleCi, BlePduType, BlePhy, bits_to_bytes  # pylint: disable=unused-import
 
 tests_dir = os.path.dirname(__file__)
 rtl_dir = os.path.abspath(os.path.join(tests_dir, '..', 'rtl'))
 sim_dir = os.path.abspath(os.path.join(tests_dir, '..', 'sim'))
+tb_rtl_dir = os.path.abspath(os.path.join(tests_dir, 'rtl'))
+model_dir = os.path.abspath(os.path.join(tests_dir, '..', 'model'))
+bench_dir = os.path.abspath(os.path.join(tests_dir, '..', 'bench'))
+
+class _CachedIcarus(cocotb_test.simulator.Icarus):
+    """Icarus runner that never recompiles, the build comes from the cache."""
+
+    def build_command(self):
+        if self.compile_only:
+            return super().build_command()
+        return [self.run_command()]
+
+
+class _CachedVerilator(cocotb_test.simulator.Verilator):
+    """Verilator runner that never recompiles, the build comes from the cache."""
+
+    def build_command(self):
+        if self.compile_only:
+            return super().build_command()
+        return [[os.path.join(self.sim_dir, self.toplevel_module)] + self.plus_args]
+
+
+SIMULATORS = {
+    "icarus": (_CachedIcarus, ["iverilog", "-V"]),
+    "verilator": (_CachedVerilator, ["verilator", "--version"]),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def simulator_version(simulator):
+    """First line printed by the simulator's version command."""
+    command = SIMULATORS[simulator][1]
+    result = subprocess.run(command, capture_output=True, text=True, check=False)
+    return (result.stdout or result.stderr).splitlines()[0]
+
+
+def build_hash(simulator, toplevel, verilog_sources, includes, parameters):
+    """
+    Hash everything the compiled simulation depends on.
+
+    Args:
+        simulator (str): Simulator name.
+        toplevel (str): Name of the top-level module.
+        verilog_sources (list): List of Verilog source files.
+        includes (list): Include directories, every file in them is hashed.
+        parameters (dict): Top-level parameter overrides.
+
+    Returns:
+        str: Hex digest.
+    """
+    digest = hashlib.sha256()
+    for item in (simulator, simulator_version(simulator), cocotb.__version__, toplevel,
+                 repr(sorted((parameters or {}).items())), os.getenv("WAVES", "0")):
+        digest.update(item.encode())
+        digest.update(b"\0")
+
+    include_files = sorted(
+        os.path.join(root, name) for include in includes for root, _, names in os.walk(include) for name in names
+        if name.endswith((".svh", ".vh"))
+    )
+    for path in list(verilog_sources) + include_files:
+        digest.update(os.path.abspath(path).encode())
+        digest.update(b"\0")
+        with open(path, "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+
+    return digest.hexdigest()
+
+
+def build_test(module, toplevel, verilog_sources, parameters=None):
+    """
+    Compile the simulation of a test, unless it is in the build cache.
+
+    The simulation is compiled once into ``sim_build/<toplevel>-<hash>``, the
+    hash covers sources, includes, toplevel, parameters and simulator version,
+    so unchanged RTL is never recompiled. Every build goes to a private
+    directory first and is renamed into place, which keeps concurrent pytest
+    workers from seeing half-built simulations.
+
+    Args:
+        module (str): Name of the module.
+        toplevel (str): Name of the top-level module.
+        verilog_sources (list): List of Verilog source files.
+        parameters (dict): Top-level parameter overrides.
+
+    Returns:
+        tuple: Runner class, build directory and runner arguments of the simulation.
+
+    Raises:
+        ValueError: SIM names a simulator that is not supported.
+    """
+    simulator = os.getenv("SIM", "icarus")
+    if simulator not in SIMULATORS:
+        raise ValueError(f"Unsupported simulator {simulator!r} in SIM, supported: " + ", ".join(SIMULATORS))
+    runner = SIMULATORS[simulator][0]
+
+    includes = [rtl_dir]
+    key = build_hash(simulator, toplevel, verilog_sources, includes, parameters)
+    sim_build = os.path.abspath(os.path.join("sim_build", f"{toplevel}-{key[:16]}"))
+
+    kwargs = {
+        "python_search": [tests_dir, model_dir, bench_dir],
+        "verilog_sources": verilog_sources,
+        "toplevel": toplevel,
+        # The profiler module is imported first and installs the callback counter in profiled runs
+        "module": f"{PROFILER_MODULE},{module}",
+        "includes": includes,
+        "parameters": parameters,
+    }
+
+    if not os.path.isdir(sim_build):
+        os.makedirs(os.path.dirname(sim_build), exist_ok=True)
+        build_dir = tempfile.mkdtemp(prefix=f".{os.path.basename(sim_build)}-", dir=os.path.dirname(sim_build))
+        try:
+            runner(sim_build=build_dir, compile_only=True, force_compile=True, **kwargs).run()
+            os.rename(build_dir, sim_build)
+        except OSError:
+            # Another worker finished the same build first
+            if not os.path.isdir(sim_build):
+                raise
+        finally:
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+    return runner, sim_build, kwargs
+
+
+# Profiles of the simulations run by this process, see :func:`profile_run`
+test_profiles = []
+
+
+class CallbackCounter:
+    """
+    Count the callbacks from the simulator into Python, per trigger type.
 
-def setup_test(module, toplevel, verilog_sources):
+    Every GPI trigger that fires (clock edges, timers, ReadOnly, ...) enters
+    the cocotb scheduler through ``Scheduler._react``, which is wrapped to
+    count them. When a cocotb test ends, its wall time, simulated time and
+    callbacks are appended as one JSON line to the file named by the
+    TEST_PROFILE environment variable. Both hooks are private to cocotb, see
+    :data:`PROFILER_HOOKS`; :func:`install_profiler` installs the counter.
+    """
+
+    # Counter of a profiled simulation, set by install_profiler
+    installed = None
+
+    def __init__(self, profile_file):
+        self.profile_file = profile_file
+        self.counts = collections.Counter()
+
+    @property
+    def callbacks(self):
+        """Callbacks so far."""
+        return sum(self.counts.values())
+
+    def install(self):
+        """Wrap the cocotb hooks, the caller checks that they exist (see :func:`missing_profiler_hooks`)."""
+        from cocotb.regression import RegressionManager  # pylint: disable=import-outside-toplevel
+        from cocotb.scheduler import Scheduler  # pylint: disable=import-outside-toplevel
+
+        # cocotb has no public hook per trigger or per finished test, so the private
+        # methods are wrapped; the pinned cocotb version has them
+        react = Scheduler._react  # pylint: disable=protected-access
+        record_result = RegressionManager._record_result  # pylint: disable=protected-access
+        counts = self.counts
+
+        def counting_react(scheduler, trigger):
+            counts[type(trigger).__name__] += 1
+            return react(scheduler, trigger)
+
+        def profiling_record_result(manager, test, outcome, wall_time_s, sim_time_ns):
+            record_result(manager, test, outcome, wall_time_s, sim_time_ns)
+            self.write(test.__qualname__, wall_time_s, sim_time_ns)
+
+        Scheduler._react = counting_react  # pylint: disable=protected-access
+        RegressionManager._record_result = profiling_record_result  # pylint: disable=protected-access
+
+    def write(self, test, wall_time_s, sim_time_ns):
+        """Append the profile of a finished cocotb test and restart the counts."""
+        profile = {"test": test, "wall_time_s": wall_time_s, "sim_time_ns": sim_time_ns,
+                   "callbacks": self.callbacks, "callbacks_by_trigger": dict(self.counts)}
+        with open(self.profile_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(profile) + "\n")
+        self.counts.clear()
+
+
+# Private cocotb methods wrapped by CallbackCounter, present in the cocotb version of requirements.txt
+PROFILER_HOOKS = (("cocotb.scheduler", "Scheduler", "_react"), ("cocotb.regression", "RegressionManager", "_record_result"))
+
+# Module loaded ahead of the test module of every simulation, calls install_profiler
+PROFILER_MODULE = "profiler"
+
+
+def missing_profiler_hooks():
+    """Return the :data:`PROFILER_HOOKS` this cocotb version lacks, as ``module.Class.method``."""
+    missing = []
+    for module_name, class_name, method in PROFILER_HOOKS:
+        module = importlib.import_module(module_name)
+        if not hasattr(getattr(module, class_name, None), method):
+            missing.append(f"{module_name}.{class_name}.{method}")
+    return missing
+
+
+def install_profiler():
+    """
+    Install a :class:`CallbackCounter` in a simulation started by :func:`profile_run`.
+
+    Called by the :data:`PROFILER_MODULE` before the first cocotb test. Outside
+    a profiled simulation it does nothing. If cocotb lacks one of the hooks
+    the simulation runs unprofiled, with a warning.
+
+    Returns:
+        CallbackCounter | None: The installed counter.
+    """
+    if cocotb.top is None or not os.getenv("TEST_PROFILE") or CallbackCounter.installed is not None:
+        return CallbackCounter.installed
+
+    missing = missing_profiler_hooks()
+    if missing:
+        warnings.warn(f"cocotb {cocotb.__version__} has no {', '.join(missing)}, the simulation is not profiled",
+                      RuntimeWarning)
+        return None
+
+    CallbackCounter.installed = CallbackCounter(os.environ["TEST_PROFILE"])
+    CallbackCounter.installed.install()
+    return CallbackCounter.installed
+
+
+def profile_run(module, toplevel, sim_build, parameters, compile_time_s, run, extra_env=None):
+    """
+    Run a simulation and record its profile in :data:`test_profiles`.
+
+    The profile holds the compile time (close to 0 for a cached build), the
+    wall time of the simulator process, the part of it spent outside the
+    cocotb tests (elaboration, start-up and shut-down), the simulated time,
+    simulated ns per wall second and the Python callbacks, in total and per
+    cocotb test (see :class:`CallbackCounter`). It is recorded even if the
+    simulation fails.
+
+    Args:
+        module (str): Name of the test module.
+        toplevel (str): Name of the top-level module.
+        sim_build (str): Build directory of the simulation.
+        parameters (dict): Top-level parameter overrides.
+        compile_time_s (float): Time spent building the simulation.
+        run: Function running the simulation, takes the environment variables of the simulation.
+        extra_env (dict): Environment variables of the simulation.
+
+    Returns:
+        The return value of run.
+    """
+    fd, profile_file = tempfile.mkstemp(prefix=os.path.join(sim_build, ""), suffix="_profile.jsonl")
+    os.close(fd)
+
+    start = time.perf_counter()
+    try:
+        return run({**(extra_env or {}), "TEST_PROFILE": profile_file})
+    finally:
+        wall_time_s = time.perf_counter() - start
+        with open(profile_file, encoding="utf-8") as f:
+            tests = [json.loads(line) for line in f]
+        os.remove(profile_file)
+
+        sim_time_ns = sum(test["sim_time_ns"] for test in tests)
+        test_profiles.append({
+            "module": module,
+            "toplevel": toplevel,
+            "parameters": {name: str(value) for name, value in (parameters or {}).items()},
+            "compile_time_s": compile_time_s,
+            "sim_wall_time_s": wall_time_s,
+            "startup_time_s": max(0.0, wall_time_s - sum(test["wall_time_s"] for test in tests)),
+            "sim_time_ns": sim_time_ns,
+            "sim_ns_per_wall_s": sim_time_ns / wall_time_s if wall_time_s else 0.0,
+            "callbacks": sum(test["callbacks"] for test in tests),
+            "tests": tests,
+        })
+
+
+def setup_test(module, toplevel, verilog_sources, parameters=None, extra_env=None):
     """
     Set up the test environment for the given module.
 
+    The simulation comes from the build cache (see :func:`build_test`), so
+    several runs of the same test, e.g. with different seeds, can share one
+    build and run at the same time. Build and run are profiled, see
+    :func:`profile_run`.
+
     Args:
         module (str): Name of the module.
         toplevel (str): Name of the top-level module.
         verilog_sources (list): List of Verilog source files.
+        parameters (dict): Top-level parameter overrides.
+        extra_env (dict): Environment variables of the simulation.
 
     Returns:
         None
     """
-    sim_build = os.path.join("sim_build", module)
+    start = time.perf_counter()
+    runner, sim_build, kwargs = build_test(module, toplevel, verilog_sources, parameters)
+    profile_run(module, toplevel, sim_build, parameters, time.perf_counter() - start,
+                lambda env: runner(sim_build=sim_build, extra_env=env, **kwargs).run(), extra_env)
 
-    cocotb_test.simulator.run(
-        python_search=[tests_dir],
-        verilog_sources=verilog_sources,
-        toplevel=toplevel,
-        module=module,
-        sim_build=sim_build,
-        includes=[rtl_dir]
-    )
 
-class BlePhy(Enum):
-    """Enumeration for BLE PHY types."""
-    BLE_PHY_1M = 0
-    BLE_PHY_2M = 1
-    BLE_PHY_CODED = 2
-
-class BleCi(Enum):
-    """Enumeration for bluetooth coding indicator types."""
-    BLE_CI_S8 = 0
-    BLE_CI_S2 = 1
-
-class BlePduType(Enum):
-    """Enumeration for bluetooth PDU types."""
-    PDU_TYPE_ADVERTISING = 0
-    PDU_TYPE_DATA = 1
-    PDU_TYPE_ISO = 2
-    PDU_TYPE_TEST = 3
+def run_scenario_test(module, toplevel, verilog_sources, parameters=None, testcase=None):
+    """
+    Run the scenario tables of a test module and report every scenario.
+
+    The cocotb tests of the module run their tables with :class:`ScenarioRunner`
+    in one simulation, the results of all scenarios are logged and returned.
+
+    Args:
+        module (str): Name of the module.
+        toplevel (str): Name of the top-level module.
+        verilog_sources (list): List of Verilog source files.
+        parameters (dict): Top-level parameter overrides.
+        testcase (str): Comma separated cocotb tests to run, all by default.
+
+    Returns:
+        list: One dict per scenario, see :meth:`ScenarioRunner.run`.
+    """
+    start = time.perf_counter()
+    runner, sim_build, kwargs = build_test(module, toplevel, verilog_sources, parameters)
+    compile_time_s = time.perf_counter() - start
+    fd, results_file = tempfile.mkstemp(prefix=os.path.join(sim_build, ""), suffix="_scenarios.json")
+    os.close(fd)
+
+    try:
+        profile_run(module, toplevel, sim_build, parameters, compile_time_s,
+                    lambda env: runner(sim_build=sim_build, testcase=testcase, extra_env=env, **kwargs).run(),
+                    {"SCENARIO_RESULTS": results_file})
+    finally:
+        with open(results_file, encoding="utf-8") as f:
+            results = json.loads(f.read() or "[]")
+        os.remove(results_file)
+        log_scenario_results(results)
+
+    return results
+
+
+def log_scenario_results(results):
+    """Log one line per scenario result of :meth:`ScenarioRunner.run` and the number passed."""
+    log = logging.getLogger("cocotb.tb")
+    for result in results:
+        status = "PASS" if result["passed"] else f"FAIL {result['error']}"
+        log.info("%-60s %12.0f ns %8.3f s %9s callbacks  %s", result["scenario"], result["sim_time_ns"],
+                 result["wall_time_s"], result["callbacks"], status)
+    log.info("%d of %d scenarios passed", sum(result["passed"] for result in results), len(results))
+
+
+def tx_descriptor(phy, coding_indicator, access_code, channel, whitening_enabled, pdu_type, crc_init, header,
+                  encryption_enabled=0, channel_selection_enabled=0, packet_counter=0, direction=0, event_counter=0,
+                  channel_map=0):
+    """
+    Pack the parameters of one packet into an ``ll_pkt_generator`` descriptor.
+
+    ``header`` holds the plaintext length, with ``encryption_enabled`` the
+    generator adds the MIC (C_ENCRYPTION only) and takes the CCM nonce from
+    ``packet_counter`` and ``direction``. With
+    ``channel_selection_enabled`` the generator ignores ``channel`` and selects
+    it from the access code, ``event_counter`` and ``channel_map``.
+
+    Returns:
+        bytes: Descriptor, one beat of the descriptor stream (layout in ble_types.svh).
+    """
+    fields = ((phy.value, 2), (coding_indicator.value, 2), (access_code, 32), (channel, 6), (whitening_enabled, 1),
+              (pdu_type.value, 2), (crc_init, 24), (header, 24), (encryption_enabled, 1),
+              (channel_selection_enabled, 1), (packet_counter, 39), (direction, 1),
+              (event_counter, 16), (channel_map, 40))
+    return _pack_fields(fields, 24)
+
+
+def _pack_fields(fields, n_bytes):
+    """
+    Pack (value, width) fields, the first one in the lowest bits, into n_bytes little-endian bytes.
+    """
+    packed = 0
+    offset = 0
+    for value, width in fields:
+        packed |= (int(value) & ((1 << width) - 1)) << offset
+        offset += width
+    return packed.to_bytes(n_bytes, "little")
+
+
+def _as_uint8(data):
+    """View bytes-like data or a sink frame as a uint8 array, copying only lists and other sequences."""
+    if isinstance(data, AxiStreamFrame):
+        data = data.tdata
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return np.frombuffer(data, dtype=np.uint8)
+    return np.asarray(data, dtype=np.uint8)
+
+
+class PackedBits:
+    """
+    Bit stream packed 8 bits per byte, LSB first (BLE transmission order).
+
+    A stream takes an eighth of the memory of a list or array with one bit per
+    element. Bytes, bytearrays and the bytearray tdata of packed sink frames
+    are viewed in place, never copied. The tdata of a one bit wide sink is a
+    list, which is copied into an array once when a frame is compared.
+
+    Args:
+        data (bytes | array_like): Packed bytes; bits past n_bits are ignored when comparing.
+        n_bits (int): Length in bits, all bits of data by default.
+    """
+
+    def __init__(self, data, n_bits=None):
+        self.data = _as_uint8(data)
+        self.n_bits = 8 * len(self.data) if n_bits is None else n_bits
+        if not 0 <= self.n_bits <= 8 * len(self.data):
+            raise ValueError(f"{len(self.data)} bytes can't hold {self.n_bits} bits")
+
+    @classmethod
+    def from_bits(cls, bits):
+        """Pack a bit stream given one bit per element (list, array, bytes or frame)."""
+        bits = _as_uint8(bits)
+        return cls(bits_to_bytes(bits), len(bits))
+
+    def __len__(self):
+        return self.n_bits
+
+    def bits(self):
+        """Unpack into a new array, one bit per element."""
+        return np.unpackbits(self.data, count=self.n_bits, bitorder="little")
+
+    def bit_bytes(self):
+        """One bit per byte, the frame data of a one bit wide source."""
+        return self.bits().tobytes()
+
+    def words(self, width):
+        """
+        The stream as width bit words, the beats of a packed bus.
+
+        Returns a view of the data unless the last word has to be zero padded.
+        The unused bits of the last byte are kept as stored, :meth:`from_bits` zeroes them.
+        """
+        word_bytes = width // 8
+        data = self.data[:-(-self.n_bits // 8)]
+        if len(data) % word_bytes:
+            data = np.pad(data, (0, -len(data) % word_bytes))
+        return data.view(f"<u{word_bytes}")
+
+    def mismatch(self, received, packed=False):
+        """
+        Find the first bit where a received stream differs.
+
+        Args:
+            received (AxiStreamFrame | bytes | array_like): Received stream, one bit per byte,
+                or packed LSB first when packed is set (with a zero padded last byte).
+            packed (bool): Received stream is packed.
+
+        Returns:
+            int | None: Index of the first differing bit, the length of the shorter stream
+            if one is a prefix of the other, None if the streams are equal.
+        """
+        received = _as_uint8(received)
+        if packed:
+            # Only whole bytes are received, as many bytes as the stream holds count as the same length
+            n_received = self.n_bits if len(received) == -(-self.n_bits // 8) else 8 * len(received)
+        else:
+            n_received = len(received)
+            received = np.packbits(received, bitorder="little")
+
+        n_bits = min(n_received, self.n_bits)
+        n_bytes = -(-n_bits // 8)
+        diff = np.bitwise_xor(received[:n_bytes], self.data[:n_bytes])
+        if n_bits % 8:
+            diff[-1] &= (1 << (n_bits % 8)) - 1
+
+        differing = np.flatnonzero(diff)
+        if len(differing):
+            byte = int(differing[0])
+            return 8 * byte + (int(diff[byte]) & -int(diff[byte])).bit_length() - 1
+        if n_received != self.n_bits:
+            return n_bits
+        return None
+
+
+def is_high(signal):
+    """Return True if a 1-bit signal is resolvable and set."""
+    value = signal.value
+    return value.is_resolvable and int(value) == 1
+
+
+def top_parameter(name):
+    """
+    Return a parameter of the simulated top level, e.g. for ``cocotb.test(skip=...)``.
+
+    Args:
+        name (str): Parameter name.
+
+    Returns:
+        int | None: Parameter value, None when no simulation runs (pytest importing the module).
+    """
+    if cocotb.top is None:
+        return None
+    return int(getattr(cocotb.top, name).value)
+
+
+async def drain_events(dut):
+    """
+    Read every record in the event FIFO of ``timebase`` (or a top level wrapping it).
+
+    Returns:
+        list: ``(events, timestamp)`` per record, oldest first.
+    """
+    records = []
+    dut.event_tready.value = 1
+    while True:
+        await ReadOnly()
+        if not is_high(dut.event_tvalid):
+            break
+        value = dut.event_tdata.value.integer
+        records.append((value >> 32, value & 0xFFFFFFFF))
+        await RisingEdge(dut.aclk)
+    await RisingEdge(dut.aclk)
+    dut.event_tready.value = 0
+    return records
+
+
+class ScenarioRunner:
+    """
+    Run a table of scenarios in one simulation.
+
+    The toplevel is elaborated and the testbench (clock, AXI drivers,
+    monitors) is built once for the whole table; only a soft reset runs
+    between two scenarios. A failing or hanging scenario is recorded and the
+    table goes on, the test fails at the end with the list of failed
+    scenarios. When the SCENARIO_RESULTS environment variable names a file,
+    the results are appended to it as JSON (see :func:`run_scenario_test`).
+
+    Args:
+        soft_reset: Coroutine function bringing DUT and testbench back to idle.
+        log (logging.Logger): Logger of the testbench.
+        timeout_ns (int): Simulated time after which a scenario counts as hung.
+    """
+
+    def __init__(self, soft_reset, log, timeout_ns=1_000_000):
+        self.soft_reset = soft_reset
+        self.log = log
+        self.timeout_ns = timeout_ns
+
+    @staticmethod
+    def scenario_name(scenario):
+        return ", ".join(f"{key}={getattr(value, 'name', value)}" for key, value in scenario.items())
+
+    @staticmethod
+    def save_results(results):
+        """Append results to the SCENARIO_RESULTS file read back by :func:`run_scenario_test`, if set."""
+        results_file = os.getenv("SCENARIO_RESULTS")
+        if results_file:
+            with open(results_file, "r+", encoding="utf-8") as f:
+                previous = json.loads(f.read() or "[]")
+                f.seek(0)
+                json.dump(previous + results, f, indent=1)
+                f.truncate()
+
+    async def run(self, scenarios, run_scenario):
+        """
+        Run run_scenario(**scenario) for every scenario of the table.
+
+        Args:
+            scenarios (iterable): Scenario parameters, one dict per scenario.
+            run_scenario: Coroutine function taking the parameters of a scenario.
+
+        Returns:
+            list: One dict per scenario with the scenario name, passed, error,
+            simulated time in ns, wall time in seconds and Python callbacks
+            (None unless the run is profiled).
+        """
+        results = []
+        for scenario in scenarios:
+            name = self.scenario_name(scenario)
+            await self.soft_reset()
+
+            start_ns = get_sim_time("ns")
+            start = time.perf_counter()
+            start_callbacks = CallbackCounter.installed.callbacks if CallbackCounter.installed else 0
+            error = None
+            try:
+                await with_timeout(run_scenario(**scenario), self.timeout_ns, "ns")
+            except AssertionError as e:
+                error = str(e) or "assertion failed"
+            except SimTimeoutError:
+                error = f"timed out after {self.timeout_ns} ns"
+
+            result = {"scenario": name, "passed": error is None, "error": error,
+                      "sim_time_ns": get_sim_time("ns") - start_ns, "wall_time_s": time.perf_counter() - start,
+                      "callbacks": CallbackCounter.installed.callbacks - start_callbacks if CallbackCounter.installed else None}
+            self.log.info("Scenario %s: %s", name, "passed" if error is None else f"failed, {error}")
+            results.append(result)
+
+        self.save_results(results)
+
+        failed = [result["scenario"] for result in results if not result["passed"]]
+        assert not failed, f"{len(failed)} of {len(results)} scenarios failed: " + "; ".join(failed)
+        return results
+
+
+# One attribute per counter, read by the tests
+class AxiStreamThroughputMonitor:  # pylint: disable=too-many-instance-attributes
+    """
+    Count clock cycles, beats and stalls on an AXI-Stream interface.
+
+    The interface is sampled on every rising edge of the clock, like the
+    cocotbext-axi drivers do.
+
+    With ``upstream`` set, the beats on the input interface of a stage are
+    counted too, and a cycle without tvalid after the first beat is a starved
+    cycle if the stage has sent every beat it took so far and didn't turn
+    down a beat on the clock before. A stage that never holds a beat back
+    then has ``active_cycles == beats + stall_cycles + starved_cycles``:
+    every cycle without a beat is the sink's or the source's doing.
+
+    Args:
+        dut: Handle of the top-level module, or of the stage inside a shim test bench.
+        prefix (str): Signal name prefix of the interface, e.g. "output".
+        clock: Clock signal.
+        upstream (str): Signal name prefix of the input interface, e.g. "input".
+        generated_beats (int): Beats the stage sends on its own, e.g. a preamble.
+    """
+
+    def __init__(self, dut, prefix, clock, upstream=None, generated_beats=0):
+        self.tvalid = getattr(dut, f"{prefix}_tvalid")
+        self.tready = getattr(dut, f"{prefix}_tready")
+        self.clock = clock
+        self.upstream = None
+        if upstream is not None:
+            self.upstream = (getattr(dut, f"{upstream}_tvalid"), getattr(dut, f"{upstream}_tready"))
+        self.generated_beats = generated_beats
+
+        self.cycle = 0
+        self.beats = 0
+        self.upstream_beats = 0
+        self.first_beat_cycle = None
+        self.last_beat_cycle = None
+        self.stall_cycles = 0
+        self.starved_cycles = 0
+        self._starved_cycles = 0
+        self._upstream_refused = False
+
+        cocotb.start_soon(self._run())
+
+    def clear(self):
+        """Forget all beats seen so far."""
+        self.beats = 0
+        self.upstream_beats = 0
+        self.first_beat_cycle = None
+        self.last_beat_cycle = None
+        self.stall_cycles = 0
+        self.starved_cycles = 0
+        self._starved_cycles = 0
+
+    @property
+    def active_cycles(self):
+        """Cycles from the first to the last beat, both included."""
+        if not self.beats:
+            return 0
+        return self.last_beat_cycle - self.first_beat_cycle + 1
+
+    async def _run(self):
+        while True:
+            await RisingEdge(self.clock)
+            self.cycle += 1
+
+            if is_high(self.tvalid) and is_high(self.tready):
+                self.beats += 1
+                if self.first_beat_cycle is None:
+                    self.first_beat_cycle = self.cycle
+                self.last_beat_cycle = self.cycle
+                # Only the starved cycles up to the last beat count
+                self.starved_cycles = self._starved_cycles
+            elif self.first_beat_cycle is not None and is_high(self.tvalid):
+                self.stall_cycles += 1
+            elif (self.upstream is not None and self.first_beat_cycle is not None and not self._upstream_refused
+                  and self.beats >= self.upstream_beats + self.generated_beats):
+                self._starved_cycles += 1
+
+            if self.upstream is not None:
+                upstream_tvalid, upstream_tready = (is_high(signal) for signal in self.upstream)
+                self.upstream_beats += upstream_tvalid and upstream_tready
+                self._upstream_refused = upstream_tvalid and not upstream_tready
@@ -0,0 +1,10 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+"""
+First module of every simulation (see helpers.build_test): installs the callback
+counter of helpers.profile_run before cocotb starts the tests. It holds no tests.
+"""
+
+from helpers import install_profiler
+
+install_profiler()
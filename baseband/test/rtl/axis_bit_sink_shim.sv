@@ -0,0 +1,256 @@
+// 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+`resetall  //
+`timescale 1ns / 1ps  //
+`default_nettype none  //
+
+// Test bench shim: receives a 1-bit AXI-Stream output as 32-bit words, so the
+// Python driver makes one transaction per word, or with check set one per
+// frame.
+//
+// Bits are packed first bit in bit 0, a word closes after 32 bits or on
+// input_tlast. Without check the words go to the word FIFO as {tlast, tbits,
+// tdata}. With check every word is compared with the next expected word, the
+// expected frame packed the same way with expected_tlast on its last word, and
+// the frame result {first mismatch, mismatches, expected bits, bits} goes to
+// the result FIFO, the first mismatch all ones when the overlapping bits match.
+// A received frame of another length than the expected one is still taken
+// whole: when it ends first the rest of the expected frame is discarded, when
+// it runs on its remaining words are only counted. The result is written once
+// both frames ended, so the next frame is compared from its first bit.
+// input_tready is low on the clocks whose bit of pause_mask is set (the mask
+// is walked one bit per clock) and while the FIFOs can't take a word.
+module axis_bit_sink_shim #(
+    // Word, expected word and result FIFO entries, a power of two
+    parameter integer C_FIFO_DEPTH = 16
+) (
+    input wire aclk,
+    input wire aresetn,
+
+    input wire [31:0] pause_mask,
+    input wire        check,
+
+    input  wire input_tdata,
+    input  wire input_tvalid,
+    output wire input_tready,
+    input  wire input_tlast,
+
+    input  wire [31:0] expected_tdata,
+    input  wire [ 5:0] expected_tbits,
+    input  wire        expected_tlast,
+    input  wire        expected_tvalid,
+    output wire        expected_tready,
+
+    output wire [31:0] word_tdata,
+    output wire [ 5:0] word_tbits,
+    output wire        word_tlast,
+    output wire        word_tvalid,
+    input  wire        word_tready,
+
+    output wire [127:0] result_tdata,
+    output wire        result_tvalid,
+    input  wire        result_tready
+);
+  //***************************************************************************
+  // Packing
+  //***************************************************************************
+  reg [31:0] collect_data;
+  reg [5:0] collect_bits;
+  reg [4:0] phase;
+
+  // Closed word waiting to be compared or stored
+  reg [31:0] closed_data;
+  reg [5:0] closed_bits;
+  reg closed_last;
+  reg closed_valid;
+  wire closed_ready;
+
+  wire bit_handshake = input_tvalid & input_tready;
+  wire [5:0] next_bits = collect_bits + 1;
+  wire [31:0] next_data = collect_data | ({31'b0, input_tdata} << collect_bits[4:0]);
+  wire close_word = bit_handshake & ((next_bits == 32) | input_tlast);
+
+  assign input_tready = ~pause_mask[phase] & (~closed_valid | closed_ready);
+
+  always @(posedge aclk) begin
+    if (~aresetn) begin
+      collect_data <= 0;
+      collect_bits <= 0;
+      phase <= 0;
+      closed_data <= 0;
+      closed_bits <= 0;
+      closed_last <= 0;
+      closed_valid <= 0;
+    end else begin
+      phase <= phase + 1;
+
+      if (close_word) begin
+        collect_data <= 0;
+        collect_bits <= 0;
+        closed_data <= next_data;
+        closed_bits <= next_bits;
+        closed_last <= input_tlast;
+        closed_valid <= 1;
+      end else begin
+        if (bit_handshake) begin
+          collect_data <= next_data;
+          collect_bits <= next_bits;
+        end
+        if (closed_ready) begin
+          closed_valid <= 0;
+        end
+      end
+    end
+  end
+
+  //***************************************************************************
+  // Words
+  //***************************************************************************
+  wire store_tready;
+  wire [$clog2(C_FIFO_DEPTH):0] word_level;
+
+  axis_fifo #(
+      .C_DATA_WIDTH(39),
+      .C_DEPTH(C_FIFO_DEPTH)
+  ) word_fifo_inst (
+      .aclk(aclk),
+      .aresetn(aresetn),
+      .restart(1'b0),
+
+      .input_tdata ({closed_last, closed_bits, closed_data}),
+      .input_tvalid(closed_valid & ~check),
+      .input_tready(store_tready),
+
+      .output_tdata ({word_tlast, word_tbits, word_tdata}),
+      .output_tvalid(word_tvalid),
+      .output_tready(word_tready),
+
+      .level(word_level)
+  );
+
+  //***************************************************************************
+  // Check
+  //***************************************************************************
+  wire [31:0] reference_tdata;
+  wire [5:0] reference_tbits;
+  wire reference_tlast;
+  wire reference_tvalid;
+  wire reference_tready;
+  wire result_fifo_tready;
+  wire [$clog2(C_FIFO_DEPTH):0] expected_level;
+  wire [$clog2(C_FIFO_DEPTH):0] result_level;
+
+  // The received frame ended before the expected one, or the other way round
+  reg received_ended;
+  reg expected_ended;
+  wire both_running = ~received_ended & ~expected_ended;
+
+  // A step takes the closed word and its expected word, or only one of them once
+  // the other frame ended. The step ending both frames waits until its result
+  // can be stored.
+  wire step_valid = (both_running) ? closed_valid & reference_tvalid :
+      (received_ended) ? reference_tvalid : closed_valid;
+  wire step_last = (both_running) ? closed_last & reference_tlast :
+      (received_ended) ? reference_tlast : closed_last;
+  wire step = check & step_valid & (~step_last | result_fifo_tready);
+
+  assign closed_ready = (check) ? step & ~received_ended : store_tready;
+  assign reference_tready = step & ~expected_ended;
+
+  axis_fifo #(
+      .C_DATA_WIDTH(39),
+      .C_DEPTH(C_FIFO_DEPTH)
+  ) expected_fifo_inst (
+      .aclk(aclk),
+      .aresetn(aresetn),
+      .restart(1'b0),
+
+      .input_tdata ({expected_tlast, expected_tbits, expected_tdata}),
+      .input_tvalid(expected_tvalid),
+      .input_tready(expected_tready),
+
+      .output_tdata ({reference_tlast, reference_tbits, reference_tdata}),
+      .output_tvalid(reference_tvalid),
+      .output_tready(reference_tready),
+
+      .level(expected_level)
+  );
+
+  reg [31:0] frame_bits;
+  reg [31:0] frame_expected_bits;
+  reg [31:0] frame_mismatches;
+  reg [31:0] frame_first_mismatch;
+
+  // Words before the last one of a frame hold 32 bits on both sides, so the
+  // words stay aligned and only the bits present in both are compared
+  wire [5:0] received_word_bits = (received_ended) ? 6'd0 : closed_bits;
+  wire [5:0] expected_word_bits = (expected_ended) ? 6'd0 : reference_tbits;
+  wire [5:0] common_bits = (received_word_bits < expected_word_bits) ? received_word_bits : expected_word_bits;
+  wire [31:0] bit_mask = (common_bits[5]) ? 32'hffffffff : ((32'd1 << common_bits[4:0]) - 1);
+  wire [31:0] difference = (closed_data ^ reference_tdata) & bit_mask;
+  wire [31:0] total_bits = frame_bits + {26'b0, received_word_bits};
+  wire [31:0] total_expected_bits = frame_expected_bits + {26'b0, expected_word_bits};
+  wire [31:0] total_mismatches = frame_mismatches + {26'b0, count_ones(difference)};
+  wire [31:0] first_mismatch = (frame_first_mismatch == 32'hffffffff) & (difference != 0) ?
+      frame_bits + {27'b0, lowest_one(difference)} : frame_first_mismatch;
+
+  always @(posedge aclk) begin
+    if (~aresetn | (step & step_last)) begin
+      received_ended <= 0;
+      expected_ended <= 0;
+      frame_bits <= 0;
+      frame_expected_bits <= 0;
+      frame_mismatches <= 0;
+      frame_first_mismatch <= 32'hffffffff;
+    end else if (step) begin
+      if (both_running) begin
+        received_ended <= closed_last;
+        expected_ended <= reference_tlast;
+      end
+      frame_bits <= total_bits;
+      frame_expected_bits <= total_expected_bits;
+      frame_mismatches <= total_mismatches;
+      frame_first_mismatch <= first_mismatch;
+    end
+  end
+
+  axis_fifo #(
+      .C_DATA_WIDTH(128),
+      .C_DEPTH(C_FIFO_DEPTH)
+  ) result_fifo_inst (
+      .aclk(aclk),
+      .aresetn(aresetn),
+      .restart(1'b0),
+
+      .input_tdata ({first_mismatch, total_mismatches, total_expected_bits, total_bits}),
+      .input_tvalid(step & step_last),
+      .input_tready(result_fifo_tready),
+
+      .output_tdata (result_tdata),
+      .output_tvalid(result_tvalid),
+      .output_tready(result_tready),
+
+      .level(result_level)
+  );
+
+  function automatic [5:0] count_ones(input logic [31:0] value);
+    integer i;
+    count_ones = 0;
+    for (i = 0; i < 32; i = i + 1) begin
+      count_ones = count_ones + {5'b0, value[i]};
+    end
+  endfunction
+
+  function automatic [4:0] lowest_one(input logic [31:0] value);
+    integer i;
+    lowest_one = 0;
+    for (i = 31; i >= 0; i = i - 1) begin
+      if (value[i]) begin
+        lowest_one = 5'(i);
+      end
+    end
+  endfunction
+
+endmodule
+
+`resetall
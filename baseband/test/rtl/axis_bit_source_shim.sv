@@ -0,0 +1,99 @@
+// 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+`resetall  //
+`timescale 1ns / 1ps  //
+`default_nettype none  //
+
+// Test bench shim: drives a 1-bit AXI-Stream input from 32-bit words, so the
+// Python driver makes one transaction per word instead of one per bit.
+//
+// A word carries word_tbits bits (1 to 32), first bit in bit 0, word_tlast
+// marks the last word of a frame. Words wait in a FIFO and leave back-to-back
+// at one bit per clock. A new bit is not offered on the clocks whose bit of
+// pause_mask is set (a bit already offered stays valid until taken); the
+// mask is walked one bit per clock, so a pause pattern repeating every 1, 2,
+// 4, 8, 16 or 32 clocks costs the driver nothing.
+module axis_bit_source_shim #(
+    // Word FIFO entries, a power of two
+    parameter integer C_FIFO_DEPTH = 16
+) (
+    input wire aclk,
+    input wire aresetn,
+
+    input wire [31:0] pause_mask,
+
+    input  wire [31:0] word_tdata,
+    input  wire [ 5:0] word_tbits,
+    input  wire        word_tlast,
+    input  wire        word_tvalid,
+    output wire        word_tready,
+
+    output wire output_tdata,
+    output wire output_tvalid,
+    input  wire output_tready,
+    output wire output_tlast
+);
+  wire [38:0] fifo_tdata;
+  wire fifo_tvalid;
+  wire fifo_tready;
+  wire [$clog2(C_FIFO_DEPTH):0] word_level;
+
+  axis_fifo #(
+      .C_DATA_WIDTH(39),
+      .C_DEPTH(C_FIFO_DEPTH)
+  ) word_fifo_inst (
+      .aclk(aclk),
+      .aresetn(aresetn),
+      .restart(1'b0),
+
+      .input_tdata ({word_tlast, word_tbits, word_tdata}),
+      .input_tvalid(word_tvalid),
+      .input_tready(word_tready),
+
+      .output_tdata (fifo_tdata),
+      .output_tvalid(fifo_tvalid),
+      .output_tready(fifo_tready),
+
+      .level(word_level)
+  );
+
+  reg [31:0] data;
+  reg [5:0] remaining;
+  reg last;
+  reg [4:0] phase;
+  // A bit is offered and not taken yet
+  reg offered;
+
+  wire bit_handshake = output_tvalid & output_tready;
+  // The next word is loaded on the clock the last bit of the current one leaves
+  assign fifo_tready = (remaining == 0) | ((remaining == 1) & bit_handshake);
+
+  always @(posedge aclk) begin
+    if (~aresetn) begin
+      data <= 0;
+      remaining <= 0;
+      last <= 0;
+      phase <= 0;
+      offered <= 0;
+    end else begin
+      phase <= phase + 1;
+      offered <= output_tvalid & ~output_tready;
+
+      if (fifo_tvalid & fifo_tready) begin
+        data <= fifo_tdata[31:0];
+        remaining <= fifo_tdata[37:32];
+        last <= fifo_tdata[38];
+      end else if (bit_handshake) begin
+        data <= data >> 1;
+        remaining <= remaining - 1;
+      end
+    end
+  end
+
+  assign output_tdata  = data[0];
+  assign output_tvalid = (remaining != 0) & (~pause_mask[phase] | offered);
+  assign output_tlast  = last & (remaining == 1);
+
+endmodule
+
+`resetall
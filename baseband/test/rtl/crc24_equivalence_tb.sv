@@ -0,0 +1,87 @@
+// 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+`resetall  //
+`timescale 1ns / 1ps  //
+`default_nettype none  //
+
+// Test bench top: feeds the same words to parallel_crc24 directly and to
+// serial_crc24 through the serializer, so both results can be compared.
+module crc24_equivalence_tb #(
+    parameter integer C_DATA_WIDTH = 32
+) (
+    input wire aclk,
+    input wire aresetn,
+
+    input wire restart,
+
+    input wire [23:0] init_preset,
+
+    input  wire [  C_DATA_WIDTH-1:0] input_tdata,
+    input  wire [C_DATA_WIDTH/8-1:0] input_tkeep,
+    input  wire                      input_tvalid,
+    output wire                      input_tready,
+    input  wire                      input_tlast,
+
+    output wire serial_busy,
+
+    output wire [23:0] serial_crc_out,
+    output wire [23:0] parallel_crc_out
+);
+  wire serial_tdata;
+  wire serial_tvalid;
+  wire serial_tlast;
+
+  assign serial_busy = serial_tvalid | ~input_tready;
+
+  serializer #(
+      .C_DATA_WIDTH(C_DATA_WIDTH)
+  ) serializer_inst (
+      .aclk(aclk),
+      .aresetn(aresetn),
+      .restart(restart),
+      .input_length(keep_to_length(input_tkeep)),
+      .input_tdata(input_tdata),
+      .input_tvalid(input_tvalid),
+      .input_tready(input_tready),
+      .input_tlast(input_tlast),
+
+      .output_tdata (serial_tdata),
+      .output_tvalid(serial_tvalid),
+      .output_tready(1'b1),
+      .output_tlast (serial_tlast)
+  );
+
+  serial_crc24 serial_crc_inst (
+      .aclk(aclk),
+      .aresetn(aresetn),
+      .restart(restart),
+      .init_preset(init_preset),
+      .input_tdata(serial_tdata),
+      .input_tvalid(serial_tvalid),
+      .crc_out(serial_crc_out)
+  );
+
+  parallel_crc24 #(
+      .C_DATA_WIDTH(C_DATA_WIDTH)
+  ) parallel_crc_inst (
+      .aclk(aclk),
+      .aresetn(aresetn),
+      .restart(restart),
+      .init_preset(init_preset),
+      .input_tdata(input_tdata),
+      .input_tkeep(input_tkeep),
+      .input_tvalid(input_tvalid & input_tready),
+      .crc_out(parallel_crc_out)
+  );
+
+  function automatic [$clog2(C_DATA_WIDTH):0] keep_to_length(input logic [C_DATA_WIDTH/8-1:0] keep);
+    integer i;
+    keep_to_length = 0;
+    for (i = 0; i < C_DATA_WIDTH / 8; i = i + 1) begin
+      keep_to_length = keep_to_length + (keep[i] ? 8 : 0);
+    end
+  endfunction
+
+endmodule
+
+`resetall
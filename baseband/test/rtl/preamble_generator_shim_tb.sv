@@ -0,0 +1,118 @@
+// 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+`resetall  //
+`timescale 1ns / 1ps  //
+`default_nettype none  //
+`include "ble_types.svh"
+
+// Test bench top: preamble_generator with its 1-bit input and output streams
+// behind axis_bit_source_shim and axis_bit_sink_shim (see whitening_shim_tb).
+module preamble_generator_shim_tb (
+    input wire aclk,
+    input wire aresetn,
+
+    input wire restart,
+    input wire ble_phy_t phy,
+
+    input  wire [31:0] input_pause_mask,
+    input  wire [31:0] input_word_tdata,
+    input  wire [ 5:0] input_word_tbits,
+    input  wire        input_word_tlast,
+    input  wire        input_word_tvalid,
+    output wire        input_word_tready,
+
+    input  wire [31:0] output_pause_mask,
+    input  wire        output_check,
+    input  wire [31:0] output_expected_tdata,
+    input  wire [ 5:0] output_expected_tbits,
+    input  wire        output_expected_tlast,
+    input  wire        output_expected_tvalid,
+    output wire        output_expected_tready,
+    output wire [31:0] output_word_tdata,
+    output wire [ 5:0] output_word_tbits,
+    output wire        output_word_tlast,
+    output wire        output_word_tvalid,
+    input  wire        output_word_tready,
+    output wire [127:0] output_result_tdata,
+    output wire         output_result_tvalid,
+    input  wire         output_result_tready
+);
+  wire input_tdata;
+  wire input_tvalid;
+  wire input_tready;
+  wire input_tlast;
+
+  wire output_tdata;
+  wire output_tvalid;
+  wire output_tready;
+  wire output_tlast;
+
+  axis_bit_source_shim input_shim_inst (
+      .aclk(aclk),
+      .aresetn(aresetn),
+
+      .pause_mask(input_pause_mask),
+
+      .word_tdata (input_word_tdata),
+      .word_tbits (input_word_tbits),
+      .word_tlast (input_word_tlast),
+      .word_tvalid(input_word_tvalid),
+      .word_tready(input_word_tready),
+
+      .output_tdata (input_tdata),
+      .output_tvalid(input_tvalid),
+      .output_tready(input_tready),
+      .output_tlast (input_tlast)
+  );
+
+  preamble_generator dut_inst (
+      .aclk(aclk),
+      .aresetn(aresetn),
+
+      .restart(restart),
+
+      .phy(phy),
+
+      .input_tdata (input_tdata),
+      .input_tvalid(input_tvalid),
+      .input_tready(input_tready),
+      .input_tlast (input_tlast),
+
+      .output_tdata (output_tdata),
+      .output_tvalid(output_tvalid),
+      .output_tready(output_tready),
+      .output_tlast (output_tlast)
+  );
+
+  axis_bit_sink_shim output_shim_inst (
+      .aclk(aclk),
+      .aresetn(aresetn),
+
+      .pause_mask(output_pause_mask),
+      .check(output_check),
+
+      .input_tdata (output_tdata),
+      .input_tvalid(output_tvalid),
+      .input_tready(output_tready),
+      .input_tlast (output_tlast),
+
+      .expected_tdata (output_expected_tdata),
+      .expected_tbits (output_expected_tbits),
+      .expected_tlast (output_expected_tlast),
+      .expected_tvalid(output_expected_tvalid),
+      .expected_tready(output_expected_tready),
+
+      .word_tdata (output_word_tdata),
+      .word_tbits (output_word_tbits),
+      .word_tlast (output_word_tlast),
+      .word_tvalid(output_word_tvalid),
+      .word_tready(output_word_tready),
+
+      .result_tdata (output_result_tdata),
+      .result_tvalid(output_result_tvalid),
+      .result_tready(output_result_tready)
+  );
+
+endmodule
+
+`resetall
@@ -0,0 +1,146 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+import logging
+import os
+
+import cocotb
+import numpy as np
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge
+
+from ble_model import correlate, ll_packet_bits
+from helpers import setup_test, rtl_dir, is_high, BlePhy
+
+ACCESS_CODES = [0x8E89BED6, 0x50654A2D, 0xA1B2C3D4, 0x71764129]
+
+class TB:
+    def __init__(self, dut):
+        self.dut = dut
+
+        self.log = logging.getLogger("cocotb.tb")
+        self.log.setLevel(logging.DEBUG)
+        cocotb.start_soon(Clock(dut.aclk, 2, units="ns").start())
+
+        dut.restart.setimmediatevalue(0)
+        dut.input_tdata.setimmediatevalue(0)
+        dut.input_tvalid.setimmediatevalue(0)
+
+    async def reset(self):
+        self.dut.aresetn.setimmediatevalue(0)
+        await RisingEdge(self.dut.aclk)
+        await RisingEdge(self.dut.aclk)
+        self.dut.aresetn.value = 0
+        await RisingEdge(self.dut.aclk)
+        await RisingEdge(self.dut.aclk)
+        self.dut.aresetn.value = 1
+        await RisingEdge(self.dut.aclk)
+        await RisingEdge(self.dut.aclk)
+
+    def set_bank(self, access_codes, enable, error_threshold, phy):
+        self.dut.access_codes.value = sum(code << (32 * i) for i, code in enumerate(access_codes))
+        self.dut.access_code_enable.value = sum(int(bit) << i for i, bit in enumerate(enable))
+        self.dut.error_threshold.value = error_threshold
+        self.dut.phy.value = phy.value
+
+    async def send_and_collect(self, bits, idle=None):
+        """Send bits, one per clock unless idle yields 1, and return the matches like the model does"""
+        matches = []
+        accepted = []
+
+        async def collect():
+            while True:
+                await RisingEdge(self.dut.aclk)
+                accepted.append(is_high(self.dut.input_tvalid))
+                if is_high(self.dut.match_valid):
+                    # The match is registered one clock after the window took the last bit
+                    bit_index = sum(accepted[:-2]) - 1
+                    matches.append((bit_index, int(self.dut.match_mask.value), int(self.dut.match_index.value),
+                                    int(self.dut.match_errors.value)))
+
+        monitor = cocotb.start_soon(collect())
+
+        for bit in bits:
+            while idle is not None and next(idle):
+                self.dut.input_tvalid.value = 0
+                await RisingEdge(self.dut.aclk)
+            self.dut.input_tdata.value = int(bit)
+            self.dut.input_tvalid.value = 1
+            await RisingEdge(self.dut.aclk)
+        self.dut.input_tvalid.value = 0
+
+        for _ in range(4):
+            await RisingEdge(self.dut.aclk)
+        monitor.kill()
+
+        return matches
+
+
+def noisy_stream(rng, phy, access_codes, n_errors):
+    """Random bits with one packet per access code, each with n_errors flipped preamble/access code bits"""
+    preamble_length = 8 if phy == BlePhy.BLE_PHY_1M else 16
+    chunks = []
+    for access_code, errors in zip(access_codes, n_errors):
+        packet = ll_packet_bits(phy, access_code, 0, False, 0x555555, 0x0300, [[0x42, 0x4C, 0x45]])[0]
+        flips = rng.choice(preamble_length + 32, errors, replace=False)
+        packet[flips] ^= 1
+        chunks += [rng.integers(0, 2, rng.integers(20, 80), dtype=np.uint8), packet]
+    return np.concatenate(chunks)
+
+
+async def run_and_compare(dut, phy, enable, error_threshold, n_errors, idle=None):
+    tb = TB(dut)
+    await tb.reset()
+
+    rng = np.random.default_rng(sum(n_errors) + error_threshold)
+    bits = noisy_stream(rng, phy, ACCESS_CODES, n_errors)
+
+    tb.set_bank(ACCESS_CODES, enable, error_threshold, phy)
+    matches = await tb.send_and_collect(bits, idle)
+
+    expected = correlate(bits, ACCESS_CODES, enable, error_threshold, phy)
+    tb.log.info("Matches: %s", matches)
+    assert matches == expected
+    return matches
+
+@cocotb.test()
+async def run_test_1m_exact(dut):
+    matches = await run_and_compare(dut, BlePhy.BLE_PHY_1M, [1, 1, 1, 1], 0, [0, 0, 0, 0])
+    assert [index for _, _, index, _ in matches] == [0, 1, 2, 3]
+
+@cocotb.test()
+async def run_test_1m_threshold(dut):
+    # The packet with 5 errors is rejected with threshold 4
+    matches = await run_and_compare(dut, BlePhy.BLE_PHY_1M, [1, 1, 1, 1], 4, [1, 3, 4, 5])
+    assert [index for _, _, index, _ in matches] == [0, 1, 2]
+
+@cocotb.test()
+async def run_test_2m_threshold(dut):
+    matches = await run_and_compare(dut, BlePhy.BLE_PHY_2M, [1, 1, 1, 1], 3, [0, 2, 3, 6])
+    assert [index for _, _, index, _ in matches] == [0, 1, 2]
+
+@cocotb.test()
+async def run_test_disabled_address(dut):
+    matches = await run_and_compare(dut, BlePhy.BLE_PHY_1M, [1, 0, 1, 0], 2, [0, 0, 1, 0])
+    assert [index for _, _, index, _ in matches] == [0, 2]
+
+@cocotb.test()
+async def run_test_idle(dut):
+    idle = iter(np.random.default_rng(7).integers(0, 2, 100000))
+    await run_and_compare(dut, BlePhy.BLE_PHY_2M, [1, 1, 1, 1], 2, [0, 1, 2, 3], idle)
+
+@cocotb.test()
+async def run_test_coded_never_matches(dut):
+    tb = TB(dut)
+    await tb.reset()
+    bits = noisy_stream(np.random.default_rng(0), BlePhy.BLE_PHY_1M, ACCESS_CODES, [0, 0, 0, 0])
+    tb.set_bank(ACCESS_CODES, [1, 1, 1, 1], 0, BlePhy.BLE_PHY_CODED)
+    assert await tb.send_and_collect(bits) == []
+
+def test_access_code_correlator():
+    setup_test(
+        "test_access_code_correlator",
+        "access_code_correlator",
+        [
+            os.path.join(rtl_dir, "rx/access_code_correlator.sv"),
+        ]
+    )
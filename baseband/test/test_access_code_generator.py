@@ -1,27 +1,32 @@
 #!/usr/bin/env python
 
-import itertools
-import logging
 import os
 
 import cocotb
 from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge
 
-from cocotbext.axi import AxiStreamFrame, AxiStreamBus, AxiStreamSource, AxiStreamSink
-
-from helpers import setup_test, rtl_dir
+from bit_stream import BitStreamSink, BitStreamSource
+from helpers import setup_test, rtl_dir, tb_rtl_dir, AxiStreamThroughputMonitor
 
 class TB:
     def __init__(self, dut):
         self.dut = dut
 
-        self.log = logging.getLogger("cocotb.tb")
-        self.log.setLevel(logging.DEBUG)
         cocotb.start_soon(Clock(dut.aclk, 2, units="ns").start())
 
-        self.source = AxiStreamSource(AxiStreamBus.from_prefix(dut, "input"), dut.aclk, dut.aresetn, False, byte_lanes=1)
-        self.sink = AxiStreamSink(AxiStreamBus.from_prefix(dut, "output"), dut.aclk, dut.aresetn, False, byte_lanes=1)
+        self.source = BitStreamSource(dut, "input", dut.aclk)
+        self.sink = BitStreamSink(dut, "output", dut.aclk, check=True)
+        self.monitor = AxiStreamThroughputMonitor(dut.dut_inst, "output", dut.aclk, upstream="input")
+
+        dut.restart.setimmediatevalue(0)
+        dut.access_code.setimmediatevalue(0)
+
+    def set_idle_mask(self, mask):
+        self.source.set_pause_mask(mask)
+
+    def set_backpressure_mask(self, mask):
+        self.sink.set_pause_mask(mask)
 
     async def reset(self):
         self.dut.aresetn.setimmediatevalue(0)
@@ -35,19 +40,23 @@ class TB:
         await RisingEdge(self.dut.aclk)
 
 
-def idle_cycle_pause():
-    return itertools.cycle([1, 1, 1, 1, 0])
-
-def backpressure_cycle_pause():
-    return itertools.cycle([1, 1, 1, 1, 1, 0])
+# Pause masks of the shims, walked one bit per clock: idle three clocks in four,
+# backpressure seven in eight
+IDLE_PAUSE_MASK = 0x77777777
+BACKPRESSURE_PAUSE_MASK = 0x7F7F7F7F
 
+# Pauses one clock in four, more than a stage at half rate can keep up with
+LIGHT_CYCLE_PAUSE_MASK = 0x88888888
 
 
-async def generate_and_compare(dut, access_code , input_data, expected_output_data):
+async def generate_and_compare(dut, access_code , input_data, expected_output_data, idle_mask=0, backpressure_mask=0):
     tb = TB(dut)
     await tb.reset()
 
-    expected_output_data = bytes(expected_output_data)
+    tb.set_idle_mask(idle_mask)
+    tb.set_backpressure_mask(backpressure_mask)
+
+    tb.monitor.generated_beats = len(expected_output_data) - len(input_data)
 
     dut.access_code.value = access_code
     dut.restart.value = 1
@@ -55,15 +64,17 @@ async def generate_and_compare(dut, access_code , input_data, expected_output_da
     dut.restart.value = 0
     await RisingEdge(dut.aclk)
 
-    test_frame = AxiStreamFrame(input_data)
-    await tb.source.send(test_frame)
+    tb.source.send(input_data)
+    assert await tb.sink.check(expected_output_data) is None
 
-    output_data = bytes(await tb.sink.recv())
+    # Throughput is limited by the source and sink pauses only
+    assert tb.monitor.beats == len(expected_output_data)
+    if not idle_mask and not backpressure_mask:
+        assert tb.monitor.active_cycles == tb.monitor.beats
+    else:
+        assert tb.monitor.active_cycles == tb.monitor.beats + tb.monitor.stall_cycles + tb.monitor.starved_cycles
 
-    assert tb.sink.empty()
-    assert output_data == expected_output_data
-
-async def run_test(dut):
+async def run_test(dut, idle_mask=0, backpressure_mask=0):
 
     input_data = [
         # PDU: 00 03 42 4C 45
@@ -81,13 +92,38 @@ async def run_test(dut):
         1,0,0,1,0,1,0,0, 0,1,0,1,0,0,0,0, 0,1,1,1,0,0,1,1,
     ]
 
-    await generate_and_compare(dut, 0x8E89BED6, input_data, expected_output_data)
+    await generate_and_compare(dut, 0x8E89BED6, input_data, expected_output_data, idle_mask, backpressure_mask)
+
+@cocotb.test()
+async def run_test_full_rate(dut):
+    await run_test(dut)
+
+@cocotb.test()
+async def run_test_idle(dut):
+    await run_test(dut, idle_mask=IDLE_PAUSE_MASK)
+
+@cocotb.test()
+async def run_test_backpressure(dut):
+    await run_test(dut, backpressure_mask=BACKPRESSURE_PAUSE_MASK)
+
+@cocotb.test()
+async def run_test_idle_backpressure(dut):
+    await run_test(dut, IDLE_PAUSE_MASK, BACKPRESSURE_PAUSE_MASK)
+
+@cocotb.test()
+async def run_test_light_idle_backpressure(dut):
+    await run_test(dut, LIGHT_CYCLE_PAUSE_MASK, LIGHT_CYCLE_PAUSE_MASK)
 
 def test_access_code_generator():
     setup_test(
         "test_access_code_generator",
-        "access_code_generator",
+        "access_code_generator_shim_tb",
         [
+            os.path.join(tb_rtl_dir, "access_code_generator_shim_tb.sv"),
+            os.path.join(tb_rtl_dir, "axis_bit_source_shim.sv"),
+            os.path.join(tb_rtl_dir, "axis_bit_sink_shim.sv"),
             os.path.join(rtl_dir, "tx/access_code_generator.sv"),
+            os.path.join(rtl_dir, "axis_skid_buffer.sv"),
+            os.path.join(rtl_dir, "axis_fifo.sv"),
         ]
     )
@@ -0,0 +1,88 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+import os
+
+import cocotb
+import numpy as np
+from cocotb.clock import Clock
+from cocotb.triggers import ReadOnly, RisingEdge
+
+from ble_model import aes128_encrypt
+from helpers import setup_test, rtl_dir, is_high
+
+# FIPS-197 Appendix C.1
+FIPS_197_KEY = bytes.fromhex("000102030405060708090a0b0c0d0e0f")
+FIPS_197_PLAINTEXT = bytes.fromhex("00112233445566778899aabbccddeeff")
+FIPS_197_CIPHERTEXT = bytes.fromhex("69c4e0d86a7b0430d8cdb78070b4c55a")
+
+# Clocks from the input handshake to output_tvalid
+LATENCY = 10
+
+
+async def reset(dut):
+    cocotb.start_soon(Clock(dut.aclk, 2, units="ns").start())
+    dut.restart.value = 0
+    dut.input_tvalid.value = 0
+    dut.key.value = 0
+    dut.input_tdata.value = 0
+    dut.aresetn.value = 0
+    for _ in range(2):
+        await RisingEdge(dut.aclk)
+    dut.aresetn.value = 1
+    await RisingEdge(dut.aclk)
+
+
+async def encrypt(dut, key, block):
+    """Encrypt one block, return the ciphertext and the clocks it took"""
+    dut.key.value = int.from_bytes(key, "big")
+    dut.input_tdata.value = int.from_bytes(block, "big")
+    dut.input_tvalid.value = 1
+    await ReadOnly()
+    assert is_high(dut.input_tready)
+    await RisingEdge(dut.aclk)
+    dut.input_tvalid.value = 0
+
+    for clocks in range(1, 2 * LATENCY):
+        await RisingEdge(dut.aclk)
+        await ReadOnly()
+        if is_high(dut.output_tvalid):
+            return dut.output_tdata.value.integer.to_bytes(16, "big"), clocks
+        assert not is_high(dut.input_tready)
+    raise AssertionError("no output")
+
+
+@cocotb.test()
+async def run_test_fips_197(dut):
+    """
+    Test the FIPS-197 AES-128 example vector.
+    """
+    await reset(dut)
+    ciphertext, clocks = await encrypt(dut, FIPS_197_KEY, FIPS_197_PLAINTEXT)
+    assert ciphertext == FIPS_197_CIPHERTEXT
+    assert clocks == LATENCY
+
+
+@cocotb.test()
+async def run_test_random_blocks(dut):
+    """
+    Test random keys and blocks against the model, a new key with every block.
+    """
+    await reset(dut)
+    rng = np.random.default_rng(20)
+    keys = rng.integers(0, 0x100, (64, 16), dtype=np.uint8)
+    blocks = rng.integers(0, 0x100, (64, 16), dtype=np.uint8)
+    expected = aes128_encrypt(keys, blocks)
+
+    for key, block, ciphertext in zip(keys, blocks, expected):
+        await RisingEdge(dut.aclk)
+        assert (await encrypt(dut, key.tobytes(), block.tobytes()))[0] == ciphertext.tobytes()
+
+
+def test_aes128():
+    setup_test(
+        "test_aes128",
+        "aes128",
+        [
+            os.path.join(rtl_dir, "aes128.sv"),
+        ]
+    )
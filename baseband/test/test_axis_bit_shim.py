@@ -0,0 +1,159 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+import os
+
+import cocotb
+import numpy as np
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge
+from cocotb.utils import get_sim_time
+
+from ble_model import whiten
+from bit_stream import BitStreamSink, BitStreamSource
+from helpers import setup_test, rtl_dir, tb_rtl_dir, PackedBits
+
+# One idle clock in four, the CYCLE_PAUSE of the cocotbext-axi tests as a shim mask
+PAUSE_MASK = 0x88888888
+
+CLOCK_PERIOD_NS = 2
+
+
+class TB:
+    def __init__(self, dut, check=False):
+        self.dut = dut
+        cocotb.start_soon(Clock(dut.aclk, CLOCK_PERIOD_NS, units="ns").start())
+        self.source = BitStreamSource(dut, "input", dut.aclk)
+        self.sink = BitStreamSink(dut, "output", dut.aclk, check)
+
+        dut.bypass.setimmediatevalue(0)
+        dut.restart.setimmediatevalue(0)
+        dut.channel.setimmediatevalue(0)
+
+    async def reset(self):
+        self.dut.aresetn.setimmediatevalue(0)
+        await RisingEdge(self.dut.aclk)
+        await RisingEdge(self.dut.aclk)
+        self.dut.aresetn.value = 1
+        await RisingEdge(self.dut.aclk)
+
+    async def restart(self, channel, bypass=0):
+        self.dut.channel.value = channel
+        self.dut.bypass.value = bypass
+        self.dut.restart.value = 1
+        await RisingEdge(self.dut.aclk)
+        self.dut.restart.value = 0
+
+
+def random_frames(rng, n_frames, max_bits):
+    return [rng.integers(0, 2, int(rng.integers(1, max_bits + 1)), dtype=np.uint8) for _ in range(n_frames)]
+
+
+@cocotb.test()
+async def run_test_recv_bypass(dut):
+    """
+    Test frames of every word alignment pass through the shims unchanged, with and without pauses.
+    """
+    tb = TB(dut)
+    await tb.reset()
+    await tb.restart(0, bypass=1)
+
+    rng = np.random.default_rng(23)
+    for pause_mask in [0, PAUSE_MASK]:
+        tb.source.set_pause_mask(pause_mask)
+        tb.sink.set_pause_mask(pause_mask)
+        frames = [rng.integers(0, 2, n_bits, dtype=np.uint8) for n_bits in [1, 2, 31, 32, 33, 63, 64, 65, 300]]
+        for frame in frames:
+            tb.source.send(frame)
+        for frame in frames:
+            expected = PackedBits.from_bits(frame)
+            assert expected.mismatch((await tb.sink.recv()).bits()) is None
+
+
+@cocotb.test()
+async def run_test_check_whitening(dut):
+    """
+    Test the shim checks whitened frames against the model and reports the first differing bit.
+    """
+    tb = TB(dut, check=True)
+    await tb.reset()
+
+    rng = np.random.default_rng(2323)
+    for i, frame in enumerate(random_frames(rng, 24, 400)):
+        channel = int(rng.integers(0, 40))
+        await tb.restart(channel)
+        tb.source.set_pause_mask(PAUSE_MASK if i % 2 else 0)
+        tb.sink.set_pause_mask(PAUSE_MASK if i % 3 else 0)
+        tb.source.send(frame)
+        expected = whiten([frame], channel)[0]
+        if i % 4 == 3:
+            flipped = int(rng.integers(len(frame)))
+            expected[flipped] ^= 1
+            assert await tb.sink.check(expected) == flipped
+        else:
+            assert await tb.sink.check(expected) is None
+
+
+@cocotb.test()
+async def run_test_check_length_mismatch(dut):
+    """
+    Test received frames longer and shorter than the expected frame are reported and the next frame is checked in step.
+    """
+    tb = TB(dut, check=True)
+    await tb.reset()
+    await tb.restart(0, bypass=1)
+
+    rng = np.random.default_rng(2325)
+    for i, (n_bits, n_expected) in enumerate([(40, 70), (70, 40), (31, 32), (33, 32), (64, 200), (200, 64)]):
+        tb.sink.set_pause_mask(PAUSE_MASK if i % 2 else 0)
+        frame = rng.integers(0, 2, n_bits, dtype=np.uint8)
+        expected = rng.integers(0, 2, n_expected, dtype=np.uint8)
+        common = min(n_bits, n_expected)
+        expected[:common] = frame[:common]
+        tb.source.send(frame)
+        assert await tb.sink.check(expected) == common
+
+        # A mismatch ahead of the end is reported first
+        expected[common // 2] ^= 1
+        tb.source.send(frame)
+        assert await tb.sink.check(expected) == common // 2
+
+        # The rest of the shorter or longer frame is gone
+        frame = rng.integers(0, 2, 50, dtype=np.uint8)
+        tb.source.send(frame)
+        assert await tb.sink.check(frame) is None
+
+
+@cocotb.test()
+async def run_test_full_rate(dut):
+    """
+    Test a long frame streams at one bit per clock with one driver transaction per 32 bits.
+    """
+    tb = TB(dut, check=True)
+    await tb.reset()
+    await tb.restart(38)
+
+    n_bits = 32 * 1024
+    frame = np.random.default_rng(2324).integers(0, 2, n_bits, dtype=np.uint8)
+    start_ns = get_sim_time("ns")
+    tb.source.send(frame)
+    assert await tb.sink.check(whiten([frame], 38)[0]) is None
+
+    clocks = (get_sim_time("ns") - start_ns) // CLOCK_PERIOD_NS
+    assert clocks < n_bits + 16
+    assert tb.source.transactions == n_bits // 32
+    assert tb.sink.transactions == 1
+
+
+def test_axis_bit_shim():
+    setup_test(
+        "test_axis_bit_shim",
+        "whitening_shim_tb",
+        [
+            os.path.join(tb_rtl_dir, "whitening_shim_tb.sv"),
+            os.path.join(tb_rtl_dir, "axis_bit_source_shim.sv"),
+            os.path.join(tb_rtl_dir, "axis_bit_sink_shim.sv"),
+            os.path.join(rtl_dir, "whitening.sv"),
+            os.path.join(rtl_dir, "axis_skid_buffer.sv"),
+            os.path.join(rtl_dir, "axis_fifo.sv"),
+        ]
+    )
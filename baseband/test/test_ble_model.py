@@ -0,0 +1,336 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+import numpy as np
+import pytest
+
+from ble_model import (
+    ALL_CHANNELS_MAP, BleCi, BlePduType, BlePhy, GfskModulator, PduFilterTable, advertising_channel,
+    aes128_encrypt, bytes_to_bits, ccm_decrypt, ccm_encrypt, ccm_nonce, conv_encode, correlate,
+    csa2_channel, crc24, crc24_bytes, crc24_to_bits, decode_packets, encrypt_pdu, fec_bits, fec_decode,
+    filter_key, gaussian_pulse, gfsk_modulate, ll_packet_bits, ll_packets_bits, pdu_crc_bits,
+    random_packets, viterbi_decode, whiten, whitening_init, whitening_keystream,
+    whitening_keystream_words, NUM_CHANNEL_INDEXES, NUM_CHANNELS, WHITENING_PERIOD
+)
+
+# The reference packet is described as bytes in transmission order (the leftmost
+# byte in a line is transmitted first). Inside a byte, bits are transmitted LSB first.
+# Access address: D6 BE 89 8E
+# PDU: 00 03 42 4C 45
+# CRC: 29 0A CE
+REFERENCE_PDU_CRC = [
+    # PDU: 00 03 42 4C 45
+    0,0,0,0,0,0,0,0, 1,1,0,0,0,0,0,0, 0,1,0,0,0,0,1,0, 0,0,1,1,0,0,1,0, 1,0,1,0,0,0,1,0,
+    # CRC: 29 0A CE
+    1,0,0,1,0,1,0,0, 0,1,0,1,0,0,0,0, 0,1,1,1,0,0,1,1,
+]
+
+REFERENCE_ACCESS_CODE = [
+    0,1,1,0,1,0,1,1, 0,1,1,1,1,1,0,1, 1,0,0,1,0,0,0,1, 0,1,1,1,0,0,0,1,
+]
+
+
+def test_pdu_crc():
+    output = pdu_crc_bits(0x555555, 0x0300, [[0x42, 0x4C, 0x45]])
+    assert output.tolist() == [REFERENCE_PDU_CRC]
+
+
+def test_crc_residue():
+    # Running the CRC over a PDU followed by its CRC leaves zero in the register
+    assert crc24([REFERENCE_PDU_CRC], 0x555555).tolist() == [0]
+
+
+def test_whitening_channel_38():
+    # PDU and CRC before whitening
+    input_bistream = [
+        0,1,0,0,0,0,1,0, 1,0,0,1,0,0,0,0, 0,1,1,0,0,1,0,1, 1,0,1,0,0,1,0,1, 0,0,1,0,0,1,0,1, 1,1,0,0,0,1,0,1, 0,1,0,0,0,1,0,1,
+        1,0,0,0,0,0,1,1, 1,0,0,0,0,0,0,0, 0,1,0,0,0,0,0,0, 1,1,0,0,0,0,0,0, 1,0,1,1,0,1,0,1, 0,0,1,0,1,1,0,1, 1,1,0,1,0,1,1,1,
+    ]
+    # PDU and CRC after whitening
+    expected_output_data = [
+        0,0,1,0,1,0,0,1, 0,0,1,1,0,0,1,1, 0,1,0,0,0,1,1,1, 1,0,1,0,0,0,0,1, 1,0,1,1,1,1,1,1, 1,0,1,1,1,1,1,0, 1,1,0,0,0,0,1,0,
+        0,1,1,1,0,0,1,0, 0,1,0,1,1,0,0,0, 1,1,1,0,0,1,0,1, 0,0,1,1,0,1,0,1, 1,1,1,1,0,1,1,1, 1,1,1,1,0,0,1,1, 1,0,1,0,0,1,0,1,
+    ]
+    assert whiten([input_bistream], 38).tolist() == [expected_output_data]
+    assert whiten(whiten([input_bistream], 38), 38).tolist() == [input_bistream]
+
+
+def test_whitening_keystream_table():
+    # One LFSR run per index of the 6-bit channel port, longer than the tabulated period
+    for channel in range(NUM_CHANNEL_INDEXES):
+        lfsr = int(whitening_init(channel))
+        keystream = []
+        for _ in range(3 * WHITENING_PERIOD):
+            msb = lfsr >> 6
+            keystream.append(msb)
+            lfsr = (((lfsr << 1) & 0x7F) | msb) ^ (msb << 4)
+        assert whitening_keystream(channel, len(keystream)).tolist() == [keystream]
+
+    channels = np.arange(NUM_CHANNELS)
+    words = whitening_keystream_words(channels, 4)
+    assert words.dtype == np.uint32
+    assert (bytes_to_bits(words.view(np.uint8)) == whitening_keystream(channels, 128)).all()
+
+    for channel in (-1, NUM_CHANNEL_INDEXES):
+        with pytest.raises(ValueError):
+            whitening_keystream([0, channel], 8)
+
+
+def test_aes128_fips_197():
+    # FIPS-197 Appendix C.1
+    key = np.arange(16, dtype=np.uint8)
+    plaintext = np.frombuffer(bytes.fromhex("00112233445566778899aabbccddeeff"), dtype=np.uint8)
+    assert aes128_encrypt(key, plaintext).tobytes() == bytes.fromhex("69c4e0d86a7b0430d8cdb78070b4c55a")
+
+
+def test_ccm_rfc_3610():
+    # RFC 3610 Packet Vector #1: 8-byte MIC, 8 bytes of additional data
+    key = np.arange(0xC0, 0xD0, dtype=np.uint8)
+    nonce = np.frombuffer(bytes.fromhex("00000003020100a0a1a2a3a4a5"), dtype=np.uint8)
+    aad = np.arange(8, dtype=np.uint8)
+    payload = np.arange(8, 31, dtype=np.uint8)
+
+    ciphertext, mic = ccm_encrypt(key, [nonce], [aad], [payload], mic_size=8)
+    assert ciphertext.tobytes() == bytes.fromhex("588c979a61c663d2f066d0c2c0f989806d5f6b61dac384")
+    assert mic.tobytes() == bytes.fromhex("17e8d12cfdf926e0")
+
+
+def test_encrypt_pdu_sample_data():
+    # Bluetooth Core Specification Vol 6 Part C 1, LL_START_ENC_RSP with packet
+    # counter 0 from the central and from the peripheral. SK and IV are given
+    # most significant octet first, the IV enters the nonce least significant first
+    key = np.frombuffer(bytes.fromhex("99AD1B5226A37E3E058E3B8E27C2C666"), dtype=np.uint8)
+    iv = np.frombuffer(bytes.fromhex("DEAFBABEBADCAB24")[::-1], dtype=np.uint8)
+    for direction, pdu in [(1, "0F059FCDA7F448"), (0, "0F05A34C13A415")]:
+        header, payload = encrypt_pdu(key, iv, 0, direction, [0x010F], [[0x06]])
+        assert int(header[0]).to_bytes(2, "little") + payload[0].tobytes() == bytes.fromhex(pdu)
+
+
+def test_encrypt_pdu_round_trip():
+    rng = np.random.default_rng(20)
+    key = rng.integers(0, 0x100, 16, dtype=np.uint8)
+    iv = rng.integers(0, 0x100, 8, dtype=np.uint8)
+    packet_counter = rng.integers(0, 1 << 39, 64, dtype=np.uint64)
+    direction = rng.integers(0, 2, 64)
+    for payload_length in [1, 15, 16, 17, 251]:
+        params = random_packets(rng, 64, payload_length)
+        header, payload = encrypt_pdu(key, iv, packet_counter, direction, params["header"], params["payload"])
+        assert (header == params["header"] + (4 << 8)).all()
+
+        nonce = ccm_nonce(packet_counter, direction, iv)
+        aad = (params["header"] & 0xE3).astype(np.uint8)[:, np.newaxis]
+        plaintext, valid = ccm_decrypt(key, nonce, aad, payload[:, :-4], payload[:, -4:])
+        assert (plaintext == params["payload"]).all() and valid.all()
+
+        # A flipped bit in the ciphertext, the authenticated header or the nonce fails the MIC
+        flipped = payload.copy()
+        flipped[:, rng.integers(payload_length)] ^= 0x80
+        assert not ccm_decrypt(key, nonce, aad, flipped[:, :-4], flipped[:, -4:])[1].any()
+        assert not ccm_decrypt(key, nonce, aad ^ 0x01, payload[:, :-4], payload[:, -4:])[1].any()
+        nonce = ccm_nonce(packet_counter, 1 - direction, iv)
+        assert not ccm_decrypt(key, nonce, aad, payload[:, :-4], payload[:, -4:])[1].any()
+
+    # Empty PDUs are not encrypted
+    header, payload = encrypt_pdu(key, iv, 0, 0, [0x0001], np.zeros((1, 0), dtype=np.uint8))
+    assert header.tolist() == [0x0001] and payload.shape == (1, 0)
+
+
+def csa2_channel_reference(access_address, event_counter, channel_map):
+    """CSA#2 one event at a time, as written in the specification"""
+    identifier = (access_address >> 16) ^ (access_address & 0xFFFF)
+    prn = event_counter ^ identifier
+    for _ in range(3):
+        prn = int(f"{prn >> 8:08b}"[::-1], 2) << 8 | int(f"{prn & 0xFF:08b}"[::-1], 2)
+        prn = (17 * prn + identifier) & 0xFFFF
+    prn_e = prn ^ identifier
+    used = [channel for channel in range(37) if channel_map >> channel & 1]
+    if prn_e % 37 in used:
+        return prn_e % 37
+    return used[len(used) * prn_e >> 16]
+
+
+def test_csa2_sample_data():
+    # Bluetooth Core Specification Vol 6 Part C 3
+    nine_channels = sum(1 << channel for channel in (9, 10, 21, 22, 23, 33, 34, 35, 36))
+    assert csa2_channel(0x8E89BED6, [1, 2, 3], ALL_CHANNELS_MAP).tolist() == [20, 6, 21]
+    assert csa2_channel(0x8E89BED6, [6, 7, 8], nine_channels).tolist() == [23, 9, 34]
+
+
+def test_csa2_matches_reference():
+    rng = np.random.default_rng(21)
+    # Every event counter of 64 connections, 4M events
+    access_address = rng.integers(0, 1 << 32, 64)
+    channel_map = [sum(1 << int(c) for c in rng.choice(37, rng.integers(2, 38), replace=False)) for _ in range(64)]
+    channels = csa2_channel(np.repeat(access_address, 1 << 16), np.tile(np.arange(1 << 16), 64),
+                            np.repeat(channel_map, 1 << 16)).reshape(64, 1 << 16)
+
+    used = (np.array(channel_map, dtype=np.uint64)[:, np.newaxis] >> channels.astype(np.uint64)) & 1
+    assert used.all()
+    for i, counter in zip(rng.integers(0, 64, 2000), rng.integers(0, 1 << 16, 2000)):
+        assert channels[i, counter] == csa2_channel_reference(int(access_address[i]), int(counter), channel_map[i])
+
+
+def test_advertising_channel_sequence():
+    assert advertising_channel(np.arange(6), ALL_CHANNELS_MAP).tolist() == [37, 38, 39, 37, 38, 39]
+    assert advertising_channel(np.arange(4), 0b101 << 37).tolist() == [37, 39, 37, 39]
+    assert advertising_channel(np.arange(2), 0b010 << 37).tolist() == [38, 38]
+
+
+def test_ll_packet_1m_2m():
+    for phy, preamble in ((BlePhy.BLE_PHY_1M, [0, 1] * 4), (BlePhy.BLE_PHY_2M, [0, 1] * 8)):
+        output = ll_packet_bits(phy, 0x8E89BED6, 0, False, 0x555555, 0x0300, [[0x42, 0x4C, 0x45]])
+        assert output.tolist() == [preamble + REFERENCE_ACCESS_CODE + REFERENCE_PDU_CRC]
+
+
+def test_batch_matches_single_packets():
+    rng = np.random.default_rng(0)
+    params = random_packets(rng, 64, 17)
+    batch = ll_packet_bits(BlePhy.BLE_PHY_1M, **params)
+
+    for i in range(64):
+        single = ll_packet_bits(BlePhy.BLE_PHY_1M, *(params[k][i] for k in ("access_code", "channel", "whitening_enabled", "crc_init", "header")),
+                                params["payload"][i:i + 1])
+        assert np.array_equal(batch[i], single[0])
+
+        pdu = single[0, 8 + 32:]
+        if params["whitening_enabled"][i]:
+            pdu = whiten([pdu], params["channel"][i])[0]
+        assert crc24([pdu], params["crc_init"][i]).tolist() == [0]
+        assert np.array_equal(crc24_to_bits(crc24([pdu[:-24]], params["crc_init"][i]))[0], pdu[-24:])
+
+
+def test_mixed_lengths():
+    payloads = [b"", b"\x01", bytes(range(255)), b"\x01"]
+    packets = ll_packets_bits(BlePhy.BLE_PHY_2M, 0x8E89BED6, 37, True, 0x555555, [len(p) << 8 for p in payloads], payloads)
+    assert [len(p) for p in packets] == [16 + 32 + 40 + 8 * len(p) for p in payloads]
+    assert np.array_equal(packets[1], packets[3])
+
+
+def test_crc_table_matches_serial():
+    rng = np.random.default_rng(2)
+    data = rng.integers(0, 0x100, (256, 67), dtype=np.uint8)
+    init = rng.integers(0, 1 << 24, 256)
+    assert np.array_equal(crc24_bytes(data, init), crc24(bytes_to_bits(data), init))
+
+
+def test_conv_encode_matches_serial():
+    rng = np.random.default_rng(3)
+    bits = rng.integers(0, 2, (16, 50), dtype=np.uint8)
+
+    for packet, coded in zip(bits, conv_encode(bits)):
+        state = [0, 0, 0]
+        expected = []
+        for bit in packet:
+            expected += [bit ^ state[0] ^ state[1] ^ state[2], bit ^ state[1] ^ state[2]]
+            state = [bit] + state[:2]
+        assert coded.tolist() == expected
+
+
+def test_ll_packet_coded_lengths():
+    for ci, s in ((BleCi.BLE_CI_S8, 8), (BleCi.BLE_CI_S2, 2)):
+        output = ll_packet_bits(BlePhy.BLE_PHY_CODED, 0x8E89BED6, 0, False, 0x555555, 0x0300, [[0x42, 0x4C, 0x45]], ci)
+        # Preamble, FEC block 1 (access code, CI, TERM1) with S=8, FEC block 2 (PDU, CRC, TERM2)
+        assert output.shape == (1, 80 + (32 + 2 + 3) * 8 + (40 + 24 + 3) * s)
+
+
+def test_correlate_reference_packet():
+    packet = ll_packet_bits(BlePhy.BLE_PHY_1M, 0x8E89BED6, 0, False, 0x555555, 0x0300, [[0x42, 0x4C, 0x45]])[0]
+    bits = np.concatenate([np.zeros(10, dtype=np.uint8), packet])
+    bits[20] ^= 1
+
+    # The match is reported on the last access code bit, the second address never matches
+    assert correlate(bits, [0x8E89BED6, 0x12345678], [1, 1], 1, BlePhy.BLE_PHY_1M) == [(10 + 8 + 32 - 1, 1, 0, 1)]
+    assert not correlate(bits, [0x8E89BED6, 0x12345678], [1, 1], 0, BlePhy.BLE_PHY_1M)
+
+
+def test_viterbi_round_trip():
+    rng = np.random.default_rng(4)
+    params = random_packets(rng, 64, 20)
+    for ci in (BleCi.BLE_CI_S8, BleCi.BLE_CI_S2):
+        coded = ll_packet_bits(BlePhy.BLE_PHY_CODED, coding_indicator=ci, **params)[:, 80:]
+        access_code, coding_indicator, pdu_crc = fec_decode(coded)
+        assert coding_indicator == ci
+        assert np.array_equal(fec_bits(access_code, pdu_crc, ci), coded)
+
+
+def test_viterbi_soft_corrects_errors():
+    rng = np.random.default_rng(5)
+    bits = np.concatenate([rng.integers(0, 2, (200, 100), dtype=np.uint8), np.zeros((200, 3), dtype=np.uint8)], axis=1)
+    soft = 2.0 * conv_encode(bits) - 1 + rng.normal(0, 0.6, (200, 206))
+
+    # About 5% of the hard decisions are wrong, the decoder recovers every packet
+    assert np.mean((soft > 0) != conv_encode(bits)) > 0.03
+    assert np.array_equal(viterbi_decode(soft), bits)
+
+
+def test_decode_packets_mixed_coding():
+    rng = np.random.default_rng(6)
+    packets = []
+    for ci in (BleCi.BLE_CI_S8, BleCi.BLE_CI_S2, BleCi.BLE_CI_S8):
+        params = random_packets(rng, 3, 10)
+        packets += list(ll_packet_bits(BlePhy.BLE_PHY_CODED, coding_indicator=ci, **params)[:, 80:])
+
+    decoded = decode_packets(packets, processes=2, chunk_size=2)
+    assert [ci for _, ci, _ in decoded] == [BleCi.BLE_CI_S8] * 3 + [BleCi.BLE_CI_S2] * 3 + [BleCi.BLE_CI_S8] * 3
+    for packet, (access_code, ci, pdu_crc) in zip(packets, decoded):
+        assert np.array_equal(fec_bits(access_code, pdu_crc, ci)[0], packet)
+
+
+def test_gfsk_matches_direct_filter():
+    rng = np.random.default_rng(8)
+    bits = rng.integers(0, 2, 5000, dtype=np.uint8)
+
+    # Impulses filtered by the Gaussian pulse, integrated over the whole signal at once
+    impulses = np.zeros((len(bits) + 2) * 8)
+    impulses[:8 * len(bits):8] = 2.0 * bits - 1
+    frequency = np.convolve(impulses, gaussian_pulse(0.5, 8, 3))[:len(impulses)]
+    expected = np.exp(1j * np.pi * 0.5 / 8 * np.cumsum(frequency))
+
+    assert np.allclose(gfsk_modulate(bits), expected, atol=1e-5)
+
+
+def test_gfsk_chunked_stream():
+    packets = ll_packets_bits(BlePhy.BLE_PHY_2M, 0x8E89BED6, 37, True, 0x555555, [10 << 8, 200 << 8], [bytes(10), bytes(range(200))])
+    modulator = GfskModulator(BlePhy.BLE_PHY_2M, 4, chunk_size=300)
+    iq = np.concatenate([chunk.copy() for chunk in modulator.stream(packets)])
+
+    assert modulator.sample_rate == 8e6
+    assert np.allclose(iq, gfsk_modulate(np.concatenate(packets), BlePhy.BLE_PHY_2M, 4), atol=1e-5)
+    assert np.allclose(np.abs(iq), 1, atol=1e-5)
+
+    # A run of ones settles at +250 kHz (h = 0.5) at 1 Msym/s
+    ones = gfsk_modulate(np.ones(64, dtype=np.uint8))
+    frequency = np.angle(ones[1:] * np.conj(ones[:-1])) * 8e6 / (2 * np.pi)
+    assert abs(frequency[32 * 8] - 250e3) < 100
+
+
+def test_filter_key_advertiser_address():
+    address = bytes([0x11, 0x22, 0x33, 0x44, 0x55, 0x66])
+    scanner = bytes(6)
+    adv = BlePduType.PDU_TYPE_ADVERTISING
+
+    # ADV_IND carries AdvA first, SCAN_REQ after ScanA, ADV_EXT_IND none
+    assert filter_key(0x8E89BED6, adv, 0x0600, address) == (0x8E89BED6 << 48) | 0x665544332211
+    assert filter_key(0x8E89BED6, adv, 0x0C03, scanner + address) == (0x8E89BED6 << 48) | 0x665544332211
+    assert filter_key(0x8E89BED6, adv, 0x0607, address) == 0x8E89BED6 << 48
+    # A short PDU reads as zeros past its end
+    assert filter_key(0x8E89BED6, adv, 0x0300, address[:3]) == (0x8E89BED6 << 48) | 0x332211
+    # Data PDUs are matched on type and access code only
+    assert filter_key(0x50654A2D, BlePduType.PDU_TYPE_DATA, 0x0600, address) == (1 << 80) | (0x50654A2D << 48)
+
+
+def test_filter_table_moves_keep_keys():
+    rng = np.random.default_rng(24)
+    table = PduFilterTable(256, 4)
+    placed = {}
+    for _ in range(900):
+        key = (int(rng.integers(0, 4)) << 80) | (int(rng.integers(0, 1 << 32)) << 48) | int(rng.integers(1, 1 << 48))
+        before = dict(placed)
+        for index, entry in table.insert(key):
+            placed[index] = entry
+            # Every key stays in the table while the writes move keys around
+            assert set(before.values()) <= set(placed.values()) | {0}
+        assert table.keys() == {entry & ((1 << 82) - 1) for entry in placed.values() if entry}
+
+    index, entry = table.remove(key)
+    assert placed[index] == (1 << 82) | key and entry == 0
+    assert len(table.keys()) == 899
@@ -0,0 +1,104 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+import os
+
+import cocotb
+import numpy as np
+from cocotb.triggers import Timer
+
+from ble_model import ALL_CHANNELS_MAP, select_channel
+from helpers import setup_test, rtl_dir
+
+# Sample data of CSA#2, Bluetooth Core Specification Vol 6 Part C 3
+SAMPLE_ACCESS_ADDRESS = 0x8E89BED6
+SAMPLE_9_CHANNELS_MAP = sum(1 << channel for channel in (9, 10, 21, 22, 23, 33, 34, 35, 36))
+SAMPLE_ALL_CHANNELS = {1: 20, 2: 6, 3: 21}
+SAMPLE_9_CHANNELS = {6: 23, 7: 9, 8: 34}
+
+N_EVENT_COUNTERS = 1 << 16
+# Event counters sampled per map, the model test covers all of them (test_csa2_matches_reference)
+N_SAMPLED_COUNTERS = 2048
+
+
+async def select(dut, access_address, event_counter, channel_map, advertising=0):
+    dut.access_address.value = int(access_address)
+    dut.event_counter.value = int(event_counter)
+    dut.channel_map.value = int(channel_map)
+    dut.advertising.value = int(advertising)
+    await Timer(1, units="ns")
+    return dut.channel.value.integer
+
+
+async def sweep(dut, rng, access_address, channel_map):
+    """Select the channel of the first, the last and random event counters, compare with the model"""
+    counters = np.concatenate([[0, 1, N_EVENT_COUNTERS - 1], rng.integers(0, N_EVENT_COUNTERS, N_SAMPLED_COUNTERS)])
+    dut.access_address.value = int(access_address)
+    dut.channel_map.value = int(channel_map)
+    dut.advertising.value = 0
+    channels = np.empty(len(counters), dtype=np.uint8)
+    for i, counter in enumerate(counters):
+        dut.event_counter.value = int(counter)
+        await Timer(1, units="ns")
+        channels[i] = dut.channel.value.integer
+
+    expected = select_channel(access_address, counters, channel_map, False)
+    mismatches = np.flatnonzero(channels != expected)
+    assert not mismatches.size, (f"access address {access_address:#010x}, map {channel_map:#012x}: "
+                                 f"event counter {counters[mismatches[0]]} got {channels[mismatches[0]]}, "
+                                 f"expected {expected[mismatches[0]]}")
+
+
+@cocotb.test()
+async def run_test_sample_data(dut):
+    """
+    Test the CSA#2 sample data of the specification.
+    """
+    for counter, channel in SAMPLE_ALL_CHANNELS.items():
+        assert await select(dut, SAMPLE_ACCESS_ADDRESS, counter, ALL_CHANNELS_MAP) == channel
+    for counter, channel in SAMPLE_9_CHANNELS.items():
+        assert await select(dut, SAMPLE_ACCESS_ADDRESS, counter, SAMPLE_9_CHANNELS_MAP) == channel
+
+
+@cocotb.test()
+async def run_test_sample_sweep(dut):
+    """
+    Test sampled event counters of the sample access address with both sample maps against the model.
+    """
+    rng = np.random.default_rng(20)
+    await sweep(dut, rng, SAMPLE_ACCESS_ADDRESS, ALL_CHANNELS_MAP)
+    await sweep(dut, rng, SAMPLE_ACCESS_ADDRESS, SAMPLE_9_CHANNELS_MAP)
+
+
+@cocotb.test()
+async def run_test_random_sweep(dut):
+    """
+    Test sampled event counters of random access addresses and channel maps against the model.
+
+    The maps use 2 to 37 data channels, down to the minimum the specification allows.
+    """
+    rng = np.random.default_rng(21)
+    for n_used in (2, 3, 12, 25, 36):
+        channels = rng.choice(37, n_used, replace=False)
+        await sweep(dut, rng, int(rng.integers(0, 1 << 32)), sum(1 << int(channel) for channel in channels))
+
+
+@cocotb.test()
+async def run_test_advertising(dut):
+    """
+    Test the advertising channel sequence of every advertising channel map.
+    """
+    for advertising_map in range(1, 8):
+        channel_map = advertising_map << 37
+        for index in range(6):
+            expected = select_channel(SAMPLE_ACCESS_ADDRESS, index, channel_map, True)
+            assert await select(dut, SAMPLE_ACCESS_ADDRESS, index, channel_map, 1) == expected
+
+
+def test_channel_selector():
+    setup_test(
+        "test_channel_selector",
+        "channel_selector",
+        [
+            os.path.join(rtl_dir, "channel_selector.sv"),
+        ]
+    )
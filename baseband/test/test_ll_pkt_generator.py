@@ -6,12 +6,15 @@ import os
 
 
 import cocotb
+import numpy as np
+import pytest
 from cocotb.clock import Clock
-from cocotb.triggers import RisingEdge
+from cocotb.triggers import ClockCycles, ReadOnly, RisingEdge
 
 from cocotbext.axi import AxiStreamFrame, AxiStreamBus, AxiStreamSource, AxiStreamSink
 
-from helpers import setup_test, rtl_dir, BleCi, BlePhy, BlePduType
+from ble_model import encrypt_pdu, ll_packet_bits, random_packets, select_channel
+from helpers import setup_test, rtl_dir, is_high, top_parameter, drain_events, tx_descriptor, BleCi, BlePhy, BlePduType, AxiStreamThroughputMonitor, PackedBits
 
 class TB:
     def __init__(self, dut):
@@ -23,7 +26,26 @@ class TB:
         # 1/40Mhz = 25ns
         cocotb.start_soon(Clock(dut.aclk, 25, units="ns").start())
         self.source = AxiStreamSource(AxiStreamBus.from_prefix(dut, "payload"), dut.aclk, dut.aresetn, False)
-        self.sink = AxiStreamSink(AxiStreamBus.from_prefix(dut, "output"), dut.aclk, dut.aresetn, False, byte_lanes=1)
+        # One bit per beat, or C_OUTPUT_WIDTH bit words; the lanes follow output_tkeep
+        self.output_width = len(dut.output_tdata)
+        self.sink = AxiStreamSink(AxiStreamBus.from_prefix(dut, "output"), dut.aclk, dut.aresetn, False)
+        self.descriptor_source = AxiStreamSource(AxiStreamBus.from_prefix(dut, "descriptor"), dut.aclk, dut.aresetn, False)
+
+        dut.counter_address.setimmediatevalue(0)
+        dut.counter_clear.setimmediatevalue(0)
+        dut.event_overflow_clear.setimmediatevalue(0)
+        dut.encryption_enabled.setimmediatevalue(0)
+        dut.session_key.setimmediatevalue(0)
+        dut.iv.setimmediatevalue(0)
+        dut.packet_counter.setimmediatevalue(0)
+        dut.direction.setimmediatevalue(0)
+        dut.channel_selection_enabled.setimmediatevalue(0)
+        dut.event_counter.setimmediatevalue(0)
+        dut.channel_map.setimmediatevalue(0)
+        dut.start_tick.setimmediatevalue(0)
+        dut.start_arm.setimmediatevalue(0)
+        dut.start_disarm.setimmediatevalue(0)
+        dut.event_tready.setimmediatevalue(0)
 
     def set_idle_generator(self, generator=None):
         if generator:
@@ -64,20 +86,183 @@ class TB:
         await RisingEdge(self.dut.aclk)
 
     async def send_receive_and_comapre(self, input_bistream, expected_output_data):
-        test_frame = AxiStreamFrame(input_bistream)
-        await self.source.send(test_frame)
+        # Empty PDU doesn't read the payload stream
+        if len(input_bistream):
+            test_frame = AxiStreamFrame(input_bistream)
+            await self.source.send(test_frame)
 
-        output_data =  bytes(await self.sink.recv())
+        self.check_output(await self.sink.recv(), expected_output_data)
 
-        expected = bytes(expected_output_data)
+    async def clear_counters(self):
+        self.dut.counter_clear.value = 1
+        await RisingEdge(self.dut.aclk)
+        self.dut.counter_clear.value = 0
+        await RisingEdge(self.dut.aclk)
+
+    async def read_counter(self, stage, counter):
+        """Read one performance counter, counter_rdata is registered"""
+        self.dut.counter_address.value = (stage << 3) | counter
+        await RisingEdge(self.dut.aclk)
+        await RisingEdge(self.dut.aclk)
+        return self.dut.counter_rdata.value.integer
 
-        assert len(output_data) == len(expected)
-        assert output_data == bytes(expected_output_data)
+    async def read_stage_counters(self, stage):
+        return {name: await self.read_counter(stage, counter) for counter, name in enumerate(COUNTER_NAMES)}
+
+    def check_output(self, frame, expected_bits):
+        """Compare a sink frame, one bit per beat or packed LSB first, with the expected bits"""
+        expected = expected_bits if isinstance(expected_bits, PackedBits) else PackedBits.from_bits(expected_bits)
+        mismatch = expected.mismatch(frame, packed=self.output_width > 1)
+        assert mismatch is None, f"output differs from bit {mismatch} of {len(expected)}"
+
+    def output_beats(self, n_bits):
+        """Output beats of a packet of n_bits"""
+        return -(-n_bits // self.output_width)
+
+class PacketGapMonitor:
+    """Record the cycles of the first and last output beat of every packet."""
+
+    def __init__(self, dut):
+        self.dut = dut
+        self.packets = []
+        cocotb.start_soon(self._run())
+
+    async def _run(self):
+        cycle = 0
+        first = None
+        while True:
+            await RisingEdge(self.dut.aclk)
+            cycle += 1
+            if is_high(self.dut.output_tvalid) and is_high(self.dut.output_tready):
+                if first is None:
+                    first = cycle
+                if is_high(self.dut.output_tlast):
+                    self.packets.append((first, cycle))
+                    first = None
+
+    def gaps(self):
+        """Idle cycles between the last beat of a packet and the first beat of the next one."""
+        return [b[0] - a[1] - 1 for a, b in zip(self.packets, self.packets[1:])]
+
+
+def random_descriptor_packets(rng, n_packets, max_payload_length):
+    """Random packets over all PHYs: (descriptor, payload, expected output as PackedBits)"""
+    modes = [(BlePhy.BLE_PHY_1M, BleCi.BLE_CI_S8), (BlePhy.BLE_PHY_2M, BleCi.BLE_CI_S8),
+             (BlePhy.BLE_PHY_CODED, BleCi.BLE_CI_S8), (BlePhy.BLE_PHY_CODED, BleCi.BLE_CI_S2)]
+    packets = []
+    for _ in range(n_packets):
+        phy, coding_indicator = modes[rng.integers(len(modes))]
+        params = random_packets(rng, 1, int(rng.integers(0, max_payload_length + 1)))
+        descriptor = tx_descriptor(phy, coding_indicator, params["access_code"][0], params["channel"][0], params["whitening_enabled"][0],
+                                   BlePduType.PDU_TYPE_ADVERTISING, params["crc_init"][0], params["header"][0])
+        expected = ll_packet_bits(phy, **params, coding_indicator=coding_indicator)[0]
+        packets.append((descriptor, params["payload"][0].tobytes(), PackedBits.from_bits(expected)))
+    return packets
+
+
+def encrypted_descriptor_packets(rng, key, iv, packet_counter, n_packets):
+    """
+    Data packets over all PHYs, three in four encrypted, packet i with counter packet_counter + i
+    and direction i % 2: (descriptor, payload, expected output as PackedBits)
+    """
+    modes = [(BlePhy.BLE_PHY_1M, BleCi.BLE_CI_S8), (BlePhy.BLE_PHY_2M, BleCi.BLE_CI_S8),
+             (BlePhy.BLE_PHY_CODED, BleCi.BLE_CI_S2)]
+    packets = []
+    for i in range(n_packets):
+        phy, coding_indicator = modes[i % len(modes)]
+        encryption_enabled = i % 4 != 3
+        params = random_packets(rng, 1, int(rng.integers(0, 60)))
+        descriptor = tx_descriptor(phy, coding_indicator, params["access_code"][0], params["channel"][0],
+                                   params["whitening_enabled"][0], BlePduType.PDU_TYPE_DATA, params["crc_init"][0],
+                                   params["header"][0], encryption_enabled, packet_counter=packet_counter + i,
+                                   direction=i % 2)
+        payload = params["payload"][0].tobytes()
+        if encryption_enabled:
+            params["header"], params["payload"] = encrypt_pdu(key, iv, packet_counter + i, i % 2, params["header"],
+                                                              params["payload"])
+        expected = ll_packet_bits(phy, **params, coding_indicator=coding_indicator)[0]
+        packets.append((descriptor, payload, PackedBits.from_bits(expected)))
+    return packets
+
+
+async def send_descriptor_queue(tb, packets):
+    """Queue every descriptor and payload up front and check the packets in order"""
+    for descriptor, payload, _ in packets:
+        await tb.descriptor_source.send(descriptor)
+        # Empty PDU doesn't read the payload stream
+        if payload:
+            await tb.source.send(payload)
+
+    for _, _, expected in packets:
+        tb.check_output(await tb.sink.recv(), expected)
+
+# Longest idle time between queued packets on the output, in clocks
+MAX_DESCRIPTOR_GAP = 7
+
+# Performance counter stages and counters, the counter_address layout of ll_pkt_generator
+STAGE_PDU_CRC, STAGE_WHITENING, STAGE_ACCESS_CODE, STAGE_FEC, STAGE_PREAMBLE = range(5)
+COUNTER_NAMES = ("active", "stall", "starve", "packets", "bits")
+
+# fsm_tx_state_t in ble_types.svh
+FSM_TX_DONE = 8
+
+PREAMBLE_LENGTH = {BlePhy.BLE_PHY_1M: 8, BlePhy.BLE_PHY_2M: 16, BlePhy.BLE_PHY_CODED: 80}
+
+
+def stage_bits(phy, payload_length, n_output_bits):
+    """Bits every pipeline stage sends for one packet"""
+    pdu_crc = 16 + 8 * payload_length + 24
+    fec = n_output_bits - PREAMBLE_LENGTH[phy]
+    return {
+        STAGE_PDU_CRC: pdu_crc,
+        STAGE_WHITENING: pdu_crc,
+        STAGE_ACCESS_CODE: 32 + pdu_crc,
+        STAGE_FEC: fec,
+        STAGE_PREAMBLE: n_output_bits,
+    }
+
+
+class OutputStallMonitor:
+    """Count the clocks output_tvalid is held while output_tready is low."""
+
+    def __init__(self, dut):
+        self.dut = dut
+        self.stall_cycles = 0
+        cocotb.start_soon(self._run())
+
+    async def _run(self):
+        while True:
+            await RisingEdge(self.dut.aclk)
+            if is_high(self.dut.output_tvalid) and not is_high(self.dut.output_tready):
+                self.stall_cycles += 1
+
+
+async def send_counted_packet(tb, rng, phy, payload_length):
+    """Clear the counters, send one random packet and return the counters of every stage"""
+    params = random_packets(rng, 1, payload_length)
+    expected_output_data = ll_packet_bits(phy, **params)[0]
+
+    await tb.clear_counters()
+    # Queue the payload first, so only a slow source can starve the PDU stage
+    await tb.source.send(params["payload"][0].tobytes())
+    await tb.set_transmitter_parameters(phy, BleCi.BLE_CI_S8, int(params["access_code"][0]), int(params["whitening_enabled"][0]),
+                                        int(params["channel"][0]), BlePduType.PDU_TYPE_ADVERTISING, int(params["crc_init"][0]),
+                                        int(params["header"][0]))
+    tb.check_output(await tb.sink.recv(), expected_output_data)
+
+    counters = {stage: await tb.read_stage_counters(stage) for stage in range(STAGE_PREAMBLE + 1)}
+    for stage, bits in stage_bits(phy, payload_length, len(expected_output_data)).items():
+        tb.log.info("Stage %d: %s", stage, counters[stage])
+        assert counters[stage]["bits"] == bits
+        assert counters[stage]["packets"] == 1
+        c = counters[stage]
+        assert c["active"] == c["bits"] + c["stall"] + c["starve"]
+    return counters
 
 def cycle_pause():
     return itertools.cycle([1, 1, 1, 0])
 
-# TODO: Enable after adding coded phy: @cocotb.test()
+@cocotb.test()
 async def run_test_codec_s8(dut):
     """
     Test function for Coded S8 PHY transmission.
@@ -138,7 +323,7 @@ async def run_test_codec_s8(dut):
     await tb.send_receive_and_comapre(input_data, expected_output_data)
 
 
-# TODO: Enable after adding coded phy: @cocotb.test()
+@cocotb.test()
 async def run_test_codec_s2(dut):
     """
     Test function for Coded S2 PHY transmission.
@@ -266,8 +451,341 @@ async def run_test_2m_phy(dut):
 
     await tb.send_receive_and_comapre(input_data, expected_output_data)
 
+@cocotb.test()
+async def run_test_random_packets(dut):
+    """
+    Test function for random 1M/2M/Coded PHY packets checked against the reference model.
+    """
+    tb = TB(dut)
+    await tb.reset()
+
+    rng = np.random.default_rng(2024)
+
+    for phy, coding_indicator in ((BlePhy.BLE_PHY_1M, None), (BlePhy.BLE_PHY_2M, None),
+                                  (BlePhy.BLE_PHY_CODED, BleCi.BLE_CI_S8), (BlePhy.BLE_PHY_CODED, BleCi.BLE_CI_S2)):
+        for payload_length in rng.integers(0, 40, 8):
+            params = random_packets(rng, 1, int(payload_length))
+            expected_output_data = ll_packet_bits(phy, **params, coding_indicator=coding_indicator or BleCi.BLE_CI_S8)[0]
+
+            await tb.set_transmitter_parameters(phy, coding_indicator, int(params["access_code"][0]), int(params["whitening_enabled"][0]),
+                                                int(params["channel"][0]), BlePduType.PDU_TYPE_ADVERTISING, int(params["crc_init"][0]),
+                                                int(params["header"][0]))
+
+            await tb.send_receive_and_comapre(params["payload"][0].tobytes(), expected_output_data.tobytes())
+
+    # Empty PDU
+    params = random_packets(rng, 1, 0)
+    await tb.set_transmitter_parameters(BlePhy.BLE_PHY_1M, None, int(params["access_code"][0]), 1, 37, BlePduType.PDU_TYPE_ADVERTISING,
+                                        int(params["crc_init"][0]), int(params["header"][0]))
+    await tb.send_receive_and_comapre(b"", ll_packet_bits(BlePhy.BLE_PHY_1M, **{**params, "whitening_enabled": 1, "channel": 37})[0].tobytes())
+
+
+@cocotb.test()
+async def run_test_coded_line_rate(dut):
+    """
+    Test that Coded PHY packets leave at one coded bit per clock.
+    """
+    tb = TB(dut)
+    await tb.reset()
+    monitor = AxiStreamThroughputMonitor(dut, "output", dut.aclk)
+
+    rng = np.random.default_rng(2025)
+    for coding_indicator in (BleCi.BLE_CI_S8, BleCi.BLE_CI_S2):
+        params = random_packets(rng, 1, 255)
+        expected_output_data = ll_packet_bits(BlePhy.BLE_PHY_CODED, **params, coding_indicator=coding_indicator)[0]
+
+        monitor.clear()
+        await tb.set_transmitter_parameters(BlePhy.BLE_PHY_CODED, coding_indicator, int(params["access_code"][0]),
+                                            int(params["whitening_enabled"][0]), int(params["channel"][0]),
+                                            BlePduType.PDU_TYPE_ADVERTISING, int(params["crc_init"][0]), int(params["header"][0]))
+        await tb.send_receive_and_comapre(params["payload"][0].tobytes(), expected_output_data.tobytes())
+
+        assert monitor.beats == tb.output_beats(len(expected_output_data))
+        assert monitor.active_cycles <= len(expected_output_data)
+        assert monitor.stall_cycles == 0
+
+
+@cocotb.test()
+async def run_test_descriptor_queue(dut):
+    """
+    Test hundreds of queued descriptors over all PHYs are sent back-to-back with a bounded gap.
+    """
+    tb = TB(dut)
+    await tb.reset()
+    monitor = PacketGapMonitor(dut)
+
+    packets = random_descriptor_packets(np.random.default_rng(2026), 300, 40)
+    await send_descriptor_queue(tb, packets)
+
+    gaps = monitor.gaps()
+    tb.log.info("Inter-packet gap: min %d, max %d cycles", min(gaps), max(gaps))
+    assert len(gaps) == len(packets) - 1
+    # Restart one clock after the last bit, then the first-bit latency of the pipeline (5-7 clocks);
+    # a packed output adds the clocks to fill the first word
+    word_fill = tb.output_width if tb.output_width > 1 else 0
+    assert max(gaps) <= MAX_DESCRIPTOR_GAP + word_fill
+
+
+@cocotb.test()
+async def run_test_descriptor_queue_stalls(dut):
+    """
+    Test queued descriptors with an idle payload source and output backpressure.
+    """
+    tb = TB(dut)
+    await tb.reset()
+    tb.set_idle_generator(cycle_pause)
+    tb.set_backpressure_generator(cycle_pause)
+
+    await send_descriptor_queue(tb, random_descriptor_packets(np.random.default_rng(2027), 100, 20))
+
+
+@cocotb.test()
+async def run_test_task_start_after_descriptors(dut):
+    """
+    Test task_start with the parameter inputs still works after descriptor packets.
+    """
+    tb = TB(dut)
+    await tb.reset()
+
+    rng = np.random.default_rng(2028)
+    await send_descriptor_queue(tb, random_descriptor_packets(rng, 4, 10))
+
+    params = random_packets(rng, 1, 10)
+    await tb.set_transmitter_parameters(BlePhy.BLE_PHY_2M, None, int(params["access_code"][0]), int(params["whitening_enabled"][0]),
+                                        int(params["channel"][0]), BlePduType.PDU_TYPE_ADVERTISING, int(params["crc_init"][0]),
+                                        int(params["header"][0]))
+    await tb.send_receive_and_comapre(params["payload"][0].tobytes(), ll_packet_bits(BlePhy.BLE_PHY_2M, **params)[0].tobytes())
+
+
+@cocotb.test(skip=not top_parameter("C_ENCRYPTION"))
+async def run_test_encrypted_descriptor_queue(dut):
+    """
+    Test queued packets over all PHYs with and without AES-CCM encryption against the model.
+
+    Every descriptor carries its own packet counter and direction, the ports
+    hold a different counter that must not be used.
+    """
+    tb = TB(dut)
+    await tb.reset()
+
+    rng = np.random.default_rng(2020)
+    key = rng.integers(0, 0x100, 16, dtype=np.uint8)
+    iv = rng.integers(0, 0x100, 8, dtype=np.uint8)
+    packet_counter = int(rng.integers(0, (1 << 39) - 24))
+    dut.session_key.value = int.from_bytes(key.tobytes(), "big")
+    dut.iv.value = int.from_bytes(iv.tobytes(), "little")
+    dut.packet_counter.value = packet_counter ^ 0x55
+    dut.direction.value = 0
+
+    await send_descriptor_queue(tb, encrypted_descriptor_packets(rng, key, iv, packet_counter, 24))
+
+
+@cocotb.test()
+async def run_test_channel_selection(dut):
+    """
+    Test queued data and advertising packets on the channels selected in hardware against the model.
+
+    Every descriptor carries the event counter and channel map of its event,
+    the ports hold values that must not be used.
+    """
+    tb = TB(dut)
+    await tb.reset()
+    dut.event_counter.value = 0x5555
+    dut.channel_map.value = 0x55_5555_5555
+
+    rng = np.random.default_rng(2121)
+    pdu_types = [BlePduType.PDU_TYPE_DATA, BlePduType.PDU_TYPE_ADVERTISING]
+    first_event = int(rng.integers(0, (1 << 16) - 16))
+    packets = []
+    for i in range(16):
+        pdu_type = pdu_types[i % 2]
+        event_counter = first_event + i
+        channel_map = int(rng.integers(1, 1 << 40)) | (1 << 37)
+        params = random_packets(rng, 1, int(rng.integers(0, 20)))
+        params["whitening_enabled"][:] = 1
+        # The channel field of the descriptor is ignored
+        descriptor = tx_descriptor(BlePhy.BLE_PHY_1M, BleCi.BLE_CI_S8, params["access_code"][0], params["channel"][0],
+                                   1, pdu_type, params["crc_init"][0], params["header"][0],
+                                   channel_selection_enabled=1, event_counter=event_counter, channel_map=channel_map)
+        params["channel"] = select_channel(params["access_code"], event_counter, channel_map,
+                                           pdu_type == BlePduType.PDU_TYPE_ADVERTISING)
+        expected = ll_packet_bits(BlePhy.BLE_PHY_1M, **params, coding_indicator=BleCi.BLE_CI_S8)[0]
+        packets.append((descriptor, params["payload"][0].tobytes(), PackedBits.from_bits(expected)))
+
+    await send_descriptor_queue(tb, packets)
+
+
+class EventMonitor:
+    """Timestamps of the first output beats and of the event_payload and event_end pulses"""
+
+    def __init__(self, dut):
+        self.dut = dut
+        self.output_starts = []
+        self.events = []
+        cocotb.start_soon(self._run())
+
+    async def _run(self):
+        in_packet = False
+        while True:
+            await RisingEdge(self.dut.aclk)
+            await ReadOnly()
+            timestamp = self.dut.timestamp.value.integer
+            events = int(self.dut.event_end.value) << 1 | int(self.dut.event_payload.value)
+            if events:
+                self.events.append((events, timestamp))
+            if is_high(self.dut.output_tvalid) and not in_packet:
+                self.output_starts.append(timestamp)
+            if is_high(self.dut.output_tvalid) and is_high(self.dut.output_tready):
+                in_packet = not is_high(self.dut.output_tlast)
+
+
+@cocotb.test()
+async def run_test_timed_start(dut):
+    """
+    Test packets started by the timebase compare leave a fixed number of clocks after the programmed tick,
+    with their event timestamps in the event FIFO.
+    """
+    tb = TB(dut)
+    await tb.reset()
+    monitor = EventMonitor(dut)
+
+    rng = np.random.default_rng(2222)
+    ticks = []
+    for delay in [5, 40, 333, 1000]:
+        params = random_packets(rng, 1, 12)
+        params["whitening_enabled"][:] = 1
+        dut.phy_type.value = BlePhy.BLE_PHY_1M.value
+        dut.access_code.value = int(params["access_code"][0])
+        dut.whitening_enabled.value = int(params["whitening_enabled"][0])
+        dut.channel.value = int(params["channel"][0])
+        dut.pdu_type.value = BlePduType.PDU_TYPE_ADVERTISING.value
+        dut.crc_init.value = int(params["crc_init"][0])
+        dut.packet_hdr.value = int(params["header"][0])
+
+        await ReadOnly()
+        tick = dut.timestamp.value.integer + delay
+        await RisingEdge(dut.aclk)
+        dut.start_tick.value = tick
+        dut.start_arm.value = 1
+        await RisingEdge(dut.aclk)
+        dut.start_arm.value = 0
+        ticks.append(tick)
+
+        await tb.send_receive_and_comapre(params["payload"][0].tobytes(), ll_packet_bits(BlePhy.BLE_PHY_1M, **params)[0].tobytes())
+        await ReadOnly()
+        assert not is_high(dut.start_armed)
+        await RisingEdge(dut.aclk)
+
+    # Same PHY and length, the same latency from the tick to the air and to the events
+    assert len({start - tick for start, tick in zip(monitor.output_starts, ticks)}) == 1
+    records = await drain_events(dut)
+    assert records == monitor.events
+    assert [events for events, _ in records] == [1, 2] * len(ticks)
+    assert len({timestamp - tick for (_, timestamp), tick in zip(records[1::2], ticks)}) == 1
+
+
+@cocotb.test()
+async def run_test_event_overflow(dut):
+    """
+    Test event_overflow is cleared by event_overflow_clear only, not by counter_clear.
+    """
+    tb = TB(dut)
+    await tb.reset()
+
+    # Two events per packet, one packet more than the event FIFO holds
+    event_fifo_depth = 1 << (len(dut.event_level) - 1)
+    n_packets = event_fifo_depth // 2 + 1
+    await send_descriptor_queue(tb, random_descriptor_packets(np.random.default_rng(2030), n_packets, 4))
+    await ClockCycles(dut.aclk, 4)
+    assert await tb.read_counter(STAGE_PREAMBLE, 3) == n_packets
+    assert is_high(dut.event_overflow)
+
+    await tb.clear_counters()
+    assert await tb.read_counter(STAGE_PREAMBLE, 3) == 0
+    assert is_high(dut.event_overflow)
+
+    dut.event_overflow_clear.value = 1
+    await RisingEdge(dut.aclk)
+    dut.event_overflow_clear.value = 0
+    await ReadOnly()
+    assert not is_high(dut.event_overflow)
+    await RisingEdge(dut.aclk)
+    assert len(await drain_events(dut)) == event_fifo_depth
+
+
+@cocotb.test()
+async def run_test_perf_counters(dut):
+    """
+    Test the per-stage counters of packets sent without idle cycles or backpressure.
+    """
+    tb = TB(dut)
+    await tb.reset()
+
+    rng = np.random.default_rng(2029)
+    for phy in (BlePhy.BLE_PHY_1M, BlePhy.BLE_PHY_2M, BlePhy.BLE_PHY_CODED):
+        counters = await send_counted_packet(tb, rng, phy, 20)
+
+        # The output is never stalled; upstream stages only wait while the stages after them
+        # insert bits (preamble, access code, FEC)
+        assert counters[STAGE_PREAMBLE]["stall"] == 0
+        for stage in counters.values():
+            assert stage["stall"] <= counters[STAGE_PREAMBLE]["active"] - stage["bits"]
+        # The payload is already queued, the PDU stage never waits on it
+        assert counters[STAGE_PDU_CRC]["starve"] == 0
+        assert int(dut.fsm_state.value) == FSM_TX_DONE
+
+    # Counters hold their values until cleared and read 0 outside the map
+    assert await tb.read_counter(STAGE_PREAMBLE, 4) == counters[STAGE_PREAMBLE]["bits"]
+    assert await tb.read_counter(STAGE_PREAMBLE, 5) == 0
+    assert await tb.read_counter(5, 0) == 0
+    await tb.clear_counters()
+    assert await tb.read_stage_counters(STAGE_PREAMBLE) == dict.fromkeys(COUNTER_NAMES, 0)
+
+
+@cocotb.test()
+async def run_test_perf_counters_backpressure(dut):
+    """
+    Test the stall counters follow the cycle_pause backpressure on the output.
+    """
+    tb = TB(dut)
+    await tb.reset()
+    tb.set_backpressure_generator(cycle_pause)
+    monitor = OutputStallMonitor(dut)
+
+    rng = np.random.default_rng(2030)
+    for phy in (BlePhy.BLE_PHY_1M, BlePhy.BLE_PHY_CODED):
+        monitor.stall_cycles = 0
+        counters = await send_counted_packet(tb, rng, phy, 20)
+        output_stage = counters[STAGE_PREAMBLE]
+
+        if tb.output_width == 1:
+            # The sink takes one beat in four
+            assert output_stage["stall"] == monitor.stall_cycles
+            assert 3 * output_stage["bits"] - 3 <= output_stage["stall"] <= 3 * output_stage["bits"]
+        # Backpressure reaches the PDU stage
+        assert counters[STAGE_PDU_CRC]["stall"] > 0
+
+
+@cocotb.test()
+async def run_test_perf_counters_starved(dut):
+    """
+    Test the PDU stage counts the clocks it waits on a slow payload source.
+    """
+    tb = TB(dut)
+    await tb.reset()
+    # One 32-bit payload word every 64 clocks, the PDU stage sends a word in 32
+    tb.source.set_pause_generator(itertools.cycle([1] * 63 + [0]))
+
+    payload_words = 5
+    counters = await send_counted_packet(tb, np.random.default_rng(2031), BlePhy.BLE_PHY_1M, 4 * payload_words)
+
+    assert counters[STAGE_PDU_CRC]["starve"] >= 16 * (payload_words - 1)
+    assert counters[STAGE_PREAMBLE]["stall"] == 0
+
 
-def test_ll_pkt_generator():
+@pytest.mark.parametrize("output_width, word_whitening, encryption",
+                         [(1, 0, 0), (8, 0, 0), (16, 0, 0), (32, 0, 0), (1, 1, 0), (32, 1, 1)])
+def test_ll_pkt_generator(output_width, word_whitening, encryption):
     setup_test(
         "test_ll_pkt_generator",
         "ll_pkt_generator",
@@ -278,8 +796,17 @@ def test_ll_pkt_generator():
             os.path.join(rtl_dir, "tx/access_code_generator.sv"),
             os.path.join(rtl_dir, "tx/fec_encoder.sv"),
 
-            os.path.join(rtl_dir, "serial_crc24.sv"),
+            os.path.join(rtl_dir, "parallel_crc24.sv"),
             os.path.join(rtl_dir, "serializer.sv"),
             os.path.join(rtl_dir, "whitening.sv"),
-        ]
+            os.path.join(rtl_dir, "channel_selector.sv"),
+            os.path.join(rtl_dir, "timebase.sv"),
+            os.path.join(rtl_dir, "axis_skid_buffer.sv"),
+            os.path.join(rtl_dir, "axis_fifo.sv"),
+            os.path.join(rtl_dir, "deserializer.sv"),
+            os.path.join(rtl_dir, "axis_perf_counter.sv"),
+            os.path.join(rtl_dir, "tx/ccm_encryptor.sv"),
+            os.path.join(rtl_dir, "aes128.sv"),
+        ],
+        parameters={"C_OUTPUT_WIDTH": output_width, "C_WORD_WHITENING": word_whitening, "C_ENCRYPTION": encryption}
     )
@@ -0,0 +1,281 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+"""Constrained-random regression of ll_pkt_generator against the reference model.
+
+Every shard is one simulation with its own seed; the shards run in a process
+pool, so a long regression scales with the cores of the machine:
+
+    REGRESSION_SEED=1000 REGRESSION_SHARDS=64 REGRESSION_PACKETS=20000 \\
+        pytest -s baseband/test/test_ll_pkt_generator_regression.py --sim=verilator
+
+    REGRESSION_SEED       seed of the first shard, shard i uses REGRESSION_SEED + i (default 0)
+    REGRESSION_SHARDS     number of shards (default 2)
+    REGRESSION_PACKETS    packets per shard (default 50)
+    REGRESSION_PROCESSES  simulations running at the same time (default: all cores)
+
+A failing shard is reproduced by running it alone with its seed and
+REGRESSION_SHARDS=1.
+"""
+
+import logging
+import multiprocessing
+import os
+
+import cocotb
+import numpy as np
+import pytest
+from cocotb.clock import Clock
+from cocotb.queue import Queue
+from cocotb.result import SimTimeoutError
+from cocotb.triggers import Event, RisingEdge, with_timeout
+
+from cocotbext.axi import AxiStreamBus, AxiStreamSource, AxiStreamSink
+
+from ble_model import ll_packet_bits
+from helpers import build_test, setup_test, rtl_dir, is_high, tx_descriptor, test_profiles, BleCi, BlePhy, BlePduType, PackedBits
+
+MODES = [(BlePhy.BLE_PHY_1M, BleCi.BLE_CI_S8), (BlePhy.BLE_PHY_2M, BleCi.BLE_CI_S8),
+         (BlePhy.BLE_PHY_CODED, BleCi.BLE_CI_S8), (BlePhy.BLE_PHY_CODED, BleCi.BLE_CI_S2)]
+
+# Packets generated ahead of the one on the output
+PACKETS_IN_FLIGHT = 8
+
+CLOCK_PERIOD_NS = 25
+# A Coded S=8 packet with 255 payload bytes is about 17k bits, more than twice that
+# at the highest backpressure; no packet for this long means the DUT hangs
+PACKET_TIMEOUT_CYCLES = 100_000
+
+
+def random_packet(rng):
+    """
+    Draw one packet: PHY and coding, channel 0-39, payload length 0-255, CRC preset,
+    access address and whitening on or off.
+
+    Returns:
+        tuple: Descriptor, payload bytes and expected output (PackedBits).
+    """
+    phy, coding_indicator = MODES[rng.integers(len(MODES))]
+    payload_length = int(rng.integers(0, 256))
+    access_code = int(rng.integers(0, 1 << 32))
+    channel = int(rng.integers(0, 40))
+    whitening_enabled = int(rng.integers(0, 2))
+    crc_init = int(rng.integers(0, 1 << 24))
+    header = int(rng.integers(0, 0x100)) | (payload_length << 8)
+    payload = rng.integers(0, 0x100, payload_length, dtype=np.uint8)
+
+    descriptor = tx_descriptor(phy, coding_indicator, access_code, channel, whitening_enabled, BlePduType.PDU_TYPE_ADVERTISING,
+                               crc_init, header)
+    expected = ll_packet_bits(phy, access_code, channel, whitening_enabled, crc_init, header, payload[None, :],
+                              coding_indicator)[0]
+    return descriptor, payload.tobytes(), PackedBits.from_bits(expected)
+
+
+def random_pause(rng, probability):
+    """Pause generator, every clock is paused with the given probability"""
+    while True:
+        yield from rng.random(1024) < probability
+
+
+class StreamingScoreboard:  # pylint: disable=too-many-instance-attributes
+    """
+    Check the output of ll_pkt_generator beat by beat against expected packets.
+
+    Beats are compared on the clock the sink accepts them, so a mismatch is
+    reported with its packet and bit position as soon as it leaves the DUT,
+    and only the packets in flight are held in memory, packed. The frames the sink
+    assembles are dropped after every packet. Besides tdata and tlast, tkeep must
+    flag every lane of a beat but the unused bytes of the last word.
+
+    Args:
+        dut: Handle of the top-level module.
+        sink (AxiStreamSink): Sink driving output_tready.
+    """
+
+    def __init__(self, dut, sink):
+        self.dut = dut
+        self.sink = sink
+        self.width = len(dut.output_tdata)
+        self.lanes = len(dut.output_tkeep)
+        self.expected = Queue(maxsize=PACKETS_IN_FLIGHT)
+
+        self.packets = 0
+        self.bits = 0
+        self.error = None
+        self.done = Event()
+        self.progress = Event()
+        self.expected_packets = None
+
+        cocotb.start_soon(self._run())
+
+    def _fail(self, message):
+        self.error = f"packet {self.packets}: {message}"
+        self.done.set()
+        self.progress.set()
+
+    async def _run(self):
+        words = None
+        n_bits = 0
+        beat = 0
+        while True:
+            await RisingEdge(self.dut.aclk)
+            if not (is_high(self.dut.output_tvalid) and is_high(self.dut.output_tready)):
+                continue
+
+            if words is None:
+                if self.expected.empty():
+                    self._fail("unexpected output beat")
+                    return
+                expected = self.expected.get_nowait()
+                n_bits = len(expected)
+                words = expected.bits() if self.width == 1 else expected.words(self.width)
+                beat = 0
+
+            data = self.dut.output_tdata.value.integer
+            if data != int(words[beat]):
+                self._fail(f"beat {beat} (bit {beat * self.width}) is {data:#x}, expected {int(words[beat]):#x}")
+                return
+
+            last = beat == len(words) - 1
+            if is_high(self.dut.output_tlast) != last:
+                self._fail(f"tlast on beat {beat} of {len(words)}")
+                return
+
+            lanes = -(-(n_bits - beat * self.width) // 8) if last and self.width > 1 else self.lanes
+            keep = self.dut.output_tkeep.value.integer
+            if keep != (1 << lanes) - 1:
+                self._fail(f"tkeep on beat {beat} of {len(words)} is {keep:#x}, expected {(1 << lanes) - 1:#x}")
+                return
+
+            beat += 1
+            if last:
+                words = None
+                self.packets += 1
+                self.bits += n_bits
+                self.sink.clear()
+                self.progress.set()
+                if self.packets == self.expected_packets:
+                    self.done.set()
+
+
+@cocotb.test()
+async def run_random_regression(dut):
+    """
+    Stream random packets through the descriptor queue with random idle and backpressure.
+    """
+    seed = int(os.getenv("REGRESSION_SEED", "0"))
+    n_packets = int(os.getenv("REGRESSION_PACKETS", "50"))
+    rng = np.random.default_rng(seed)
+    log = logging.getLogger("cocotb.tb")
+
+    cocotb.start_soon(Clock(dut.aclk, CLOCK_PERIOD_NS, units="ns").start())
+    source = AxiStreamSource(AxiStreamBus.from_prefix(dut, "payload"), dut.aclk, dut.aresetn, False)
+    descriptor_source = AxiStreamSource(AxiStreamBus.from_prefix(dut, "descriptor"), dut.aclk, dut.aresetn, False)
+    sink = AxiStreamSink(AxiStreamBus.from_prefix(dut, "output"), dut.aclk, dut.aresetn, False)
+    scoreboard = StreamingScoreboard(dut, sink)
+    scoreboard.expected_packets = n_packets
+
+    # Every shard draws its own idle and backpressure rates, half of them run at full speed
+    idle, backpressure = rng.choice([0.0, 0.0, 0.25, 0.5], 2)
+    source.set_pause_generator(random_pause(rng, idle))
+    sink.set_pause_generator(random_pause(rng, backpressure))
+    log.info("Seed %d: %d packets, idle %.2f, backpressure %.2f", seed, n_packets, idle, backpressure)
+
+    dut.task_start.value = 0
+    dut.counter_address.value = 0
+    dut.counter_clear.value = 0
+    dut.event_overflow_clear.value = 0
+    dut.encryption_enabled.value = 0
+    dut.channel_selection_enabled.value = 0
+    dut.start_tick.value = 0
+    dut.start_arm.value = 0
+    dut.start_disarm.value = 0
+    dut.event_tready.value = 0
+    dut.aresetn.value = 0
+    for _ in range(4):
+        await RisingEdge(dut.aclk)
+    dut.aresetn.value = 1
+    await RisingEdge(dut.aclk)
+
+    async def produce():
+        for _ in range(n_packets):
+            descriptor, payload, expected = random_packet(rng)
+            # Blocks while PACKETS_IN_FLIGHT packets wait for the output
+            await scoreboard.expected.put(expected)
+            await descriptor_source.send(descriptor)
+            # Empty PDU doesn't read the payload stream
+            if payload:
+                await source.send(payload)
+
+    cocotb.start_soon(produce())
+    while not scoreboard.done.is_set():
+        scoreboard.progress.clear()
+        try:
+            await with_timeout(scoreboard.progress.wait(), PACKET_TIMEOUT_CYCLES * CLOCK_PERIOD_NS, "ns")
+        except SimTimeoutError:
+            raise AssertionError(f"seed {seed}, packet {scoreboard.packets}: "
+                                 f"no packet for {PACKET_TIMEOUT_CYCLES} clocks") from None
+
+    assert scoreboard.error is None, f"seed {seed}, {scoreboard.error}"
+    log.info("Seed %d: %d packets, %d bits match the model", seed, scoreboard.packets, scoreboard.bits)
+
+
+VERILOG_SOURCES = [
+    os.path.join(rtl_dir, "tx/ll_pkt_generator.sv"),
+    os.path.join(rtl_dir, "tx/pdu_crc_generator.sv"),
+    os.path.join(rtl_dir, "tx/preamble_generator.sv"),
+    os.path.join(rtl_dir, "tx/access_code_generator.sv"),
+    os.path.join(rtl_dir, "tx/fec_encoder.sv"),
+
+    os.path.join(rtl_dir, "parallel_crc24.sv"),
+    os.path.join(rtl_dir, "serializer.sv"),
+    os.path.join(rtl_dir, "whitening.sv"),
+    os.path.join(rtl_dir, "channel_selector.sv"),
+    os.path.join(rtl_dir, "timebase.sv"),
+    os.path.join(rtl_dir, "axis_skid_buffer.sv"),
+    os.path.join(rtl_dir, "axis_fifo.sv"),
+    os.path.join(rtl_dir, "deserializer.sv"),
+    os.path.join(rtl_dir, "axis_perf_counter.sv"),
+    os.path.join(rtl_dir, "tx/ccm_encryptor.sv"),
+    os.path.join(rtl_dir, "aes128.sv"),
+]
+
+
+def run_shard(shard):
+    """Simulate one shard, return the failure (None if it passed) and the profile of the simulation"""
+    seed, n_packets, parameters = shard
+    failure = None
+    try:
+        setup_test("test_ll_pkt_generator_regression", "ll_pkt_generator", VERILOG_SOURCES, parameters,
+                   extra_env={"REGRESSION_SEED": str(seed), "REGRESSION_PACKETS": str(n_packets)})
+    except SystemExit as e:
+        failure = f"seed {seed}: {e}"
+    return failure, test_profiles.pop()
+
+
+@pytest.mark.parametrize("output_width, word_whitening", [(1, 0), (32, 1)])
+def test_ll_pkt_generator_regression(output_width, word_whitening):
+    seed = int(os.getenv("REGRESSION_SEED", "0"))
+    n_shards = int(os.getenv("REGRESSION_SHARDS", "2"))
+    n_packets = int(os.getenv("REGRESSION_PACKETS", "50"))
+    processes = int(os.getenv("REGRESSION_PROCESSES", "0")) or os.cpu_count()
+    parameters = {"C_OUTPUT_WIDTH": output_width, "C_WORD_WHITENING": word_whitening}
+
+    # Build once, the shards share the simulation
+    build_test("test_ll_pkt_generator_regression", "ll_pkt_generator", VERILOG_SOURCES, parameters)
+
+    shards = [(seed + i, n_packets, parameters) for i in range(n_shards)]
+    failures = []
+    with multiprocessing.Pool(min(processes, n_shards)) as pool:
+        try:
+            # The shards are profiled in the workers, report them with this test
+            for failure, profile in pool.imap_unordered(run_shard, shards):
+                test_profiles.append(profile)
+                if failure:
+                    failures.append(failure)
+        finally:
+            # Let the workers exit on their own before the with block terminates the pool,
+            # cocotb-test turns SIGTERM from terminate() into an error
+            pool.close()
+            pool.join()
+
+    assert not failures, "Failed shards:\n" + "\n".join(sorted(failures))
@@ -0,0 +1,115 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+"""ll_pkt_generator scenario table, every scenario in one simulation.
+
+The testbench is built once and only a soft reset runs between scenarios, so
+the simulator start-up and the compile are shared by the whole table. Every
+scenario is reported on its own:
+
+    pytest --log-cli-level=INFO baseband/test/test_ll_pkt_generator_scenarios.py --sim=verilator
+"""
+
+import functools
+import itertools
+import os
+
+import cocotb
+import numpy as np
+
+from ble_model import ll_packet_bits, random_packets
+from helpers import run_scenario_test, rtl_dir, BleCi, BlePhy, BlePduType, ScenarioRunner
+from test_ll_pkt_generator import TB, cycle_pause
+
+MODES = [(BlePhy.BLE_PHY_1M, BleCi.BLE_CI_S8), (BlePhy.BLE_PHY_2M, BleCi.BLE_CI_S8),
+         (BlePhy.BLE_PHY_CODED, BleCi.BLE_CI_S8), (BlePhy.BLE_PHY_CODED, BleCi.BLE_CI_S2)]
+PAYLOAD_LENGTHS = [0, 1, 3, 4, 5, 37, 255]
+
+SCENARIOS = [
+    {"phy": phy, "coding_indicator": coding_indicator, "payload_length": payload_length, "whitening_enabled": whitening_enabled,
+     "backpressure": backpressure}
+    for (phy, coding_indicator), payload_length, whitening_enabled, backpressure
+    in itertools.product(MODES, PAYLOAD_LENGTHS, [0, 1], [False, True])
+]
+
+
+async def soft_reset(tb):
+    """Drop the pause patterns and pending frames of the last scenario and reset the DUT"""
+    for driver in (tb.source, tb.descriptor_source, tb.sink):
+        driver.clear_pause_generator()
+        driver.pause = False
+    # A scenario that timed out may have left payload or descriptors queued
+    tb.source.clear()
+    tb.descriptor_source.clear()
+    await tb.reset()
+    tb.sink.clear()
+
+
+async def run_scenario(tb, rng, phy, coding_indicator, payload_length, whitening_enabled, backpressure):
+    if backpressure:
+        tb.set_backpressure_generator(cycle_pause)
+
+    params = random_packets(rng, 1, payload_length)
+    params["whitening_enabled"][:] = whitening_enabled
+    expected_output_data = ll_packet_bits(phy, **params, coding_indicator=coding_indicator)[0]
+
+    await tb.set_transmitter_parameters(phy, coding_indicator, int(params["access_code"][0]), whitening_enabled,
+                                        int(params["channel"][0]), BlePduType.PDU_TYPE_ADVERTISING,
+                                        int(params["crc_init"][0]), int(params["header"][0]))
+    await tb.send_receive_and_comapre(params["payload"][0].tobytes(), expected_output_data)
+
+
+@cocotb.test()
+async def run_scenarios(dut):
+    """
+    Send one packet per scenario: every PHY, payload lengths 0-255, whitening on/off, with and without backpressure.
+    """
+    tb = TB(dut)
+    rng = np.random.default_rng(19)
+
+    # Coded S8 with 255 bytes and backpressure takes about 2 ms
+    await ScenarioRunner(lambda: soft_reset(tb), tb.log, timeout_ns=10_000_000).run(
+        SCENARIOS, functools.partial(run_scenario, tb, rng))
+
+
+@cocotb.test()
+async def run_test_soft_reset(dut):
+    """
+    Test the soft reset drops the payload of a scenario that never finished.
+    """
+    tb = TB(dut)
+    rng = np.random.default_rng(1919)
+    await soft_reset(tb)
+
+    # Payload without a descriptor, as left behind by a scenario that timed out
+    tb.source.send_nowait(bytes(range(37)))
+    await soft_reset(tb)
+    assert tb.source.empty()
+
+    await run_scenario(tb, rng, BlePhy.BLE_PHY_1M, BleCi.BLE_CI_S8, 37, 1, False)
+
+
+def test_ll_pkt_generator_scenarios():
+    results = run_scenario_test(
+        "test_ll_pkt_generator_scenarios",
+        "ll_pkt_generator",
+        [
+            os.path.join(rtl_dir, "tx/ll_pkt_generator.sv"),
+            os.path.join(rtl_dir, "tx/pdu_crc_generator.sv"),
+            os.path.join(rtl_dir, "tx/preamble_generator.sv"),
+            os.path.join(rtl_dir, "tx/access_code_generator.sv"),
+            os.path.join(rtl_dir, "tx/fec_encoder.sv"),
+
+            os.path.join(rtl_dir, "parallel_crc24.sv"),
+            os.path.join(rtl_dir, "serializer.sv"),
+            os.path.join(rtl_dir, "whitening.sv"),
+            os.path.join(rtl_dir, "channel_selector.sv"),
+            os.path.join(rtl_dir, "timebase.sv"),
+            os.path.join(rtl_dir, "axis_skid_buffer.sv"),
+            os.path.join(rtl_dir, "axis_fifo.sv"),
+            os.path.join(rtl_dir, "deserializer.sv"),
+            os.path.join(rtl_dir, "axis_perf_counter.sv"),
+            os.path.join(rtl_dir, "tx/ccm_encryptor.sv"),
+            os.path.join(rtl_dir, "aes128.sv"),
+        ]
+    )
+    assert len(results) == len(SCENARIOS)
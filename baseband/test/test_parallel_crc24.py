@@ -0,0 +1,96 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+import logging
+import os
+import random
+
+import cocotb
+import pytest
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge
+
+from cocotbext.axi import AxiStreamFrame, AxiStreamBus, AxiStreamSource
+
+from ble_model import crc24_bytes
+from helpers import setup_test, rtl_dir, tb_rtl_dir
+
+class TB:
+    def __init__(self, dut):
+        self.dut = dut
+
+        self.log = logging.getLogger("cocotb.tb")
+        self.log.setLevel(logging.DEBUG)
+        cocotb.start_soon(Clock(dut.aclk, 2, units="ns").start())
+        self.source = AxiStreamSource(AxiStreamBus.from_prefix(dut, "input"), dut.aclk, dut.aresetn, False)
+
+    async def reset(self):
+        self.dut.aresetn.setimmediatevalue(0)
+        await RisingEdge(self.dut.aclk)
+        await RisingEdge(self.dut.aclk)
+        self.dut.aresetn.value = 0
+        await RisingEdge(self.dut.aclk)
+        await RisingEdge(self.dut.aclk)
+        self.dut.aresetn.value = 1
+        await RisingEdge(self.dut.aclk)
+        await RisingEdge(self.dut.aclk)
+
+    async def restart(self, init_preset):
+        self.dut.init_preset.value = init_preset
+        self.dut.restart.value = 1
+        await RisingEdge(self.dut.aclk)
+        self.dut.restart.value = 0
+        await RisingEdge(self.dut.aclk)
+
+    async def calculate(self, data):
+        await self.source.send(AxiStreamFrame(data))
+        await self.source.wait()
+
+        # Let the serializer drain the last word into serial_crc24
+        await RisingEdge(self.dut.aclk)
+        while self.dut.serial_busy.value:
+            await RisingEdge(self.dut.aclk)
+        await RisingEdge(self.dut.aclk)
+
+        return int(self.dut.serial_crc_out.value), int(self.dut.parallel_crc_out.value)
+
+@cocotb.test()
+async def run_test_reference_pdu(dut):
+    tb = TB(dut)
+    await tb.reset()
+
+    # PDU: 00 03 42 4C 45, CRC: 29 0A CE
+    await tb.restart(0x555555)
+    serial_crc, parallel_crc = await tb.calculate([0x00, 0x03, 0x42, 0x4C, 0x45])
+
+    assert serial_crc == parallel_crc == 0x945073
+
+@cocotb.test()
+async def run_test_random(dut):
+    tb = TB(dut)
+    await tb.reset()
+
+    rng = random.Random(int(os.getenv("RANDOM_SEED", "0")))
+
+    for _ in range(64):
+        init_preset = rng.getrandbits(24)
+        data = [rng.getrandbits(8) for _ in range(rng.randint(1, 257))]
+
+        await tb.restart(init_preset)
+        serial_crc, parallel_crc = await tb.calculate(data)
+
+        assert serial_crc == parallel_crc
+        assert parallel_crc == int(crc24_bytes([data], init_preset)[0])
+
+@pytest.mark.parametrize("data_width", [8, 16, 32])
+def test_parallel_crc24(data_width):
+    setup_test(
+        "test_parallel_crc24",
+        "crc24_equivalence_tb",
+        [
+            os.path.join(tb_rtl_dir, "crc24_equivalence_tb.sv"),
+            os.path.join(rtl_dir, "parallel_crc24.sv"),
+            os.path.join(rtl_dir, "serial_crc24.sv"),
+            os.path.join(rtl_dir, "serializer.sv"),
+        ],
+        parameters={"C_DATA_WIDTH": data_width}
+    )
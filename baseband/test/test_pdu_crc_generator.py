@@ -4,12 +4,15 @@ import logging
 import os
 
 import cocotb
+import numpy as np
+import pytest
 from cocotb.clock import Clock
-from cocotb.triggers import RisingEdge
+from cocotb.triggers import ReadOnly, RisingEdge
 
 from cocotbext.axi import AxiStreamFrame, AxiStreamBus, AxiStreamSource, AxiStreamSink
 
-from helpers import setup_test, rtl_dir
+from ble_model import encrypt_pdu, pdu_crc_bits, random_packets, whiten
+from helpers import setup_test, rtl_dir, is_high, top_parameter, AxiStreamThroughputMonitor
 
 class TB:
     def __init__(self, dut):
@@ -21,6 +24,14 @@ class TB:
         self.source = AxiStreamSource(AxiStreamBus.from_prefix(dut, "payload"), dut.aclk, dut.aresetn, False)
         self.sink = AxiStreamSink(AxiStreamBus.from_prefix(dut, "output"), dut.aclk, dut.aresetn, False, byte_lanes=1)
 
+        dut.whitening_enabled.setimmediatevalue(0)
+        dut.channel.setimmediatevalue(0)
+        dut.encryption_enabled.setimmediatevalue(0)
+        dut.session_key.setimmediatevalue(0)
+        dut.iv.setimmediatevalue(0)
+        dut.packet_counter.setimmediatevalue(0)
+        dut.direction.setimmediatevalue(0)
+
 
     async def reset(self):
         self.dut.aresetn.setimmediatevalue(0)
@@ -76,13 +87,164 @@ async def run_test(dut):
     assert len(output_data) == len(expected)
     assert output_data == bytes(expected_output_data)
 
-def test_serial_crc24():
+@cocotb.test()
+async def run_test_no_dead_cycles(dut):
+    """
+    Test the header is on the output the clock after restart and header, payload and CRC follow without gaps.
+    """
+    tb = TB(dut)
+    await tb.reset()
+    monitor = AxiStreamThroughputMonitor(dut, "output", dut.aclk)
+
+    rng = np.random.default_rng(13)
+    for payload_length in [0, 1, 2, 3, 4, 5, 8, 37, 255]:
+        params = random_packets(rng, 1, payload_length)
+        dut.crc_init.value = int(params["crc_init"][0])
+        dut.packet_hdr.value = int(params["header"][0])
+        # Queue the payload before the restart, so nothing waits for the testbench
+        if payload_length:
+            tb.source.send_nowait(params["payload"][0].tobytes())
+
+        monitor.clear()
+        dut.restart.value = 1
+        await RisingEdge(dut.aclk)
+        dut.restart.value = 0
+        await ReadOnly()
+        assert is_high(dut.output_tvalid)
+
+        expected = pdu_crc_bits(params["crc_init"], params["header"], params["payload"])[0]
+        assert bytes(await tb.sink.recv()) == expected.tobytes()
+
+        assert monitor.beats == 16 + 8 * payload_length + 24
+        assert monitor.active_cycles == monitor.beats
+        assert monitor.stall_cycles == 0
+        await RisingEdge(dut.aclk)
+
+@cocotb.test(skip=not top_parameter("C_WORD_WHITENING"))
+async def run_test_word_whitening(dut):
+    """
+    Test whitening of the header, payload and CRC words against the model for every channel index.
+    """
+    tb = TB(dut)
+    await tb.reset()
+    monitor = AxiStreamThroughputMonitor(dut, "output", dut.aclk)
+
+    rng = np.random.default_rng(18)
+    # The 40 BLE channels and the rest of the 6-bit channel port
+    for channel in range(64):
+        params = random_packets(rng, 1, int(rng.integers(0, 64)))
+        payload_length = params["payload"].shape[1]
+        whitening_enabled = channel % 8 != 7
+        dut.crc_init.value = int(params["crc_init"][0])
+        dut.packet_hdr.value = int(params["header"][0])
+        dut.whitening_enabled.value = whitening_enabled
+        dut.channel.value = channel
+        if payload_length:
+            tb.source.send_nowait(params["payload"][0].tobytes())
+
+        monitor.clear()
+        dut.restart.value = 1
+        await RisingEdge(dut.aclk)
+        dut.restart.value = 0
+
+        expected = pdu_crc_bits(params["crc_init"], params["header"], params["payload"])
+        if whitening_enabled:
+            expected = whiten(expected, channel)
+        assert bytes(await tb.sink.recv()) == expected[0].tobytes()
+
+        # Whitening doesn't cost a cycle
+        assert monitor.active_cycles == monitor.beats == 16 + 8 * payload_length + 24
+        await RisingEdge(dut.aclk)
+
+@cocotb.test(skip=not top_parameter("C_ENCRYPTION"))
+async def run_test_encryption(dut):
+    """
+    Test AES-CCM encryption of the payload and the MIC against the model, block boundaries and empty PDUs.
+    """
+    tb = TB(dut)
+    await tb.reset()
+
+    rng = np.random.default_rng(20)
+    key = rng.integers(0, 0x100, 16, dtype=np.uint8)
+    iv = rng.integers(0, 0x100, 8, dtype=np.uint8)
+    # Session key in AES byte order, IV least significant octet first like the packet counter
+    dut.session_key.value = int.from_bytes(key.tobytes(), "big")
+    dut.iv.value = int.from_bytes(iv.tobytes(), "little")
+
+    for i, payload_length in enumerate([0, 1, 3, 4, 5, 12, 15, 16, 17, 31, 32, 33, 100, 251]):
+        params = random_packets(rng, 1, payload_length)
+        packet_counter = int(rng.integers(0, 1 << 39))
+        direction = i % 2
+        encryption_enabled = i % 5 != 4
+        dut.crc_init.value = int(params["crc_init"][0])
+        dut.packet_hdr.value = int(params["header"][0])
+        dut.encryption_enabled.value = encryption_enabled
+        dut.packet_counter.value = packet_counter
+        dut.direction.value = direction
+        if payload_length:
+            tb.source.send_nowait(params["payload"][0].tobytes())
+
+        dut.restart.value = 1
+        await RisingEdge(dut.aclk)
+        dut.restart.value = 0
+
+        header, payload = params["header"], params["payload"]
+        if encryption_enabled:
+            header, payload = encrypt_pdu(key, iv, packet_counter, direction, header, payload)
+        expected = pdu_crc_bits(params["crc_init"], header, payload)
+        assert bytes(await tb.sink.recv()) == expected[0].tobytes(), f"payload length {payload_length}"
+        await RisingEdge(dut.aclk)
+
+# Encryption sample data of the Bluetooth Core Specification (Vol 6 Part C 1),
+# LL_START_ENC_RSP from the central and from the peripheral with packet counter 0:
+# direction, encrypted PDU
+ENCRYPTION_SAMPLE_KEY = "99AD1B5226A37E3E058E3B8E27C2C666"
+ENCRYPTION_SAMPLE_IV = "DEAFBABEBADCAB24"
+ENCRYPTION_SAMPLE_PDUS = [(1, "0F059FCDA7F448"), (0, "0F05A34C13A415")]
+
+
+@cocotb.test(skip=not top_parameter("C_ENCRYPTION"))
+async def run_test_encryption_sample_data(dut):
+    """
+    Test the encrypted LL_START_ENC_RSP PDUs of the specification sample data.
+    """
+    tb = TB(dut)
+    await tb.reset()
+
+    # Both are given most significant octet first
+    dut.session_key.value = int(ENCRYPTION_SAMPLE_KEY, 16)
+    dut.iv.value = int(ENCRYPTION_SAMPLE_IV, 16)
+    dut.crc_init.value = 0x555555
+    # LLID 3, length 1, opcode 0x06
+    dut.packet_hdr.value = 0x010F
+    dut.encryption_enabled.value = 1
+    dut.packet_counter.value = 0
+
+    for direction, pdu in ENCRYPTION_SAMPLE_PDUS:
+        pdu = np.frombuffer(bytes.fromhex(pdu), dtype=np.uint8)
+        dut.direction.value = direction
+        tb.source.send_nowait(b"\x06")
+
+        dut.restart.value = 1
+        await RisingEdge(dut.aclk)
+        dut.restart.value = 0
+
+        expected = pdu_crc_bits([0x555555], [int.from_bytes(pdu[:2].tobytes(), "little")], pdu[np.newaxis, 2:])
+        assert bytes(await tb.sink.recv()) == expected[0].tobytes(), f"direction {direction}"
+        await RisingEdge(dut.aclk)
+
+
+@pytest.mark.parametrize("word_whitening, encryption", [(0, 0), (1, 0), (0, 1)])
+def test_serial_crc24(word_whitening, encryption):
     setup_test(
         "test_pdu_crc_generator",
         "pdu_crc_generator",
         [
             os.path.join(rtl_dir, "tx/pdu_crc_generator.sv"),
-            os.path.join(rtl_dir, "serial_crc24.sv"),
+            os.path.join(rtl_dir, "parallel_crc24.sv"),
             os.path.join(rtl_dir, "serializer.sv"),
-        ]
+            os.path.join(rtl_dir, "tx/ccm_encryptor.sv"),
+            os.path.join(rtl_dir, "aes128.sv"),
+        ],
+        parameters={"C_WORD_WHITENING": word_whitening, "C_ENCRYPTION": encryption}
     )
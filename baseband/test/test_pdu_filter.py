@@ -0,0 +1,262 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+import itertools
+import logging
+import os
+
+import cocotb
+import numpy as np
+from cocotb.clock import Clock
+from cocotb.triggers import ReadOnly, RisingEdge
+
+from cocotbext.axi import AxiStreamFrame, AxiStreamBus, AxiStreamSource, AxiStreamSink
+
+from ble_model import PduFilterTable, filter_key, filter_packets
+from helpers import setup_test, rtl_dir, AxiStreamThroughputMonitor, BlePduType
+
+NUM_BUCKETS = 256
+NUM_WAYS = 4
+
+ADVERTISING_ACCESS_CODE = 0x8E89BED6
+
+
+class TB:
+    def __init__(self, dut):
+        self.dut = dut
+
+        self.log = logging.getLogger("cocotb.tb")
+        self.log.setLevel(logging.DEBUG)
+        cocotb.start_soon(Clock(dut.aclk, 2, units="ns").start())
+        self.source = AxiStreamSource(AxiStreamBus.from_prefix(dut, "input"), dut.aclk, dut.aresetn, False)
+        self.sink = AxiStreamSink(AxiStreamBus.from_prefix(dut, "output"), dut.aclk, dut.aresetn, False)
+        self.table = PduFilterTable(NUM_BUCKETS, NUM_WAYS)
+
+        dut.enable.setimmediatevalue(1)
+        dut.counter_clear.setimmediatevalue(0)
+        dut.table_write.setimmediatevalue(0)
+        dut.table_index.setimmediatevalue(0)
+        dut.table_entry.setimmediatevalue(0)
+
+    async def reset(self):
+        self.dut.aresetn.setimmediatevalue(0)
+        await RisingEdge(self.dut.aclk)
+        await RisingEdge(self.dut.aclk)
+        self.dut.aresetn.value = 1
+        await RisingEdge(self.dut.aclk)
+
+    async def write(self, writes):
+        """Write (table_index, table_entry) pairs, one per clock"""
+        for index, entry in writes:
+            self.dut.table_index.value = index
+            self.dut.table_entry.value = entry
+            self.dut.table_write.value = 1
+            await RisingEdge(self.dut.aclk)
+        self.dut.table_write.value = 0
+
+    def insert(self, keys):
+        """Place the keys the table has room for, return the writes"""
+        writes = []
+        for key in keys:
+            try:
+                writes += self.table.insert(key)
+            except ValueError:
+                self.log.info("No room for key %#x", key)
+        return writes
+
+    def send(self, packets):
+        for access_code, pdu_type, header, payload in packets:
+            data = int(header).to_bytes(2, "little") + bytes(bytearray(payload))
+            self.source.send_nowait(AxiStreamFrame(data, tuser=(pdu_type.value << 32) | int(access_code)))
+
+    async def recv(self, packets, forwarded):
+        """Receive the forwarded packets and compare them with the sent ones"""
+        for packet, forward in zip(packets, forwarded):
+            if not forward:
+                continue
+            access_code, pdu_type, header, payload = packet
+            frame = await self.sink.recv()
+            assert frame.tdata == int(header).to_bytes(2, "little") + bytes(bytearray(payload))
+            assert frame.tuser == (pdu_type.value << 32) | int(access_code)
+
+    async def counters(self):
+        await ReadOnly()
+        return self.dut.forwarded_packets.value.integer, self.dut.dropped_packets.value.integer
+
+
+def random_traffic(rng, n_packets, addresses, access_codes):
+    """
+    Draw PDUs as (access_code, pdu_type, header, payload).
+
+    Advertising PDUs of every header type carry one of the addresses as AdvA at
+    the offset of their type, the other PDUs use one of the access codes.
+    """
+    packets = []
+    for _ in range(n_packets):
+        pdu_type = BlePduType(int(rng.integers(0, 4)))
+        if pdu_type == BlePduType.PDU_TYPE_ADVERTISING:
+            adv_type = int(rng.integers(0, 16))
+            # Mostly long enough for AdvA at byte 6, sometimes cutting it short
+            length = int(rng.integers(0, 16)) if rng.integers(0, 8) == 0 else int(rng.integers(12, 38))
+            payload = rng.integers(0, 0x100, length, dtype=np.uint8)
+            address = int(rng.choice(addresses)).to_bytes(6, "little")
+            offset = 6 if adv_type in (3, 5) else 0
+            payload[offset:offset + 6] = np.frombuffer(address, dtype=np.uint8)[:max(0, length - offset)]
+            access_code = ADVERTISING_ACCESS_CODE
+            header = adv_type | (int(rng.integers(0, 16)) << 4)
+        else:
+            length = int(rng.integers(0, 40))
+            payload = rng.integers(0, 0x100, length, dtype=np.uint8)
+            access_code = int(rng.choice(access_codes))
+            header = int(rng.integers(0, 0x100))
+        packets.append((access_code, pdu_type, header | (length << 8), payload))
+    return packets
+
+
+def traffic_keys(packets):
+    return list(dict.fromkeys(filter_key(*packet) for packet in packets))
+
+
+def random_keys(rng, n_keys):
+    """Keys of random advertisers and connections that never show up on air"""
+    return [(int(rng.integers(0, 4)) << 80) | (int(rng.integers(0, 1 << 32)) << 48) | int(rng.integers(1, 1 << 48))
+            for _ in range(n_keys)]
+
+
+async def write_without_stalls(tb, monitor, writes):
+    """Make table writes and check the stream on the monitored input didn't stall meanwhile"""
+    stalls = monitor.stall_cycles
+    await tb.write(writes)
+    assert monitor.stall_cycles == stalls
+
+
+@cocotb.test()
+async def run_test_filter(dut):
+    """
+    Test only the PDUs whose key is in a table of several hundred entries are forwarded.
+    """
+    tb = TB(dut)
+    await tb.reset()
+
+    rng = np.random.default_rng(24)
+    addresses = rng.integers(1, 1 << 48, 300, dtype=np.int64)
+    access_codes = rng.integers(0, 1 << 32, 40, dtype=np.int64)
+
+    for pause in [False, True]:
+        if pause:
+            tb.source.set_pause_generator(itertools.cycle([0, 0, 1]))
+            tb.sink.set_pause_generator(itertools.cycle([0, 1, 1, 0, 0]))
+
+        packets = random_traffic(rng, 400, addresses, access_codes)
+        keys = traffic_keys(packets)
+        await tb.write(tb.insert(keys[:len(keys) // 2] + random_keys(rng, 400)))
+        assert len(tb.table.keys()) >= 450
+
+        forwarded = filter_packets(tb.table.keys(), packets)
+        assert 0 < sum(forwarded) < len(packets)
+        start = await tb.counters()
+        await RisingEdge(dut.aclk)
+        tb.send(packets)
+        await tb.recv(packets, forwarded)
+        await tb.source.wait()
+        for _ in range(8):
+            await RisingEdge(dut.aclk)
+        assert tb.sink.empty()
+        end = await tb.counters()
+        assert (end[0] - start[0], end[1] - start[1]) == (sum(forwarded), len(packets) - sum(forwarded))
+        await RisingEdge(dut.aclk)
+
+
+@cocotb.test()
+async def run_test_disabled(dut):
+    """
+    Test every PDU is forwarded with the filter disabled, and counter_clear clears the counters.
+    """
+    tb = TB(dut)
+    await tb.reset()
+    dut.enable.value = 0
+
+    rng = np.random.default_rng(2424)
+    packets = random_traffic(rng, 100, rng.integers(1, 1 << 48, 10), rng.integers(0, 1 << 32, 10))
+    tb.send(packets)
+    await tb.recv(packets, filter_packets(set(), packets, enable=False))
+    await tb.source.wait()
+    for _ in range(8):
+        await RisingEdge(dut.aclk)
+    assert await tb.counters() == (len(packets), 0)
+
+    await RisingEdge(dut.aclk)
+    dut.counter_clear.value = 1
+    await RisingEdge(dut.aclk)
+    dut.counter_clear.value = 0
+    assert await tb.counters() == (0, 0)
+
+
+@cocotb.test()
+async def run_test_runtime_update(dut):
+    """
+    Test table writes during a stream take effect without stalling it.
+    """
+    tb = TB(dut)
+    await tb.reset()
+
+    rng = np.random.default_rng(2425)
+    addresses = rng.integers(1, 1 << 48, 200, dtype=np.int64)
+    access_codes = rng.integers(0, 1 << 32, 20, dtype=np.int64)
+
+    # The first stream uses half of the senders, the second one the other half
+    first = random_traffic(rng, 200, addresses[:100], access_codes[:10])
+    second = random_traffic(rng, 200, addresses[100:], access_codes[10:])
+    first_keys = traffic_keys(first)
+    second_keys = [key for key in traffic_keys(second) if key not in first_keys]
+    added, removed = second_keys[::2], second_keys[1::2]
+    # A full table, so adding keys moves others, some of them in use
+    await tb.write(tb.insert(first_keys[::2] + removed + random_keys(rng, 700)))
+
+    first_forwarded = filter_packets(tb.table.keys(), first)
+    tb.send(first)
+    monitor = AxiStreamThroughputMonitor(dut, "input", dut.aclk)
+    for _ in range(20):
+        await RisingEdge(dut.aclk)
+
+    # Swap the entries of the second stream while the first one flows
+    writes = tb.insert(added) + [tb.table.remove(key) for key in removed]
+    assert len(writes) > len(added) + len(removed)
+    await write_without_stalls(tb, monitor, writes)
+    assert tb.source.count() > 0
+
+    second_forwarded = filter_packets(tb.table.keys(), second)
+    assert 0 < sum(second_forwarded) < len(second)
+    tb.send(second)
+    await tb.recv(first + second, first_forwarded + second_forwarded)
+
+
+@cocotb.test()
+async def run_test_full_rate(dut):
+    """
+    Test back-to-back PDUs pass at one word per clock.
+    """
+    tb = TB(dut)
+    await tb.reset()
+
+    rng = np.random.default_rng(2426)
+    packets = random_traffic(rng, 100, rng.integers(1, 1 << 48, 20), rng.integers(0, 1 << 32, 20))
+    await tb.write(tb.insert(traffic_keys(packets)))
+    forwarded = filter_packets(tb.table.keys(), packets)
+    assert all(forwarded)
+
+    monitor = AxiStreamThroughputMonitor(dut, "input", dut.aclk)
+    tb.send(packets)
+    await tb.recv(packets, forwarded)
+    assert monitor.active_cycles == monitor.beats == sum((2 + len(packet[3]) + 3) // 4 for packet in packets)
+
+
+def test_pdu_filter():
+    setup_test(
+        "test_pdu_filter",
+        "pdu_filter",
+        [
+            os.path.join(rtl_dir, "rx", "pdu_filter.sv"),
+            os.path.join(rtl_dir, "axis_fifo.sv"),
+        ],
+        parameters={"C_NUM_BUCKETS": NUM_BUCKETS, "C_NUM_WAYS": NUM_WAYS}
+    )
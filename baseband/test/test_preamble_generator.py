@@ -1,27 +1,32 @@
 # 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
 
-import itertools
-import logging
 import os
 
 import cocotb
 from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge
 
-from cocotbext.axi import AxiStreamFrame, AxiStreamBus, AxiStreamSource, AxiStreamSink
-
-from helpers import setup_test, rtl_dir, BlePhy
+from bit_stream import BitStreamSink, BitStreamSource
+from helpers import setup_test, rtl_dir, tb_rtl_dir, BlePhy, AxiStreamThroughputMonitor
 
 class TB:
     def __init__(self, dut):
         self.dut = dut
 
-        self.log = logging.getLogger("cocotb.tb")
-        self.log.setLevel(logging.DEBUG)
         cocotb.start_soon(Clock(dut.aclk, 2, units="ns").start())
 
-        self.source = AxiStreamSource(AxiStreamBus.from_prefix(dut, "input"), dut.aclk, dut.aresetn, False, byte_lanes=1)
-        self.sink = AxiStreamSink(AxiStreamBus.from_prefix(dut, "output"), dut.aclk, dut.aresetn, False, byte_lanes=1)
+        self.source = BitStreamSource(dut, "input", dut.aclk)
+        self.sink = BitStreamSink(dut, "output", dut.aclk, check=True)
+        self.monitor = AxiStreamThroughputMonitor(dut.dut_inst, "output", dut.aclk, upstream="input")
+
+        dut.restart.setimmediatevalue(0)
+        dut.phy.setimmediatevalue(0)
+
+    def set_idle_mask(self, mask):
+        self.source.set_pause_mask(mask)
+
+    def set_backpressure_mask(self, mask):
+        self.sink.set_pause_mask(mask)
 
     async def reset(self):
         self.dut.aresetn.setimmediatevalue(0)
@@ -35,19 +40,23 @@ class TB:
         await RisingEdge(self.dut.aclk)
 
 
-def idle_cycle_pause():
-    return itertools.cycle([1, 1, 1, 1, 0])
+# Pause masks of the shims, walked one bit per clock: idle three clocks in four,
+# backpressure seven in eight
+IDLE_PAUSE_MASK = 0x77777777
+BACKPRESSURE_PAUSE_MASK = 0x7F7F7F7F
 
-def backpressure_cycle_pause():
-    return itertools.cycle([1, 1, 1, 1, 1, 0])
+# Pauses one clock in four, more than a stage at half rate can keep up with
+LIGHT_CYCLE_PAUSE_MASK = 0x88888888
 
 
-
-async def generate_and_compare(dut, phy: BlePhy , input_data, expected_output_data):
+async def generate_and_compare(dut, phy: BlePhy , input_data, expected_output_data, idle_mask=0, backpressure_mask=0):
     tb = TB(dut)
     await tb.reset()
 
-    expected_output_data = bytes(expected_output_data)
+    tb.set_idle_mask(idle_mask)
+    tb.set_backpressure_mask(backpressure_mask)
+
+    tb.monitor.generated_beats = len(expected_output_data) - len(input_data)
 
     dut.phy.value = phy.value
 
@@ -56,13 +65,15 @@ async def generate_and_compare(dut, phy: BlePhy , input_data, expected_output_da
     dut.restart.value = 0
     await RisingEdge(dut.aclk)
 
-    test_frame = AxiStreamFrame(input_data)
-    await tb.source.send(test_frame)
-
-    output_data = bytes(await tb.sink.recv())
+    tb.source.send(input_data)
+    assert await tb.sink.check(expected_output_data) is None
 
-    assert tb.sink.empty()
-    assert output_data == expected_output_data
+    # Throughput is limited by the source and sink pauses only
+    assert tb.monitor.beats == len(expected_output_data)
+    if not idle_mask and not backpressure_mask:
+        assert tb.monitor.active_cycles == tb.monitor.beats
+    else:
+        assert tb.monitor.active_cycles == tb.monitor.beats + tb.monitor.stall_cycles + tb.monitor.starved_cycles
 
 @cocotb.test()
 async def run_test_1phy_55(dut):
@@ -146,11 +157,47 @@ async def run_test_coded_phy(dut):
 
     await generate_and_compare(dut, BlePhy.BLE_PHY_CODED, input_data, expected_output_data)
 
+async def run_test_1phy_access_code(dut, idle_mask=0, backpressure_mask=0):
+    input_data = [
+        # Access address
+        0,1,1,0,1,0,1,1, 0,1,1,1,1,1,0,1, 1,0,0,1,0,0,0,1, 0,1,1,1,0,0,0,1,
+    ]
+
+    expected_output_data = [
+        # Preamble
+        0,1,0,1,0,1,0,1,
+        # Access address
+        0,1,1,0,1,0,1,1, 0,1,1,1,1,1,0,1, 1,0,0,1,0,0,0,1, 0,1,1,1,0,0,0,1,
+    ]
+
+    await generate_and_compare(dut, BlePhy.BLE_PHY_1M, input_data, expected_output_data, idle_mask, backpressure_mask)
+
+@cocotb.test()
+async def run_test_1phy_idle(dut):
+    await run_test_1phy_access_code(dut, idle_mask=IDLE_PAUSE_MASK)
+
+@cocotb.test()
+async def run_test_1phy_backpressure(dut):
+    await run_test_1phy_access_code(dut, backpressure_mask=BACKPRESSURE_PAUSE_MASK)
+
+@cocotb.test()
+async def run_test_1phy_idle_backpressure(dut):
+    await run_test_1phy_access_code(dut, IDLE_PAUSE_MASK, BACKPRESSURE_PAUSE_MASK)
+
+@cocotb.test()
+async def run_test_1phy_light_idle_backpressure(dut):
+    await run_test_1phy_access_code(dut, LIGHT_CYCLE_PAUSE_MASK, LIGHT_CYCLE_PAUSE_MASK)
+
 def test_preamble_generator():
     setup_test(
         "test_preamble_generator",
-        "preamble_generator",
+        "preamble_generator_shim_tb",
         [
+            os.path.join(tb_rtl_dir, "preamble_generator_shim_tb.sv"),
+            os.path.join(tb_rtl_dir, "axis_bit_source_shim.sv"),
+            os.path.join(tb_rtl_dir, "axis_bit_sink_shim.sv"),
             os.path.join(rtl_dir, "tx/preamble_generator.sv"),
+            os.path.join(rtl_dir, "axis_skid_buffer.sv"),
+            os.path.join(rtl_dir, "axis_fifo.sv"),
         ]
     )
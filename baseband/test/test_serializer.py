@@ -0,0 +1,107 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+import itertools
+import logging
+import os
+import random
+
+import cocotb
+import pytest
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge
+
+from cocotbext.axi import AxiStreamBus, AxiStreamSink
+
+from helpers import setup_test, rtl_dir, is_high, AxiStreamThroughputMonitor, PackedBits
+
+class TB:
+    def __init__(self, dut):
+        self.dut = dut
+
+        self.log = logging.getLogger("cocotb.tb")
+        self.log.setLevel(logging.DEBUG)
+        cocotb.start_soon(Clock(dut.aclk, 2, units="ns").start())
+
+        self.sink = AxiStreamSink(AxiStreamBus.from_prefix(dut, "output"), dut.aclk, dut.aresetn, False, byte_lanes=1)
+        self.monitor = AxiStreamThroughputMonitor(dut, "output", dut.aclk)
+
+        dut.input_tvalid.setimmediatevalue(0)
+        dut.input_tlast.setimmediatevalue(0)
+
+    def set_backpressure_generator(self, generator=None):
+        if generator:
+            self.sink.set_pause_generator(generator())
+
+    async def reset(self):
+        self.dut.aresetn.setimmediatevalue(0)
+        await RisingEdge(self.dut.aclk)
+        await RisingEdge(self.dut.aclk)
+        self.dut.aresetn.value = 0
+        await RisingEdge(self.dut.aclk)
+        await RisingEdge(self.dut.aclk)
+        self.dut.aresetn.value = 1
+        await RisingEdge(self.dut.aclk)
+        await RisingEdge(self.dut.aclk)
+
+    async def send_words(self, data, word_bytes=4):
+        """Drive data as words of word_bytes, input_length follows the remaining bytes"""
+        chunks = [data[i:i + word_bytes] for i in range(0, len(data), word_bytes)]
+
+        for index, chunk in enumerate(chunks):
+            self.dut.input_tdata.value = int.from_bytes(chunk, "little")
+            self.dut.input_length.value = 8 * len(chunk)
+            self.dut.input_tlast.value = int(index == len(chunks) - 1)
+            self.dut.input_tvalid.value = 1
+
+            await RisingEdge(self.dut.aclk)
+            while not is_high(self.dut.input_tready):
+                await RisingEdge(self.dut.aclk)
+
+        self.dut.input_tvalid.value = 0
+        self.dut.input_tlast.value = 0
+
+def backpressure_cycle_pause():
+    return itertools.cycle([1, 1, 1, 1, 1, 0])
+
+async def send_and_compare(dut, data, backpressure_inserter=None):
+    tb = TB(dut)
+    await tb.reset()
+
+    tb.set_backpressure_generator(backpressure_inserter)
+
+    cocotb.start_soon(tb.send_words(data))
+
+    # The input bytes are the packed expected output
+    assert PackedBits(data).mismatch(await tb.sink.recv()) is None
+    assert tb.monitor.beats == 8 * len(data)
+
+    return tb
+
+@cocotb.test()
+async def run_test_max_payload(dut):
+    data = bytes(random.Random(0).getrandbits(8) for _ in range(255))
+
+    tb = await send_and_compare(dut, data)
+
+    tb.log.info("Cycles active: %d, bits out: %d", tb.monitor.active_cycles, tb.monitor.beats)
+    if int(dut.C_DOUBLE_BUFFER.value):
+        # Bits out equals cycles active: no gaps between words
+        assert tb.monitor.active_cycles == tb.monitor.beats
+        assert tb.monitor.stall_cycles == 0
+
+@cocotb.test()
+async def run_test_backpressure(dut):
+    data = bytes(random.Random(1).getrandbits(8) for _ in range(37))
+
+    await send_and_compare(dut, data, backpressure_cycle_pause)
+
+@pytest.mark.parametrize("double_buffer", [0, 1])
+def test_serializer(double_buffer):
+    setup_test(
+        "test_serializer",
+        "serializer",
+        [
+            os.path.join(rtl_dir, "serializer.sv"),
+        ],
+        parameters={"C_DOUBLE_BUFFER": double_buffer}
+    )
@@ -0,0 +1,164 @@
+# 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
+
+import os
+
+import cocotb
+import numpy as np
+from cocotb.clock import Clock
+from cocotb.triggers import ReadOnly, RisingEdge
+
+from helpers import setup_test, rtl_dir, is_high, drain_events
+
+EVENT_FIFO_DEPTH = 16
+
+
+class TB:
+    def __init__(self, dut):
+        self.dut = dut
+        cocotb.start_soon(Clock(dut.aclk, 25, units="ns").start())
+
+        dut.compare_tick.setimmediatevalue(0)
+        dut.compare_arm.setimmediatevalue(0)
+        dut.compare_disarm.setimmediatevalue(0)
+        dut.events.setimmediatevalue(0)
+        dut.event_tready.setimmediatevalue(0)
+        dut.event_overflow_clear.setimmediatevalue(0)
+
+    async def reset(self):
+        self.dut.aresetn.setimmediatevalue(0)
+        await RisingEdge(self.dut.aclk)
+        await RisingEdge(self.dut.aclk)
+        self.dut.aresetn.value = 1
+        await RisingEdge(self.dut.aclk)
+
+    async def timestamp(self):
+        await ReadOnly()
+        return self.dut.timestamp.value.integer
+
+    async def arm(self, tick):
+        self.dut.compare_tick.value = tick & 0xFFFFFFFF
+        self.dut.compare_arm.value = 1
+        await RisingEdge(self.dut.aclk)
+        self.dut.compare_arm.value = 0
+
+    async def wait_match(self, max_clocks):
+        """Return the timestamps of the clocks compare_match was high on"""
+        matches = []
+        for _ in range(max_clocks):
+            await ReadOnly()
+            if is_high(self.dut.compare_match):
+                matches.append(self.dut.timestamp.value.integer)
+            await RisingEdge(self.dut.aclk)
+        return matches
+
+    async def pulse_events(self, events):
+        """Raise the event inputs for one clock, return the timestamp of that clock"""
+        self.dut.events.value = events
+        timestamp = await self.timestamp()
+        await RisingEdge(self.dut.aclk)
+        self.dut.events.value = 0
+        return timestamp
+
+
+@cocotb.test()
+async def run_test_compare_match(dut):
+    """
+    Test the compare matches once, on the clock the timestamp reaches the tick.
+    """
+    tb = TB(dut)
+    await tb.reset()
+
+    for delay in [2, 3, 17, 150]:
+        await RisingEdge(dut.aclk)
+        tick = (await tb.timestamp()) + delay
+        await RisingEdge(dut.aclk)
+        await tb.arm(tick)
+        assert await tb.wait_match(delay + 8) == [tick]
+        await ReadOnly()
+        assert not is_high(dut.compare_armed)
+
+
+@cocotb.test()
+async def run_test_compare_late_arm(dut):
+    """
+    Test a tick already passed matches on the next clock and disarm cancels a compare.
+    """
+    tb = TB(dut)
+    await tb.reset()
+
+    for _ in range(40):
+        await RisingEdge(dut.aclk)
+    tick = (await tb.timestamp()) - 30
+    await RisingEdge(dut.aclk)
+    await tb.arm(tick)
+    matches = await tb.wait_match(4)
+    assert len(matches) == 1
+
+    tick = (await tb.timestamp()) + 20
+    await RisingEdge(dut.aclk)
+    await tb.arm(tick)
+    await ReadOnly()
+    assert is_high(dut.compare_armed)
+    await RisingEdge(dut.aclk)
+    dut.compare_disarm.value = 1
+    await RisingEdge(dut.aclk)
+    dut.compare_disarm.value = 0
+    assert await tb.wait_match(40) == []
+
+
+@cocotb.test()
+async def run_test_event_fifo(dut):
+    """
+    Test event records are drained in bulk with the timestamps of the event clocks.
+    """
+    tb = TB(dut)
+    await tb.reset()
+
+    rng = np.random.default_rng(22)
+    for _ in range(4):
+        expected = []
+        for _ in range(EVENT_FIFO_DEPTH):
+            for _ in range(int(rng.integers(0, 10))):
+                await RisingEdge(dut.aclk)
+            events = int(rng.integers(1, 4))
+            expected.append((events, await tb.pulse_events(events)))
+
+        await ReadOnly()
+        assert dut.event_level.value.integer == EVENT_FIFO_DEPTH
+        await RisingEdge(dut.aclk)
+        assert await drain_events(dut) == expected
+        assert not is_high(dut.event_overflow)
+
+
+@cocotb.test()
+async def run_test_event_overflow(dut):
+    """
+    Test events that find the FIFO full are dropped and flagged until cleared.
+    """
+    tb = TB(dut)
+    await tb.reset()
+
+    expected = [(1, await tb.pulse_events(1)) for _ in range(EVENT_FIFO_DEPTH)]
+    await tb.pulse_events(2)
+    await ReadOnly()
+    assert is_high(dut.event_overflow)
+    await RisingEdge(dut.aclk)
+    assert await drain_events(dut) == expected
+
+    dut.event_overflow_clear.value = 1
+    await RisingEdge(dut.aclk)
+    dut.event_overflow_clear.value = 0
+    await ReadOnly()
+    assert not is_high(dut.event_overflow)
+
+
+def test_timebase():
+    setup_test(
+        "test_timebase",
+        "timebase",
+        [
+            os.path.join(rtl_dir, "timebase.sv"),
+            os.path.join(rtl_dir, "axis_fifo.sv"),
+        ],
+        parameters={"C_EVENT_FIFO_DEPTH": EVENT_FIFO_DEPTH}
+    )
@@ -1,34 +1,34 @@
 # 2024 Taras Zaporozhets <zaporozhets.taras@gmail.com>
 
-import itertools
-import logging
 import os
 
 import cocotb
 from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge
 
-from cocotbext.axi import AxiStreamFrame, AxiStreamBus, AxiStreamSource, AxiStreamSink
-
-from helpers import setup_test, rtl_dir
+from ble_model import whiten
+from bit_stream import BitStreamSink, BitStreamSource
+from helpers import setup_test, rtl_dir, tb_rtl_dir, AxiStreamThroughputMonitor
 
 class TB:
     def __init__(self, dut):
         self.dut = dut
 
-        self.log = logging.getLogger("cocotb.tb")
-        self.log.setLevel(logging.DEBUG)
         cocotb.start_soon(Clock(dut.aclk, 2, units="ns").start())
-        self.source = AxiStreamSource(AxiStreamBus.from_prefix(dut, "input"), dut.aclk, dut.aresetn, False, byte_lanes=1)
-        self.sink = AxiStreamSink(AxiStreamBus.from_prefix(dut, "output"), dut.aclk, dut.aresetn, False, byte_lanes=1)
+        # The 1-bit streams of whitening are driven through the shims of whitening_shim_tb
+        self.source = BitStreamSource(dut, "input", dut.aclk)
+        self.sink = BitStreamSink(dut, "output", dut.aclk, check=True)
+        self.monitor = AxiStreamThroughputMonitor(dut.dut_inst, "output", dut.aclk, upstream="input")
+
+        dut.bypass.setimmediatevalue(0)
+        dut.restart.setimmediatevalue(0)
+        dut.channel.setimmediatevalue(0)
 
-    def set_idle_generator(self, generator=None):
-        if generator:
-            self.source.set_pause_generator(generator())
+    def set_idle_mask(self, mask):
+        self.source.set_pause_mask(mask)
 
-    def set_backpressure_generator(self, generator=None):
-        if generator:
-            self.sink.set_pause_generator(generator())
+    def set_backpressure_mask(self, mask):
+        self.sink.set_pause_mask(mask)
 
     async def reset(self):
         self.dut.aresetn.setimmediatevalue(0)
@@ -42,16 +42,31 @@ class TB:
         await RisingEdge(self.dut.aclk)
 
 
-def cycle_pause():
-    return itertools.cycle([1, 1, 1, 0])
+# Pause masks of the shims, walked one bit per clock: three clocks in four
+CYCLE_PAUSE_MASK = 0x77777777
+
+# Pauses one clock in four, more than a stage at half rate can keep up with
+LIGHT_CYCLE_PAUSE_MASK = 0x88888888
+
+# PDU and CRC before whitening:
+INPUT_BITSTREAM = [
+    0,1,0,0,0,0,1,0, 1,0,0,1,0,0,0,0, 0,1,1,0,0,1,0,1, 1,0,1,0,0,1,0,1, 0,0,1,0,0,1,0,1, 1,1,0,0,0,1,0,1, 0,1,0,0,0,1,0,1,
+    1,0,0,0,0,0,1,1, 1,0,0,0,0,0,0,0, 0,1,0,0,0,0,0,0, 1,1,0,0,0,0,0,0, 1,0,1,1,0,1,0,1, 0,0,1,0,1,1,0,1, 1,1,0,1,0,1,1,1,
+]
+
+# PDU and CRC after whitening:
+WHITENED_BITSTREAM = [
+    0,0,1,0,1,0,0,1, 0,0,1,1,0,0,1,1, 0,1,0,0,0,1,1,1, 1,0,1,0,0,0,0,1, 1,0,1,1,1,1,1,1, 1,0,1,1,1,1,1,0, 1,1,0,0,0,0,1,0,
+    0,1,1,1,0,0,1,0, 0,1,0,1,1,0,0,0, 1,1,1,0,0,1,0,1, 0,0,1,1,0,1,0,1, 1,1,1,1,0,1,1,1, 1,1,1,1,0,0,1,1, 1,0,1,0,0,1,0,1,
+]
 
 @cocotb.test()
 async def run_test_basic(dut):
     tb = TB(dut)
     await tb.reset()
 
-    tb.set_idle_generator(cycle_pause)
-    tb.set_backpressure_generator(cycle_pause)
+    tb.set_idle_mask(CYCLE_PAUSE_MASK)
+    tb.set_backpressure_mask(CYCLE_PAUSE_MASK)
 
 
     # Channel index: 38
@@ -65,25 +80,12 @@ async def run_test_basic(dut):
     await RisingEdge(dut.aclk)
 
 
-    # PDU and CRC before whitening:
-    input_bistream = [
-        0,1,0,0,0,0,1,0, 1,0,0,1,0,0,0,0, 0,1,1,0,0,1,0,1, 1,0,1,0,0,1,0,1, 0,0,1,0,0,1,0,1, 1,1,0,0,0,1,0,1, 0,1,0,0,0,1,0,1,
-        1,0,0,0,0,0,1,1, 1,0,0,0,0,0,0,0, 0,1,0,0,0,0,0,0, 1,1,0,0,0,0,0,0, 1,0,1,1,0,1,0,1, 0,0,1,0,1,1,0,1, 1,1,0,1,0,1,1,1,
-    ]
+    tb.source.send(INPUT_BITSTREAM)
+    assert await tb.sink.check(WHITENED_BITSTREAM) is None
 
-    # PDU and CRC after whitening:
-    expected_output_data = [
-        0,0,1,0,1,0,0,1, 0,0,1,1,0,0,1,1, 0,1,0,0,0,1,1,1, 1,0,1,0,0,0,0,1, 1,0,1,1,1,1,1,1, 1,0,1,1,1,1,1,0, 1,1,0,0,0,0,1,0,
-        0,1,1,1,0,0,1,0, 0,1,0,1,1,0,0,0, 1,1,1,0,0,1,0,1, 0,0,1,1,0,1,0,1, 1,1,1,1,0,1,1,1, 1,1,1,1,0,0,1,1, 1,0,1,0,0,1,0,1,
-    ]
-
-    test_frame = AxiStreamFrame(input_bistream)
-    await tb.source.send(test_frame)
-
-    output_data = await tb.sink.recv()
-
-    assert tb.sink.empty()
-    assert bytes(output_data) == bytes(expected_output_data)
+    # Throughput is limited by the source and sink pauses only
+    assert tb.monitor.beats == len(WHITENED_BITSTREAM)
+    assert tb.monitor.active_cycles == tb.monitor.beats + tb.monitor.stall_cycles + tb.monitor.starved_cycles
 
 @cocotb.test()
 async def run_test_bypass(dut):
@@ -91,8 +93,8 @@ async def run_test_bypass(dut):
     tb = TB(dut)
     await tb.reset()
 
-    tb.set_idle_generator(cycle_pause)
-    tb.set_backpressure_generator(cycle_pause)
+    tb.set_idle_mask(CYCLE_PAUSE_MASK)
+    tb.set_backpressure_mask(CYCLE_PAUSE_MASK)
 
 
     # Channel index: 38
@@ -106,25 +108,68 @@ async def run_test_bypass(dut):
     await RisingEdge(dut.aclk)
 
 
-    # PDU and CRC before whitening:
-    input_bistream = [
-        0,1,0,0,0,0,1,0, 1,0,0,1,0,0,0,0, 0,1,1,0,0,1,0,1, 1,0,1,0,0,1,0,1, 0,0,1,0,0,1,0,1, 1,1,0,0,0,1,0,1, 0,1,0,0,0,1,0,1,
-        1,0,0,0,0,0,1,1, 1,0,0,0,0,0,0,0, 0,1,0,0,0,0,0,0, 1,1,0,0,0,0,0,0, 1,0,1,1,0,1,0,1, 0,0,1,0,1,1,0,1, 1,1,0,1,0,1,1,1,
-    ]
+    tb.source.send(INPUT_BITSTREAM)
+    assert await tb.sink.check(INPUT_BITSTREAM) is None
 
-    test_frame = AxiStreamFrame(input_bistream)
-    await tb.source.send(test_frame)
+    assert tb.monitor.beats == len(INPUT_BITSTREAM)
+    assert tb.monitor.active_cycles == tb.monitor.beats + tb.monitor.stall_cycles + tb.monitor.starved_cycles
+
+@cocotb.test()
+async def run_test_light_pause(dut):
+
+    tb = TB(dut)
+    await tb.reset()
+
+    tb.set_idle_mask(LIGHT_CYCLE_PAUSE_MASK)
+    tb.set_backpressure_mask(LIGHT_CYCLE_PAUSE_MASK)
+
+    # Channel index: 38
+    dut.channel.value = 38
+    dut.bypass.value = 0
+    dut.restart.value = 1
+    await RisingEdge(dut.aclk)
+    dut.restart.value = 0
+    await RisingEdge(dut.aclk)
+
+    tb.source.send(INPUT_BITSTREAM * 4)
+    assert await tb.sink.check(whiten([INPUT_BITSTREAM * 4], 38)[0]) is None
+
+    # Every clock without an output bit is a source or sink pause
+    assert tb.monitor.beats == len(INPUT_BITSTREAM) * 4
+    assert tb.monitor.active_cycles == tb.monitor.beats + tb.monitor.stall_cycles + tb.monitor.starved_cycles
+
+@cocotb.test()
+async def run_test_full_rate(dut):
+
+    tb = TB(dut)
+    await tb.reset()
+
+    # Channel index: 38
+    dut.channel.value = 38
+    dut.bypass.value = 0
+    dut.restart.value = 1
+    await RisingEdge(dut.aclk)
+    dut.restart.value = 0
+    await RisingEdge(dut.aclk)
 
-    output_data = await tb.sink.recv()
+    tb.source.send(INPUT_BITSTREAM * 4)
+    assert await tb.sink.check(whiten([INPUT_BITSTREAM * 4], 38)[0]) is None
 
-    assert tb.sink.empty()
-    assert bytes(output_data) == bytes(input_bistream)
+    # One bit per clock, no bubbles
+    assert tb.monitor.beats == len(INPUT_BITSTREAM) * 4
+    assert tb.monitor.active_cycles == tb.monitor.beats
+    assert tb.monitor.stall_cycles == 0
 
 def test_whitening():
     setup_test(
         "test_whitening",
-        "whitening",
+        "whitening_shim_tb",
         [
+            os.path.join(tb_rtl_dir, "whitening_shim_tb.sv"),
+            os.path.join(tb_rtl_dir, "axis_bit_source_shim.sv"),
+            os.path.join(tb_rtl_dir, "axis_bit_sink_shim.sv"),
             os.path.join(rtl_dir, "whitening.sv"),
+            os.path.join(rtl_dir, "axis_skid_buffer.sv"),
+            os.path.join(rtl_dir, "axis_fifo.sv"),
         ]
     )